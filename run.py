@@ -1,27 +1,33 @@
 import sys
 import traceback
 import platform
+import multiprocessing
 
 import wafel.log as log
 import wafel.config as config
 
-log.info('Wafel', config.version_str('.'))
-log.info(f'Platform: {platform.platform()} {platform.machine()}')
+# Precompute worker processes import this module, so the app must only start in the main
+# process
+if __name__ == '__main__':
+  multiprocessing.freeze_support()
 
-config.init()
+  log.info('Wafel', config.version_str('.'))
+  log.info(f'Platform: {platform.platform()} {platform.machine()}')
 
-with open(config.log_file, 'a') as log_file:
-  log_file.write('-' * 80 + '\n')
-  def append_to_log(message: log.LogMessage) -> None:
-    log_file.write(str(message) + '\n')
-    log_file.flush()
-  log.subscribe(append_to_log)
+  config.init()
 
-  try:
-    from wafel.main import run
-    # import cProfile
-    # cProfile.run('run()', sort='cumtime')
-    run()
-  except:
-    log.error('Uncaught:', traceback.format_exc())
-    sys.exit(1)
+  with open(config.log_file, 'a') as log_file:
+    log_file.write('-' * 80 + '\n')
+    def append_to_log(message: log.LogMessage) -> None:
+      log_file.write(str(message) + '\n')
+      log_file.flush()
+    log.subscribe(append_to_log)
+
+    try:
+      from wafel.main import run
+      # import cProfile
+      # cProfile.run('run()', sort='cumtime')
+      run()
+    except:
+      log.error('Uncaught:', traceback.format_exc())
+      sys.exit(1)
@@ -16,13 +16,14 @@ assets_directory: str
 lib_directory: str
 log_file: str
 settings_file: str
+snapshot_directory: str
 
 
 def version_str(delim: str) -> str:
   return delim.join(map(str, version))
 
 def init() -> None:
-  global dev_mode, assets_directory, lib_directory, log_file, settings_file
+  global dev_mode, assets_directory, lib_directory, log_file, settings_file, snapshot_directory
   if getattr(sys, 'frozen', False):
     dev_mode = False
     root_dir = os.path.dirname(sys.executable)
@@ -35,6 +36,7 @@ def init() -> None:
   assets_directory = os.path.join(root_dir, 'assets')
   log_file = os.path.join(root_dir, 'log.txt')
   settings_file = os.path.join(root_dir, 'settings.json')
+  snapshot_directory = os.path.join(root_dir, 'snapshots')
 
   import wafel.bindings as bindings
   bindings.init()
@@ -91,6 +91,8 @@ class FrameSheet:
     self.prev_selected_frame: Optional[int] = None
     self.scroll_delta = 0.0
 
+    self.pinned: Optional[Tuple[object, List[FrameSheetColumn]]] = None
+
 
   def _insert_variable(self, index: int, variable: Variable) -> None:
     variable = variable.without_frame()
@@ -110,6 +112,14 @@ class FrameSheet:
     self.columns = list(self.next_columns)
 
 
+  def update_pinned_variables(self) -> None:
+    # Keep the columns preloaded for new frames, even while they are scrolled out of view
+    pinned = (self.model.pipeline, self.columns)
+    if pinned != self.pinned:
+      self.model.pipeline.set_pinned_variables([column.variable for column in self.columns])
+      self.pinned = pinned
+
+
   def _move_column(self, source: int, dest: int) -> None:
     if self.columns != self.next_columns:
       log.error('Multiple frame sheet column mods on same frame')
@@ -324,3 +334,4 @@ class FrameSheet:
     ig.end_child()
 
     self.columns = list(self.next_columns)
+    self.update_pinned_variables()
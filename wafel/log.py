@@ -62,6 +62,7 @@ def error(*words: object) -> None:
 class Summary:
   time: float = 0.0
   copies: float = 0.0
+  copied_bytes: float = 0.0
   updates: float = 0.0
   requests: float = 0.0
 
@@ -72,6 +73,7 @@ class Summary:
     return Summary(
       time = sum(s.time for s in samples) / len(samples),
       copies = sum(s.copies for s in samples) / len(samples),
+      copied_bytes = sum(s.copied_bytes for s in samples) / len(samples),
       updates = sum(s.updates for s in samples) / len(samples),
       requests = sum(s.requests for s in samples) / len(samples),
     )
@@ -85,6 +87,7 @@ class Timer:
     self.active: Dict[Tuple[str, ...], Summary] = {}
     self.stack: List[str] = []
     self.get_num_copies = lambda: 0
+    self.get_num_copied_bytes = lambda: 0
     self.get_num_updates = lambda: 0
 
   def begin(self, name: str) -> None:
@@ -93,6 +96,7 @@ class Timer:
     self.active[path] = Summary(
       time = time.time(),
       copies = self.get_num_copies(),
+      copied_bytes = self.get_num_copied_bytes(),
       updates = self.get_num_updates(),
     )
 
@@ -104,6 +108,7 @@ class Timer:
     sample = self.active.pop(path)
     sample.time = (time.time() - sample.time) * 1000
     sample.copies = self.get_num_copies() - sample.copies
+    sample.copied_bytes = self.get_num_copied_bytes() - sample.copied_bytes
     sample.updates = self.get_num_updates() - sample.updates
     self.samples[path].append(sample)
 
@@ -142,12 +147,13 @@ class Timer:
   def format(self, summaries: Dict[Tuple[str, ...], Summary]) -> List[str]:
     from wafel.util import format_align
     return format_align(
-      '{0}%s%a - %s{1:.1f}%ams  %s{2}%a  %s{3}%a  %s{4}%a',
+      '{0}%s%a - %s{1:.1f}%ams  %s{2}%a (%s{3}%aKB)  %s{4}%a  %s{5}%a',
       [
         (
           '  ' * (len(path) - 1) + path[-1],
           s.time,
           math.ceil(s.copies),
+          math.ceil(s.copied_bytes / 1024),
           math.ceil(s.updates),
           math.ceil(s.requests),
         )
@@ -1,4 +1,5 @@
 from typing import *
+import atexit
 import json
 import math
 import sys
@@ -16,7 +17,7 @@ from OpenGL import GL as gl
 from wafel_core import Pipeline
 
 import wafel.imgui as ig
-from wafel.model import Model
+from wafel.model import Model, PLAYBACK_FPS
 from wafel.frame_sheet import FrameSheet
 from wafel.variable import Variable
 from wafel.variable_explorer import VariableExplorer
@@ -322,16 +323,35 @@ class MainView:
 
 
     ig.same_line()
+    self.render_frame_slider()
+
+
+  def render_frame_slider(self) -> None:
+    num_frames = self.model.max_frame - 1
+
+    def frame_cost_bins(num_bins: int) -> List[float]:
+      return self.model.pipeline.frame_cost_bins(max(num_frames, 0), num_bins)
+
     new_frame = ui.render_frame_slider(
       'frame-slider',
       self.model.selected_frame,
-      self.model.max_frame - 1,
+      num_frames,
       self.model.pipeline.cached_frames() if self.show_debug_pane else [],
+      frame_cost_bins if self.show_debug_pane else None,
     )
     if new_frame is not None:
       self.model.selected_frame = new_frame.value
 
 
+  # Shown in place of the columns while a distant frame is loading, since reading from it
+  # would block. Clicking elsewhere on the slider retargets the seek
+  def render_seek_progress(self) -> None:
+    ui.render_loading_bar('seek-progress', self.model.seek_progress(), ig.get_window_width() - 20)
+    if ig.button('Cancel'):
+      self.model.cancel_seek()
+    self.render_frame_slider()
+
+
   def render_right_column(self) -> None:
     total_height = ig.get_window_height()
 
@@ -361,6 +381,23 @@ class MainView:
       for line in log.timer.format(log.timer.get_summaries()):
         ig.text(line)
 
+      cost_model = self.model.pipeline.cost_model()
+      if cost_model['copy_time'] is not None and cost_model['advance_time'] is not None:
+        ig.text(
+          f"copy: {cost_model['copy_time'] * 1000:.3f}ms"
+          f"  advance: {cost_model['advance_time'] * 1000:.3f}ms"
+          f"  ratio: {cost_model['copy_cost']:.1f}"
+        )
+
+      cache_stats = self.model.pipeline.data_cache_stats()
+      ig.text(
+        f"cache: {self.model.pipeline.data_cache_size() // 1024}KB"
+        f"  hits: {cache_stats['hits']}"
+        f"  misses: {cache_stats['misses']}"
+        f"  evictions: {cache_stats['evictions']}"
+        f"  hot paths: {cache_stats['hot_paths']}"
+      )
+
       ig.columns(1)
       ig.end_child()
       ig.pop_id()
@@ -489,8 +526,6 @@ class MainView:
     # if ig.is_key_pressed(ord('`')):
     #   self.show_debug_pane = not self.show_debug_pane
 
-    self.handle_controller()
-
     prev_frame_time = use_state_with('prev-frame-time', time.time)
     accum_time = use_state('accum-time', 0.0)
     now = time.time()
@@ -501,7 +536,7 @@ class MainView:
     if play_speed == 0.0:
       accum_time.value = 0
     else:
-      target_fps = 30 * abs(play_speed)
+      target_fps = PLAYBACK_FPS * abs(play_speed)
       target_dt = 1 / target_fps
       updates = 0
       while accum_time.value >= target_dt and updates < 20:
@@ -510,14 +545,21 @@ class MainView:
         self.handle_controller()
         updates += 1
 
+    loaded = self.model.seek_selected_frame()
+    if loaded:
+      self.handle_controller()
+
     ig_window_size = ig.get_window_size()
     window_size = (int(ig_window_size.x), int(ig_window_size.y))
 
-    ig.columns(2)
-    self.render_left_column(window_size)
-    ig.next_column()
-    self.render_right_column()
-    ig.columns(1)
+    if loaded:
+      ig.columns(2)
+      self.render_left_column(window_size)
+      ig.next_column()
+      self.render_right_column()
+      ig.columns(1)
+    else:
+      self.render_seek_progress()
 
     ig.pop_id()
 
@@ -626,6 +668,25 @@ class View:
 
         ig.end_menu()
 
+      if hasattr(self.model, 'pipeline') and ig.begin_menu('Branch'):
+        if ig.menu_item('New branch')[0]:
+          self.model.fork_branch()
+        ig.separator()
+
+        current_branch = self.model.branch
+        branches = self.model.branches
+        for branch in branches:
+          if ig.menu_item(f'Branch {branch}', selected = branch == current_branch)[0]:
+            self.model.switch_branch(branch)
+
+        if ig.begin_menu('Delete', enabled = len(branches) > 1):
+          for branch in branches:
+            if branch != current_branch and ig.menu_item(f'Branch {branch}')[0]:
+              self.model.delete_branch(branch)
+          ig.end_menu()
+
+        ig.end_menu()
+
       if ig.begin_menu('Settings'):
         if ig.menu_item('Controller')[0]:
           open_popup = 'Controller##settings-controller'
@@ -678,6 +739,8 @@ class View:
 
 def run() -> None:
   model = Model()
+  # Stop precompute workers and remove their files on exit
+  atexit.register(model.close)
   view = None
   error = None
 
@@ -708,10 +771,16 @@ def run() -> None:
         log.info(
           f'mspf: {int(1000 / fps.value * 10) / 10} ({int(fps.value)} fps)'
           f' - cache={model.pipeline.data_cache_size() // 1024}KB'
+          f' - slots={model.pipeline.slot_memory_size() // 1024}KB'
         )
 
+      # Balancing and seeking continue on a background thread while the UI is idle
       log.timer.begin('balance')
-      model.pipeline.balance_distribution(1/120)
+      model.pipeline.balance_in_background()
+      log.timer.end()
+
+      log.timer.begin('precompute')
+      model.precompute()
       log.timer.end()
 
   # TODO: Clean up (use local_state)
@@ -748,6 +817,7 @@ def run() -> None:
     try:
       if hasattr(model, 'pipeline'):
         log.timer.get_num_copies = lambda: model.pipeline.num_copies() if config.dev_mode else 0
+        log.timer.get_num_copied_bytes = lambda: model.pipeline.num_copied_bytes() if config.dev_mode else 0
         log.timer.get_num_updates = lambda: model.pipeline.num_advances() if config.dev_mode else 0
 
       log.timer.begin_frame()
@@ -5,12 +5,21 @@ import gc
 import os
 import weakref
 
-from wafel_core import Variable, Pipeline, ObjectBehavior
+from wafel_core import Variable, Pipeline, ObjectBehavior, DataPath
 
 import wafel.config as config
+from wafel.precompute import Precomputer
+from wafel.loading import Progress
 from wafel.util import *
 
 
+# Time spent advancing toward the selected frame per UI frame, in seconds
+SEEK_TIME_BUDGET = 1/60
+
+# Frames played per second at a play speed of 1
+PLAYBACK_FPS = 30
+
+
 class Model:
 
   def __init__(self) -> None:
@@ -18,6 +27,12 @@ class Model:
     self.pipeline: Pipeline
     self.rotational_camera_yaw = 0
     self.input_up_yaw: Optional[int] = None
+    self.precomputer: Optional[Precomputer] = None
+
+  def close(self) -> None:
+    if self.precomputer is not None:
+      self.precomputer.close()
+      self.precomputer = None
 
   def load(self, game_version: str, edits: Dict[Variable, object]) -> None:
     self._load_game_version(game_version, 0)
@@ -33,21 +48,56 @@ class Model:
     if prev_pipeline:
       self.pipeline = Pipeline.load_reusing_edits(dll_path, prev_pipeline)
     else:
-      self.pipeline = Pipeline.load(dll_path)
+      memory_budget_mb = config.settings.get('slot_memory_budget_mb')
+      self.pipeline = Pipeline.load(
+        dll_path,
+        delta_slots=True,
+        memory_budget_bytes=None if memory_budget_mb is None else int(memory_budget_mb * 1024 * 1024),
+      )
+      self.pipeline.set_convergence_limit(config.settings.get('convergence_max_advances'))
+    self._data_paths: Dict[str, DataPath] = {}
+
+    data_cache_mb = config.settings.get('data_cache_mb')
+    if data_cache_mb is not None:
+      self.pipeline.set_data_cache_budget(int(data_cache_mb * 1024 * 1024))
+
+    snapshot_cache_mb = config.settings.get('snapshot_cache_mb')
+    if snapshot_cache_mb is not None:
+      self.pipeline.set_snapshot_store(
+        config.snapshot_directory,
+        int(snapshot_cache_mb * 1024 * 1024),
+      )
+
+    if self.precomputer is not None:
+      self.precomputer.close()
+      self.precomputer = None
+    precompute_workers = config.settings.get('precompute_workers')
+    if precompute_workers:
+      precompute_cache_mb = config.settings.get('precompute_cache_mb') or 256
+      self.precomputer = Precomputer(
+        dll_path,
+        int(precompute_workers),
+        int(precompute_cache_mb * 1024 * 1024),
+      )
 
     self.action_names = self.pipeline.action_names()
 
     self._selected_frame = selected_frame
+    self._loaded_frame = selected_frame
     self.selected_frame_callbacks: List[Callable[[int], None]] = []
 
     self.edit_callbacks: List[Callable[[], None]] = []
 
-    self.play_speed = 0.0
+    self._play_speed = 0.0
     self.playback_mode = False
 
+    self._hotspots: Dict[str, int] = {}
+
     def set_hotspot(frame: int) -> None:
-      self.pipeline.set_hotspot('selected-frame', frame)
-      self.pipeline.set_hotspot('selected-frame-lookahead', frame + 60)
+      self.set_hotspot('selected-frame', frame)
+      self.set_hotspot('selected-frame-lookahead', frame + 60)
+      if self._play_speed != 0.0:
+        self._update_playback()
     self.on_selected_frame_change(set_hotspot)
     set_hotspot(self._selected_frame)
 
@@ -92,12 +142,74 @@ class Model:
     if self.selected_frame > frame or self.selected_frame > self._max_frame:
       self.selected_frame -= 1
 
+  def seek_selected_frame(self) -> bool:
+    loaded = self.pipeline.seek(self._selected_frame, SEEK_TIME_BUDGET)
+    if loaded:
+      self._loaded_frame = self._selected_frame
+    return loaded
+
+  def seek_progress(self) -> Progress:
+    progress = self.pipeline.seek_progress()
+    return Progress(
+      0.0 if progress is None else progress[1],
+      f'Loading frame {self._selected_frame}',
+    )
+
+  def cancel_seek(self) -> None:
+    self.pipeline.cancel_seek()
+    self.selected_frame = self._loaded_frame
+
+  @property
+  def play_speed(self) -> float:
+    return self._play_speed
+
+  @play_speed.setter
+  def play_speed(self, play_speed: float) -> None:
+    if play_speed != self._play_speed:
+      self._play_speed = play_speed
+      self._update_playback()
+
+  # Let the pipeline prefetch frames in the direction of playback
+  def _update_playback(self) -> None:
+    if self._play_speed == 0.0:
+      self.pipeline.stop_playback()
+    else:
+      self.pipeline.set_playback(self._selected_frame, PLAYBACK_FPS * self._play_speed)
+
   def set_hotspot(self, name: str, frame: int) -> None:
     self.pipeline.set_hotspot(name, frame)
+    self._hotspots[name] = frame
+
+  def precompute(self) -> None:
+    if self.precomputer is not None:
+      self.precomputer.update(self.pipeline, [*self._hotspots.values(), self._max_frame])
 
   def on_edit(self, callback: Callable[[], None]) -> None:
     self.edit_callbacks.append(callback)
 
+  # Branches
+
+  @property
+  def branch(self) -> int:
+    return self.pipeline.branch()
+
+  @property
+  def branches(self) -> List[int]:
+    return self.pipeline.branches()
+
+  # Switches to a new branch with a copy of the current edits
+  def fork_branch(self) -> None:
+    self.switch_branch(self.pipeline.fork())
+
+  def switch_branch(self, branch: int) -> None:
+    if branch != self.pipeline.branch():
+      self.pipeline.switch_branch(branch)
+      for callback in self.edit_callbacks:
+        callback()
+
+  def delete_branch(self, branch: int) -> None:
+    self.pipeline.delete_branch(branch)
+
   @overload
   def get(self, frame: int, path: str) -> object:
     ...
@@ -111,7 +223,11 @@ class Model:
     else:
       frame: int = arg1
       path: str = arg2
-      return self.pipeline.path_read(frame, path)
+      data_path = self._data_paths.get(path)
+      if data_path is None:
+        data_path = self.pipeline.data_path(path)
+        self._data_paths[path] = data_path
+      return self.pipeline.data_path_read(frame, data_path)
 
   def get_object_behavior(self, frame: int, object_slot: int) -> Optional[ObjectBehavior]:
     return self.pipeline.object_behavior(frame, object_slot)
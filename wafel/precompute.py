@@ -0,0 +1,134 @@
+from typing import *
+from multiprocessing.pool import AsyncResult
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from wafel_core import Pipeline, Variable
+
+from wafel.util import *
+
+
+# Frames are precomputed up to a multiple of this, since workers only snapshot these frames
+TARGET_ALIGNMENT = 1000
+
+# Targets within this many frames of a cached frame are left to the main process
+MIN_TARGET_DISTANCE = 5000
+
+# Minimum time in seconds between checks for new targets
+SUBMIT_INTERVAL = 0.5
+
+
+EditRanges = List[Tuple[bytes, int, int, object]]
+
+_worker_pipeline: Optional[Pipeline] = None
+_worker_edit_ranges: Optional[EditRanges] = None
+
+
+def _init_worker(dll_path: str) -> None:
+  global _worker_pipeline
+  _worker_pipeline = Pipeline.load(dll_path, delta_slots=True)
+
+
+def _precompute(
+  edit_ranges: EditRanges,
+  frame: int,
+  max_size_bytes: int,
+  root_directory: str,
+) -> str:
+  global _worker_edit_ranges
+  pipeline = assert_not_none(_worker_pipeline)
+
+  if edit_ranges != _worker_edit_ranges:
+    pipeline.set_edit_ranges([
+      (Variable.from_bytes(column), start, end, value)
+        for column, start, end, value in edit_ranges
+    ])
+    _worker_edit_ranges = edit_ranges
+
+  # Simulating the frame snapshots every multiple of TARGET_ALIGNMENT along the way
+  directory = tempfile.mkdtemp(dir=root_directory)
+  pipeline.set_snapshot_store(directory, max_size_bytes)
+  try:
+    pipeline.path_read(frame, 'gGlobalTimer')
+  finally:
+    pipeline.set_snapshot_store(None, 0)
+  return directory
+
+
+# Simulates distant frames in worker processes, each with its own copy of the game.
+#
+# Frame simulation is sequential, so a single target doesn't get faster, but separate targets
+# (e.g. the end of the TAS and a hotspot after an edit) are simulated in parallel without
+# blocking the UI. Workers write their results to a temporary snapshot store, which the main
+# process loads into backup slots. These stores are kept under a single temporary directory so
+# that the ones written by terminated workers are removed as well.
+class Precomputer:
+  def __init__(self, dll_path: str, num_workers: int, max_size_bytes: int) -> None:
+    context = multiprocessing.get_context('spawn')
+    self.pool = context.Pool(num_workers, initializer=_init_worker, initargs=(dll_path,))
+    self.root_directory = tempfile.mkdtemp(prefix='wafel-precompute-')
+    self.num_workers = num_workers
+    self.max_size_bytes = max_size_bytes
+    self.pending: Dict[int, AsyncResult] = {}
+    # The edit hash that each target was last attempted with
+    self.attempted: Dict[int, int] = {}
+    self.last_submit_time = 0.0
+
+  def close(self) -> None:
+    self.pool.terminate()
+    self.pool.join()
+    self.pending.clear()
+    shutil.rmtree(self.root_directory, ignore_errors=True)
+
+  def update(self, pipeline: Pipeline, frames: Iterable[int]) -> None:
+    self._collect(pipeline)
+    if time.time() > self.last_submit_time + SUBMIT_INTERVAL:
+      self.last_submit_time = time.time()
+      self._submit(pipeline, frames)
+
+  def _collect(self, pipeline: Pipeline) -> None:
+    for target, result in list(self.pending.items()):
+      if not result.ready():
+        continue
+      del self.pending[target]
+      try:
+        directory = result.get()
+      except Exception as e:
+        log.warn(f'Failed to precompute frame {target}: {e}')
+        continue
+      try:
+        count = pipeline.import_snapshots(directory)
+        log.debug(f'Precomputed frame {target}: imported {count} snapshots')
+      finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+  def _submit(self, pipeline: Pipeline, frames: Iterable[int]) -> None:
+    cached_frames = pipeline.cached_frames()
+    edit_ranges: Optional[EditRanges] = None
+
+    for frame in sorted(set(frames)):
+      if len(self.pending) >= self.num_workers:
+        break
+      target = frame - frame % TARGET_ALIGNMENT
+      nearest_frame = max((f for f in cached_frames if f <= frame), default=0)
+      if target in self.pending or frame - nearest_frame < MIN_TARGET_DISTANCE:
+        continue
+
+      # Each target is only attempted once per edit history, in case the results can't be
+      # used by this process. Changing the edits replaces the target's previous attempt
+      edit_hash = pipeline.edit_hash(target)
+      if edit_hash is None or self.attempted.get(target) == edit_hash:
+        continue
+      self.attempted[target] = edit_hash
+
+      if edit_ranges is None:
+        edit_ranges = [
+          (column.to_bytes(), start, end, value)
+            for column, start, end, value in pipeline.edit_ranges()
+        ]
+      self.pending[target] = self.pool.apply_async(
+        _precompute,
+        (edit_ranges, target, self.max_size_bytes, self.root_directory),
+      )
@@ -4,11 +4,43 @@ import wafel.imgui as ig
 from wafel.util import *
 
 
+# Frames that take this many times the average advance time are drawn at full intensity
+HEAT_STRIP_MAX_RATIO = 8.0
+
+HEAT_STRIP_BIN_WIDTH = 2
+
+
+def render_heat_strip(
+  pos: Tuple[float, float],
+  width: float,
+  frame_cost_bins: Callable[[int], List[float]],
+) -> None:
+  # Each bin shows its most expensive frame relative to the average, so that single expensive
+  # frames stand out
+  num_bins = max(int(width / HEAT_STRIP_BIN_WIDTH), 1)
+  bins = frame_cost_bins(num_bins)
+
+  dl = ig.get_window_draw_list()
+  bin_width = width / num_bins
+  for index, ratio in enumerate(bins):
+    heat = min((ratio - 1) / (HEAT_STRIP_MAX_RATIO - 1), 1)
+    if heat <= 0:
+      continue
+    dl.add_rect_filled(
+      pos[0] + index * bin_width,
+      pos[1] + 18,
+      pos[0] + (index + 1) * bin_width,
+      pos[1] + 20,
+      ig.get_color_u32_rgba(1, 1 - heat, 0, 0.3 + 0.7 * heat),
+    )
+
+
 def render_frame_slider(
   id: str,
   current_frame: int,
   num_frames: int,
   loaded_frames: List[int] = [],
+  frame_cost_bins: Optional[Callable[[int], List[float]]] = None,
 ) -> Maybe[int]:
   ig.push_id(id)
 
@@ -28,6 +60,9 @@ def render_frame_slider(
   )
   ig.pop_item_width()
 
+  if frame_cost_bins is not None:
+    render_heat_strip(pos, width, frame_cost_bins)
+
   dl = ig.get_window_draw_list()
   for frame in loaded_frames:
     line_pos = pos[0] + frame / num_frames * width
@@ -62,6 +62,9 @@ class VariableExplorer:
   def close_tab(self, tab: TabId) -> None:
     if tab in self.open_tabs:
       self.open_tabs.remove(tab)
+      # Stop preloading the tab's variables on new frames
+      if tab.object is not None or tab.surface is not None:
+        self.model.pipeline.demote_variables(self.get_variables_for_tab(tab))
 
   def get_tab_label(self, tab: TabId) -> str:
     if tab.object is not None:
@@ -426,6 +429,6 @@ class VariableExplorer:
     if open_tab is not None:
       self.current_tab = self.open_tabs[open_tab]
     if closed_tab is not None:
-      del self.open_tabs[closed_tab]
+      self.close_tab(self.open_tabs[closed_tab])
 
     ig.pop_id()
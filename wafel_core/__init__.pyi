@@ -5,7 +5,11 @@ from typing import *
 
 class Pipeline:
   @staticmethod
-  def load(dll_path: str) -> Pipeline: ...
+  def load(
+    dll_path: str,
+    delta_slots: bool = False,
+    memory_budget_bytes: Optional[int] = None,
+  ) -> Pipeline: ...
   @staticmethod
   def load_reusing_edits(dll_path: str, prev_pipeline: Pipeline) -> Pipeline: ...
   def dump_layout(self) -> str: ...
@@ -13,9 +17,13 @@ class Pipeline:
   def read(self, variable: Variable) -> object: ...
   def write(self, variable: Variable, value: object) -> None: ...
   def reset(self, variable: Variable) -> None: ...
+  def set_pinned_variables(self, variables: List[Variable]) -> None: ...
+  def demote_variables(self, variables: List[Variable]) -> None: ...
 
   def path_address(self, frame: int, path: str) -> Optional[Address]: ...
   def path_read(self, frame: int, path: str) -> object: ...
+  def data_path(self, path: str) -> DataPath: ...
+  def data_path_read(self, frame: int, path: DataPath) -> object: ...
 
   def insert_frame(self, frame: int) -> None: ...
   def delete_frame(self, frame: int) -> None: ...
@@ -24,14 +32,46 @@ class Pipeline:
   def update_drag(self, target_frame: int) -> None: ...
   def release_drag(self) -> None: ...
   def find_edit_range(self, variable: Variable) -> Optional[EditRange]: ...
+  def edit_ranges(self) -> List[Tuple[Variable, int, int, object]]: ...
+  def edit_hash(self, frame: int) -> Optional[int]: ...
+  def set_edit_ranges(self, ranges: List[Tuple[Variable, int, int, object]]) -> None: ...
+
+  def fork(self) -> int: ...
+  def branch(self) -> int: ...
+  def branches(self) -> List[int]: ...
+  def switch_branch(self, branch: int) -> None: ...
+  def delete_branch(self, branch: int) -> None: ...
 
   def set_hotspot(self, name: str, frame: int) -> None: ...
+  def seek(self, frame: int, max_run_time_seconds: float) -> bool: ...
+  def seek_progress(self) -> Optional[Tuple[int, float]]: ...
+  def cancel_seek(self) -> None: ...
+  def set_playback(self, frame: int, frames_per_second: float) -> None: ...
+  def stop_playback(self) -> None: ...
   def balance_distribution(self, max_run_time_seconds: float) -> None: ...
+  def balance_in_background(self) -> None: ...
 
   def cached_frames(self) -> List[int]: ...
   def num_advances(self) -> int: ...
   def num_copies(self) -> int: ...
+  def num_copied_bytes(self) -> int: ...
   def data_cache_size(self) -> int: ...
+  def data_cache_budget(self) -> int: ...
+  def set_data_cache_budget(self, budget_bytes: int) -> None: ...
+  def data_cache_stats(self) -> Dict[str, int]: ...
+  def slot_memory_size(self) -> int: ...
+  def placement_policy(self) -> str: ...
+  def set_placement_policy(self, policy: str) -> None: ...
+  def cost_model(self) -> Dict[str, Optional[float]]: ...
+  def convergence_limit(self) -> Optional[int]: ...
+  def set_convergence_limit(self, max_advances: Optional[int]) -> None: ...
+  def set_snapshot_store(self, directory: Optional[str], max_size_bytes: int) -> None: ...
+  def import_snapshots(self, directory: str) -> int: ...
+  def frame_cost_bins(self, num_frames: int, num_bins: int) -> List[float]: ...
+  def mean_request_advances(self) -> float: ...
+  def num_backup_slots(self) -> int: ...
+  def memory_budget(self) -> Optional[int]: ...
+  def set_memory_budget(self, memory_budget_bytes: Optional[int]) -> None: ...
 
   def label(self, variable: Variable) -> Optional[str]: ...
   def is_int(self, variable: Variable) -> bool: ...
@@ -89,6 +129,10 @@ class Address:
   pass
 
 
+class DataPath:
+  pass
+
+
 class EditRange:
   @property
   def id(self) -> int: ...
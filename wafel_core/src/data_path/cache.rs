@@ -1,11 +1,14 @@
 use super::DataPath;
 use crate::{error::Error, memory::Memory};
-use std::{collections::HashMap, sync::Mutex};
+use std::{collections::HashMap, sync::RwLock};
 
 /// A cache for data path compilation.
+///
+/// Compiled paths are shared, so a lookup only clones a reference. Lookups take a read lock and
+/// don't block each other; the write lock is only taken to add a newly compiled path.
 #[derive(Debug, Default)]
 pub struct DataPathCache {
-    paths: Mutex<HashMap<String, DataPath>>,
+    paths: RwLock<HashMap<String, DataPath>>,
 }
 
 impl DataPathCache {
@@ -16,13 +19,13 @@ impl DataPathCache {
 
     /// Look up or compile a data path.
     pub fn path(&self, memory: &impl Memory, source: &str) -> Result<DataPath, Error> {
-        let mut paths = self.paths.lock().unwrap();
-        Ok(match paths.get(source) {
-            Some(path) => path.clone(),
-            None => {
-                let path = DataPath::compile(memory, source)?;
-                paths.entry(source.to_owned()).or_insert(path).clone()
-            }
-        })
+        if let Some(path) = self.paths.read().unwrap().get(source) {
+            return Ok(path.clone());
+        }
+        let path = DataPath::compile(memory, source)?;
+        let mut paths = self.paths.write().unwrap();
+        // Another thread may have compiled the path in the meantime, in which case its path
+        // (and handle) is kept
+        Ok(paths.entry(source.to_owned()).or_insert(path).clone())
     }
 }
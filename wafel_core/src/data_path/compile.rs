@@ -1,5 +1,6 @@
 use super::{
     DataPath, DataPathEdge, DataPathErrorCause, DataPathImpl, GlobalDataPath, LocalDataPath,
+    PathSource,
 };
 use crate::{
     error::Error,
@@ -18,6 +19,7 @@ use nom::{
     sequence::{preceded, separated_pair, terminated, tuple},
     Err, IResult,
 };
+use std::sync::Arc;
 
 pub fn data_path<M: Memory>(memory: &M, source: &str) -> Result<DataPath, Error> {
     let result: Result<_, Error> = try {
@@ -33,7 +35,7 @@ pub fn data_path<M: Memory>(memory: &M, source: &str) -> Result<DataPath, Error>
                 let root_type = layout.concrete_type(root_type)?;
 
                 let mut path = DataPathImpl {
-                    source: source.to_owned(),
+                    source: PathSource::Text(source.to_owned()),
                     root,
                     edges: Vec::new(),
                     concrete_type: root_type,
@@ -43,7 +45,7 @@ pub fn data_path<M: Memory>(memory: &M, source: &str) -> Result<DataPath, Error>
                     path = follow_edge(layout, path, edge)?;
                 }
 
-                DataPath::Global(GlobalDataPath(path))
+                DataPath::Global(GlobalDataPath::new(memory, path))
             }
 
             RootAst::Local(root_name) => {
@@ -51,7 +53,7 @@ pub fn data_path<M: Memory>(memory: &M, source: &str) -> Result<DataPath, Error>
                 let root = layout.concrete_type(root)?;
 
                 let mut path = DataPathImpl {
-                    source: source.to_owned(),
+                    source: PathSource::Text(source.to_owned()),
                     root: root.clone(),
                     edges: Vec::new(),
                     concrete_type: root,
@@ -61,7 +63,7 @@ pub fn data_path<M: Memory>(memory: &M, source: &str) -> Result<DataPath, Error>
                     path = follow_edge(layout, path, edge)?;
                 }
 
-                DataPath::Local(LocalDataPath(path))
+                DataPath::Local(LocalDataPath(Arc::new(path)))
             }
         }
     };
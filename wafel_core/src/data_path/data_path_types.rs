@@ -1,16 +1,27 @@
 use super::{compile, DataPathErrorCause};
 use crate::{
     error::Error,
-    memory::{data_type::DataTypeRef, Address, ClassifiedAddress, Memory, Value},
+    memory::{
+        data_type::{DataType, DataTypeRef, FloatType, IntType},
+        Address, ClassifiedAddress, Memory, Value,
+    },
 };
 use derive_more::Display;
+use std::{
+    any::Any,
+    fmt,
+    sync::{
+        atomic::{AtomicU64, Ordering},
+        Arc,
+    },
+};
 
 /// Internal representation of a global or local data path.
 #[derive(Debug, Display, Clone)]
 #[display(fmt = "{}", source)]
 pub(super) struct DataPathImpl<R> {
     /// The original source for the data path.
-    pub(super) source: String,
+    pub(super) source: PathSource,
     /// The root for the path (either a global variable address or a struct type).
     pub(super) root: R,
     /// The operations to perform when evaluating the path.
@@ -21,6 +32,34 @@ pub(super) struct DataPathImpl<R> {
     pub(super) concrete_type: DataTypeRef,
 }
 
+/// The source of a data path, used to display the path.
+///
+/// A path taken from an `IndexedDataPath` keeps the template's source and its index separately,
+/// so that no string needs to be formatted to take the path.
+#[derive(Debug, Clone)]
+pub enum PathSource {
+    /// The source text of the path.
+    Text(String),
+    /// An element of an indexed path, displayed as `prefix[index]suffix`.
+    Indexed {
+        /// The source text of the template before and after the `[]`.
+        template: Arc<(String, String)>,
+        /// The index substituted into the template.
+        index: usize,
+    },
+}
+
+impl fmt::Display for PathSource {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        match self {
+            Self::Text(text) => write!(f, "{}", text),
+            Self::Indexed { template, index } => {
+                write!(f, "{}[{}]{}", template.0, index, template.1)
+            }
+        }
+    }
+}
+
 /// An operation that is applied when evaluating a data path.
 #[derive(Debug, Clone, Copy, PartialEq, Eq)]
 pub(super) enum DataPathEdge {
@@ -29,17 +68,165 @@ pub(super) enum DataPathEdge {
     Nullable,
 }
 
+/// A global data path compiled into a flat list of pointer loads.
+///
+/// Offsets between loads are folded together, a `?` is merged into the dereference that
+/// follows it, and the way to read the final value is decided from the concrete type, so
+/// evaluation doesn't need to walk the edges or consult the data layout.
+///
+/// The base address is also classified ahead of time when the memory is known, so that only
+/// the addresses loaded from pointers are classified during evaluation.
+#[derive(Debug, Clone)]
+pub(super) struct PathProgram {
+    /// The root address plus the offsets before the first load.
+    base: Address,
+    /// The classification of `base` for the memory the path was compiled with, or None if
+    /// `base` should be classified when the path is evaluated.
+    classified_base: Option<ClassifiedBase>,
+    loads: Vec<PointerLoad>,
+    read_kind: ReadKind,
+}
+
+/// A `ClassifiedAddress` stored without its memory type.
+#[derive(Debug, Clone)]
+struct ClassifiedBase {
+    /// The id of the memory that classified the address.
+    memory_id: usize,
+    address: Arc<dyn Any + Send + Sync>,
+}
+
+/// A pointer read from memory while evaluating a `PathProgram`.
+#[derive(Debug, Clone, Copy)]
+struct PointerLoad {
+    /// Whether the path evaluates to null if the pointer is invalid (from `?`).
+    nullable: bool,
+    /// Whether to continue from the loaded pointer. This is false for a `?` that isn't
+    /// followed by a dereference, which only checks the pointer.
+    follow: bool,
+    /// The offset to add after the load.
+    offset: usize,
+}
+
+/// How to read the value that a path points to.
+#[derive(Debug, Clone, Copy)]
+enum ReadKind {
+    Int(IntType),
+    Float(FloatType),
+    Address,
+    /// Defer to `Memory::read_value`, e.g. for structs and arrays.
+    Value,
+}
+
+impl PathProgram {
+    fn compile(path: &DataPathImpl<Address>) -> Self {
+        let mut base = path.root;
+        let mut loads: Vec<PointerLoad> = Vec::new();
+        let mut edges = path.edges.iter().peekable();
+        while let Some(edge) = edges.next() {
+            match edge {
+                DataPathEdge::Offset(offset) => match loads.last_mut() {
+                    Some(load) => load.offset += *offset,
+                    None => base = base + *offset,
+                },
+                DataPathEdge::Deref => loads.push(PointerLoad {
+                    nullable: false,
+                    follow: true,
+                    offset: 0,
+                }),
+                DataPathEdge::Nullable => {
+                    let follow = edges.peek() == Some(&&DataPathEdge::Deref);
+                    if follow {
+                        edges.next();
+                    }
+                    loads.push(PointerLoad {
+                        nullable: true,
+                        follow,
+                        offset: 0,
+                    });
+                }
+            }
+        }
+
+        let read_kind = match path.concrete_type.as_ref() {
+            DataType::Int(int_type) => ReadKind::Int(*int_type),
+            DataType::Float(float_type) => ReadKind::Float(*float_type),
+            DataType::Pointer { .. } => ReadKind::Address,
+            _ => ReadKind::Value,
+        };
+
+        Self {
+            base,
+            classified_base: None,
+            loads,
+            read_kind,
+        }
+    }
+
+    fn classify_base<M: Memory>(&mut self, memory: &M) {
+        self.classified_base = Some(ClassifiedBase {
+            memory_id: memory.id(),
+            address: Arc::new(memory.classify_address(&self.base)),
+        });
+    }
+
+    /// Add an offset to the base address, dropping its classification.
+    fn offset_base(&mut self, offset: usize) {
+        self.base = self.base + offset;
+        self.classified_base = None;
+    }
+
+    /// Return the classification of the base address, if it was computed by `memory`.
+    fn classified_base<M: Memory>(&self, memory: &M) -> Option<&ClassifiedAddress<M>> {
+        self.classified_base
+            .as_ref()
+            .filter(|classified| classified.memory_id == memory.id())?
+            .address
+            .downcast_ref()
+    }
+}
+
+/// An integer that identifies a compiled global data path.
+///
+/// A handle is assigned once when a path is compiled, so that caches can look up the path
+/// without hashing its source. Compiling the same source twice gives two different handles, so
+/// paths should be kept or shared (e.g. through `DataPathCache`) rather than recompiled.
+///
+/// The paths taken from an `IndexedDataPath` share its id and differ by index.
+#[derive(Debug, Clone, Copy, PartialEq, Eq, Hash)]
+pub struct PathHandle {
+    id: u64,
+    index: Option<usize>,
+}
+
+/// The id of the next compiled path.
+static NEXT_PATH_ID: AtomicU64 = AtomicU64::new(0);
+
+fn next_path_id() -> u64 {
+    NEXT_PATH_ID.fetch_add(1, Ordering::Relaxed)
+}
+
 /// A data path starting from a global variable address.
 ///
+/// The compiled path is shared, so cloning is cheap.
+///
 /// See module documentation for more information.
 #[derive(Debug, Display, Clone)]
-pub struct GlobalDataPath(pub(super) DataPathImpl<Address>);
+#[display(fmt = "{}", "_0.path")]
+pub struct GlobalDataPath(Arc<GlobalDataPathImpl>);
+
+#[derive(Debug)]
+struct GlobalDataPathImpl {
+    path: DataPathImpl<Address>,
+    program: PathProgram,
+    handle: PathHandle,
+}
 
 /// A data path starting from a type, such as a specific struct.
 ///
 /// See module documentation for more information.
 #[derive(Debug, Display, Clone)]
-pub struct LocalDataPath(pub(super) DataPathImpl<DataTypeRef>);
+#[display(fmt = "{}", _0)]
+pub struct LocalDataPath(pub(super) Arc<DataPathImpl<DataTypeRef>>);
 
 /// Either a global or a local data path.
 #[derive(Debug, Display, Clone)]
@@ -51,6 +238,23 @@ pub enum DataPath {
 }
 
 impl GlobalDataPath {
+    pub(super) fn new(memory: &impl Memory, path: DataPathImpl<Address>) -> Self {
+        let mut program = PathProgram::compile(&path);
+        program.classify_base(memory);
+        Self::with_program(path, program)
+    }
+
+    fn with_program(path: DataPathImpl<Address>, program: PathProgram) -> Self {
+        Self(Arc::new(GlobalDataPathImpl {
+            program,
+            path,
+            handle: PathHandle {
+                id: next_path_id(),
+                index: None,
+            },
+        }))
+    }
+
     /// Compile a global data path from source.
     ///
     /// See module documentation for syntax.
@@ -59,8 +263,13 @@ impl GlobalDataPath {
     }
 
     /// Get the source for the path.
-    pub fn source(&self) -> &str {
-        &self.0.source
+    pub fn source(&self) -> &PathSource {
+        &self.0.path.source
+    }
+
+    /// Get the handle that identifies the compiled path.
+    pub fn handle(&self) -> PathHandle {
+        self.0.handle
     }
 
     /// Concatenate a global and local path.
@@ -68,7 +277,13 @@ impl GlobalDataPath {
     /// An error will be returned if the result type of `self` doesn't match the root type
     /// of `path`.
     pub fn concat(&self, path: &LocalDataPath) -> Result<Self, Error> {
-        concat_paths(&self.0, &path.0).map(Self)
+        let path = concat_paths(&self.0.path, &path.0)?;
+        let mut program = PathProgram::compile(&path);
+        // The classification is still valid if the offsets of `path` were added after a load
+        if program.base == self.0.program.base {
+            program.classified_base = self.0.program.classified_base.clone();
+        }
+        Ok(Self::with_program(path, program))
     }
 
     /// Evaluate the path and return the address of the variable.
@@ -78,7 +293,7 @@ impl GlobalDataPath {
     /// None will only be returned if `?` is used in the data path.
     pub fn address<M: Memory>(&self, memory: &M, slot: &M::Slot) -> Result<Option<Address>, Error> {
         self.address_impl(memory, slot)
-            .map_err(|error| error.context(format!("path {}", self.0.source)))
+            .map_err(|error| error.context(format!("path {}", self.0.path.source)))
     }
 
     fn address_impl<M: Memory>(
@@ -86,37 +301,83 @@ impl GlobalDataPath {
         memory: &M,
         slot: &M::Slot,
     ) -> Result<Option<Address>, Error> {
-        let mut address: Address = self.0.root;
-        for edge in &self.0.edges {
-            match edge {
-                DataPathEdge::Offset(offset) => address = address + *offset,
-                DataPathEdge::Deref => {
-                    let classified = memory.classify_address(&address);
-                    address = memory.read_address(slot, &classified)?;
-                }
-                DataPathEdge::Nullable => {
-                    let classified = memory.classify_address(&address);
-                    let address_value = memory.read_address(slot, &classified)?;
-
-                    if let ClassifiedAddress::Invalid = memory.classify_address(&address_value) {
-                        return Ok(None);
-                    }
+        let program = &self.0.program;
+        let mut address = program.base;
+        for (i, load) in program.loads.iter().enumerate() {
+            let pointer = match program.classified_base(memory).filter(|_| i == 0) {
+                Some(base) => memory.read_address(slot, base)?,
+                None => memory.read_address(slot, &memory.classify_address(&address))?,
+            };
+            if load.nullable {
+                if let ClassifiedAddress::Invalid = memory.classify_address(&pointer) {
+                    return Ok(None);
                 }
             }
+            if load.follow {
+                address = pointer;
+            }
+            address = address + load.offset;
         }
         Ok(Some(address))
     }
 
+    /// Return the path's address if it can be computed without reading memory, i.e. if the
+    /// path doesn't pass through a pointer.
+    pub fn static_address(&self) -> Option<Address> {
+        let program = &self.0.program;
+        if program.loads.is_empty() {
+            Some(program.base)
+        } else {
+            None
+        }
+    }
+
     /// Evaluate the path and return the value stored in the variable.
     pub fn read<M: Memory>(&self, memory: &M, slot: &M::Slot) -> Result<Value, Error> {
+        let program = &self.0.program;
+        let classified = if program.loads.is_empty() {
+            program.classified_base(memory)
+        } else {
+            None
+        };
         match self.address(memory, slot)? {
-            Some(address) => memory
-                .read_value(slot, &address, &self.0.concrete_type)
-                .map_err(|error| error.context(format!("path {}", self.0.source))),
+            Some(address) => self
+                .read_at(memory, slot, &address, classified)
+                .map_err(|error| error.context(format!("path {}", self.0.path.source))),
             None => Ok(Value::Null),
         }
     }
 
+    fn read_at<M: Memory>(
+        &self,
+        memory: &M,
+        slot: &M::Slot,
+        address: &Address,
+        classified: Option<&ClassifiedAddress<M>>,
+    ) -> Result<Value, Error> {
+        let read_kind = self.0.program.read_kind;
+        if let ReadKind::Value = read_kind {
+            return memory.read_value(slot, address, &self.0.path.concrete_type);
+        }
+
+        let classified_address;
+        let classified = match classified {
+            Some(classified) => classified,
+            None => {
+                classified_address = memory.classify_address(address);
+                &classified_address
+            }
+        };
+        Ok(match read_kind {
+            ReadKind::Int(int_type) => Value::Int(memory.read_int(slot, classified, int_type)?),
+            ReadKind::Float(float_type) => {
+                Value::Float(memory.read_float(slot, classified, float_type)?)
+            }
+            ReadKind::Address => Value::Address(memory.read_address(slot, classified)?),
+            ReadKind::Value => unreachable!(),
+        })
+    }
+
     /// Evaluate the path and write `value` to the variable.
     pub fn write<M: Memory>(
         &self,
@@ -126,15 +387,128 @@ impl GlobalDataPath {
     ) -> Result<(), Error> {
         match self.address(memory, slot)? {
             Some(address) => memory
-                .write_value(slot, &address, &self.0.concrete_type, value)
-                .map_err(|error| error.context(format!("path {}", self.0.source))),
+                .write_value(slot, &address, &self.0.path.concrete_type, value)
+                .map_err(|error| error.context(format!("path {}", self.0.path.source))),
             None => Ok(()),
         }
     }
 
     /// Get the concrete data type that the path points to.
     pub fn concrete_type(&self) -> DataTypeRef {
-        self.0.concrete_type.clone()
+        self.0.path.concrete_type.clone()
+    }
+}
+
+/// A global data path with an array index left as a parameter, e.g. `gObjectPool[].oPosX`.
+///
+/// The template is compiled once. Taking the path for an index adds `index * stride` to the
+/// compiled path, without compiling or formatting a new source.
+#[derive(Debug, Clone)]
+pub struct IndexedDataPath {
+    /// The path for index 0.
+    path: GlobalDataPath,
+    /// The id shared by the handles of the paths taken from the template.
+    id: u64,
+    template: Arc<(String, String)>,
+    /// The position of the index's offset in the path's edges.
+    edge: usize,
+    /// The pointer load that the index's offset is added to, or None for the base address.
+    load: Option<usize>,
+    stride: usize,
+    length: Option<usize>,
+}
+
+impl IndexedDataPath {
+    /// Compile an indexed path from source containing a single `[]`.
+    pub fn compile(memory: &impl Memory, source: &str) -> Result<Self, Error> {
+        let mut parts = source.split("[]");
+        let (prefix, suffix) = match (parts.next(), parts.next(), parts.next()) {
+            (Some(prefix), Some(suffix), None) => (prefix, suffix),
+            _ => {
+                return Err(DataPathErrorCause::ExpectedIndexParameter {
+                    path: source.to_owned(),
+                }
+                .into())
+            }
+        };
+
+        let (stride, length) = match GlobalDataPath::compile(memory, prefix)?
+            .concrete_type()
+            .as_ref()
+        {
+            DataType::Array { length, stride, .. } => (*stride, *length),
+            DataType::Pointer { stride, .. } => {
+                (stride.ok_or(DataPathErrorCause::UnsizedBaseType)?, None)
+            }
+            _ => return Err(DataPathErrorCause::NotAnArray.into()),
+        };
+        let element = GlobalDataPath::compile(memory, &format!("{}[0]", prefix))?;
+        let path = GlobalDataPath::compile(memory, &format!("{}[0]{}", prefix, suffix))?;
+
+        Ok(Self {
+            path,
+            id: next_path_id(),
+            template: Arc::new((prefix.to_owned(), suffix.to_owned())),
+            edge: element.0.path.edges.len() - 1,
+            load: element.0.program.loads.len().checked_sub(1),
+            stride,
+            length,
+        })
+    }
+
+    /// Concatenate the indexed path with a local path.
+    pub fn concat(&self, path: &LocalDataPath) -> Result<Self, Error> {
+        let (prefix, suffix) = self.template.as_ref();
+        Ok(Self {
+            path: self.path.concat(path)?,
+            id: next_path_id(),
+            template: Arc::new((prefix.clone(), format!("{}+{}", suffix, path.0.source))),
+            edge: self.edge,
+            load: self.load,
+            stride: self.stride,
+            length: self.length,
+        })
+    }
+
+    /// Get the concrete data type that the path points to.
+    pub fn concrete_type(&self) -> DataTypeRef {
+        self.path.concrete_type()
+    }
+
+    /// Return the path for the given index.
+    pub fn path(&self, index: usize) -> Result<GlobalDataPath, Error> {
+        if let Some(length) = self.length {
+            if index >= length {
+                return Err(DataPathErrorCause::IndexOutOfBounds { index, length }.into());
+            }
+        }
+        let offset = index * self.stride;
+
+        let template = &self.path.0;
+        let mut edges = template.path.edges.clone();
+        edges[self.edge] = DataPathEdge::Offset(offset);
+        let mut program = template.program.clone();
+        match self.load {
+            Some(load) => program.loads[load].offset += offset,
+            None => program.offset_base(offset),
+        }
+
+        Ok(GlobalDataPath(Arc::new(GlobalDataPathImpl {
+            path: DataPathImpl {
+                source: PathSource::Indexed {
+                    template: Arc::clone(&self.template),
+                    index,
+                },
+                root: template.path.root,
+                edges,
+                concrete_type: template.path.concrete_type.clone(),
+            },
+            program,
+            handle: PathHandle {
+                id: self.id,
+                index: Some(index),
+            },
+        })))
     }
 }
 
@@ -156,7 +530,7 @@ impl LocalDataPath {
     /// An error will be returned if the result type of `self` doesn't match the root type
     /// of `path`.
     pub fn concat(&self, path: &LocalDataPath) -> Result<Self, Error> {
-        concat_paths(&self.0, &path.0).map(Self)
+        concat_paths(&self.0, &path.0).map(|path| Self(Arc::new(path)))
     }
 
     /// Get the concrete data type that the path points to.
@@ -186,10 +560,10 @@ impl DataPath {
         compile::data_path(memory, source)
     }
 
-    fn source(&self) -> &str {
+    fn source(&self) -> &PathSource {
         match self {
-            Self::Global(path) => path.0.source.as_str(),
-            Self::Local(path) => path.0.source.as_str(),
+            Self::Global(path) => &path.0.path.source,
+            Self::Local(path) => &path.0.source,
         }
     }
 
@@ -199,7 +573,7 @@ impl DataPath {
             Ok(path)
         } else {
             Err(DataPathErrorCause::ExpectedGlobalPath {
-                path: self.source().to_owned(),
+                path: self.source().to_string(),
             }
             .into())
         }
@@ -211,7 +585,7 @@ impl DataPath {
             Ok(path)
         } else {
             Err(DataPathErrorCause::ExpectedLocalPath {
-                path: self.source().to_owned(),
+                path: self.source().to_string(),
             }
             .into())
         }
@@ -232,7 +606,7 @@ fn concat_paths<R: Clone>(
 ) -> Result<DataPathImpl<R>, Error> {
     if path1.concrete_type == path2.root {
         Ok(DataPathImpl {
-            source: format!("{}+{}", path1.source, path2.source),
+            source: PathSource::Text(format!("{}+{}", path1.source, path2.source)),
             root: path1.root.clone(),
             edges: path1
                 .edges
@@ -244,11 +618,190 @@ fn concat_paths<R: Clone>(
         })
     } else {
         Err(DataPathErrorCause::DataPathConcatTypeMismatch {
-            path1: path1.source.to_owned(),
+            path1: path1.source.to_string(),
             type1: path1.concrete_type.clone(),
-            path2: path2.source.to_owned(),
+            path2: path2.source.to_string(),
             type2: path2.concrete_type.clone(),
         }
         .into())
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::timeline::synthetic_memory::{SyntheticConfig, SyntheticMemory, SyntheticSlot};
+
+    /// Evaluate a path by walking its edges one at a time, without the compiled program.
+    fn walk_edges(
+        memory: &SyntheticMemory,
+        slot: &SyntheticSlot,
+        path: &GlobalDataPath,
+    ) -> Option<Address> {
+        let mut address = path.0.path.root;
+        for edge in &path.0.path.edges {
+            match edge {
+                DataPathEdge::Offset(offset) => address = address + *offset,
+                DataPathEdge::Deref => {
+                    let classified = memory.classify_address(&address);
+                    address = memory.read_address(slot, &classified).unwrap();
+                }
+                DataPathEdge::Nullable => {
+                    let classified = memory.classify_address(&address);
+                    let pointer = memory.read_address(slot, &classified).unwrap();
+                    if let ClassifiedAddress::Invalid = memory.classify_address(&pointer) {
+                        return None;
+                    }
+                }
+            }
+        }
+        Some(address)
+    }
+
+    fn assert_matches_edges(memory: &SyntheticMemory, slot: &SyntheticSlot, path: &GlobalDataPath) {
+        let address = path.address(memory, slot).unwrap();
+        assert_eq!(address, walk_edges(memory, slot, path), "{}", path.source());
+
+        let expected = match address {
+            Some(address) => memory
+                .read_value(slot, &address, &path.concrete_type())
+                .unwrap(),
+            None => Value::Null,
+        };
+        let value = path.read(memory, slot).unwrap();
+        assert_eq!(
+            format!("{:?}", value),
+            format!("{:?}", expected),
+            "{}",
+            path.source()
+        );
+    }
+
+    /// Return the base slot, with `gHotPointers[1]` invalid and `gHotPointers[2]` pointing to
+    /// `gHotFloats[10]`.
+    fn memory() -> (SyntheticMemory, SyntheticSlot) {
+        let (memory, mut slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let write = |slot: &mut SyntheticSlot, source: &str, value: Value| {
+            GlobalDataPath::compile(&memory, source)
+                .unwrap()
+                .write(&memory, slot, &value)
+                .unwrap()
+        };
+        write(
+            &mut slot,
+            "gHotPointers[1]",
+            Value::Address(Address(1 << 40)),
+        );
+        write(
+            &mut slot,
+            "gHotPointers[2]",
+            Value::Address(Address(16 + 40)),
+        );
+        write(&mut slot, "gHotFloats[11]", Value::Float(1.5));
+        write(&mut slot, "gMarioStates[0].vel[1]", Value::Float(-3.0));
+        (memory, slot)
+    }
+
+    #[test]
+    fn program_matches_edges() {
+        let (memory, slot) = memory();
+        let sources = [
+            "gFrameCounter",
+            "gObjectPool[5].oPosY",
+            "gMarioStates[0].pos",
+            "gMarioState->pos[2]",
+            "gMarioState?->vel[1]",
+            "gMarioState?",
+            "gHotPointers[1]?",
+            "gHotPointers[1]?[2]",
+            "gHotPointers[2]?",
+            "gHotPointers[2]?[1]",
+            "gHotPointers[2][1]",
+            "sSurfacePool[3].normal[1]",
+            "sSurfacePool?[3].normal",
+        ];
+        for source in &sources {
+            let path = GlobalDataPath::compile(&memory, source).unwrap();
+            assert_matches_edges(&memory, &slot, &path);
+        }
+
+        let program = |source| {
+            GlobalDataPath::compile(&memory, source)
+                .unwrap()
+                .0
+                .program
+                .clone()
+        };
+        let load = |program: &PathProgram, index: usize| {
+            let load = program.loads[index];
+            (load.nullable, load.follow, load.offset)
+        };
+
+        // Offsets before the first load are folded into the base, and later ones into the load
+        let path = program("gObjectPool[5].oPosY");
+        assert_eq!(path.loads.len(), 0);
+        assert_eq!(
+            path.base,
+            memory.symbol_address("gObjectPool").unwrap() + 5 * 32 + 20
+        );
+        let path = program("gMarioState->pos[2]");
+        assert_eq!(path.loads.len(), 1);
+        assert_eq!(load(&path, 0), (false, true, 12));
+
+        // A `?` is merged into the following dereference, or only checks the pointer at the end
+        let path = program("gMarioState?->vel[1]");
+        assert_eq!(path.loads.len(), 1);
+        assert_eq!(load(&path, 0), (true, true, 20));
+        let path = program("gMarioState?");
+        assert_eq!(path.loads.len(), 1);
+        assert_eq!(load(&path, 0), (true, false, 0));
+
+        // The base is classified when compiled, and only used by the same memory
+        let base = memory.symbol_address("gMarioState").unwrap();
+        match path.classified_base(&memory) {
+            Some(&ClassifiedAddress::Relocatable(offset)) => assert_eq!(offset, base.0),
+            classified => panic!("unexpected base classification: {:?}", classified),
+        }
+        let (other_memory, _) = SyntheticMemory::new(SyntheticConfig::default());
+        assert!(path.classified_base(&other_memory).is_none());
+    }
+
+    #[test]
+    fn indexed_path_pointer_roots() {
+        let (memory, slot) = memory();
+        let templates = [
+            ("sSurfacePool[].normal", "sSurfacePool[{}].normal", 5),
+            ("sSurfacePool[].normal[1]", "sSurfacePool[{}].normal[1]", 5),
+            ("sSurfacePool?[].type", "sSurfacePool?[{}].type", 5),
+            ("gMarioState->pos[]", "gMarioState->pos[{}]", 3),
+            ("gHotPointers[2]?[]", "gHotPointers[2]?[{}]", 4),
+            ("gObjectPool[].oPosY", "gObjectPool[{}].oPosY", 4),
+        ];
+
+        for &(template, source, length) in &templates {
+            let indexed = IndexedDataPath::compile(&memory, template).unwrap();
+            for index in 0..length {
+                let path = indexed.path(index).unwrap();
+                let source = source.replace("{}", &index.to_string());
+                let compiled = GlobalDataPath::compile(&memory, &source).unwrap();
+
+                assert_eq!(path.source().to_string(), source);
+                assert_eq!(path.0.path.edges, compiled.0.path.edges, "{}", source);
+                assert_eq!(
+                    path.address(&memory, &slot).unwrap(),
+                    compiled.address(&memory, &slot).unwrap(),
+                    "{}",
+                    source
+                );
+                assert_matches_edges(&memory, &slot, &path);
+                assert_eq!(path.handle(), indexed.path(index).unwrap().handle());
+                if index > 0 {
+                    assert_ne!(path.handle(), indexed.path(0).unwrap().handle());
+                }
+            }
+        }
+
+        let indexed = IndexedDataPath::compile(&memory, "gMarioState->pos[]").unwrap();
+        assert!(indexed.path(3).is_err());
+    }
+}
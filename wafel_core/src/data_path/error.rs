@@ -38,4 +38,6 @@ pub enum DataPathErrorCause {
     ExpectedLocalPath { path: String },
     #[display(fmt = "not a struct field: {}", path)]
     NotAField { path: String },
+    #[display(fmt = "expected a single [] index parameter in {}", path)]
+    ExpectedIndexParameter { path: String },
 }
@@ -10,9 +10,10 @@ use crate::{
     data_path::DataPathCache,
     error::Error,
     memory::{
+        copy_changed_chunks,
         data_type::{FloatType, IntType},
         Address, ClassifiedAddress, DataLayout, FloatValue, IntValue, Memory as MemoryTrait,
-        MemoryErrorCause,
+        MemoryErrorCause, SegmentBuffer,
     },
 };
 use derive_more::Display;
@@ -43,16 +44,16 @@ lazy_static! {
 pub struct BufferSlot {
     memory_id: usize,
     id: usize,
-    segments: Vec<Vec<u8>>,
+    buffer: SegmentBuffer,
 }
 
 impl BufferSlot {
     fn segment(&self, index: usize) -> Option<&[u8]> {
-        self.segments.get(index).map(|seg| seg.as_slice())
+        self.buffer.segment(index)
     }
 
     fn segment_mut(&mut self, index: usize) -> Option<&mut [u8]> {
-        self.segments.get_mut(index).map(|seg| seg.as_mut_slice())
+        self.buffer.segment_mut(index)
     }
 }
 
@@ -533,6 +534,10 @@ impl MemoryTrait for Memory {
         }
     }
 
+    fn id(&self) -> usize {
+        self.id
+    }
+
     fn data_layout(&self) -> &DataLayout {
         &self.layout
     }
@@ -555,25 +560,125 @@ impl MemoryTrait for Memory {
         Ok(Slot::Buffer(BufferSlot {
             memory_id: self.id,
             id,
-            segments: self
-                .data_segments
-                .iter()
-                .map(|segment| vec![0; segment.virtual_size])
-                .collect(),
+            buffer: SegmentBuffer::new(),
         }))
     }
 
-    fn copy_slot(&self, dst: &mut Self::Slot, src: &Self::Slot) -> Result<(), Error> {
+    fn copy_slot(&self, dst: &mut Self::Slot, src: &Self::Slot) -> Result<usize, Error> {
         self.validate_slot(dst)?;
         self.validate_slot(src)?;
-        for i in 0..self.data_segments.len() {
-            unsafe {
-                let dst_segment = dst.segment_mut(i).unwrap();
-                let src_segment = src.segment(i).unwrap();
-                dst_segment.copy_from_slice(src_segment);
+        let num_bytes = match (dst, src) {
+            (Slot::Buffer(dst), Slot::Buffer(src)) => {
+                dst.buffer.copy_from(&src.buffer);
+                0
+            }
+            (Slot::Buffer(dst), Slot::Base(src)) => unsafe {
+                let segments: Vec<&[u8]> = (0..self.data_segments.len())
+                    .map(|i| src.segment(i).unwrap())
+                    .collect();
+                dst.buffer.write_segments(&segments)
+            },
+            (Slot::Base(dst), Slot::Buffer(src)) => (0..self.data_segments.len())
+                .map(|i| unsafe { src.buffer.copy_segment_into(i, dst.segment_mut(i).unwrap()) })
+                .sum(),
+            (Slot::Base(dst), Slot::Base(src)) => (0..self.data_segments.len())
+                .map(|i| unsafe {
+                    let dst_segment = dst.segment_mut(i).unwrap();
+                    let src_segment = src.segment(i).unwrap();
+                    copy_changed_chunks(dst_segment, src_segment)
+                })
+                .sum(),
+        };
+        Ok(num_bytes)
+    }
+
+    fn compress_slot(&self, slot: &mut Self::Slot, reference: &Self::Slot) -> Result<bool, Error> {
+        self.validate_slot(slot)?;
+        self.validate_slot(reference)?;
+        match (slot, reference) {
+            (Slot::Buffer(slot), Slot::Buffer(reference)) => {
+                Ok(slot.buffer.compress(&reference.buffer))
             }
+            _ => Ok(false),
+        }
+    }
+
+    fn is_slot_compressed(&self, slot: &Self::Slot) -> bool {
+        match slot {
+            Slot::Base(_) => false,
+            Slot::Buffer(slot) => slot.buffer.is_compressed(),
+        }
+    }
+
+    fn slots_equal(&self, slot1: &Self::Slot, slot2: &Self::Slot) -> Result<bool, Error> {
+        self.validate_slot(slot1)?;
+        self.validate_slot(slot2)?;
+        let equal = match (slot1, slot2) {
+            (Slot::Buffer(slot1), Slot::Buffer(slot2)) => {
+                slot1.buffer.contents_equal(&slot2.buffer)
+            }
+            (Slot::Buffer(buffer), Slot::Base(base)) | (Slot::Base(base), Slot::Buffer(buffer)) => {
+                (0..self.data_segments.len())
+                    .all(|i| unsafe { buffer.buffer.segment_equals(i, base.segment(i).unwrap()) })
+            }
+            // Base slots are only equal if they refer to the same DLL memory
+            (Slot::Base(base1), Slot::Base(base2)) => base1.base_pointer.0 == base2.base_pointer.0,
+        };
+        Ok(equal)
+    }
+
+    fn slot_bytes(&self, slot: &Self::Slot) -> Result<Option<Vec<u8>>, Error> {
+        self.validate_slot(slot)?;
+        let mut bytes = Vec::with_capacity(self.data_segments.iter().map(|s| s.virtual_size).sum());
+        for (i, segment) in self.data_segments.iter().enumerate() {
+            let start = bytes.len();
+            bytes.resize(start + segment.virtual_size, 0);
+            let dst = &mut bytes[start..];
+            match slot {
+                Slot::Base(slot) => unsafe { dst.copy_from_slice(slot.segment(i).unwrap()) },
+                Slot::Buffer(slot) => {
+                    slot.buffer.copy_segment_into(i, dst);
+                }
+            }
+        }
+        Ok(Some(bytes))
+    }
+
+    fn load_slot_bytes(&self, slot: &mut Self::Slot, bytes: &[u8]) -> Result<bool, Error> {
+        self.validate_slot(slot)?;
+        if bytes.len()
+            != self
+                .data_segments
+                .iter()
+                .map(|s| s.virtual_size)
+                .sum::<usize>()
+        {
+            return Ok(false);
+        }
+        let mut segments: Vec<&[u8]> = Vec::with_capacity(self.data_segments.len());
+        let mut start = 0;
+        for segment in &self.data_segments {
+            segments.push(&bytes[start..start + segment.virtual_size]);
+            start += segment.virtual_size;
+        }
+        match slot {
+            Slot::Base(slot) => {
+                for (i, src) in segments.into_iter().enumerate() {
+                    unsafe { copy_changed_chunks(slot.segment_mut(i).unwrap(), src) };
+                }
+            }
+            Slot::Buffer(slot) => {
+                slot.buffer.write_segments(&segments);
+            }
+        }
+        Ok(true)
+    }
+
+    fn slot_size(&self, slot: &Self::Slot) -> usize {
+        match slot {
+            Slot::Base(slot) => slot.data_segments.iter().map(|s| s.virtual_size).sum(),
+            Slot::Buffer(slot) => slot.buffer.byte_size(),
         }
-        Ok(())
     }
 
     fn advance_base_slot(&self, base_slot: &mut Self::Slot) -> Result<(), Error> {
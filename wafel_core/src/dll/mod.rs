@@ -4,6 +4,9 @@
 //! Backup slots are allocated as buffers that can be copied to and from the
 //! .data and .bss sections of the DLL. DLL functions can only be run on the
 //! base slot.
+//!
+//! Backup buffers can also be compressed as a diff against another buffer, in which
+//! case they can only be restored by copying them into another slot.
 
 pub use error::*;
 pub use memory::*;
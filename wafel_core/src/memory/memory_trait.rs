@@ -20,15 +20,18 @@ use std::{collections::HashMap, fmt::Debug, ops::Add};
 ///
 /// The memory has one or more "base slots" that are capable of being frame advanced,
 /// but can create backup slots to hold copies of the base slot's data.
-pub trait Memory: Sized {
+///
+/// Addresses are classified when a data path is compiled and stored in the path along with the
+/// memory's `id`, which is why the address types must be thread safe.
+pub trait Memory: Sized + 'static {
     /// The type of a slot.
     type Slot: Debug;
 
     /// The type of a static address that lies outside of slot memory.
-    type StaticAddress;
+    type StaticAddress: Send + Sync + 'static;
 
     /// The type of an address that can be relocated to any slot.
-    type RelocatableAddress;
+    type RelocatableAddress: Send + Sync + 'static;
 
     /// Read an integer from slot memory.
     ///
@@ -161,6 +164,11 @@ pub trait Memory: Sized {
     /// address, rather than returning an error.
     fn classify_address(&self, address: &Address) -> ClassifiedAddress<Self>;
 
+    /// Return an id that is unique to this memory instance.
+    ///
+    /// A classified address is only valid for the memory that classified it.
+    fn id(&self) -> usize;
+
     /// Read a value of type `data_type` from either slot or static memory.
     ///
     /// The default implementation only handles a subset of data types, and returns
@@ -300,7 +308,57 @@ pub trait Memory: Sized {
     fn create_backup_slot(&self) -> Result<Self::Slot, Error>;
 
     /// Copy the contents of one slot into another.
-    fn copy_slot(&self, dst: &mut Self::Slot, src: &Self::Slot) -> Result<(), Error>;
+    ///
+    /// Returns the number of bytes that were actually written, which may be less than the
+    /// slot size if the implementation skips data that is already equal.
+    fn copy_slot(&self, dst: &mut Self::Slot, src: &Self::Slot) -> Result<usize, Error>;
+
+    /// Compress a backup slot by storing only its difference from `reference`.
+    ///
+    /// Returns false if the slot was left uncompressed, e.g. because the difference was too
+    /// large to be worthwhile. A compressed slot should only be used as the source of
+    /// `copy_slot`.
+    ///
+    /// The default implementation never compresses.
+    fn compress_slot(
+        &self,
+        _slot: &mut Self::Slot,
+        _reference: &Self::Slot,
+    ) -> Result<bool, Error> {
+        Ok(false)
+    }
+
+    /// Return true if the slot has been compressed using `compress_slot`.
+    fn is_slot_compressed(&self, _slot: &Self::Slot) -> bool {
+        false
+    }
+
+    /// Return true if the two slots are known to hold the same contents.
+    ///
+    /// This is used to detect when the simulation re-converges after an edit. The default
+    /// implementation conservatively returns false.
+    fn slots_equal(&self, _slot1: &Self::Slot, _slot2: &Self::Slot) -> Result<bool, Error> {
+        Ok(false)
+    }
+
+    /// Return the contents of a slot as bytes, which can be restored using `load_slot_bytes`.
+    ///
+    /// This is used to persist snapshots. The default implementation returns None, meaning
+    /// that this is unsupported.
+    fn slot_bytes(&self, _slot: &Self::Slot) -> Result<Option<Vec<u8>>, Error> {
+        Ok(None)
+    }
+
+    /// Overwrite the contents of a slot with bytes returned by `slot_bytes`.
+    ///
+    /// Returns false and leaves the slot unchanged if the bytes have the wrong size or this
+    /// is unsupported. The default implementation always returns false.
+    fn load_slot_bytes(&self, _slot: &mut Self::Slot, _bytes: &[u8]) -> Result<bool, Error> {
+        Ok(false)
+    }
+
+    /// Return the approximate number of bytes of memory used by the slot's contents.
+    fn slot_size(&self, slot: &Self::Slot) -> usize;
 
     /// Advance a base slot one frame.
     fn advance_base_slot(&self, base_slot: &mut Self::Slot) -> Result<(), Error>;
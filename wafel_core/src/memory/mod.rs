@@ -3,11 +3,13 @@
 pub use data_layout::*;
 pub use error::*;
 pub use memory_trait::*;
+pub use segment_buffer::*;
 pub use value::*;
 
 mod data_layout;
 pub mod data_type;
 mod error;
 mod memory_trait;
+mod segment_buffer;
 pub mod shallow_data_type;
 mod value;
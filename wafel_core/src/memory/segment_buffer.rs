@@ -0,0 +1,489 @@
+//! Backup storage for the data segments of a program.
+
+use std::sync::Arc;
+
+/// Segment contents that can be shared between several buffers.
+type SharedSegments = Arc<Vec<Vec<u8>>>;
+
+/// The size of the blocks that are compared before looking for individual differing words.
+const DIFF_BLOCK_SIZE: usize = 64;
+
+/// The granularity at which differences are recorded.
+const DIFF_WORD_SIZE: usize = 8;
+
+/// Runs of differing bytes that are separated by at most this many bytes are merged.
+///
+/// Each run costs 8 bytes of bookkeeping, so merging small gaps keeps deltas compact.
+const DIFF_MERGE_GAP: usize = 16;
+
+/// A delta is only kept if it is at most `1 / MIN_COMPRESSION_RATIO` of the dense size.
+const MIN_COMPRESSION_RATIO: usize = 4;
+
+/// The granularity at which `copy_changed_chunks` skips unchanged data.
+const COPY_CHUNK_SIZE: usize = 4096;
+
+/// Copy `src` into `dst`, skipping chunks that are already equal.
+///
+/// Restoring a slot that is close to the current one typically touches only a few chunks,
+/// and comparing is cheaper than writing. Returns the number of bytes that were written.
+pub fn copy_changed_chunks(dst: &mut [u8], src: &[u8]) -> usize {
+    assert_eq!(dst.len(), src.len());
+    let mut num_bytes = 0;
+    for (dst_chunk, src_chunk) in dst
+        .chunks_mut(COPY_CHUNK_SIZE)
+        .zip(src.chunks(COPY_CHUNK_SIZE))
+    {
+        if dst_chunk != src_chunk {
+            dst_chunk.copy_from_slice(src_chunk);
+            num_bytes += dst_chunk.len();
+        }
+    }
+    num_bytes
+}
+
+/// A buffer that holds a copy of each data segment of a program.
+///
+/// The contents are either stored densely, or as a sparse diff against a dense reference
+/// buffer. Dense contents are shared copy-on-write, so a compressed buffer's reference
+/// stays valid even after the buffer it was taken from is overwritten.
+#[derive(Debug, Clone)]
+pub struct SegmentBuffer {
+    contents: Contents,
+}
+
+#[derive(Debug, Clone)]
+enum Contents {
+    /// The buffer has never been written to. Its contents are conceptually all zero.
+    Unallocated,
+    /// A full copy of every segment.
+    Dense(SharedSegments),
+    /// The bytes that differ from a dense reference.
+    Delta {
+        reference: SharedSegments,
+        segments: Vec<SegmentDelta>,
+    },
+}
+
+/// The runs of bytes in a segment that differ from a reference segment.
+#[derive(Debug, Clone, Default)]
+struct SegmentDelta {
+    /// The offset and length of each run, in increasing order of offset.
+    runs: Vec<(u32, u32)>,
+    /// The contents of every run, concatenated.
+    bytes: Vec<u8>,
+}
+
+impl SegmentDelta {
+    fn diff(data: &[u8], reference: &[u8]) -> Self {
+        let mut delta = Self::default();
+        let mut run: Option<(usize, usize)> = None;
+
+        for (block_index, (block, reference_block)) in data
+            .chunks(DIFF_BLOCK_SIZE)
+            .zip(reference.chunks(DIFF_BLOCK_SIZE))
+            .enumerate()
+        {
+            if block == reference_block {
+                continue;
+            }
+            let block_offset = block_index * DIFF_BLOCK_SIZE;
+            for (word_index, (word, reference_word)) in block
+                .chunks(DIFF_WORD_SIZE)
+                .zip(reference_block.chunks(DIFF_WORD_SIZE))
+                .enumerate()
+            {
+                if word == reference_word {
+                    continue;
+                }
+                let start = block_offset + word_index * DIFF_WORD_SIZE;
+                let end = start + word.len();
+                run = match run {
+                    Some((run_start, run_end)) if start - run_end <= DIFF_MERGE_GAP => {
+                        Some((run_start, end))
+                    }
+                    Some((run_start, run_end)) => {
+                        delta.push_run(&data[run_start..run_end], run_start);
+                        Some((start, end))
+                    }
+                    None => Some((start, end)),
+                };
+            }
+        }
+        if let Some((run_start, run_end)) = run {
+            delta.push_run(&data[run_start..run_end], run_start);
+        }
+
+        delta
+    }
+
+    fn push_run(&mut self, bytes: &[u8], offset: usize) {
+        self.runs.push((offset as u32, bytes.len() as u32));
+        self.bytes.extend_from_slice(bytes);
+    }
+
+    /// Overwrite the differing bytes in `dst`, which should hold the reference segment.
+    ///
+    /// Returns the number of bytes that were written.
+    fn apply(&self, dst: &mut [u8]) -> usize {
+        let mut position = 0;
+        for &(offset, length) in &self.runs {
+            let (offset, length) = (offset as usize, length as usize);
+            dst[offset..offset + length].copy_from_slice(&self.bytes[position..position + length]);
+            position += length;
+        }
+        position
+    }
+
+    /// Return true if `data` equals the reference segment with the delta applied.
+    fn matches(&self, data: &[u8], reference: &[u8]) -> bool {
+        let mut position = 0;
+        let mut unchanged_start = 0;
+        for &(offset, length) in &self.runs {
+            let (offset, length) = (offset as usize, length as usize);
+            if data[unchanged_start..offset] != reference[unchanged_start..offset]
+                || data[offset..offset + length] != self.bytes[position..position + length]
+            {
+                return false;
+            }
+            position += length;
+            unchanged_start = offset + length;
+        }
+        data[unchanged_start..] == reference[unchanged_start..]
+    }
+
+    fn byte_size(&self) -> usize {
+        self.runs.len() * 8 + self.bytes.len()
+    }
+}
+
+impl SegmentBuffer {
+    /// Create an empty buffer.
+    ///
+    /// Memory for the segments is only allocated when the buffer is first written to.
+    pub fn new() -> Self {
+        Self {
+            contents: Contents::Unallocated,
+        }
+    }
+
+    /// Return true if the buffer is stored as a diff against another buffer.
+    pub fn is_compressed(&self) -> bool {
+        matches!(self.contents, Contents::Delta { .. })
+    }
+
+    /// Get the contents of a segment.
+    ///
+    /// Returns None if the buffer is compressed or has never been written to.
+    pub fn segment(&self, index: usize) -> Option<&[u8]> {
+        match &self.contents {
+            Contents::Dense(segments) => segments.get(index).map(Vec::as_slice),
+            _ => None,
+        }
+    }
+
+    /// Get mutable access to the contents of a segment.
+    ///
+    /// A compressed buffer is decompressed first. Returns None if the buffer has never been
+    /// written to.
+    pub fn segment_mut(&mut self, index: usize) -> Option<&mut [u8]> {
+        if self.is_compressed() {
+            self.decompress();
+        }
+        match &mut self.contents {
+            Contents::Dense(segments) => Arc::make_mut(segments)
+                .get_mut(index)
+                .map(Vec::as_mut_slice),
+            _ => None,
+        }
+    }
+
+    fn decompress(&mut self) {
+        if let Contents::Delta {
+            reference,
+            segments,
+        } = &self.contents
+        {
+            let dense = reference
+                .iter()
+                .zip(segments)
+                .map(|(reference, delta)| {
+                    let mut data = reference.clone();
+                    delta.apply(&mut data);
+                    data
+                })
+                .collect();
+            self.contents = Contents::Dense(Arc::new(dense));
+        }
+    }
+
+    /// Overwrite the buffer with the given segment contents.
+    ///
+    /// Returns the number of bytes that were written.
+    pub fn write_segments(&mut self, segments: &[&[u8]]) -> usize {
+        if let Contents::Dense(dense) = &mut self.contents {
+            if let Some(dense) = Arc::get_mut(dense) {
+                let same_shape = dense.len() == segments.len()
+                    && dense
+                        .iter()
+                        .zip(segments)
+                        .all(|(dst, src)| dst.len() == src.len());
+                if same_shape {
+                    return dense
+                        .iter_mut()
+                        .zip(segments)
+                        .map(|(dst, src)| copy_changed_chunks(dst, src))
+                        .sum();
+                }
+            }
+        }
+        // Allocate fresh storage rather than modifying contents that other buffers share
+        self.contents = Contents::Dense(Arc::new(
+            segments.iter().map(|segment| segment.to_vec()).collect(),
+        ));
+        segments.iter().map(|segment| segment.len()).sum()
+    }
+
+    /// Overwrite the buffer with the contents of another buffer.
+    ///
+    /// This is cheap, since the underlying data is shared until one of the buffers is
+    /// written to.
+    pub fn copy_from(&mut self, src: &SegmentBuffer) {
+        self.contents = src.contents.clone();
+    }
+
+    /// Copy the contents of a segment into `dst`, decompressing if necessary.
+    ///
+    /// `dst` must have the same length as the segment. Chunks of `dst` that already hold the
+    /// right contents are left untouched. Returns the number of bytes that were written.
+    pub fn copy_segment_into(&self, index: usize, dst: &mut [u8]) -> usize {
+        match &self.contents {
+            Contents::Unallocated => {
+                for byte in dst.iter_mut() {
+                    *byte = 0;
+                }
+                dst.len()
+            }
+            Contents::Dense(segments) => copy_changed_chunks(dst, &segments[index]),
+            Contents::Delta {
+                reference,
+                segments,
+            } => copy_changed_chunks(dst, &reference[index]) + segments[index].apply(dst),
+        }
+    }
+
+    /// Return true if the contents of a segment are equal to `data`.
+    ///
+    /// This doesn't require decompressing the buffer.
+    pub fn segment_equals(&self, index: usize, data: &[u8]) -> bool {
+        match &self.contents {
+            Contents::Unallocated => data.iter().all(|&byte| byte == 0),
+            Contents::Dense(segments) => segments
+                .get(index)
+                .map_or(false, |segment| segment.as_slice() == data),
+            Contents::Delta {
+                reference,
+                segments,
+            } => match (reference.get(index), segments.get(index)) {
+                (Some(reference), Some(delta)) if reference.len() == data.len() => {
+                    delta.matches(data, reference)
+                }
+                _ => false,
+            },
+        }
+    }
+
+    /// Return true if the two buffers have the same contents.
+    pub fn contents_equal(&self, other: &SegmentBuffer) -> bool {
+        match (&self.contents, &other.contents) {
+            (Contents::Dense(segments), Contents::Dense(other_segments))
+                if Arc::ptr_eq(segments, other_segments) =>
+            {
+                true
+            }
+            (_, Contents::Dense(other_segments)) => other_segments
+                .iter()
+                .enumerate()
+                .all(|(index, data)| self.segment_equals(index, data)),
+            (Contents::Dense(_), _) => other.contents_equal(self),
+            _ => {
+                let mut dense = other.clone();
+                dense.decompress();
+                match &dense.contents {
+                    Contents::Dense(_) => self.contents_equal(&dense),
+                    _ => matches!(self.contents, Contents::Unallocated),
+                }
+            }
+        }
+    }
+
+    /// Store the buffer as a diff against `reference`.
+    ///
+    /// Both buffers must be uncompressed. Returns false and leaves the buffer as is if
+    /// the diff would not be much smaller than the dense contents.
+    pub fn compress(&mut self, reference: &SegmentBuffer) -> bool {
+        let (data, reference) = match (&self.contents, &reference.contents) {
+            (Contents::Dense(data), Contents::Dense(reference))
+                if data.len() == reference.len() =>
+            {
+                (data, reference)
+            }
+            _ => return false,
+        };
+
+        let segments = if Arc::ptr_eq(data, reference) {
+            vec![SegmentDelta::default(); data.len()]
+        } else {
+            let dense_size: usize = data.iter().map(Vec::len).sum();
+            let mut delta_size = 0;
+            let mut segments = Vec::with_capacity(data.len());
+            for (data, reference) in data.iter().zip(reference.iter()) {
+                if data.len() != reference.len() {
+                    return false;
+                }
+                let delta = SegmentDelta::diff(data, reference);
+                delta_size += delta.byte_size();
+                if delta_size * MIN_COMPRESSION_RATIO > dense_size {
+                    return false;
+                }
+                segments.push(delta);
+            }
+            segments
+        };
+
+        let reference = Arc::clone(reference);
+        self.contents = Contents::Delta {
+            reference,
+            segments,
+        };
+        true
+    }
+
+    /// Return the number of bytes of memory used by the buffer.
+    ///
+    /// Data that is shared between several buffers is split evenly between them, so that
+    /// summing over all buffers gives the total memory usage.
+    pub fn byte_size(&self) -> usize {
+        match &self.contents {
+            Contents::Unallocated => 0,
+            Contents::Dense(segments) => shared_size(segments),
+            Contents::Delta {
+                reference,
+                segments,
+            } => {
+                shared_size(reference) + segments.iter().map(SegmentDelta::byte_size).sum::<usize>()
+            }
+        }
+    }
+}
+
+impl Default for SegmentBuffer {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
+fn shared_size(segments: &SharedSegments) -> usize {
+    let size: usize = segments.iter().map(Vec::len).sum();
+    size / Arc::strong_count(segments)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::ops::Range;
+
+    /// Not a multiple of `DIFF_WORD_SIZE`, so that the last word and block are partial.
+    const SEGMENT_SIZE: usize = 1003;
+
+    fn reference_segment() -> Vec<u8> {
+        (0..SEGMENT_SIZE).map(|i| (i * 7) as u8).collect()
+    }
+
+    /// Return a copy of `reference` with the bytes in `ranges` inverted.
+    fn modified(reference: &[u8], ranges: &[Range<usize>]) -> Vec<u8> {
+        let mut data = reference.to_vec();
+        for range in ranges {
+            for byte in &mut data[range.clone()] {
+                *byte = !*byte;
+            }
+        }
+        data
+    }
+
+    #[test]
+    fn delta_round_trip() {
+        let reference = reference_segment();
+        let cases: &[(&[Range<usize>], usize)] = &[
+            (&[], 0),
+            (&[0..1], 1),
+            (&[SEGMENT_SIZE - 1..SEGMENT_SIZE], 1),
+            // Words 8..16 and 24..32 are merged across the gap
+            (&[10..11, 30..31], 1),
+            // Words 8..16 and 40..48 are too far apart to merge
+            (&[10..11, 40..41], 2),
+            (&[60..70, 500..501, 1000..SEGMENT_SIZE], 3),
+            (&[0..SEGMENT_SIZE], 1),
+        ];
+
+        for &(ranges, num_runs) in cases {
+            let data = modified(&reference, ranges);
+            let delta = SegmentDelta::diff(&data, &reference);
+            assert_eq!(delta.runs.len(), num_runs, "{:?}", ranges);
+            let run_bytes: u32 = delta.runs.iter().map(|&(_, length)| length).sum();
+            assert_eq!(run_bytes as usize, delta.bytes.len());
+
+            let mut applied = reference.clone();
+            assert_eq!(delta.apply(&mut applied), delta.bytes.len());
+            assert_eq!(applied, data);
+            assert!(delta.matches(&data, &reference));
+            assert_eq!(delta.matches(&reference, &reference), ranges.is_empty());
+        }
+    }
+
+    #[test]
+    fn compress_round_trip() {
+        let segment0 = reference_segment();
+        let segment1 = vec![1; 64];
+        let changed0 = modified(&segment0, &[5..6, 900..910]);
+
+        let mut reference = SegmentBuffer::new();
+        reference.write_segments(&[&segment0, &segment1]);
+        let mut buffer = SegmentBuffer::new();
+        buffer.write_segments(&[&changed0, &segment1]);
+        assert!(buffer.compress(&reference));
+        assert!(buffer.is_compressed());
+        assert!(buffer.segment(0).is_none());
+        assert!(buffer.segment_equals(0, &changed0));
+        assert!(!buffer.segment_equals(0, &segment0));
+        assert!(buffer.segment_equals(1, &segment1));
+
+        // The reference is shared copy-on-write, so overwriting it doesn't affect the delta
+        reference.segment_mut(0).unwrap()[100] ^= 1;
+        assert!(buffer.segment_equals(0, &changed0));
+
+        let mut dst = vec![0xff; SEGMENT_SIZE];
+        buffer.copy_segment_into(0, &mut dst);
+        assert_eq!(dst, changed0);
+
+        let mut copy = SegmentBuffer::new();
+        copy.copy_from(&buffer);
+        assert!(copy.contents_equal(&buffer));
+        let mut dense = SegmentBuffer::new();
+        dense.write_segments(&[&changed0, &segment1]);
+        assert!(buffer.contents_equal(&dense));
+        assert!(dense.contents_equal(&buffer));
+        assert!(!buffer.contents_equal(&reference));
+
+        // Writing decompresses the buffer
+        buffer.segment_mut(1).unwrap()[0] = 2;
+        assert!(!buffer.is_compressed());
+        assert_eq!(buffer.segment(0), Some(changed0.as_slice()));
+        assert_eq!(buffer.segment(1).unwrap()[..2], [2, 1]);
+
+        // A buffer that differs almost everywhere is left dense
+        let mut different = SegmentBuffer::new();
+        different.write_segments(&[&modified(&segment0, &[0..SEGMENT_SIZE]), &segment1]);
+        assert!(!different.compress(&dense));
+        assert!(!different.is_compressed());
+    }
+}
@@ -28,6 +28,7 @@ fn wafel_core(_py: Python<'_>, m: &PyModule) -> PyResult<()> {
     m.add_class::<PyVariable>()?;
     m.add_class::<PyObjectBehavior>()?;
     m.add_class::<PyAddress>()?;
+    m.add_class::<PyDataPath>()?;
     m.add_class::<scene::Scene>()?;
     m.add_class::<scene::Viewport>()?;
     m.add_class::<scene::RotateCamera>()?;
@@ -1,6 +1,7 @@
 use super::{
+    error::WafelError,
     value::{py_object_to_value, value_to_py_object},
-    PyAddress, PyEditRange, PyObjectBehavior, PyVariable,
+    PyAddress, PyDataPath, PyEditRange, PyObjectBehavior, PyVariable,
 };
 use crate::{
     dll,
@@ -13,15 +14,34 @@ use crate::{
     sm64::trace_ray_to_surface,
     sm64::{
         frame_log, load_dll_pipeline, object_behavior, object_path, read_surfaces_to_scene,
-        ObjectSlot, Pipeline,
+        FrameLogPaths, ObjectSlot, Pipeline, RangeEdits, Variable,
     },
-    timeline::{SlotState, State},
+    timeline::{BranchId, PlacementPolicy, Playback, SlotMode, SlotState, SnapshotStore, State},
 };
 use lazy_static::lazy_static;
-use pyo3::{prelude::*, types::PyBytes};
-use std::{collections::HashMap, sync::Mutex};
+use pyo3::{exceptions::PyValueError, prelude::*, types::PyBytes};
+use std::{
+    collections::HashMap,
+    sync::{
+        atomic::{AtomicBool, AtomicUsize, Ordering},
+        Arc, Mutex, MutexGuard, TryLockError,
+    },
+    thread,
+    time::Duration,
+};
 
 const NUM_BACKUP_SLOTS: usize = 30;
+const NUM_DELTA_BACKUP_SLOTS: usize = 200;
+
+/// How long the background thread holds the pipeline for each round of balancing.
+///
+/// Each round stops once the slice is over, after at most one more frame advance and slot
+/// copy. This bounds how long a call from the UI thread can wait for the lock.
+const BACKGROUND_SLICE: Duration = Duration::from_millis(2);
+
+/// How long the background thread sleeps when it has nothing to do, unless woken by a change
+/// to the pipeline.
+const BACKGROUND_IDLE_TIMEOUT: Duration = Duration::from_millis(100);
 
 lazy_static! {
     static ref VALID_PIPELINES: Mutex<Vec<Py<PyPipeline>>> = Mutex::new(Vec::new());
@@ -34,13 +54,29 @@ lazy_static! {
 #[pyclass(name = Pipeline, unsendable)]
 #[derive(Debug)]
 pub struct PyPipeline {
-    valid: Option<ValidPipeline>,
+    valid: Option<Arc<SharedPipeline>>,
+    background_thread: Option<thread::JoinHandle<()>>,
+}
+
+/// The state shared between a pipeline and its background thread.
+#[derive(Debug)]
+struct SharedPipeline {
+    valid: Mutex<ValidPipeline>,
+    /// The number of calls that are waiting for the lock. The background thread yields to
+    /// them.
+    num_waiting: AtomicUsize,
+    /// Set to ask the background thread to exit.
+    stopped: AtomicBool,
+    /// The error that stopped the background thread, if any.
+    background_error: Mutex<Option<String>>,
 }
 
 #[derive(Debug)]
 struct ValidPipeline {
     pipeline: Pipeline<dll::Memory>,
     symbols_by_address: HashMap<Address, String>,
+    /// Compiled on the first call to `frame_log`.
+    frame_log_paths: Option<FrameLogPaths>,
 }
 
 impl PyPipeline {
@@ -53,23 +89,122 @@ impl PyPipeline {
             .collect();
 
         Ok(Self {
-            valid: Some(ValidPipeline {
-                pipeline,
-                symbols_by_address,
-            }),
+            valid: Some(Arc::new(SharedPipeline {
+                valid: Mutex::new(ValidPipeline {
+                    pipeline,
+                    symbols_by_address,
+                    frame_log_paths: None,
+                }),
+                num_waiting: AtomicUsize::new(0),
+                stopped: AtomicBool::new(false),
+                background_error: Mutex::new(None),
+            })),
+            background_thread: None,
         })
     }
 
     fn invalidate(&mut self) -> Option<ValidPipeline> {
-        self.valid.take()
+        self.stop_background_thread();
+        let shared = self.valid.take()?;
+        let shared = Arc::try_unwrap(shared).expect("pipeline is still shared");
+        Some(shared.valid.into_inner().unwrap())
     }
 
-    fn get(&self) -> &ValidPipeline {
+    fn shared(&self) -> &Arc<SharedPipeline> {
         self.valid.as_ref().expect("pipeline has been invalidated")
     }
 
-    fn get_mut(&mut self) -> &mut ValidPipeline {
-        self.valid.as_mut().expect("pipeline has been invalidated")
+    fn get(&self) -> MutexGuard<'_, ValidPipeline> {
+        let shared = self.shared();
+        shared.num_waiting.fetch_add(1, Ordering::SeqCst);
+        // Release the GIL while the background thread finishes its slice, so that other
+        // Python threads aren't blocked as well
+        let valid = loop {
+            match shared.valid.try_lock() {
+                Ok(valid) => break valid,
+                Err(TryLockError::WouldBlock) => {
+                    Python::with_gil(|py| py.allow_threads(thread::yield_now))
+                }
+                Err(TryLockError::Poisoned(error)) => panic!("{}", error),
+            }
+        };
+        shared.num_waiting.fetch_sub(1, Ordering::SeqCst);
+        valid
+    }
+
+    fn get_mut(&mut self) -> MutexGuard<'_, ValidPipeline> {
+        let valid = self.get();
+        // The change may leave work to do, so wake the background thread. It will block
+        // until the lock is released
+        if let Some(background_thread) = &self.background_thread {
+            background_thread.thread().unpark();
+        }
+        valid
+    }
+
+    fn stop_background_thread(&mut self) {
+        if let Some(background_thread) = self.background_thread.take() {
+            self.shared().stopped.store(true, Ordering::SeqCst);
+            background_thread.thread().unpark();
+            // Release the GIL while joining, since the background thread needs it to log. This
+            // doesn't need a `Python` token so that it also works in `drop`
+            Python::with_gil(|py| py.allow_threads(|| background_thread.join()))
+                .expect("background thread panicked");
+        }
+    }
+
+    fn validate_branch(&self, branch: usize) -> PyResult<()> {
+        if self
+            .get()
+            .pipeline
+            .timeline()
+            .branches()
+            .contains(&BranchId(branch))
+        {
+            Ok(())
+        } else {
+            Err(PyErr::new::<PyValueError, _>(format!(
+                "invalid branch: {}",
+                branch
+            )))
+        }
+    }
+}
+
+impl Drop for PyPipeline {
+    fn drop(&mut self) {
+        self.stop_background_thread();
+    }
+}
+
+/// Balance slots and continue any seek in progress until stopped, yielding to other users of
+/// the pipeline.
+fn run_background_thread(shared: Arc<SharedPipeline>) {
+    while !shared.stopped.load(Ordering::SeqCst) {
+        if shared.num_waiting.load(Ordering::SeqCst) > 0 {
+            thread::yield_now();
+            continue;
+        }
+
+        let result = {
+            let mut valid = shared.valid.lock().unwrap();
+            let timeline = valid.pipeline.timeline_mut();
+            let work_done = (timeline.num_advances(), timeline.num_copies());
+            let result = match timeline.seek_progress() {
+                Some((frame, _)) => timeline.seek(frame, BACKGROUND_SLICE).map(|_| ()),
+                None => timeline.balance_distribution(BACKGROUND_SLICE),
+            };
+            result.map(|()| (timeline.num_advances(), timeline.num_copies()) != work_done)
+        };
+
+        match result {
+            Ok(true) => {}
+            Ok(false) => thread::park_timeout(BACKGROUND_IDLE_TIMEOUT),
+            Err(error) => {
+                *shared.background_error.lock().unwrap() = Some(error.to_string());
+                break;
+            }
+        }
     }
 }
 
@@ -80,12 +215,24 @@ impl PyPipeline {
     /// To help ensure DLL safety and avoid memory leaks, this method also invalidates
     /// all existing pipelines that were created using this method.
     ///
+    /// If `delta_slots` is true, backup slots are stored as diffs against each other,
+    /// which allows many more of them to be kept in memory.
+    ///
+    /// If `memory_budget_bytes` is given, the number of backup slots is chosen to fit the
+    /// budget instead of using a fixed count.
+    ///
     /// # Safety
     ///
     /// See `dll::Memory::load`. As long as the DLL is only loaded via this method,
     /// this method is safe.
     #[staticmethod]
-    pub unsafe fn load(py: Python<'_>, dll_path: &str) -> PyResult<Py<Self>> {
+    #[args(delta_slots = "false", memory_budget_bytes = "None")]
+    pub unsafe fn load(
+        py: Python<'_>,
+        dll_path: &str,
+        delta_slots: bool,
+        memory_budget_bytes: Option<usize>,
+    ) -> PyResult<Py<Self>> {
         let mut valid_pipelines = VALID_PIPELINES.lock().unwrap();
 
         // Drop all known existing dll::Memory instances for safety
@@ -93,7 +240,18 @@ impl PyPipeline {
             pipeline_py.borrow_mut(py).invalidate();
         }
 
-        let pipeline = load_dll_pipeline(dll_path, NUM_BACKUP_SLOTS)?;
+        let (slot_mode, num_backup_slots) = if delta_slots {
+            (SlotMode::Delta, NUM_DELTA_BACKUP_SLOTS)
+        } else {
+            (SlotMode::Dense, NUM_BACKUP_SLOTS)
+        };
+        let mut pipeline = match memory_budget_bytes {
+            Some(_) => load_dll_pipeline(dll_path, 0, slot_mode)?,
+            None => load_dll_pipeline(dll_path, num_backup_slots, slot_mode)?,
+        };
+        pipeline
+            .timeline_mut()
+            .set_memory_budget(memory_budget_bytes)?;
         let pipeline_py = Py::new(py, PyPipeline::new(pipeline)?)?;
 
         valid_pipelines.push(pipeline_py.clone());
@@ -101,7 +259,8 @@ impl PyPipeline {
         Ok(pipeline_py)
     }
 
-    /// Load a new pipeline using the given DLL, reusing the edits of the given pipeline.
+    /// Load a new pipeline using the given DLL, reusing the edits, slot mode, memory budget,
+    /// convergence limit, and data cache budget of the given pipeline.
     ///
     /// This method invalidates `prev_pipeline`.
     ///
@@ -114,19 +273,30 @@ impl PyPipeline {
         dll_path: &str,
         prev_pipeline: Py<PyPipeline>,
     ) -> PyResult<Py<Self>> {
-        let edits = prev_pipeline
+        let prev_pipeline = prev_pipeline
             .borrow_mut(py)
             .invalidate()
             .expect("pipeline has been invalidated")
-            .pipeline
-            .into_edits()?;
+            .pipeline;
+        let delta_slots = prev_pipeline.timeline().slot_mode() == SlotMode::Delta;
+        let memory_budget_bytes = prev_pipeline.timeline().memory_budget();
+        let convergence_limit = prev_pipeline.timeline().convergence_limit();
+        let data_cache_budget = prev_pipeline.timeline().data_cache_budget();
+        let edits = prev_pipeline.into_edits()?;
 
-        let py_pipeline = Self::load(py, dll_path)?;
-        py_pipeline
-            .borrow_mut(py)
-            .get_mut()
-            .pipeline
-            .set_edits(edits);
+        let py_pipeline = Self::load(py, dll_path, delta_slots, memory_budget_bytes)?;
+        {
+            let mut py_pipeline = py_pipeline.borrow_mut(py);
+            let mut valid = py_pipeline.get_mut();
+            let pipeline = &mut valid.pipeline;
+            pipeline.set_edits(edits);
+            pipeline
+                .timeline_mut()
+                .set_convergence_limit(convergence_limit);
+            pipeline
+                .timeline_mut()
+                .set_data_cache_budget(data_cache_budget);
+        }
 
         Ok(py_pipeline)
     }
@@ -172,23 +342,67 @@ impl PyPipeline {
         Ok(())
     }
 
+    /// Keep the given variables preloaded in the data cache for new frames, replacing the
+    /// previously pinned variables.
+    pub fn set_pinned_variables(&mut self, variables: Vec<PyVariable>) -> PyResult<()> {
+        let variables: Vec<Variable> = variables
+            .into_iter()
+            .map(|variable| variable.variable)
+            .collect();
+        self.get_mut().pipeline.set_pinned_variables(&variables)?;
+        Ok(())
+    }
+
+    /// Stop preloading the given variables until they are read again.
+    pub fn demote_variables(&mut self, variables: Vec<PyVariable>) -> PyResult<()> {
+        let variables: Vec<Variable> = variables
+            .into_iter()
+            .map(|variable| variable.variable)
+            .collect();
+        self.get_mut().pipeline.demote_variables(&variables)?;
+        Ok(())
+    }
+
     /// Get the address for the given path.
     ///
     /// None is only returned if `?` is used in the path.
     pub fn path_address(&self, frame: u32, path: &str) -> PyResult<Option<PyAddress>> {
-        let state = self.get().pipeline.timeline().frame(frame)?;
+        let valid = self.get();
+        let state = valid.pipeline.timeline().frame(frame)?;
         let address = state.address(path)?.map(|address| PyAddress { address });
         Ok(address)
     }
 
     /// Read from the given path.
     pub fn path_read(&self, py: Python<'_>, frame: u32, path: &str) -> PyResult<PyObject> {
-        let state = self.get().pipeline.timeline().frame(frame)?;
+        let valid = self.get();
+        let state = valid.pipeline.timeline().frame(frame)?;
         let value = state.read(path)?;
         let py_object = value_to_py_object(py, &value)?;
         Ok(py_object)
     }
 
+    /// Compile a global data path so that it can be read repeatedly using `data_path_read`.
+    pub fn data_path(&self, path: &str) -> PyResult<PyDataPath> {
+        let valid = self.get();
+        let path = valid.pipeline.timeline().memory().global_path(path)?;
+        Ok(PyDataPath { path })
+    }
+
+    /// Read from a data path that was compiled using `data_path`.
+    pub fn data_path_read(
+        &self,
+        py: Python<'_>,
+        frame: u32,
+        path: &PyDataPath,
+    ) -> PyResult<PyObject> {
+        let valid = self.get();
+        let state = valid.pipeline.timeline().frame(frame)?;
+        let value = state.path_read(&path.path)?;
+        let py_object = value_to_py_object(py, &value)?;
+        Ok(py_object)
+    }
+
     /// Insert a new state at the given frame, shifting edits forward.
     pub fn insert_frame(&mut self, frame: u32) {
         self.get_mut().pipeline.insert_frame(frame);
@@ -228,10 +442,100 @@ impl PyPipeline {
 
     /// Find the edit range containing a variable, if present.
     pub fn find_edit_range(&self, variable: &PyVariable) -> PyResult<Option<PyEditRange>> {
-        let range = self.get().pipeline.find_edit_range(&variable.variable)?;
+        let valid = self.get();
+        let range = valid.pipeline.find_edit_range(&variable.variable)?;
         Ok(range.cloned().map(|range| PyEditRange { range }))
     }
 
+    /// Return every edit range as a tuple `(column, start, end, value)`, where the range
+    /// covers frames `start..end`.
+    pub fn edit_ranges(&self, py: Python<'_>) -> PyResult<Vec<(PyVariable, u32, u32, PyObject)>> {
+        self.get()
+            .pipeline
+            .edit_ranges()
+            .into_iter()
+            .map(|(column, range)| {
+                Ok((
+                    PyVariable {
+                        variable: column.clone(),
+                    },
+                    range.frames.start,
+                    range.frames.end,
+                    value_to_py_object(py, &range.value)?,
+                ))
+            })
+            .collect()
+    }
+
+    /// Return a hash of the edits on frames up to and including `frame`, or None during a
+    /// drag.
+    pub fn edit_hash(&self, frame: u32) -> Option<u64> {
+        self.get().pipeline.edit_hash(frame)
+    }
+
+    /// Overwrite all edits with ranges returned by `edit_ranges`.
+    pub fn set_edit_ranges(
+        &mut self,
+        py: Python<'_>,
+        ranges: Vec<(PyVariable, u32, u32, PyObject)>,
+    ) -> PyResult<()> {
+        let ranges = ranges
+            .into_iter()
+            .map(|(column, start, end, value)| {
+                Ok((column.variable, start..end, py_object_to_value(py, &value)?))
+            })
+            .collect::<PyResult<Vec<_>>>()?;
+        self.get_mut()
+            .pipeline
+            .set_edits(RangeEdits::from_ranges(ranges));
+        Ok(())
+    }
+
+    /// Create a branch with a copy of the current edits, returning its id.
+    ///
+    /// The current branch is unchanged. Until the branches' edits differ, they share
+    /// simulated frames, so comparing variants of a segment doesn't require re-simulating
+    /// the frames before it.
+    pub fn fork(&mut self) -> usize {
+        self.get_mut().pipeline.timeline_mut().fork().0
+    }
+
+    /// Return the id of the branch that reads and edits apply to.
+    pub fn branch(&self) -> usize {
+        self.get().pipeline.timeline().branch().0
+    }
+
+    /// Return the ids of every branch, including the current one.
+    pub fn branches(&self) -> Vec<usize> {
+        let branches = self.get().pipeline.timeline().branches();
+        branches.into_iter().map(|branch| branch.0).collect()
+    }
+
+    /// Make the given branch the current branch.
+    pub fn switch_branch(&mut self, branch: usize) -> PyResult<()> {
+        self.validate_branch(branch)?;
+        self.get_mut()
+            .pipeline
+            .timeline_mut()
+            .switch_branch(BranchId(branch));
+        Ok(())
+    }
+
+    /// Delete a branch other than the current one.
+    pub fn delete_branch(&mut self, branch: usize) -> PyResult<()> {
+        self.validate_branch(branch)?;
+        if branch == self.branch() {
+            return Err(PyErr::new::<PyValueError, _>(
+                "cannot delete the current branch",
+            ));
+        }
+        self.get_mut()
+            .pipeline
+            .timeline_mut()
+            .delete_branch(BranchId(branch));
+        Ok(())
+    }
+
     /// Set a hotspot, allowing for faster scrolling near the given frame.
     pub fn set_hotspot(&mut self, name: &str, frame: u32) {
         self.get_mut()
@@ -240,12 +544,88 @@ impl PyPipeline {
             .set_hotspot(name, frame);
     }
 
-    /// Perform housekeeping to improve scrolling near hotspots.
-    pub fn balance_distribution(&mut self, max_run_time_seconds: f32) -> PyResult<()> {
+    /// Advance toward `frame` for roughly the given time, returning true once it is loaded.
+    ///
+    /// This allows loading a distant frame over several calls without blocking. Calling with
+    /// a different frame retargets the seek.
+    pub fn seek(
+        &mut self,
+        py: Python<'_>,
+        frame: u32,
+        max_run_time_seconds: f32,
+    ) -> PyResult<bool> {
+        let mut valid = self.get_mut();
+        let timeline = valid.pipeline.timeline_mut();
+        let loaded = py.allow_threads(|| {
+            timeline.seek(frame, Duration::from_secs_f32(max_run_time_seconds))
+        })?;
+        Ok(loaded)
+    }
+
+    /// Return the target frame of the seek in progress and the fraction of the way there.
+    pub fn seek_progress(&self) -> Option<(u32, f32)> {
+        self.get().pipeline.timeline().seek_progress()
+    }
+
+    /// Stop the seek in progress, keeping any checkpoints it saved.
+    pub fn cancel_seek(&mut self) {
+        self.get_mut().pipeline.timeline_mut().cancel_seek();
+    }
+
+    /// Set a hint that frames are being played back in order from `frame`.
+    ///
+    /// `frames_per_second` is negative when playing in reverse. While the hint is set,
+    /// balancing keeps frames ready ahead of the playhead.
+    pub fn set_playback(&mut self, frame: u32, frames_per_second: f32) {
         self.get_mut()
             .pipeline
             .timeline_mut()
-            .balance_distribution(std::time::Duration::from_secs_f32(max_run_time_seconds))?;
+            .set_playback(Some(Playback {
+                frame,
+                frames_per_second,
+            }));
+    }
+
+    /// Clear the playback hint.
+    pub fn stop_playback(&mut self) {
+        self.get_mut().pipeline.timeline_mut().set_playback(None);
+    }
+
+    /// Perform housekeeping to improve scrolling near hotspots.
+    pub fn balance_distribution(
+        &mut self,
+        py: Python<'_>,
+        max_run_time_seconds: f32,
+    ) -> PyResult<()> {
+        let mut valid = self.get_mut();
+        let timeline = valid.pipeline.timeline_mut();
+        py.allow_threads(|| {
+            timeline.balance_distribution(Duration::from_secs_f32(max_run_time_seconds))
+        })?;
+        Ok(())
+    }
+
+    /// Balance slots and continue the seek in progress on a background thread whenever the
+    /// pipeline is not in use.
+    ///
+    /// The first call starts the thread. If the thread stopped due to an error, the next call
+    /// raises it and a later call restarts the thread. This is intended to be called once
+    /// per UI frame instead of `balance_distribution`.
+    pub fn balance_in_background(&mut self) -> PyResult<()> {
+        let shared = Arc::clone(self.shared());
+        let error = shared.background_error.lock().unwrap().take();
+        if let Some(error) = error {
+            self.stop_background_thread();
+            return Err(PyErr::new::<WafelError, _>(error));
+        }
+
+        if self.background_thread.is_none() {
+            shared.stopped.store(false, Ordering::SeqCst);
+            let background_thread = thread::Builder::new()
+                .name("wafel-background".to_owned())
+                .spawn(move || run_background_thread(shared))?;
+            self.background_thread = Some(background_thread);
+        }
         Ok(())
     }
 
@@ -264,18 +644,182 @@ impl PyPipeline {
         self.get().pipeline.timeline().num_copies()
     }
 
+    /// Return the number of bytes written by slot copies since the timeline was created.
+    pub fn num_copied_bytes(&self) -> usize {
+        self.get().pipeline.timeline().num_copied_bytes()
+    }
+
     /// Return the size of the data cache in bytes.
     pub fn data_cache_size(&self) -> usize {
         self.get().pipeline.timeline().data_size_cache()
     }
 
+    /// Return the number of bytes the data cache may use.
+    pub fn data_cache_budget(&self) -> usize {
+        self.get().pipeline.timeline().data_cache_budget()
+    }
+
+    /// Limit the number of bytes the data cache may use, evicting frames to fit.
+    pub fn set_data_cache_budget(&mut self, budget_bytes: usize) {
+        self.get_mut()
+            .pipeline
+            .timeline_mut()
+            .set_data_cache_budget(budget_bytes);
+    }
+
+    /// Return the data cache's hit, miss, and eviction counts and number of hot paths for
+    /// debugging purposes.
+    pub fn data_cache_stats(&self) -> HashMap<&'static str, usize> {
+        let stats = self.get().pipeline.timeline().data_cache_stats();
+        let mut result = HashMap::new();
+        result.insert("hits", stats.hits);
+        result.insert("misses", stats.misses);
+        result.insert("evictions", stats.evictions);
+        result.insert("hot_paths", stats.hot_paths);
+        result
+    }
+
+    /// Return the number of bytes used by backup slots.
+    pub fn slot_memory_size(&self) -> usize {
+        self.get().pipeline.timeline().slot_memory_size()
+    }
+
+    /// Return the name of the policy used to place backup slots.
+    pub fn placement_policy(&self) -> &'static str {
+        match self.get().pipeline.timeline().placement_policy() {
+            PlacementPolicy::Alignment => "alignment",
+            PlacementPolicy::Histogram => "histogram",
+        }
+    }
+
+    /// Set the policy used to place backup slots, either "alignment" or "histogram".
+    pub fn set_placement_policy(&mut self, policy: &str) -> PyResult<()> {
+        let policy = match policy {
+            "alignment" => PlacementPolicy::Alignment,
+            "histogram" => PlacementPolicy::Histogram,
+            _ => {
+                return Err(PyErr::new::<PyValueError, _>(format!(
+                    "unknown placement policy: {}",
+                    policy
+                )))
+            }
+        };
+        self.get_mut()
+            .pipeline
+            .timeline_mut()
+            .set_placement_policy(policy);
+        Ok(())
+    }
+
+    /// Return the measured costs of slot operations.
+    ///
+    /// `copy_time` and `advance_time` are average times in seconds, or None before the first
+    /// measurement. `copy_cost` is the cost of a copy measured in frame advances, which is
+    /// used to choose the slot to restore from.
+    pub fn cost_model(&self) -> HashMap<&'static str, Option<f64>> {
+        let cost_model = self.get().pipeline.timeline().cost_model();
+        let mut result = HashMap::new();
+        result.insert("copy_time", cost_model.copy_time());
+        result.insert("advance_time", cost_model.advance_time());
+        result.insert("copy_cost", Some(cost_model.copy_cost()));
+        result
+    }
+
+    /// Return the maximum number of frames simulated to detect convergence after an edit, or
+    /// None if disabled.
+    pub fn convergence_limit(&self) -> Option<usize> {
+        self.get().pipeline.timeline().convergence_limit()
+    }
+
+    /// Enable convergence detection after edits, simulating at most `max_advances` frames
+    /// past each edit, or disable it if None.
+    pub fn set_convergence_limit(&mut self, max_advances: Option<usize>) {
+        self.get_mut()
+            .pipeline
+            .timeline_mut()
+            .set_convergence_limit(max_advances);
+    }
+
+    /// Persist snapshots of frames in `directory` using at most `max_size_bytes` of disk,
+    /// so that later sessions with the same edits can skip simulating them.
+    ///
+    /// If `directory` is None, snapshots are disabled.
+    pub fn set_snapshot_store(
+        &mut self,
+        directory: Option<&str>,
+        max_size_bytes: usize,
+    ) -> PyResult<()> {
+        let store = match directory {
+            Some(directory) => Some(SnapshotStore::open(directory, max_size_bytes)?),
+            None => None,
+        };
+        self.get_mut()
+            .pipeline
+            .timeline_mut()
+            .set_snapshot_store(store)?;
+        Ok(())
+    }
+
+    /// Load snapshots from the store in `directory` into backup slots, returning the number
+    /// of snapshots loaded.
+    ///
+    /// Only snapshots taken with the same edits as this pipeline are used. This allows frames
+    /// that were simulated by another process to be reused.
+    pub fn import_snapshots(&mut self, directory: &str) -> PyResult<usize> {
+        let mut store = SnapshotStore::open(directory, usize::MAX)?;
+        let count = self
+            .get_mut()
+            .pipeline
+            .timeline_mut()
+            .import_snapshots(&mut store)?;
+        Ok(count)
+    }
+
+    /// Return the highest advance time in each of `num_bins` equal bins of frames
+    /// `0..num_frames`, relative to the average advance time.
+    ///
+    /// Bins without measured frames have a value of zero.
+    pub fn frame_cost_bins(&self, num_frames: usize, num_bins: usize) -> Vec<f32> {
+        self.get()
+            .pipeline
+            .timeline()
+            .frame_cost_bins(num_frames, num_bins)
+    }
+
+    /// Return a decayed average of the number of frame advances per frame request.
+    pub fn mean_request_advances(&self) -> f32 {
+        self.get().pipeline.timeline().mean_request_advances()
+    }
+
+    /// Return the current number of backup slots.
+    pub fn num_backup_slots(&self) -> usize {
+        self.get().pipeline.timeline().num_backup_slots()
+    }
+
+    /// Return the memory budget for backup slots, if any.
+    pub fn memory_budget(&self) -> Option<usize> {
+        self.get().pipeline.timeline().memory_budget()
+    }
+
+    /// Limit the memory used by backup slots, creating or evicting slots to fit.
+    ///
+    /// If `memory_budget_bytes` is None, the current slots are kept but no longer adjusted.
+    pub fn set_memory_budget(&mut self, memory_budget_bytes: Option<usize>) -> PyResult<()> {
+        self.get_mut()
+            .pipeline
+            .timeline_mut()
+            .set_memory_budget(memory_budget_bytes)?;
+        Ok(())
+    }
+
     /// Return the label for the variable if it has one.
-    pub fn label(&self, variable: &PyVariable) -> PyResult<Option<&str>> {
+    pub fn label(&self, variable: &PyVariable) -> PyResult<Option<String>> {
         let label = self
             .get()
             .pipeline
             .data_variables()
-            .label(&variable.variable)?;
+            .label(&variable.variable)?
+            .map(str::to_owned);
         Ok(label)
     }
 
@@ -326,7 +870,8 @@ impl PyPipeline {
         frame: u32,
         address: &PyAddress,
     ) -> PyResult<&'p PyBytes> {
-        let timeline = self.get().pipeline.timeline();
+        let valid = self.get();
+        let timeline = valid.pipeline.timeline();
         let state = timeline.frame_uncached(frame)?;
         let memory = timeline.memory();
 
@@ -348,7 +893,8 @@ impl PyPipeline {
 
     /// Return a map from mario action values to human readable names.
     pub fn action_names(&self) -> HashMap<u32, String> {
-        let data_layout = self.get().pipeline.timeline().memory().data_layout();
+        let valid = self.get();
+        let data_layout = valid.pipeline.timeline().memory().data_layout();
         data_layout
             .constants
             .iter()
@@ -372,10 +918,12 @@ impl PyPipeline {
 
     /// Get the object behavior for an object, or None if the object is not active.
     pub fn object_behavior(&self, frame: u32, object: usize) -> PyResult<Option<PyObjectBehavior>> {
-        let state = self.get().pipeline.timeline().frame(frame)?;
-        match object_path(&state, ObjectSlot(object))? {
-            Some(object_path) => {
-                let behavior = object_behavior(&state, &object_path)?;
+        let valid = self.get();
+        let state = valid.pipeline.timeline().frame(frame)?;
+        let paths = valid.pipeline.data_variables().pool_paths();
+        match object_path(&state, paths, ObjectSlot(object))? {
+            Some(_) => {
+                let behavior = object_behavior(&state, paths, ObjectSlot(object))?;
                 Ok(Some(PyObjectBehavior { behavior }))
             }
             None => Ok(None),
@@ -385,7 +933,8 @@ impl PyPipeline {
     /// Get a human readable name for the given object behavior, if possible.
     pub fn object_behavior_name(&self, behavior: &PyObjectBehavior) -> String {
         let address = behavior.behavior.0;
-        let symbol = self.get().symbols_by_address.get(&address);
+        let valid = self.get();
+        let symbol = valid.symbols_by_address.get(&address);
 
         if let Some(symbol) = symbol {
             symbol.strip_prefix("bhv").unwrap_or(symbol).to_owned()
@@ -402,8 +951,14 @@ impl PyPipeline {
         py: Python<'_>,
         frame: u32,
     ) -> PyResult<Vec<HashMap<String, PyObject>>> {
-        let state = self.get().pipeline.timeline().frame(frame)?;
-        let events = frame_log(&state)?;
+        let mut valid = self.get();
+        if valid.frame_log_paths.is_none() {
+            let paths = FrameLogPaths::new(valid.pipeline.timeline().memory())?;
+            valid.frame_log_paths = Some(paths);
+        }
+        let valid = &*valid;
+        let state = valid.pipeline.timeline().frame(frame)?;
+        let events = frame_log(&state, valid.frame_log_paths.as_ref().unwrap())?;
 
         let convert_event = |event: HashMap<String, Value>| -> PyResult<HashMap<String, PyObject>> {
             event
@@ -421,7 +976,8 @@ impl PyPipeline {
         frame: u32,
         ray: ([f32; 3], [f32; 3]),
     ) -> PyResult<Option<usize>> {
-        let state = self.get().pipeline.timeline().frame_uncached(frame)?;
+        let valid = self.get();
+        let state = valid.pipeline.timeline().frame_uncached(frame)?;
         let index = trace_ray_to_surface(
             &state,
             (
@@ -435,26 +991,29 @@ impl PyPipeline {
 
     /// Load the SM64 surfaces from the game state and add them to the scene.
     pub fn read_surfaces_to_scene(&self, scene: &mut Scene, frame: u32) -> PyResult<()> {
-        let state = self.get().pipeline.timeline().frame_uncached(frame)?;
+        let valid = self.get();
+        let state = valid.pipeline.timeline().frame_uncached(frame)?;
         read_surfaces_to_scene(scene, &state)?;
         Ok(())
     }
 
     /// Load the SM64 objects from the game state and add them to the scene.
     pub fn read_objects_to_scene(&self, scene: &mut Scene, frame: u32) -> PyResult<()> {
-        let state = self.get().pipeline.timeline().frame_uncached(frame)?;
+        let valid = self.get();
+        let state = valid.pipeline.timeline().frame_uncached(frame)?;
         read_objects_to_scene(scene, &state)?;
         Ok(())
     }
 
     /// Add an object path for mario to the scene, using the given frame range.
     pub fn read_mario_path(&self, frame_start: u32, frame_end: u32) -> PyResult<scene::ObjectPath> {
-        let timeline = self.get().pipeline.timeline();
+        let valid = self.get();
+        let timeline = valid.pipeline.timeline();
         let pos_path = timeline.memory().global_path("gMarioState->pos")?;
 
         let mut nodes = Vec::new();
-        for frame in frame_start..frame_end {
-            let pos_coords = timeline.frame(frame)?.path_read(&pos_path)?.as_f32_3()?;
+        for pos in timeline.path_read_range(&pos_path, frame_start..frame_end)? {
+            let pos_coords = pos.as_f32_3()?;
             nodes.push(scene::ObjectPathNode {
                 pos: Point3f::from_slice(&pos_coords).into(),
                 quarter_steps: Vec::new(),
@@ -1,5 +1,6 @@
 use super::value::value_to_py_object;
 use crate::{
+    data_path::GlobalDataPath,
     error::Error,
     memory::Address,
     sm64::{EditRange, ObjectBehavior, ObjectSlot, SM64ErrorCause, SurfaceSlot, Variable},
@@ -174,6 +175,16 @@ pub struct PyAddress {
     pub(crate) address: Address,
 }
 
+/// A compiled global data path.
+///
+/// Reading through a `DataPath` skips parsing and looking up the path on every read.
+/// It is only valid for the pipeline that compiled it.
+#[pyclass(name = DataPath)]
+#[derive(Debug, Clone)]
+pub struct PyDataPath {
+    pub(crate) path: GlobalDataPath,
+}
+
 /// Information about a variable edit range.
 #[pyclass(name = EditRange)]
 #[derive(Debug)]
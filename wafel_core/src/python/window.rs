@@ -107,6 +107,11 @@ pub fn open_window_and_run_impl(title: &str, update_fn: PyObject) -> PyResult<()
                         }
                     }
                     Event::MainEventsCleared => window.request_redraw(),
+                    Event::LoopDestroyed => {
+                        // The event loop exits the process without returning to Python, so
+                        // run its exit handlers here
+                        py.import("atexit")?.call_method0("_run_exitfuncs")?;
+                    }
                     Event::RedrawRequested(_) => {
                         let delta_time = last_frame_time.elapsed().as_secs_f64();
                         last_frame_time = Instant::now();
@@ -1,9 +1,9 @@
-use super::{util, SM64ErrorCause, Variable};
+use super::{PoolPaths, SM64ErrorCause, Variable};
 use crate::{
-    data_path::{DataPath, GlobalDataPath, LocalDataPath},
+    data_path::{DataPath, GlobalDataPath, IndexedDataPath},
     error::Error,
     memory::{data_type::DataTypeRef, IntValue, Memory, Value},
-    timeline::{SlotStateMut, State},
+    timeline::{Guard, GuardedPath, SlotStateMut, State},
 };
 use indexmap::IndexMap;
 
@@ -79,8 +79,8 @@ fn build_variables(builder: &mut Builder) {
 #[derive(Debug, Clone)]
 enum Path {
     Global(GlobalDataPath),
-    Object(LocalDataPath),
-    Surface(LocalDataPath),
+    Object(IndexedDataPath),
+    Surface(IndexedDataPath),
 }
 
 #[derive(Debug, Clone)]
@@ -94,14 +94,21 @@ struct DataVariableSpec {
 #[derive(Debug)]
 pub struct DataVariables {
     specs: IndexMap<String, DataVariableSpec>,
+    pool_paths: PoolPaths,
 }
 
 impl DataVariables {
     pub fn all(memory: &impl Memory) -> Result<Self, Error> {
         let mut builder = Builder::new();
         build_variables(&mut builder);
-        let specs = builder.build(memory)?;
-        Ok(Self { specs })
+        let pool_paths = PoolPaths::new(memory)?;
+        let specs = builder.build(memory, &pool_paths)?;
+        Ok(Self { specs, pool_paths })
+    }
+
+    /// The compiled paths into the object and surface pools.
+    pub fn pool_paths(&self) -> &PoolPaths {
+        &self.pool_paths
     }
 
     pub fn group<'a>(&'a self, group: &'a str) -> impl Iterator<Item = Variable> + 'a {
@@ -120,41 +127,32 @@ impl DataVariables {
         })
     }
 
-    fn path(
-        &self,
-        state: &impl State,
-        variable: &Variable,
-    ) -> Result<Option<GlobalDataPath>, Error> {
-        let spec = self.specs.get(variable.name.as_ref()).ok_or_else(|| {
-            SM64ErrorCause::UnhandledVariable {
-                variable: variable.to_string(),
-            }
-        })?;
-
+    /// Get the guarded path for a variable.
+    ///
+    /// For object and surface variables, the guards check that the slot is active (and that
+    /// the object has the variable's behavior, if given), so that the variable reads as null
+    /// otherwise.
+    pub fn guarded_path(&self, variable: &Variable) -> Result<GuardedPath, Error> {
+        let spec = self.variable_spec(&variable.name)?;
         match &spec.path {
-            Path::Global(path) => Ok(Some(path.clone())),
+            Path::Global(path) => Ok(path.clone().into()),
             Path::Object(path) => {
                 let object = variable.try_object()?;
-                match util::object_path(state, object)? {
-                    Some(object_path) => {
-                        if let Some(expected_behavior) = &variable.object_behavior {
-                            let actual_behavior = util::object_behavior(state, &object_path)?;
-                            if &actual_behavior != expected_behavior {
-                                return Ok(None);
-                            }
-                        }
-
-                        Ok(Some(object_path.concat(path)?))
-                    }
-                    None => Ok(None),
+                let paths = &self.pool_paths;
+                let mut guards = vec![Guard::NonZero(paths.object_active_flags.path(object.0)?)];
+                if let Some(behavior) = &variable.object_behavior {
+                    let behavior_path = paths.object_behavior.path(object.0)?;
+                    guards.push(Guard::AddressEquals(behavior_path, behavior.0));
                 }
+                Ok(GuardedPath::new(path.path(object.0)?, guards))
             }
             Path::Surface(path) => {
                 let surface = variable.try_surface()?;
-                match util::surface_path(state, surface)? {
-                    Some(surface_path) => Ok(Some(surface_path.concat(path)?)),
-                    None => Ok(None),
-                }
+                let guards = vec![Guard::GreaterThan(
+                    self.pool_paths.surfaces_allocated.clone(),
+                    surface.0 as IntValue,
+                )];
+                Ok(GuardedPath::new(path.path(surface.0)?, guards))
             }
         }
     }
@@ -163,20 +161,17 @@ impl DataVariables {
         assert!(variable.frame.is_none() || variable.frame == Some(state.frame()));
 
         let spec = self.variable_spec(&variable.name)?;
-        let path = self.path(state, variable)?;
-        match path {
-            Some(path) => {
-                let mut value = state.path_read(&path)?;
-
-                if let Some(flag) = spec.flag {
-                    let flag_set = (value.as_int()? & flag) != 0;
-                    value = Value::Int(flag_set as IntValue);
-                }
+        let path = self.guarded_path(variable)?;
+        let mut value = state.guarded_read(&path)?;
 
-                Ok(value)
+        if let Some(flag) = spec.flag {
+            if !value.is_null() {
+                let flag_set = (value.as_int()? & flag) != 0;
+                value = Value::Int(flag_set as IntValue);
             }
-            None => Ok(Value::Null),
         }
+
+        Ok(value)
     }
 
     pub fn set(
@@ -188,22 +183,22 @@ impl DataVariables {
         assert!(variable.frame.is_none() || variable.frame == Some(state.frame()));
 
         let spec = self.variable_spec(&variable.name)?;
-        match self.path(state, variable)? {
-            Some(path) => {
-                if let Some(flag) = spec.flag {
-                    let flag_set = value.as_int()? != 0;
-                    let prev_value = state.path_read(&path)?.as_int()?;
-                    value = Value::Int(if flag_set {
-                        prev_value | flag
-                    } else {
-                        prev_value & !flag
-                    });
-                }
+        let path = self.guarded_path(variable)?;
+        if !path.guards_hold(&*state)? {
+            return Ok(());
+        }
 
-                state.path_write(&path, &value)
-            }
-            None => Ok(()),
+        if let Some(flag) = spec.flag {
+            let flag_set = value.as_int()? != 0;
+            let prev_value = state.path_read(path.path())?.as_int()?;
+            value = Value::Int(if flag_set {
+                prev_value | flag
+            } else {
+                prev_value & !flag
+            });
         }
+
+        state.path_write(path.path(), &value)
     }
 
     /// Get the label for the given variable if it has one.
@@ -244,7 +239,11 @@ impl Builder {
         self.groups.push(group_builder);
     }
 
-    fn build(self, memory: &impl Memory) -> Result<IndexMap<String, DataVariableSpec>, Error> {
+    fn build(
+        self,
+        memory: &impl Memory,
+        pool_paths: &PoolPaths,
+    ) -> Result<IndexMap<String, DataVariableSpec>, Error> {
         let object_struct = memory.local_path("struct Object")?.root_type();
         let surface_struct = memory.local_path("struct Surface")?.root_type();
 
@@ -257,9 +256,9 @@ impl Builder {
                     DataPath::Local(path) => {
                         let root_type = path.root_type();
                         if root_type == object_struct {
-                            Path::Object(path)
+                            Path::Object(pool_paths.object.concat(&path)?)
                         } else if root_type == surface_struct {
-                            Path::Surface(path)
+                            Path::Surface(pool_paths.surface.concat(&path)?)
                         } else {
                             return Err(SM64ErrorCause::InvalidVariableRoot { path }.into());
                         }
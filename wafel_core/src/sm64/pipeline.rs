@@ -7,13 +7,14 @@ use crate::{
     dll,
     error::Error,
     memory::{Memory, Value},
-    timeline::{Controller, InvalidatedFrames, SlotStateMut, Timeline},
+    timeline::{Controller, GuardedPath, InvalidatedFrames, SlotMode, SlotStateMut, Timeline},
 };
+use std::sync::Arc;
 
 /// SM64 controller implementation.
-#[derive(Debug)]
+#[derive(Debug, Clone)]
 pub struct SM64Controller {
-    data_variables: DataVariables,
+    data_variables: Arc<DataVariables>,
     edits: RangeEdits,
 }
 
@@ -21,7 +22,7 @@ impl SM64Controller {
     /// Create a new SM64Controller that allows reading/writing the given data variables.
     pub fn new(data_variables: DataVariables) -> Self {
         Self {
-            data_variables,
+            data_variables: Arc::new(data_variables),
             edits: RangeEdits::new(),
         }
     }
@@ -34,6 +35,10 @@ impl<M: Memory> Controller<M> for SM64Controller {
         }
         Ok(())
     }
+
+    fn edit_prefix_hash(&self, frame: u32) -> Option<u64> {
+        self.edits.prefix_hash(frame)
+    }
 }
 
 /// An abstraction for reading and writing variables.
@@ -71,6 +76,31 @@ impl<M: Memory> Pipeline<M> {
         self.data_variables().get(&state, &variable.without_frame())
     }
 
+    /// Keep the data paths read by the given variables preloaded for new frames, replacing
+    /// the previously pinned variables.
+    pub fn set_pinned_variables(&mut self, variables: &[Variable]) -> Result<(), Error> {
+        let paths = self.variable_paths(variables)?;
+        self.timeline.set_pinned_paths(&paths);
+        Ok(())
+    }
+
+    /// Stop preloading the data paths read by the given variables until they are read again.
+    pub fn demote_variables(&mut self, variables: &[Variable]) -> Result<(), Error> {
+        let paths = self.variable_paths(variables)?;
+        self.timeline.demote_paths(&paths);
+        Ok(())
+    }
+
+    fn variable_paths(&self, variables: &[Variable]) -> Result<Vec<GuardedPath>, Error> {
+        variables
+            .iter()
+            .map(|variable| {
+                self.data_variables()
+                    .guarded_path(&variable.without_frame())
+            })
+            .collect()
+    }
+
     /// Write a variable.
     pub fn write(&mut self, variable: &Variable, value: &Value) -> Result<(), Error> {
         let column = variable.without_frame();
@@ -98,7 +128,7 @@ impl<M: Memory> Pipeline<M> {
     ) -> Result<(), Error> {
         let column = source_variable.without_frame();
         let source_frame = source_variable.try_frame()?;
-        self.timeline.with_controller_mut(|controller| {
+        self.timeline.with_controller_mut_preview(|controller| {
             controller
                 .edits
                 .begin_drag(&column, source_frame, source_value)
@@ -112,7 +142,7 @@ impl<M: Memory> Pipeline<M> {
     /// called.
     pub fn update_drag(&mut self, target_frame: u32) {
         self.timeline
-            .with_controller_mut(|controller| controller.edits.update_drag(target_frame));
+            .with_controller_mut_preview(|controller| controller.edits.update_drag(target_frame));
     }
 
     /// End the drag operation, committing range changes.
@@ -129,6 +159,17 @@ impl<M: Memory> Pipeline<M> {
             .find_range(&variable.without_frame(), variable.try_frame()?))
     }
 
+    /// Return every committed edit range along with its column.
+    pub fn edit_ranges(&self) -> Vec<(&Variable, &EditRange)> {
+        self.timeline.controller().edits.committed_ranges()
+    }
+
+    /// Return a hash of the edits on frames up to and including `frame`, or None during a
+    /// drag.
+    pub fn edit_hash(&self, frame: u32) -> Option<u64> {
+        self.timeline.controller().edits.prefix_hash(frame)
+    }
+
     /// Insert a new state at the given frame, shifting edits forward.
     pub fn insert_frame(&mut self, frame: u32) {
         self.timeline
@@ -165,6 +206,7 @@ impl<M: Memory> Pipeline<M> {
 pub unsafe fn load_dll_pipeline(
     dll_path: &str,
     num_backup_slots: usize,
+    slot_mode: SlotMode,
 ) -> Result<Pipeline<dll::Memory>, Error> {
     let (mut memory, base_slot) = dll::Memory::load(dll_path, "sm64_init", "sm64_update")?;
 
@@ -179,7 +221,7 @@ pub unsafe fn load_dll_pipeline(
 
     let data_variables = DataVariables::all(&memory)?;
     let controller = SM64Controller::new(data_variables);
-    let timeline = Timeline::new(memory, base_slot, controller, num_backup_slots)?;
+    let timeline = Timeline::new(memory, base_slot, controller, num_backup_slots, slot_mode)?;
     let pipeline = Pipeline::new(timeline);
 
     Ok(pipeline)
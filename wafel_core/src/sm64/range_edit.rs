@@ -1,12 +1,16 @@
 //! Implementation of range editing (drag and drop in the frame sheet).
 
 use super::Variable;
-use crate::{memory::Value, timeline::InvalidatedFrames};
+use crate::{
+    memory::Value,
+    timeline::{InvalidatedFrames, StableHasher},
+};
 use std::{
     cmp::Ordering,
     collections::{HashMap, HashSet},
-    hash::Hash,
+    hash::{Hash, Hasher},
     ops::Range,
+    sync::Arc,
 };
 
 /// A unique identifier for an edit range.
@@ -25,9 +29,12 @@ pub struct EditRange {
 }
 
 /// Manages all of the active edit ranges.
-#[derive(Debug, Default)]
+///
+/// Columns are shared between clones and only copied when they are edited, so cloning is
+/// cheap.
+#[derive(Debug, Clone, Default)]
 pub struct RangeEdits {
-    ranges: HashMap<Variable, Ranges>,
+    ranges: HashMap<Variable, Arc<Ranges>>,
     drag_state: Option<DragState>,
     next_range_id: usize,
 }
@@ -49,6 +56,69 @@ impl RangeEdits {
         edits
     }
 
+    /// Create edits from a list of ranges, as returned by `committed_ranges`.
+    ///
+    /// Ranges that are empty or overlap an earlier range in the same column are skipped.
+    pub fn from_ranges(ranges: impl IntoIterator<Item = (Variable, Range<u32>, Value)>) -> Self {
+        let mut edits = Self::new();
+        for (column, frames, value) in ranges {
+            let ranges = Arc::make_mut(edits.ranges.entry(column.without_frame()).or_default());
+            if frames.is_empty()
+                || frames
+                    .clone()
+                    .any(|frame| ranges.find_range_id(frame).is_some())
+            {
+                continue;
+            }
+            let range_id = EditRangeId(edits.next_range_id);
+            edits.next_range_id += 1;
+            ranges.insert_range(EditRange {
+                id: range_id,
+                frames,
+                value,
+            });
+        }
+        edits
+    }
+
+    /// Return every committed edit range along with its column.
+    ///
+    /// Ranges previewed by an ongoing drag are not included.
+    pub fn committed_ranges(&self) -> Vec<(&Variable, &EditRange)> {
+        let mut ranges: Vec<(&Variable, &EditRange)> = self
+            .ranges
+            .iter()
+            .flat_map(|(column, ranges)| ranges.ranges.values().map(move |range| (column, range)))
+            .collect();
+        ranges.sort_by_key(|(_, range)| (range.frames.start, range.id.0));
+        ranges
+    }
+
+    /// Return a hash of the edits on frames up to and including `frame`.
+    ///
+    /// Returns None during a drag, since the previewed ranges aren't committed yet.
+    pub fn prefix_hash(&self, frame: u32) -> Option<u64> {
+        if self.drag_state.is_some() {
+            return None;
+        }
+        // Ranges are combined with addition so that the order of iteration doesn't matter
+        let mut result: u64 = 0;
+        for (column, ranges) in &self.ranges {
+            for range in ranges.ranges.values() {
+                if range.frames.start > frame {
+                    continue;
+                }
+                let mut hasher = StableHasher::new();
+                column.to_string().hash(&mut hasher);
+                range.frames.start.hash(&mut hasher);
+                range.frames.end.min(frame + 1).hash(&mut hasher);
+                range.value.to_string().hash(&mut hasher);
+                result = result.wrapping_add(hasher.finish());
+            }
+        }
+        Some(result)
+    }
+
     /// Edit the value of a given cell.
     ///
     /// If the cell is in an edit range, the entire edit range is given the
@@ -57,7 +127,7 @@ impl RangeEdits {
     pub fn write(&mut self, column: &Variable, frame: u32, value: Value) -> InvalidatedFrames {
         let invalidated = self.rollback_drag();
 
-        let ranges = self.ranges.entry(column.without_frame()).or_default();
+        let ranges = Arc::make_mut(self.ranges.entry(column.without_frame()).or_default());
         invalidated.union(ranges.set_value_or_create_range(
             frame,
             value,
@@ -74,7 +144,7 @@ impl RangeEdits {
                 let range = range.clone();
                 let mut invalidated = self.rollback_drag();
 
-                let ranges = self.ranges.entry(column.without_frame()).or_default();
+                let ranges = Arc::make_mut(self.ranges.entry(column.without_frame()).or_default());
 
                 // Simulate a reset by dragging the cell up or down.
                 let mut preview = RangeEditPreview::new(
@@ -95,7 +165,7 @@ impl RangeEdits {
     pub fn insert_frame(&mut self, frame: u32) -> InvalidatedFrames {
         let invalidated = self.rollback_drag();
         for range in self.ranges.values_mut() {
-            range.insert(frame, 1);
+            Arc::make_mut(range).insert(frame, 1);
         }
         invalidated.union(InvalidatedFrames::StartingAt(frame))
     }
@@ -104,7 +174,7 @@ impl RangeEdits {
     pub fn delete_frame(&mut self, frame: u32) -> InvalidatedFrames {
         let invalidated = self.rollback_drag();
         for range in self.ranges.values_mut() {
-            range.remove(frame, 1);
+            Arc::make_mut(range).remove(frame, 1);
         }
         invalidated.union(InvalidatedFrames::StartingAt(frame))
     }
@@ -150,7 +220,7 @@ impl RangeEdits {
     pub fn update_drag(&mut self, target_frame: u32) -> InvalidatedFrames {
         if let Some(DragState { column, preview }) = &mut self.drag_state {
             let ranges = self.ranges.entry(column.without_frame()).or_default();
-            preview.update_drag_target(&ranges, target_frame)
+            preview.update_drag_target(ranges, target_frame)
         } else {
             InvalidatedFrames::None
         }
@@ -159,7 +229,7 @@ impl RangeEdits {
     /// End the drag operation, committing range changes.
     pub fn release_drag(&mut self) -> InvalidatedFrames {
         if let Some(DragState { column, preview }) = self.drag_state.take() {
-            let ranges = self.ranges.entry(column.without_frame()).or_default();
+            let ranges = Arc::make_mut(self.ranges.entry(column.without_frame()).or_default());
             preview.commit(ranges);
         }
         InvalidatedFrames::None
@@ -182,7 +252,7 @@ fn range_id_generator<'a>(next_range_id: &'a mut usize) -> impl FnMut() -> EditR
     }
 }
 
-#[derive(Debug)]
+#[derive(Debug, Clone)]
 struct DragState {
     column: Variable,
     preview: RangeEditPreview,
@@ -222,7 +292,10 @@ impl Ranges {
             Some(range_id) => {
                 let range = self.ranges.get_mut(&range_id).unwrap();
                 range.value = value;
-                InvalidatedFrames::StartingAt(range.frames.start)
+                InvalidatedFrames::Edited {
+                    start: range.frames.start,
+                    end: range.frames.end,
+                }
             }
             None => {
                 let range_id = gen_range_id();
@@ -235,11 +308,21 @@ impl Ranges {
                     },
                 );
                 self.ranges_by_frame.insert(frame, range_id);
-                InvalidatedFrames::StartingAt(frame)
+                InvalidatedFrames::Edited {
+                    start: frame,
+                    end: frame + 1,
+                }
             }
         }
     }
 
+    fn insert_range(&mut self, range: EditRange) {
+        for frame in range.frames.clone() {
+            self.ranges_by_frame.insert(frame, range.id);
+        }
+        self.ranges.insert(range.id, range);
+    }
+
     fn insert(&mut self, start_frame: u32, count: usize) {
         let shift = |frame| {
             if frame >= start_frame {
@@ -314,7 +397,7 @@ impl Ranges {
     }
 }
 
-#[derive(Debug)]
+#[derive(Debug, Clone)]
 struct RangeEditPreview {
     drag_source: u32,
     source_value: Value,
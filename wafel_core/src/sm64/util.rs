@@ -2,7 +2,7 @@ use graphics::scene::{self, Scene};
 
 use super::{ObjectBehavior, ObjectSlot, SM64ErrorCause, SurfaceSlot};
 use crate::{
-    data_path::GlobalDataPath,
+    data_path::{GlobalDataPath, IndexedDataPath},
     error::Error,
     geo::Point3f,
     geo::Vector3f,
@@ -15,33 +15,53 @@ use crate::{
 };
 use std::collections::HashMap;
 
+/// Compiled paths into the object and surface pools, indexed by slot.
+#[derive(Debug, Clone)]
+pub struct PoolPaths {
+    pub(super) object: IndexedDataPath,
+    pub(super) object_active_flags: IndexedDataPath,
+    pub(super) object_behavior: IndexedDataPath,
+    pub(super) surface: IndexedDataPath,
+    pub(super) surfaces_allocated: GlobalDataPath,
+}
+
+impl PoolPaths {
+    /// Compile the pool paths.
+    pub fn new(memory: &impl Memory) -> Result<Self, Error> {
+        Ok(Self {
+            object: IndexedDataPath::compile(memory, "gObjectPool[]")?,
+            object_active_flags: IndexedDataPath::compile(memory, "gObjectPool[].activeFlags")?,
+            object_behavior: IndexedDataPath::compile(memory, "gObjectPool[].behavior")?,
+            surface: IndexedDataPath::compile(memory, "sSurfacePool[]")?,
+            surfaces_allocated: memory.global_path("gSurfacesAllocated")?,
+        })
+    }
+}
+
 /// Get the data path for an object, or None if the object is inactive.
 pub fn object_path(
     state: &impl State,
+    paths: &PoolPaths,
     object: ObjectSlot,
 ) -> Result<Option<GlobalDataPath>, Error> {
     let active_flags = state
-        .read(&format!("gObjectPool[{}].activeFlags", object.0))?
+        .path_read(&paths.object_active_flags.path(object.0)?)?
         .as_int()?;
 
     if active_flags == 0 {
         return Ok(None);
     }
 
-    let object_path = state
-        .memory()
-        .global_path(&format!("gObjectPool[{}]", object.0))?;
-
-    Ok(Some(object_path))
+    Ok(Some(paths.object.path(object.0)?))
 }
 
 /// Get the behavior address for an object.
 pub fn object_behavior(
     state: &impl State,
-    object_path: &GlobalDataPath,
+    paths: &PoolPaths,
+    object: ObjectSlot,
 ) -> Result<ObjectBehavior, Error> {
-    let behavior_path =
-        object_path.concat(&state.memory().local_path("struct Object.behavior")?)?;
+    let behavior_path = paths.object_behavior.path(object.0)?;
     let behavior_address = state.path_read(&behavior_path)?.as_address()?;
     Ok(ObjectBehavior(behavior_address))
 }
@@ -49,50 +69,80 @@ pub fn object_behavior(
 /// Get the data path for a surface, or None if the surface is inactive.
 pub fn surface_path(
     state: &impl State,
+    paths: &PoolPaths,
     surface: SurfaceSlot,
 ) -> Result<Option<GlobalDataPath>, Error> {
-    let num_surfaces = state.read("gSurfacesAllocated")?.as_usize()?;
+    let num_surfaces = state.path_read(&paths.surfaces_allocated)?.as_usize()?;
     if surface.0 >= num_surfaces {
         return Ok(None);
     }
-    let surface_path = state
-        .memory()
-        .global_path(&format!("sSurfacePool[{}]", surface))?;
-    Ok(Some(surface_path))
+    Ok(Some(paths.surface.path(surface.0)?))
+}
+
+/// Compiled paths for reading the wafel frame log.
+#[derive(Debug, Clone)]
+pub struct FrameLogPaths {
+    length: GlobalDataPath,
+    event_type: IndexedDataPath,
+    /// The name of each event type and the path to its data, by event type value.
+    ///
+    /// The data path is None if it failed to compile, in which case the error is reported when
+    /// an event of that type is read.
+    events: HashMap<IntValue, (String, Option<IndexedDataPath>)>,
+}
+
+impl FrameLogPaths {
+    /// Compile the frame log paths.
+    pub fn new(memory: &impl Memory) -> Result<Self, Error> {
+        let event_type_source = ConstantSource::Enum {
+            name: Some("FrameLogEventType".to_owned()),
+        };
+        let events = memory
+            .data_layout()
+            .constants
+            .iter()
+            .filter(|(_, constant)| constant.source == event_type_source)
+            .map(|(name, constant)| {
+                let path = IndexedDataPath::compile(memory, &frame_log_event_source(name)).ok();
+                (constant.value, (name.clone(), path))
+            })
+            .collect();
+
+        Ok(Self {
+            length: memory.global_path("gFrameLogLength")?,
+            event_type: IndexedDataPath::compile(memory, "gFrameLog[].type")?,
+            events,
+        })
+    }
 }
 
 /// Get the wafel frame log.
 ///
 /// The events in the frame log occurred on the frame leading to `state`.
-pub fn frame_log(state: &impl State) -> Result<Vec<HashMap<String, Value>>, Error> {
-    let event_type_source = ConstantSource::Enum {
-        name: Some("FrameLogEventType".to_owned()),
-    };
-    let event_types: HashMap<IntValue, String> = state
-        .memory()
-        .data_layout()
-        .constants
-        .iter()
-        .filter(|(_, constant)| constant.source == event_type_source)
-        .map(|(name, constant)| (constant.value, name.clone()))
-        .collect();
-
-    let log_length = state.read("gFrameLogLength")?.as_usize()?;
+pub fn frame_log(
+    state: &impl State,
+    paths: &FrameLogPaths,
+) -> Result<Vec<HashMap<String, Value>>, Error> {
+    let log_length = state.path_read(&paths.length)?.as_usize()?;
 
     (0..log_length)
         .map(|i| -> Result<_, Error> {
-            let event_type_value = state.read(&format!("gFrameLog[{}].type", i))?.as_int()?;
-            let event_type = event_types.get(&event_type_value).ok_or_else(|| {
-                SM64ErrorCause::InvalidFrameLogEventType {
-                    value: event_type_value,
+            let event_type_value = state.path_read(&paths.event_type.path(i)?)?.as_int()?;
+            let (event_type, event_path) =
+                paths.events.get(&event_type_value).ok_or_else(|| {
+                    SM64ErrorCause::InvalidFrameLogEventType {
+                        value: event_type_value,
+                    }
+                })?;
+            let event_path = match event_path {
+                Some(event_path) => event_path.path(i)?,
+                None => {
+                    IndexedDataPath::compile(state.memory(), &frame_log_event_source(event_type))?
+                        .path(i)?
                 }
-            })?;
+            };
 
-            let variant_name = frame_log_event_variant_name(event_type);
-            let mut event = state
-                .read(&format!("gFrameLog[{}].__anon.{}", i, variant_name))?
-                .as_struct()?
-                .clone();
+            let mut event = state.path_read(&event_path)?.as_struct()?.clone();
 
             event.insert("type".to_owned(), Value::String(event_type.clone()));
             Ok(event)
@@ -100,6 +150,14 @@ pub fn frame_log(state: &impl State) -> Result<Vec<HashMap<String, Value>>, Erro
         .collect()
 }
 
+/// Return the source of the indexed path to a frame log event's data.
+fn frame_log_event_source(event_type: &str) -> String {
+    format!(
+        "gFrameLog[].__anon.{}",
+        frame_log_event_variant_name(event_type)
+    )
+}
+
 /// Convert a frame log event type to the variant name corresponding to its data.
 ///
 /// For example, `FLT_BEGIN_MOVEMENT_STEP` maps to `beginMovementStep`.
@@ -4,7 +4,7 @@ use derive_more::Display;
 use serde::{Deserialize, Serialize};
 use std::{
     fmt::{self, Display},
-    rc::Rc,
+    sync::Arc,
 };
 
 /// A wrapper for an object slot index.
@@ -23,7 +23,7 @@ pub struct ObjectBehavior(pub Address);
 #[derive(Debug, Clone, PartialEq, Eq, Hash, Serialize, Deserialize)]
 pub struct Variable {
     /// The internal name of the variable.
-    pub name: Rc<String>,
+    pub name: Arc<String>,
     /// The frame that the variable is taken on.
     #[serde(skip_serializing_if = "Option::is_none")]
     pub frame: Option<u32>,
@@ -42,7 +42,7 @@ impl Variable {
     /// Create a variable with the given name with no associated data.
     pub fn new(name: &str) -> Self {
         Self {
-            name: Rc::new(name.to_owned()),
+            name: Arc::new(name.to_owned()),
             frame: None,
             object: None,
             object_behavior: None,
@@ -0,0 +1,1468 @@
+//! Benchmarks for the timeline, run using `cargo test --release -- --ignored --nocapture`.
+
+#[cfg(target_os = "linux")]
+use super::fork_memory::{ForkMemory, ForkSlot};
+use super::{
+    data_cache::{DataCache, DEFAULT_BYTE_BUDGET},
+    slot_manager::SlotManager,
+    synthetic_memory::{SyntheticConfig, SyntheticController, SyntheticMemory, SyntheticSlot},
+    Controller, Guard, GuardedPath, InvalidatedFrames, PlacementPolicy, Playback, SlotMode,
+    SlotState, SnapshotStore, State, Timeline,
+};
+use crate::{
+    data_path::GlobalDataPath,
+    memory::{IntValue, Memory, Value},
+    sm64::{object_behavior, object_path, ObjectSlot, PoolPaths},
+};
+use rand::{rngs::StdRng, Rng, SeedableRng};
+use std::{
+    env, fs,
+    ops::Range,
+    process,
+    sync::Arc,
+    thread,
+    time::{Duration, Instant},
+};
+
+const NUM_FRAMES: u32 = 50_000;
+const SCROLL_STEP: u32 = 250;
+
+fn scroll_through<M: Memory>(manager: &mut SlotManager<M, SyntheticController>)
+where
+    SyntheticController: Controller<M>,
+{
+    for frame in (0..NUM_FRAMES).step_by(SCROLL_STEP as usize) {
+        manager.set_hotspot("selected-frame", frame);
+        manager.set_hotspot("selected-frame-lookahead", frame + 60);
+        manager.frame(frame).unwrap();
+        manager
+            .balance_distribution(Duration::from_secs(10))
+            .unwrap();
+    }
+}
+
+#[test]
+#[ignore]
+fn bench_slot_modes() {
+    let reference_checksums: Vec<(u32, u64)> = {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let manager = SlotManager::new(
+            memory,
+            base_slot,
+            SyntheticController::default(),
+            0,
+            SlotMode::Dense,
+        )
+        .unwrap();
+        (0..NUM_FRAMES)
+            .step_by(97)
+            .map(|frame| {
+                let state = manager.frame(frame).unwrap();
+                (frame, state.memory().checksum(state.slot()))
+            })
+            .collect()
+    };
+
+    println!();
+    println!(
+        "{:>6} {:>6} {:>10} {:>12} {:>12} {:>14} {:>14}",
+        "mode", "slots", "resident", "total KB", "bytes/slot", "restore (us)", "restore bytes"
+    );
+    // The budgeted run uses the same amount of memory as 30 dense slots
+    for &(slot_mode, num_backup_slots, memory_budget) in &[
+        (SlotMode::Dense, 30, None),
+        (SlotMode::Delta, 30, None),
+        (SlotMode::Delta, 200, None),
+        (SlotMode::Delta, 0, Some(31 << 20)),
+    ] {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let mut manager = SlotManager::new(
+            memory,
+            base_slot,
+            SyntheticController::default(),
+            num_backup_slots,
+            slot_mode,
+        )
+        .unwrap();
+        manager.set_placement_policy(PlacementPolicy::Alignment);
+        manager.set_memory_budget(memory_budget).unwrap();
+        scroll_through(&mut manager);
+
+        let mut cached_frames = manager.cached_frames();
+        cached_frames.sort_unstable();
+        cached_frames.dedup();
+        let slot_memory_size = manager.slot_memory_size();
+
+        // Requesting frames in decreasing order means that every request is a restore from a
+        // backup slot
+        let num_copies = manager.num_copies();
+        let num_copied_bytes = manager.num_copied_bytes();
+        let start_time = Instant::now();
+        for _ in 0..10 {
+            for &frame in cached_frames.iter().rev() {
+                let state = manager.base_slot(frame).unwrap();
+                assert_eq!(state.memory().frame_counter(state.slot()), frame);
+            }
+        }
+        let num_restores = manager.num_copies() - num_copies;
+        let restore_time = start_time.elapsed() / num_restores as u32;
+        let restore_bytes = (manager.num_copied_bytes() - num_copied_bytes) / num_restores;
+
+        for &(frame, checksum) in &reference_checksums {
+            let state = manager.frame(frame).unwrap();
+            assert_eq!(state.memory().checksum(state.slot()), checksum);
+        }
+
+        println!(
+            "{:>6} {:>6} {:>10} {:>12} {:>12} {:>14.1} {:>14}",
+            format!("{:?}", slot_mode),
+            manager.num_backup_slots(),
+            cached_frames.len(),
+            slot_memory_size / 1024,
+            slot_memory_size / cached_frames.len(),
+            restore_time.as_secs_f64() * 1_000_000.0,
+            restore_bytes,
+        );
+    }
+}
+
+/// An event in a recorded sequence of timeline requests.
+#[derive(Debug, Clone)]
+enum TraceEvent {
+    Hotspot(String, u32),
+    Request(u32),
+    Balance,
+}
+
+/// Parse a trace with one event per line: `hotspot <name> <frame>`, `request <frame>`, or
+/// `balance`.
+fn parse_trace(text: &str) -> Vec<TraceEvent> {
+    text.lines()
+        .filter_map(|line| {
+            let words: Vec<&str> = line.split_whitespace().collect();
+            match words.as_slice() {
+                ["hotspot", name, frame] => {
+                    Some(TraceEvent::Hotspot(name.to_string(), frame.parse().ok()?))
+                }
+                ["request", frame] => Some(TraceEvent::Request(frame.parse().ok()?)),
+                ["balance"] => Some(TraceEvent::Balance),
+                _ => None,
+            }
+        })
+        .collect()
+}
+
+/// Build the events for one rendered frame of the UI with the given selected frame.
+fn ui_frame(events: &mut Vec<TraceEvent>, selected_frame: u32, extra_request: Option<u32>) {
+    events.push(TraceEvent::Hotspot(
+        "selected-frame".to_owned(),
+        selected_frame,
+    ));
+    events.push(TraceEvent::Hotspot(
+        "selected-frame-lookahead".to_owned(),
+        selected_frame + 60,
+    ));
+    events.push(TraceEvent::Request(selected_frame));
+    events.extend(extra_request.map(TraceEvent::Request));
+    events.push(TraceEvent::Balance);
+}
+
+fn generated_traces() -> Vec<(String, Vec<TraceEvent>)> {
+    let mut rng = StdRng::seed_from_u64(0);
+
+    // Small back and forth movements with occasional jumps
+    let mut scrub = Vec::new();
+    let mut selected_frame: u32 = 20_000;
+    for _ in 0..3000 {
+        let action = rng.gen_range(0, 100);
+        if action < 80 {
+            selected_frame = (selected_frame + rng.gen_range(0, 40)).saturating_sub(20);
+        } else if action < 97 {
+            selected_frame = (selected_frame + rng.gen_range(0, 1000)).saturating_sub(500);
+        } else {
+            selected_frame = rng.gen_range(0, NUM_FRAMES);
+        }
+        let hovered_frame = selected_frame + rng.gen_range(0, 60);
+        ui_frame(&mut scrub, selected_frame, Some(hovered_frame));
+    }
+
+    // Forward playback
+    let mut playback = Vec::new();
+    for selected_frame in 10_000..13_000 {
+        ui_frame(&mut playback, selected_frame, None);
+    }
+
+    // Comparing the effect of an edit on a later frame
+    let mut compare = Vec::new();
+    for i in 0..3000 {
+        let base_frame = if (i / 20) % 2 == 0 { 15_000 } else { 15_900 };
+        ui_frame(&mut compare, base_frame + rng.gen_range(0, 10), None);
+    }
+
+    vec![
+        ("scrub".to_owned(), scrub),
+        ("playback".to_owned(), playback),
+        ("compare".to_owned(), compare),
+    ]
+}
+
+/// Replay a trace, returning the number of advances for each request and the total number of
+/// advances spent balancing.
+fn replay(placement_policy: PlacementPolicy, events: &[TraceEvent]) -> (Vec<usize>, usize) {
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let mut manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        30,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    manager.set_placement_policy(placement_policy);
+
+    let mut request_advances = Vec::new();
+    let mut balance_advances = 0;
+    for event in events {
+        match event {
+            TraceEvent::Hotspot(name, frame) => manager.set_hotspot(name, *frame),
+            TraceEvent::Request(frame) => {
+                let num_advances = manager.num_advances();
+                manager.frame(*frame).unwrap();
+                request_advances.push(manager.num_advances() - num_advances);
+            }
+            TraceEvent::Balance => {
+                let num_advances = manager.num_advances();
+                manager
+                    .balance_distribution(Duration::from_millis(8))
+                    .unwrap();
+                balance_advances += manager.num_advances() - num_advances;
+            }
+        }
+    }
+    (request_advances, balance_advances)
+}
+
+/// Replay request traces with each placement policy.
+///
+/// Set `WAFEL_REQUEST_TRACE` to the path of a recorded trace to replay it in addition to the
+/// generated ones.
+#[test]
+#[ignore]
+fn bench_placement_replay() {
+    let mut traces = generated_traces();
+    if let Ok(path) = env::var("WAFEL_REQUEST_TRACE") {
+        let text = fs::read_to_string(&path).expect("failed to read trace");
+        traces.push((path, parse_trace(&text)));
+    }
+
+    println!();
+    println!(
+        "{:>10} {:>10} {:>10} {:>10} {:>10} {:>16}",
+        "trace", "policy", "requests", "mean adv", "p99 adv", "balance adv"
+    );
+    for (name, events) in &traces {
+        for &placement_policy in &[PlacementPolicy::Alignment, PlacementPolicy::Histogram] {
+            let (mut request_advances, balance_advances) = replay(placement_policy, events);
+            request_advances.sort_unstable();
+            let mean = request_advances.iter().sum::<usize>() as f64
+                / request_advances.len().max(1) as f64;
+            let p99 = request_advances
+                .get(request_advances.len() * 99 / 100)
+                .cloned()
+                .unwrap_or(0);
+            println!(
+                "{:>10} {:>10} {:>10} {:>10.1} {:>10} {:>16}",
+                name,
+                format!("{:?}", placement_policy),
+                request_advances.len(),
+                mean,
+                p99,
+                balance_advances,
+            );
+        }
+    }
+}
+
+/// Return the checksum of `frame` with the given controller edits, simulated from scratch.
+fn reference_checksum(edits: Vec<(u32, u64)>, frame: u32) -> u64 {
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController { edits },
+        0,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let state = manager.frame(frame).unwrap();
+    state.memory().checksum(state.slot())
+}
+
+/// Compare the advances needed to return to the selected frame after an edit just before it,
+/// with and without convergence detection.
+///
+/// Writing zero to the edited word doesn't change the state, while writing a non-zero value
+/// changes every later frame.
+#[test]
+#[ignore]
+fn bench_convergence() {
+    const SELECTED_FRAME: u32 = 20_000;
+    const EDIT_FRAME: u32 = 19_990;
+
+    println!();
+    println!(
+        "{:>10} {:>12} {:>12} {:>12}",
+        "edit", "limit", "edit adv", "request adv"
+    );
+    for &(edit_value, convergence_limit) in
+        &[(0, None), (0, Some(1000)), (1, None), (1, Some(1000))]
+    {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let mut timeline = Timeline::new(
+            memory,
+            base_slot,
+            SyntheticController::default(),
+            30,
+            SlotMode::Dense,
+        )
+        .unwrap();
+        timeline.set_convergence_limit(convergence_limit);
+        timeline.set_hotspot("selected-frame", SELECTED_FRAME);
+        timeline.frame_uncached(SELECTED_FRAME).unwrap();
+        timeline
+            .balance_distribution(Duration::from_secs(10))
+            .unwrap();
+
+        let num_advances = timeline.num_advances();
+        timeline.with_controller_mut(|controller| {
+            controller.edits.push((EDIT_FRAME, edit_value));
+            InvalidatedFrames::Edited {
+                start: EDIT_FRAME,
+                end: EDIT_FRAME + 1,
+            }
+        });
+        let edit_advances = timeline.num_advances() - num_advances;
+
+        let num_advances = timeline.num_advances();
+        let checksum = {
+            let state = timeline.frame_uncached(SELECTED_FRAME + 100).unwrap();
+            state.memory().checksum(state.slot())
+        };
+        let request_advances = timeline.num_advances() - num_advances;
+        assert_eq!(
+            checksum,
+            reference_checksum(vec![(EDIT_FRAME, edit_value)], SELECTED_FRAME + 100)
+        );
+
+        println!(
+            "{:>10} {:>12} {:>12} {:>12}",
+            if edit_value == 0 {
+                "no-op"
+            } else {
+                "diverging"
+            },
+            format!("{:?}", convergence_limit),
+            edit_advances,
+            request_advances,
+        );
+    }
+}
+
+/// Measure the time to jump straight to a late frame after opening a timeline, with and
+/// without a snapshot store populated by a previous session.
+#[test]
+#[ignore]
+fn bench_snapshot_cold_open() {
+    const TARGET_FRAME: u32 = 40_000;
+    const EDIT_FRAME: u32 = 35_500;
+
+    let directory = env::temp_dir().join(format!("wafel-snapshot-bench-{}", process::id()));
+    let open_manager = |edits: Vec<(u32, u64)>, use_store: bool| {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let mut manager = SlotManager::new(
+            memory,
+            base_slot,
+            SyntheticController { edits },
+            30,
+            SlotMode::Dense,
+        )
+        .unwrap();
+        if use_store {
+            let store = SnapshotStore::open(&directory, 256 << 20).unwrap();
+            manager.set_snapshot_store(Some(store)).unwrap();
+        }
+        manager
+    };
+
+    // The first session scrolls through the timeline, persisting snapshots along the way
+    {
+        let mut manager = open_manager(Vec::new(), true);
+        for frame in (0..=TARGET_FRAME).step_by(SCROLL_STEP as usize) {
+            manager.set_hotspot("selected-frame", frame);
+            manager.frame(frame).unwrap();
+            manager
+                .balance_distribution(Duration::from_millis(1))
+                .unwrap();
+        }
+    }
+
+    println!();
+    println!(
+        "{:>10} {:>10} {:>12} {:>12}",
+        "store", "edits", "time (ms)", "advances"
+    );
+    for &(use_store, edited) in &[(false, false), (true, false), (true, true)] {
+        let edits = if edited {
+            vec![(EDIT_FRAME, 1)]
+        } else {
+            Vec::new()
+        };
+        let manager = open_manager(edits.clone(), use_store);
+
+        let start_time = Instant::now();
+        let checksum = {
+            let state = manager.frame(TARGET_FRAME).unwrap();
+            state.memory().checksum(state.slot())
+        };
+        let time = start_time.elapsed();
+        assert_eq!(checksum, reference_checksum(edits, TARGET_FRAME));
+
+        println!(
+            "{:>10} {:>10} {:>12.1} {:>12}",
+            use_store,
+            if edited { "changed" } else { "same" },
+            time.as_secs_f64() * 1000.0,
+            manager.num_advances(),
+        );
+    }
+
+    fs::remove_dir_all(&directory).unwrap();
+}
+
+/// Compare the advances needed to alternate between two variants of a segment, using two
+/// branches or by toggling an edit on a single branch.
+#[test]
+#[ignore]
+fn bench_branches() {
+    const EDIT_FRAME: u32 = 19_000;
+    const SEGMENT_START: u32 = 19_500;
+    const SEGMENT_LEN: u32 = 200;
+    const NUM_ROUNDS: usize = 20;
+
+    println!();
+    println!(
+        "{:>10} {:>12} {:>12} {:>12}",
+        "mode", "setup adv", "switch adv", "backups"
+    );
+    for &use_branches in &[false, true] {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let mut timeline = Timeline::new(
+            memory,
+            base_slot,
+            SyntheticController::default(),
+            30,
+            SlotMode::Dense,
+        )
+        .unwrap();
+
+        // Read the segment on each variant, and balance the slots toward it
+        let scroll = |timeline: &mut Timeline<SyntheticMemory, SyntheticController>,
+                      edits: Vec<(u32, u64)>| {
+            for frame in SEGMENT_START..SEGMENT_START + SEGMENT_LEN {
+                timeline.set_hotspot("selected-frame", frame);
+                let checksum = {
+                    let state = timeline.frame_uncached(frame).unwrap();
+                    state.memory().checksum(state.slot())
+                };
+                if frame == SEGMENT_START {
+                    assert_eq!(checksum, reference_checksum(edits.clone(), frame));
+                }
+                timeline
+                    .balance_distribution(Duration::from_millis(1))
+                    .unwrap();
+            }
+        };
+        let set_edit = |timeline: &mut Timeline<SyntheticMemory, SyntheticController>,
+                        edited: bool| {
+            timeline.with_controller_mut(|controller| {
+                controller.edits = if edited {
+                    vec![(EDIT_FRAME, 1)]
+                } else {
+                    Vec::new()
+                };
+                InvalidatedFrames::StartingAt(EDIT_FRAME)
+            });
+        };
+
+        scroll(&mut timeline, Vec::new());
+        let original_branch = timeline.branch();
+        let edited_branch = if use_branches {
+            let branch = timeline.fork();
+            timeline.switch_branch(branch);
+            branch
+        } else {
+            original_branch
+        };
+        set_edit(&mut timeline, true);
+        scroll(&mut timeline, vec![(EDIT_FRAME, 1)]);
+        let setup_advances = timeline.num_advances();
+
+        for round in 0..NUM_ROUNDS {
+            let edited = round % 2 == 1;
+            if use_branches {
+                timeline.switch_branch(if edited {
+                    edited_branch
+                } else {
+                    original_branch
+                });
+            } else {
+                set_edit(&mut timeline, edited);
+            }
+            let edits = if edited {
+                vec![(EDIT_FRAME, 1)]
+            } else {
+                Vec::new()
+            };
+            scroll(&mut timeline, edits);
+        }
+        let switch_advances = timeline.num_advances() - setup_advances;
+
+        println!(
+            "{:>10} {:>12} {:>12.0} {:>12}",
+            if use_branches { "branches" } else { "toggle" },
+            setup_advances,
+            switch_advances as f64 / NUM_ROUNDS as f64,
+            timeline.num_backup_slots(),
+        );
+    }
+}
+
+/// Measure the advances needed to read a screen of frame sheet rows after seeking to a
+/// distant frame.
+#[test]
+#[ignore]
+fn bench_rows_after_seek() {
+    const SEEK_FRAME: u32 = 20_000;
+    const ROWS_BEFORE: u32 = 30;
+    const ROWS_AFTER: u32 = 10;
+    let paths = [
+        "gFrameCounter",
+        "gHotWords[10]",
+        "gHotFloats[100]",
+        "gHotShorts[7]",
+    ];
+
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let mut timeline = Timeline::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        30,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let read_rows = |timeline: &Timeline<SyntheticMemory, SyntheticController>,
+                     frames: Range<u32>| {
+        for frame in frames {
+            let state = timeline.frame(frame).unwrap();
+            for path in &paths {
+                let value = state.read(path).unwrap();
+                if *path == "gFrameCounter" {
+                    assert_eq!(value.as_int().unwrap(), frame as i128);
+                }
+            }
+        }
+    };
+
+    // Read the first screen so that the paths are known to the data cache
+    read_rows(&timeline, 0..ROWS_BEFORE + ROWS_AFTER);
+
+    let num_advances = timeline.num_advances();
+    while !timeline
+        .seek(SEEK_FRAME, Duration::from_millis(16))
+        .unwrap()
+    {}
+    let seek_advances = timeline.num_advances() - num_advances;
+
+    let num_advances = timeline.num_advances();
+    read_rows(&timeline, SEEK_FRAME - ROWS_BEFORE..SEEK_FRAME + ROWS_AFTER);
+    let row_advances = timeline.num_advances() - num_advances;
+
+    println!();
+    println!("{:>12} {:>12} {:>12}", "seek adv", "rows", "row adv");
+    println!(
+        "{:>12} {:>12} {:>12}",
+        seek_advances,
+        ROWS_BEFORE + ROWS_AFTER,
+        row_advances
+    );
+}
+
+/// Measure the memory used per cached data cache value, and the effect of the byte budget
+/// on a second pass over the frames.
+#[test]
+#[ignore]
+fn bench_data_cache_memory() {
+    const NUM_FRAMES: u32 = 10_000;
+    let mut sources = vec!["gFrameCounter".to_owned()];
+    sources.extend((0..8).map(|i| format!("gHotFloats[{}]", i)));
+    sources.extend((0..4).map(|i| format!("gHotShorts[{}]", i)));
+    sources.extend((0..3).map(|i| format!("gHotWords[{}]", i)));
+
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        30,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let paths: Vec<GlobalDataPath> = sources
+        .iter()
+        .map(|source| manager.memory().global_path(source).unwrap())
+        .collect();
+
+    println!();
+    println!(
+        "{:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}",
+        "budget KB", "cells", "bytes", "bytes/cell", "hits", "misses", "evictions", "time (ms)"
+    );
+    for &byte_budget in &[DEFAULT_BYTE_BUDGET, 256 << 10] {
+        let mut data_cache = DataCache::new();
+        data_cache.set_byte_budget(byte_budget);
+
+        // Mirror Timeline::path_read_cached, reading every path on every frame
+        let start_time = Instant::now();
+        for _ in 0..2 {
+            for frame in 0..NUM_FRAMES {
+                let state = manager.frame(frame).unwrap();
+                for path in &paths {
+                    if data_cache.get(frame, path).is_none() {
+                        data_cache.preload_frame(&state);
+                        let value = state.path_read(path).unwrap();
+                        data_cache.insert(&state, path, value);
+                    }
+                }
+            }
+        }
+        let elapsed = start_time.elapsed();
+
+        for (i, value) in data_cache
+            .get_range(&paths[0], 0..NUM_FRAMES)
+            .into_iter()
+            .enumerate()
+        {
+            if let Some(value) = value {
+                assert_eq!(value.as_int().unwrap(), i as i128);
+            }
+        }
+        assert!(data_cache.byte_size() <= byte_budget);
+
+        let num_cells = data_cache.num_cells();
+        let byte_size = data_cache.byte_size();
+        let stats = data_cache.stats();
+        println!(
+            "{:>10} {:>10} {:>10} {:>10.1} {:>10} {:>10} {:>10} {:>10}",
+            byte_budget / 1024,
+            num_cells,
+            byte_size,
+            byte_size as f64 / num_cells as f64,
+            stats.hits,
+            stats.misses,
+            stats.evictions,
+            elapsed.as_millis()
+        );
+    }
+}
+
+/// Measure the cost of invalidating the data cache while dragging an edit, with many
+/// earlier frames cached.
+#[test]
+#[ignore]
+fn bench_data_cache_invalidation() {
+    const NUM_FRAMES: u32 = 40_000;
+    const EDIT_FRAME: u32 = 30_000;
+    const VISIBLE_ROWS: u32 = 40;
+    const NUM_MOVES: u32 = 1000;
+    let mut sources = vec!["gFrameCounter".to_owned()];
+    sources.extend((0..8).map(|i| format!("gHotFloats[{}]", i)));
+
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        30,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let paths: Vec<GlobalDataPath> = sources
+        .iter()
+        .map(|source| manager.memory().global_path(source).unwrap())
+        .collect();
+
+    let mut data_cache = DataCache::new();
+    for frame in 0..NUM_FRAMES {
+        let state = manager.frame(frame).unwrap();
+        for path in &paths {
+            if data_cache.get(frame, path).is_none() {
+                data_cache.preload_frame(&state);
+                let value = state.path_read(path).unwrap();
+                data_cache.insert(&state, path, value);
+            }
+        }
+    }
+    let num_cells = data_cache.num_cells();
+
+    // Each mouse move re-renders the visible rows after the edit, then invalidates them
+    let mut invalidate_time = Duration::from_secs(0);
+    for _ in 0..NUM_MOVES {
+        for frame in EDIT_FRAME..EDIT_FRAME + VISIBLE_ROWS {
+            let state = manager.frame(frame).unwrap();
+            data_cache.preload_frame(&state);
+        }
+        let start_time = Instant::now();
+        data_cache.invalidate_frame(EDIT_FRAME);
+        invalidate_time += start_time.elapsed();
+    }
+    assert!(!data_cache.contains_frame(EDIT_FRAME));
+    assert!(data_cache.contains_frame(EDIT_FRAME - 1));
+
+    println!();
+    println!("{:>10} {:>10} {:>16}", "cells", "moves", "invalidate (us)");
+    println!(
+        "{:>10} {:>10} {:>16.2}",
+        num_cells,
+        NUM_MOVES,
+        invalidate_time.as_secs_f64() * 1e6 / NUM_MOVES as f64
+    );
+}
+
+/// Measure the paths preloaded on each new frame while playing forward, as a variable tab is
+/// opened and closed next to a frame sheet.
+#[test]
+#[ignore]
+fn bench_hot_paths() {
+    const FRAMES_PER_PHASE: u32 = 2000;
+    let sheet_sources = vec![
+        "gFrameCounter",
+        "gHotShorts[0]",
+        "gHotShorts[1]",
+        "gHotWords[0]",
+    ];
+    let mut tab_sources: Vec<String> = (0..8).map(|i| format!("gHotFloats[{}]", i)).collect();
+    tab_sources.extend((2..4).map(|i| format!("gHotShorts[{}]", i)));
+    tab_sources.extend((1..3).map(|i| format!("gHotWords[{}]", i)));
+
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        30,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let sheet_paths: Vec<GlobalDataPath> = sheet_sources
+        .iter()
+        .map(|source| manager.memory().global_path(source).unwrap())
+        .collect();
+    let tab_paths: Vec<GlobalDataPath> = tab_sources
+        .iter()
+        .map(|source| manager.memory().global_path(source).unwrap())
+        .collect();
+
+    let mut data_cache = DataCache::new();
+    let pinned_paths: Vec<GuardedPath> = sheet_paths.iter().cloned().map(Into::into).collect();
+    data_cache.set_pinned_paths(&pinned_paths);
+    let mut frame = 0;
+
+    // Play forward, reading the tab's paths on the selected frame only while it is open
+    let mut play = |data_cache: &mut DataCache, tab_open: bool| {
+        let start_time = Instant::now();
+        for _ in 0..FRAMES_PER_PHASE {
+            let state = manager.frame(frame).unwrap();
+            data_cache.preload_frame(&state);
+            if tab_open {
+                for path in &tab_paths {
+                    if data_cache.get(frame, path).is_none() {
+                        let value = state.path_read(path).unwrap();
+                        data_cache.insert(&state, path, value);
+                    }
+                }
+            }
+            frame += 1;
+        }
+        start_time.elapsed()
+    };
+
+    println!();
+    println!(
+        "{:<24} {:>10} {:>16}",
+        "phase", "hot paths", "per frame (us)"
+    );
+    let mut report = |name: &str, data_cache: &mut DataCache, elapsed: Duration| {
+        println!(
+            "{:<24} {:>10} {:>16.2}",
+            name,
+            data_cache.stats().hot_paths,
+            elapsed.as_secs_f64() * 1e6 / FRAMES_PER_PHASE as f64
+        );
+    };
+
+    let elapsed = play(&mut data_cache, true);
+    report("tab open", &mut data_cache, elapsed);
+    assert_eq!(
+        data_cache.stats().hot_paths,
+        sheet_paths.len() + tab_paths.len()
+    );
+
+    for path in &tab_paths {
+        data_cache.demote_path(&path.clone().into());
+    }
+    let elapsed = play(&mut data_cache, false);
+    report("tab closed (demoted)", &mut data_cache, elapsed);
+    assert_eq!(data_cache.stats().hot_paths, sheet_paths.len());
+
+    // Paths that stop being read without being demoted expire after two windows
+    play(&mut data_cache, true);
+    std::thread::sleep(Duration::from_millis(2100));
+    play(&mut data_cache, false);
+    std::thread::sleep(Duration::from_millis(1100));
+    let elapsed = play(&mut data_cache, false);
+    report("tab closed (expired)", &mut data_cache, elapsed);
+    assert_eq!(data_cache.stats().hot_paths, sheet_paths.len());
+}
+
+/// Compare evaluating the guards of object columns on every read against caching the guarded
+/// paths, while scrolling a frame sheet one row at a time.
+///
+/// Half of the columns belong to an inactive object, and the other half to an active object
+/// with a different behavior, so every cell is null.
+#[test]
+#[ignore]
+fn bench_guarded_reads() {
+    const VISIBLE_ROWS: u32 = 40;
+    const NUM_SCROLLS: u32 = 2000;
+    const NUM_COLUMNS: usize = 12;
+
+    println!();
+    println!(
+        "{:<10} {:>14} {:>14} {:>16}",
+        "mode", "reads/scroll", "lookups/row", "render (us)"
+    );
+    for &guarded in &[false, true] {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let mut timeline = Timeline::new(
+            memory,
+            base_slot,
+            SyntheticController::default(),
+            30,
+            SlotMode::Dense,
+        )
+        .unwrap();
+
+        let memory = timeline.memory();
+        let path = |source: &str| memory.global_path(source).unwrap();
+        let inactive = Guard::GreaterThan(path("gFrameCounter"), u32::MAX as IntValue);
+        let active = Guard::NonZero(path("gFrameCounter"));
+        let other_behavior = Guard::GreaterThan(path("gHotShorts[3]"), i16::MAX as IntValue);
+        let columns: Vec<GuardedPath> = (0..NUM_COLUMNS)
+            .map(|i| {
+                let guards = if i % 2 == 0 {
+                    vec![inactive.clone()]
+                } else {
+                    vec![active.clone(), other_behavior.clone()]
+                };
+                GuardedPath::new(path(&format!("gHotFloats[{}]", i)), guards)
+            })
+            .collect();
+
+        // Pin the paths that each mode reads
+        if guarded {
+            timeline.set_pinned_paths(&columns);
+        } else {
+            let paths: Vec<GuardedPath> = columns
+                .iter()
+                .flat_map(|column| {
+                    let mut paths: Vec<GuardedPath> = column
+                        .guards()
+                        .iter()
+                        .map(|guard| guard.path().clone().into())
+                        .collect();
+                    paths.push(column.path().clone().into());
+                    paths
+                })
+                .collect();
+            timeline.set_pinned_paths(&paths);
+        }
+
+        let render = |timeline: &Timeline<SyntheticMemory, SyntheticController>, top: u32| {
+            for frame in top..top + VISIBLE_ROWS {
+                let state = timeline.frame(frame).unwrap();
+                for column in &columns {
+                    let value = if guarded {
+                        state.guarded_read(column).unwrap()
+                    } else if column.guards_hold(&state).unwrap() {
+                        state.path_read(column.path()).unwrap()
+                    } else {
+                        Value::Null
+                    };
+                    assert!(value.is_null());
+                }
+            }
+        };
+
+        render(&timeline, 1);
+        let num_reads = timeline.memory().num_slot_reads();
+        let stats = timeline.data_cache_stats();
+        let start_time = Instant::now();
+        for top in 2..2 + NUM_SCROLLS {
+            render(&timeline, top);
+        }
+        let elapsed = start_time.elapsed();
+        let num_reads = timeline.memory().num_slot_reads() - num_reads;
+        let num_lookups = timeline.data_cache_stats().hits + timeline.data_cache_stats().misses
+            - stats.hits
+            - stats.misses;
+
+        println!(
+            "{:<10} {:>14.1} {:>14.1} {:>16.2}",
+            if guarded { "guarded" } else { "unguarded" },
+            num_reads as f64 / NUM_SCROLLS as f64,
+            num_lookups as f64 / (NUM_SCROLLS * VISIBLE_ROWS) as f64,
+            elapsed.as_secs_f64() * 1e6 / NUM_SCROLLS as f64
+        );
+    }
+}
+
+/// Compare computing path addresses from a slot on every call against caching them, while
+/// scrolling a frame sheet that shows the addresses of a static path and a pointer path.
+#[test]
+#[ignore]
+fn bench_path_address() {
+    const VISIBLE_ROWS: u32 = 40;
+    const NUM_SCROLLS: u32 = 500;
+    const START_FRAME: u32 = 5000;
+    let sources = ["gHotFloats[100]", "gHotPointers[5]?[0]"];
+
+    println!();
+    println!(
+        "{:<10} {:>14} {:>14} {:>16}",
+        "mode", "adv/scroll", "reads/scroll", "render (us)"
+    );
+    for &cached in &[false, true] {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let timeline = Timeline::new(
+            memory,
+            base_slot,
+            SyntheticController::default(),
+            30,
+            SlotMode::Dense,
+        )
+        .unwrap();
+        let paths: Vec<GlobalDataPath> = sources
+            .iter()
+            .map(|source| timeline.memory().global_path(source).unwrap())
+            .collect();
+
+        let render = |top: u32| {
+            for frame in top..top + VISIBLE_ROWS {
+                for path in &paths {
+                    if cached {
+                        timeline.frame(frame).unwrap().path_address(path).unwrap();
+                    } else {
+                        timeline
+                            .frame_uncached(frame)
+                            .unwrap()
+                            .path_address(path)
+                            .unwrap();
+                    }
+                }
+            }
+        };
+
+        render(START_FRAME);
+        let num_advances = timeline.num_advances();
+        let num_reads = timeline.memory().num_slot_reads();
+        let start_time = Instant::now();
+        for top in START_FRAME + 1..START_FRAME + 1 + NUM_SCROLLS {
+            render(top);
+        }
+        let elapsed = start_time.elapsed();
+
+        println!(
+            "{:<10} {:>14.1} {:>14.1} {:>16.2}",
+            if cached { "cached" } else { "uncached" },
+            (timeline.num_advances() - num_advances) as f64 / NUM_SCROLLS as f64,
+            (timeline.memory().num_slot_reads() - num_reads) as f64 / NUM_SCROLLS as f64,
+            elapsed.as_secs_f64() * 1e6 / NUM_SCROLLS as f64
+        );
+    }
+}
+
+/// Measure the time taken by a single `GlobalDataPath::read` on a slot, for paths through
+/// arrays, struct fields, and pointers.
+#[test]
+#[ignore]
+fn bench_path_read() {
+    const NUM_READS: u32 = 1_000_000;
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+
+    let mut paths: Vec<GlobalDataPath> = [
+        "gFrameCounter",
+        "gHotFloats[100]",
+        "gMarioState->pos[0]",
+        "gMarioState?->vel[1]",
+        "gObjectPool[12].oPosX",
+    ]
+    .iter()
+    .map(|source| memory.global_path(source).unwrap())
+    .collect();
+    let object_path = memory.global_path("gObjectPool[12]").unwrap();
+    let field_path = memory.local_path("struct Object.oPosY").unwrap();
+    paths.push(object_path.concat(&field_path).unwrap());
+
+    println!();
+    println!("{:<36} {:>10} {:>12}", "path", "ns/read", "slot reads");
+    for path in &paths {
+        let num_reads = memory.num_slot_reads();
+        let start_time = Instant::now();
+        let mut num_null = 0;
+        for _ in 0..NUM_READS {
+            if let Value::Null = path.read(&memory, &base_slot).unwrap() {
+                num_null += 1;
+            }
+        }
+        let elapsed = start_time.elapsed();
+        assert_eq!(num_null, 0);
+
+        println!(
+            "{:<36} {:>10.1} {:>12.1}",
+            path.source(),
+            elapsed.as_secs_f64() * 1e9 / NUM_READS as f64,
+            (memory.num_slot_reads() - num_reads) as f64 / NUM_READS as f64
+        );
+    }
+}
+
+/// Compare looking up a global path by its source in the path cache, from one or more threads,
+/// against keeping the compiled path and reading through it.
+///
+/// Times are wall time divided by the total number of reads across all threads.
+#[test]
+#[ignore]
+fn bench_path_lookup() {
+    const NUM_LOOKUPS: u32 = 1_000_000;
+    const SOURCES: [&str; 4] = [
+        "gFrameCounter",
+        "gHotFloats[100]",
+        "gMarioState->pos[0]",
+        "gObjectPool[12].oPosX",
+    ];
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let memory = Arc::new(memory);
+    let base_slot = Arc::new(base_slot);
+
+    println!();
+    println!("{:<12} {:>8} {:>12}", "mode", "threads", "ns/read");
+    for &keep_path in &[false, true] {
+        for &num_threads in &[1, 2, 4] {
+            let start_time = Instant::now();
+            let workers: Vec<_> = (0..num_threads)
+                .map(|_| {
+                    let memory = Arc::clone(&memory);
+                    let base_slot = Arc::clone(&base_slot);
+                    thread::spawn(move || {
+                        let paths: Vec<GlobalDataPath> = SOURCES
+                            .iter()
+                            .map(|source| memory.global_path(source).unwrap())
+                            .collect();
+                        for i in 0..NUM_LOOKUPS as usize {
+                            let path = if keep_path {
+                                paths[i % paths.len()].clone()
+                            } else {
+                                memory.global_path(SOURCES[i % SOURCES.len()]).unwrap()
+                            };
+                            path.read(&*memory, &*base_slot).unwrap();
+                        }
+                    })
+                })
+                .collect();
+            for worker in workers {
+                worker.join().unwrap();
+            }
+            let elapsed = start_time.elapsed();
+
+            println!(
+                "{:<12} {:>8} {:>12.1}",
+                if keep_path { "kept" } else { "lookup" },
+                num_threads,
+                elapsed.as_secs_f64() * 1e9 / (NUM_LOOKUPS * num_threads) as f64
+            );
+        }
+    }
+}
+
+/// Compare listing the behaviors of all 240 object slots by formatting a path for each slot
+/// against taking the slot's path from the compiled pool paths.
+#[test]
+#[ignore]
+fn bench_object_slots() {
+    const NUM_RENDERS: u32 = 200;
+    const FRAME: u32 = 100;
+
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let timeline = Timeline::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        30,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let memory = timeline.memory();
+    let paths = PoolPaths::new(memory).unwrap();
+
+    let render_formatted = || {
+        let state = timeline.frame(FRAME).unwrap();
+        let mut behaviors = Vec::new();
+        for object in 0..240 {
+            let active_flags = state
+                .read(&format!("gObjectPool[{}].activeFlags", object))
+                .unwrap()
+                .as_int()
+                .unwrap();
+            if active_flags != 0 {
+                let behavior_path = memory
+                    .global_path(&format!("gObjectPool[{}].behavior", object))
+                    .unwrap();
+                behaviors.push(
+                    state
+                        .path_read(&behavior_path)
+                        .unwrap()
+                        .as_address()
+                        .unwrap(),
+                );
+            }
+        }
+        behaviors
+    };
+    let render_indexed = || {
+        let state = timeline.frame(FRAME).unwrap();
+        let mut behaviors = Vec::new();
+        for object in 0..240 {
+            if object_path(&state, &paths, ObjectSlot(object))
+                .unwrap()
+                .is_some()
+            {
+                let behavior = object_behavior(&state, &paths, ObjectSlot(object)).unwrap();
+                behaviors.push(behavior.0);
+            }
+        }
+        behaviors
+    };
+    assert_eq!(render_formatted(), render_indexed());
+
+    println!();
+    println!("{:<12} {:>14}", "mode", "render (us)");
+    for &indexed in &[false, true] {
+        let start_time = Instant::now();
+        for _ in 0..NUM_RENDERS {
+            if indexed {
+                render_indexed();
+            } else {
+                render_formatted();
+            }
+        }
+        let elapsed = start_time.elapsed();
+
+        println!(
+            "{:<12} {:>14.1}",
+            if indexed { "indexed" } else { "formatted" },
+            elapsed.as_secs_f64() * 1e6 / NUM_RENDERS as f64
+        );
+    }
+}
+
+/// Compare the advances needed to rewind through frames one at a time, with and without a
+/// reverse playback hint.
+///
+/// With the hint, the slot manager simulates blocks of frames behind the playhead into a ring
+/// of slots.
+#[test]
+#[ignore]
+fn bench_reverse_playback() {
+    const START_FRAME: u32 = 20_000;
+    const NUM_FRAMES: u32 = 2000;
+    // Frames per UI frame at 4x speed
+    const STEP: u32 = 2;
+
+    println!();
+    println!(
+        "{:>10} {:>12} {:>12} {:>12} {:>12}",
+        "mode", "request adv", "max adv", "balance adv", "total adv"
+    );
+    for &use_ring in &[false, true] {
+        let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+        let mut manager = SlotManager::new(
+            memory,
+            base_slot,
+            SyntheticController::default(),
+            30,
+            SlotMode::Dense,
+        )
+        .unwrap();
+        manager.set_hotspot("selected-frame", START_FRAME);
+        manager.frame(START_FRAME).unwrap();
+        manager
+            .balance_distribution(Duration::from_secs(10))
+            .unwrap();
+        let initial_advances = manager.num_advances();
+
+        let mut request_advances = 0;
+        let mut max_advances = 0;
+        let mut balance_advances = 0;
+        for frame in (START_FRAME - NUM_FRAMES..=START_FRAME)
+            .rev()
+            .step_by(STEP as usize)
+        {
+            manager.set_hotspot("selected-frame", frame);
+            manager.set_hotspot("selected-frame-lookahead", frame + 60);
+            if use_ring {
+                manager.set_playback(Some(Playback {
+                    frame,
+                    frames_per_second: -(STEP as f32) * 60.0,
+                }));
+            }
+
+            let num_advances = manager.num_advances();
+            let checksum = {
+                let state = manager.frame(frame).unwrap();
+                state.memory().checksum(state.slot())
+            };
+            request_advances += manager.num_advances() - num_advances;
+            max_advances = max_advances.max(manager.num_advances() - num_advances);
+            if frame % 500 == 0 {
+                assert_eq!(checksum, reference_checksum(Vec::new(), frame));
+            }
+
+            let num_advances = manager.num_advances();
+            manager
+                .balance_distribution(Duration::from_millis(8))
+                .unwrap();
+            balance_advances += manager.num_advances() - num_advances;
+        }
+
+        println!(
+            "{:>10} {:>12} {:>12} {:>12} {:>12}",
+            if use_ring { "ring" } else { "none" },
+            request_advances,
+            max_advances,
+            balance_advances,
+            manager.num_advances() - initial_advances,
+        );
+    }
+}
+
+/// Access to the simulated state, for benchmarks that compare `Memory` implementations.
+trait SyntheticState: Memory {
+    fn frame_counter(&self, slot: &Self::Slot) -> u32;
+
+    fn checksum(&self, slot: &Self::Slot) -> u64;
+
+    /// Return the child processes that hold slot contents.
+    fn child_pids(&self) -> Vec<u32>;
+}
+
+impl SyntheticState for SyntheticMemory {
+    fn frame_counter(&self, slot: &SyntheticSlot) -> u32 {
+        SyntheticMemory::frame_counter(self, slot)
+    }
+
+    fn checksum(&self, slot: &SyntheticSlot) -> u64 {
+        SyntheticMemory::checksum(self, slot)
+    }
+
+    fn child_pids(&self) -> Vec<u32> {
+        Vec::new()
+    }
+}
+
+#[cfg(target_os = "linux")]
+impl SyntheticState for ForkMemory {
+    fn frame_counter(&self, slot: &ForkSlot) -> u32 {
+        ForkMemory::frame_counter(self, slot)
+    }
+
+    fn checksum(&self, slot: &ForkSlot) -> u64 {
+        ForkMemory::checksum(self, slot)
+    }
+
+    fn child_pids(&self) -> Vec<u32> {
+        ForkMemory::child_pids(self)
+            .into_iter()
+            .map(|pid| pid as u32)
+            .collect()
+    }
+}
+
+/// Return the proportional set size of a process plus the size of its page tables, in KB.
+///
+/// Pages shared between processes are split evenly between them, so the sum over a parent and
+/// its forked children counts each page once.
+#[cfg(target_os = "linux")]
+fn process_memory_kb(pid: u32) -> usize {
+    let field = |path: String, name: &str| -> usize {
+        fs::read_to_string(path)
+            .unwrap()
+            .lines()
+            .find(|line| line.starts_with(name))
+            .and_then(|line| line.split_whitespace().nth(1))
+            .and_then(|value| value.parse().ok())
+            .unwrap_or(0)
+    };
+    field(format!("/proc/{}/smaps_rollup", pid), "Pss:")
+        + field(format!("/proc/{}/status", pid), "VmPTE:")
+}
+
+/// Fill the backup slots, then return the number of cached frames, the memory used in KB, the
+/// mean time to save a slot, and the mean time and number of bytes to restore one.
+#[cfg(target_os = "linux")]
+fn measure_slots<M: SyntheticState>(
+    mut manager: SlotManager<M, SyntheticController>,
+    reference_checksums: &[(u32, u64)],
+) -> (usize, usize, Duration, Duration, usize)
+where
+    SyntheticController: Controller<M>,
+{
+    const NUM_SAVES: u32 = 20;
+
+    let baseline_kb = process_memory_kb(process::id());
+    manager.set_placement_policy(PlacementPolicy::Alignment);
+    scroll_through(&mut manager);
+
+    let mut cached_frames = manager.cached_frames();
+    cached_frames.sort_unstable();
+    cached_frames.dedup();
+    let memory_kb = process_memory_kb(process::id())
+        + manager
+            .memory()
+            .child_pids()
+            .into_iter()
+            .map(process_memory_kb)
+            .sum::<usize>()
+        - baseline_kb;
+
+    let num_copies = manager.num_copies();
+    let num_copied_bytes = manager.num_copied_bytes();
+    let start_time = Instant::now();
+    for _ in 0..10 {
+        for &frame in cached_frames.iter().rev() {
+            let state = manager.base_slot(frame).unwrap();
+            assert_eq!(state.memory().frame_counter(state.slot()), frame);
+        }
+    }
+    let num_restores = manager.num_copies() - num_copies;
+    let restore_time = start_time.elapsed() / num_restores as u32;
+    let restore_bytes = (manager.num_copied_bytes() - num_copied_bytes) / num_restores;
+
+    for &(frame, checksum) in reference_checksums {
+        let state = manager.frame(frame).unwrap();
+        assert_eq!(state.memory().checksum(state.slot()), checksum);
+    }
+
+    let save_time = {
+        let state = manager.base_slot(NUM_FRAMES / 2).unwrap();
+        let memory = state.memory();
+        let mut slots = Vec::new();
+        let start_time = Instant::now();
+        for _ in 0..NUM_SAVES {
+            let mut slot = memory.create_backup_slot().unwrap();
+            memory.copy_slot(&mut slot, state.slot()).unwrap();
+            slots.push(slot);
+        }
+        start_time.elapsed() / NUM_SAVES
+    };
+
+    (
+        cached_frames.len(),
+        memory_kb,
+        save_time,
+        restore_time,
+        restore_bytes,
+    )
+}
+
+/// Compare backup slots held by suspended forked children against `SegmentBuffer` slots.
+///
+/// Memory is measured from the kernel's accounting rather than `slot_size`, since the pages
+/// held by children aren't visible to the slot manager.
+#[cfg(target_os = "linux")]
+#[test]
+#[ignore]
+fn bench_fork_slots() {
+    let reference_checksums: Vec<(u32, u64)> = [1000, 12_345, NUM_FRAMES - 1]
+        .iter()
+        .map(|&frame| (frame, reference_checksum(Vec::new(), frame)))
+        .collect();
+
+    println!();
+    if !ForkMemory::new(SyntheticConfig::default())
+        .0
+        .tracks_dirty_pages()
+    {
+        println!("soft-dirty bits are unavailable, so fork restores copy every page");
+    }
+    println!(
+        "{:>7} {:>6} {:>10} {:>12} {:>10} {:>10} {:>14} {:>14}",
+        "backend",
+        "slots",
+        "resident",
+        "total KB",
+        "KB/slot",
+        "save (us)",
+        "restore (us)",
+        "restore bytes"
+    );
+    for &num_backup_slots in &[30, 200] {
+        for &use_fork in &[false, true] {
+            let (resident, memory_kb, save_time, restore_time, restore_bytes) = if use_fork {
+                let (memory, base_slot) = ForkMemory::new(SyntheticConfig::default());
+                let manager = SlotManager::new(
+                    memory,
+                    base_slot,
+                    SyntheticController::default(),
+                    num_backup_slots,
+                    SlotMode::Dense,
+                )
+                .unwrap();
+                measure_slots(manager, &reference_checksums)
+            } else {
+                let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+                let manager = SlotManager::new(
+                    memory,
+                    base_slot,
+                    SyntheticController::default(),
+                    num_backup_slots,
+                    SlotMode::Delta,
+                )
+                .unwrap();
+                measure_slots(manager, &reference_checksums)
+            };
+
+            println!(
+                "{:>7} {:>6} {:>10} {:>12} {:>10} {:>10.1} {:>14.1} {:>14}",
+                if use_fork { "fork" } else { "buffer" },
+                num_backup_slots,
+                resident,
+                memory_kb,
+                memory_kb / resident,
+                save_time.as_secs_f64() * 1_000_000.0,
+                restore_time.as_secs_f64() * 1_000_000.0,
+                restore_bytes,
+            );
+        }
+    }
+}
@@ -0,0 +1,216 @@
+//! Measuring the relative cost of slot operations.
+
+use std::{collections::BTreeSet, ops::AddAssign, time::Duration};
+
+/// The weight given to each new measurement in the moving averages.
+const SMOOTHING: f64 = 0.05;
+
+/// The cost of a copy relative to an advance before any measurements are made.
+const DEFAULT_COPY_COST: f64 = 10.0;
+
+/// New measurements of a single frame's advance time are averaged with the previous
+/// measurement using this weight.
+const FRAME_SMOOTHING: f32 = 0.5;
+
+/// A frame is considered expensive if it takes at least this many times the average advance
+/// time.
+const EXPENSIVE_FRAME_FACTOR: f32 = 4.0;
+
+/// Exponential moving averages of the time taken by slot copies and frame advances.
+#[derive(Debug, Clone, Default)]
+pub struct CostModel {
+    copy_time: Option<f64>,
+    advance_time: Option<f64>,
+}
+
+fn update_average(average: &mut Option<f64>, sample: Duration) {
+    let sample = sample.as_secs_f64();
+    *average = Some(match *average {
+        Some(average) => average + SMOOTHING * (sample - average),
+        None => sample,
+    });
+}
+
+impl CostModel {
+    pub fn new() -> Self {
+        Self::default()
+    }
+
+    /// Record the time taken by a slot copy.
+    pub fn record_copy(&mut self, time: Duration) {
+        update_average(&mut self.copy_time, time);
+    }
+
+    /// Record the time taken by a single frame advance.
+    pub fn record_advance(&mut self, time: Duration) {
+        update_average(&mut self.advance_time, time);
+    }
+
+    /// Return the average time of a slot copy in seconds, if measured.
+    pub fn copy_time(&self) -> Option<f64> {
+        self.copy_time
+    }
+
+    /// Return the average time of a frame advance in seconds, if measured.
+    pub fn advance_time(&self) -> Option<f64> {
+        self.advance_time
+    }
+
+    /// Return the cost of a slot copy measured in frame advances.
+    pub fn copy_cost(&self) -> f64 {
+        match (self.copy_time, self.advance_time) {
+            (Some(copy_time), Some(advance_time)) if advance_time > 0.0 => copy_time / advance_time,
+            _ => DEFAULT_COPY_COST,
+        }
+    }
+}
+
+/// A Fenwick tree, supporting point updates and prefix sums in O(log n).
+#[derive(Debug, Clone, Default)]
+struct FenwickTree<T> {
+    nodes: Vec<T>,
+}
+
+impl<T: Copy + Default + AddAssign> FenwickTree<T> {
+    fn from_values(values: impl Iterator<Item = T>) -> Self {
+        let mut nodes: Vec<T> = values.collect();
+        for i in 1..=nodes.len() {
+            let parent = i + (i & i.wrapping_neg());
+            if parent <= nodes.len() {
+                let value = nodes[i - 1];
+                nodes[parent - 1] += value;
+            }
+        }
+        Self { nodes }
+    }
+
+    fn add(&mut self, index: usize, delta: T) {
+        let mut i = index + 1;
+        while i <= self.nodes.len() {
+            self.nodes[i - 1] += delta;
+            i += i & i.wrapping_neg();
+        }
+    }
+
+    /// Return the sum of the values before `end`.
+    fn prefix_sum(&self, end: usize) -> T {
+        let mut sum = T::default();
+        let mut i = end.min(self.nodes.len());
+        while i > 0 {
+            sum += self.nodes[i - 1];
+            i -= i & i.wrapping_neg();
+        }
+        sum
+    }
+}
+
+/// The measured advance time of each frame.
+///
+/// Times are kept in a flat array indexed by frame, with zero for frames that haven't been
+/// measured yet. Fenwick trees over the array allow the cost of advancing through a range of
+/// frames to be computed in O(log n).
+#[derive(Debug, Clone, Default)]
+pub struct FrameCosts {
+    /// The advance time in seconds of each frame, i.e. the time to advance from the previous
+    /// frame to it.
+    times: Vec<f32>,
+    time_tree: FenwickTree<f64>,
+    /// Counts the frames that have been measured.
+    count_tree: FenwickTree<u32>,
+    /// Frames that were expensive when they were last measured.
+    expensive_frames: BTreeSet<u32>,
+}
+
+impl FrameCosts {
+    pub fn new() -> Self {
+        Self::default()
+    }
+
+    /// Record the time taken to advance to `frame` from the previous frame.
+    pub fn record(&mut self, frame: u32, time: Duration) {
+        let index = frame as usize;
+        if index >= self.times.len() {
+            self.grow(index + 1);
+        }
+
+        // Zero is reserved for unmeasured frames
+        let sample = time.as_secs_f32().max(f32::MIN_POSITIVE);
+        let old_time = self.times[index];
+        let new_time = if old_time > 0.0 {
+            old_time + FRAME_SMOOTHING * (sample - old_time)
+        } else {
+            self.count_tree.add(index, 1);
+            sample
+        };
+        self.times[index] = new_time;
+        self.time_tree.add(index, new_time as f64 - old_time as f64);
+
+        if new_time as f64 >= EXPENSIVE_FRAME_FACTOR as f64 * self.mean_time().unwrap_or(0.0) {
+            self.expensive_frames.insert(frame);
+        } else {
+            self.expensive_frames.remove(&frame);
+        }
+    }
+
+    fn grow(&mut self, min_len: usize) {
+        let len = min_len.max(2 * self.times.len()).max(1024);
+        self.times.resize(len, 0.0);
+        self.time_tree = FenwickTree::from_values(self.times.iter().map(|&time| time as f64));
+        self.count_tree =
+            FenwickTree::from_values(self.times.iter().map(|&time| (time > 0.0) as u32));
+    }
+
+    /// Split frames `0..num_frames` into `num_bins` equal bins, and return the highest advance
+    /// time in each bin relative to the average over all measured frames.
+    ///
+    /// Bins without measured frames have a value of zero.
+    pub fn bins(&self, num_frames: usize, num_bins: usize) -> Vec<f32> {
+        let mut bins = vec![0.0; num_bins];
+        let mean_time = match self.mean_time() {
+            Some(mean_time) if mean_time > 0.0 && num_frames > 0 => mean_time as f32,
+            _ => return bins,
+        };
+        let times = &self.times[..num_frames.min(self.times.len())];
+        for (frame, &time) in times.iter().enumerate() {
+            let bin = &mut bins[(frame * num_bins / num_frames).min(num_bins - 1)];
+            *bin = bin.max(time / mean_time);
+        }
+        bins
+    }
+
+    /// Return the average advance time over all measured frames, in seconds.
+    pub fn mean_time(&self) -> Option<f64> {
+        let count = self.count_tree.prefix_sum(self.times.len());
+        if count == 0 {
+            None
+        } else {
+            Some(self.time_tree.prefix_sum(self.times.len()) / count as f64)
+        }
+    }
+
+    /// Return the cost of advancing from `start` to `end`, measured in average frame advances.
+    ///
+    /// Frames that haven't been measured are counted as one average advance.
+    pub fn advances(&self, start: u32, end: u32) -> f64 {
+        if start >= end {
+            return 0.0;
+        }
+        let num_frames = (end - start) as f64;
+        let mean_time = match self.mean_time() {
+            Some(mean_time) if mean_time > 0.0 => mean_time,
+            _ => return num_frames,
+        };
+
+        let (start, end) = (start as usize + 1, end as usize + 1);
+        let time = self.time_tree.prefix_sum(end) - self.time_tree.prefix_sum(start);
+        let count = self.count_tree.prefix_sum(end) - self.count_tree.prefix_sum(start);
+        time / mean_time + (num_frames - count as f64)
+    }
+
+    /// Return the frames in `start..end` that are much more expensive than average to advance
+    /// to.
+    pub fn expensive_frames(&self, start: u32, end: u32) -> impl Iterator<Item = u32> + '_ {
+        let range = if start < end { start..end } else { 0..0 };
+        self.expensive_frames.range(range).cloned()
+    }
+}
@@ -1,103 +1,1223 @@
-use super::State;
-use crate::{data_path::GlobalDataPath, memory::Value};
-use deepsize::{known_deep_size, DeepSizeOf};
+use super::{GuardedPath, GuardedPathKey, State};
+use crate::{
+    data_path::{GlobalDataPath, PathHandle},
+    error::Error,
+    memory::{
+        data_type::{DataType, DataTypeRef, FloatType, IntType},
+        Address, DataLayout, FloatValue, IntValue, Memory, Value,
+    },
+};
 use lru::LruCache;
-use std::collections::HashMap;
+use std::{
+    collections::{BTreeSet, HashMap},
+    convert::{TryFrom, TryInto},
+    mem,
+    ops::Range,
+    time::{Duration, Instant},
+};
+
+/// The number of consecutive frames stored together in a chunk.
+///
+/// Each chunk tracks which of its frames are present using one bit per frame.
+const CHUNK_FRAMES: u32 = 64;
+
+/// The default number of bytes the cache may use before evicting chunks.
+pub const DEFAULT_BYTE_BUDGET: usize = 16 << 20;
+
+/// Frames advanced through further than this before the requested frame are not preloaded.
+const CAPTURE_FRAMES: u32 = 1024;
+
+/// A path stays hot until a full window passes without it being looked up.
+const HOT_PATH_WINDOW: Duration = Duration::from_secs(1);
+
+/// The maximum number of paths to preload on each new frame.
+const MAX_HOT_PATHS: usize = 200;
+
+/// Counters describing how well the data cache is performing.
+#[derive(Debug, Clone, Copy, Default)]
+pub struct DataCacheStats {
+    /// The number of lookups that found a cached value.
+    pub hits: usize,
+    /// The number of lookups that did not find a cached value.
+    pub misses: usize,
+    /// The number of cached values evicted to stay within the byte budget.
+    pub evictions: usize,
+    /// The number of paths currently preloaded on each new frame.
+    pub hot_paths: usize,
+}
 
 /// A cache for data path accesses, with the goal of minimizing calls to `SlotManager#frame`.
 ///
-/// Besides caching individual values, it also preloads certain paths as soon as a
-/// frame is requested for the first time.
+/// Guarded paths are cached by their path and guards. A guarded path whose guards fail
+/// is cached as null like any other value, so that reading a variable of an inactive object
+/// costs a single lookup. Path addresses are cached in their own columns in the same way.
+///
+/// Besides caching individual values, it also preloads the hot paths as soon as a
+/// frame is requested for the first time. A path becomes hot when it is looked up, and stays
+/// hot while it keeps being looked up (e.g. by an open variable tab), or while it is pinned.
+///
+/// Values are stored by column: each path has its own frame-indexed array of values, split
+/// into chunks of `CHUNK_FRAMES` frames. Int and float values (and fixed length arrays of
+/// them) are packed at their native width, so that a cached `f32` costs 4 bytes instead of a
+/// full `Value`. Chunks are evicted together across all columns in LRU order once the cache
+/// exceeds its byte budget.
 #[derive(Debug)]
 pub struct DataCache {
-    path_intern: HashMap<String, usize>,
-    path_unintern: HashMap<usize, GlobalDataPath>,
-    hot_paths: LruCache<usize, ()>,
-    cache: LruCache<u32, HashMap<usize, Value>>,
+    /// The value columns for paths without guards, by path handle.
+    path_intern: HashMap<PathHandle, usize>,
+    /// The value columns for paths with guards.
+    guarded_intern: HashMap<GuardedPathKey, usize>,
+    /// The address columns, by path handle.
+    address_intern: HashMap<PathHandle, usize>,
+    columns: Vec<Column>,
+    /// The paths to preload on each new frame.
+    hot_paths: Vec<usize>,
+    /// Incremented every `HOT_PATH_WINDOW`, and used to track when each path was last used.
+    window: u64,
+    window_start: Instant,
+    /// The cached chunks in LRU order.
+    chunks: LruCache<u32, ChunkEntry>,
+    /// The indices of the cached chunks in frame order, so that invalidating a range of frames
+    /// only visits the chunks in that range.
+    chunk_order: BTreeSet<u32>,
+    /// The total size of the chunks, kept up to date on every insertion and removal.
+    byte_size: usize,
+    byte_budget: usize,
+    stats: DataCacheStats,
 }
 
 impl DataCache {
     pub fn new() -> Self {
         Self {
             path_intern: HashMap::new(),
-            path_unintern: HashMap::new(),
-            hot_paths: LruCache::new(100),
-            cache: LruCache::new(100),
+            guarded_intern: HashMap::new(),
+            address_intern: HashMap::new(),
+            columns: Vec::new(),
+            hot_paths: Vec::new(),
+            window: 0,
+            window_start: Instant::now(),
+            chunks: LruCache::unbounded(),
+            chunk_order: BTreeSet::new(),
+            byte_size: 0,
+            byte_budget: DEFAULT_BYTE_BUDGET,
+            stats: DataCacheStats::default(),
         }
     }
 
     fn intern(&mut self, path: &GlobalDataPath) -> usize {
-        match self.path_intern.get(path.source()) {
+        match self.path_intern.get(&path.handle()) {
+            Some(&key) => key,
+            None => self.add_column(path.clone().into()),
+        }
+    }
+
+    fn intern_guarded(&mut self, path: &GuardedPath) -> usize {
+        match self.find_guarded(path) {
+            Some(key) => key,
+            None => self.add_column(path.clone()),
+        }
+    }
+
+    fn find_guarded(&self, path: &GuardedPath) -> Option<usize> {
+        if path.guards().is_empty() {
+            self.path_intern.get(&path.path().handle()).copied()
+        } else {
+            self.guarded_intern.get(path.key()).copied()
+        }
+    }
+
+    fn intern_address(&mut self, path: &GlobalDataPath) -> usize {
+        match self.address_intern.get(&path.handle()) {
             Some(&key) => key,
             None => {
-                let key = self.path_intern.len();
-                self.path_intern.insert(path.source().to_owned(), key);
-                self.path_unintern.insert(key, path.clone());
+                let key = self.columns.len();
+                self.address_intern.insert(path.handle(), key);
+                let kind = ColumnKind::Address {
+                    static_address: path.static_address(),
+                };
+                self.columns
+                    .push(Column::new(path.clone().into(), kind, Vec::new()));
                 key
             }
         }
     }
 
-    fn unintern(&self, key: usize) -> &GlobalDataPath {
-        self.path_unintern.get(&key).unwrap()
+    fn add_column(&mut self, path: GuardedPath) -> usize {
+        let guard_keys = path
+            .guards()
+            .iter()
+            .map(|guard| self.intern(guard.path()))
+            .collect();
+        let key = self.columns.len();
+        if path.guards().is_empty() {
+            self.path_intern.insert(path.path().handle(), key);
+        } else {
+            self.guarded_intern.insert(path.key().clone(), key);
+        }
+        self.columns
+            .push(Column::new(path, ColumnKind::Value, guard_keys));
+        key
+    }
+
+    /// Mark a chunk as recently used, adding it if necessary.
+    fn touch_chunk(&mut self, index: u32) -> &mut ChunkEntry {
+        if !self.chunks.contains(&index) {
+            let entry = ChunkEntry::default();
+            self.byte_size += entry.byte_size();
+            self.chunks.put(index, entry);
+            self.chunk_order.insert(index);
+        }
+        self.chunks.get_mut(&index).unwrap()
+    }
+
+    /// Remove a chunk from every column that has it, returning the number of values removed.
+    fn remove_chunk(&mut self, index: u32) -> usize {
+        let mut num_cells = 0;
+        if let Some(entry) = self.chunks.pop(&index) {
+            self.chunk_order.remove(&index);
+            self.byte_size -= entry.byte_size();
+            for &path_key in &entry.columns {
+                let column = &mut self.columns[path_key];
+                let prev_size = column.byte_size;
+                num_cells += column.remove_chunk(index);
+                self.byte_size -= prev_size - column.byte_size;
+            }
+        }
+        num_cells
+    }
+
+    /// Evict least recently used chunks until the cache fits in its budget.
+    ///
+    /// The most recently used chunk is always kept.
+    fn evict_over_budget(&mut self) {
+        while self.byte_size > self.byte_budget && self.chunks.len() > 1 {
+            let index = *self.chunks.peek_lru().unwrap().0;
+            self.stats.evictions += self.remove_chunk(index);
+        }
+    }
+
+    /// Store a value, keeping the total size up to date.
+    fn store(&mut self, data_layout: &DataLayout, path_key: usize, frame: u32, value: Value) {
+        let column = &mut self.columns[path_key];
+        let prev_size = column.byte_size;
+        let created_chunk = column.store(data_layout, frame, value);
+        self.byte_size -= prev_size;
+        self.byte_size += column.byte_size;
+
+        if created_chunk {
+            let entry = self.chunks.peek_mut(&chunk_index(frame)).unwrap();
+            let prev_size = entry.byte_size();
+            entry.columns.push(path_key);
+            self.byte_size -= prev_size;
+            self.byte_size += entry.byte_size();
+        }
+    }
+
+    /// Record an access to a path, making it hot.
+    fn access(&mut self, path_key: usize) {
+        let column = &mut self.columns[path_key];
+        if column.last_window != self.window {
+            column.last_window = self.window;
+            column.window_accesses = 0;
+        }
+        column.window_accesses += 1;
+        if !column.hot {
+            column.hot = true;
+            self.hot_paths.push(path_key);
+        }
+    }
+
+    /// Start a new window once the current one has passed, demoting the paths that weren't
+    /// accessed during the previous window.
+    ///
+    /// If there are too many hot paths, the ones accessed least often in the previous window
+    /// are demoted.
+    fn update_hot_paths(&mut self) {
+        if self.window_start.elapsed() < HOT_PATH_WINDOW {
+            return;
+        }
+        self.window += 1;
+        self.window_start = Instant::now();
+
+        let window = self.window;
+        let columns = &mut self.columns;
+        self.hot_paths.retain(|&path_key| {
+            let column = &mut columns[path_key];
+            column.hot = column.pinned || column.last_window + 1 >= window;
+            column.hot
+        });
+
+        if self.hot_paths.len() > MAX_HOT_PATHS {
+            self.hot_paths.sort_by_key(|&path_key| {
+                let column = &columns[path_key];
+                let accesses = if column.last_window + 1 == window {
+                    column.window_accesses
+                } else {
+                    0
+                };
+                (!column.pinned, u32::MAX - accesses)
+            });
+            for &path_key in &self.hot_paths[MAX_HOT_PATHS..] {
+                columns[path_key].hot = false;
+            }
+            self.hot_paths.truncate(MAX_HOT_PATHS);
+        }
+    }
+
+    /// Always preload the given paths, unpinning the previously pinned paths.
+    pub fn set_pinned_paths(&mut self, paths: &[GuardedPath]) {
+        for column in &mut self.columns {
+            column.pinned = false;
+        }
+        for path in paths {
+            let path_key = self.intern_guarded(path);
+            self.columns[path_key].pinned = true;
+            if !self.columns[path_key].hot {
+                self.columns[path_key].hot = true;
+                self.hot_paths.push(path_key);
+            }
+        }
+    }
+
+    /// Return the currently pinned paths.
+    pub fn pinned_paths(&self) -> Vec<GuardedPath> {
+        self.columns
+            .iter()
+            .filter(|column| column.pinned)
+            .map(|column| column.path.clone())
+            .collect()
+    }
+
+    /// Stop preloading a path until it is looked up again, unless it is pinned.
+    pub fn demote_path(&mut self, path: &GuardedPath) {
+        if let Some(path_key) = self.find_guarded(path) {
+            let column = &mut self.columns[path_key];
+            if column.hot && !column.pinned {
+                column.hot = false;
+                self.hot_paths.retain(|&key| key != path_key);
+            }
+        }
     }
 
     pub fn get(&mut self, frame: u32, path: &GlobalDataPath) -> Option<Value> {
         let path_key = self.intern(path);
-        self.hot_paths.put(path_key, ());
-        self.cache
-            .get(&frame)
-            .and_then(|cache| cache.get(&path_key))
-            .cloned()
+        self.get_column(frame, path_key)
+    }
+
+    /// Look up the cached value of a guarded path, which is null if its guards failed.
+    pub fn get_guarded(&mut self, frame: u32, path: &GuardedPath) -> Option<Value> {
+        let path_key = self.intern_guarded(path);
+        self.get_column(frame, path_key)
+    }
+
+    /// Look up the cached address of a path, which is None if the path evaluated to null.
+    ///
+    /// The address of a path that doesn't pass through a pointer is always available, since it
+    /// is the same on every frame.
+    pub fn get_address(&mut self, frame: u32, path: &GlobalDataPath) -> Option<Option<Address>> {
+        let path_key = self.intern_address(path);
+        if let ColumnKind::Address {
+            static_address: Some(address),
+        } = self.columns[path_key].kind
+        {
+            self.stats.hits += 1;
+            return Some(Some(address));
+        }
+        self.get_column(frame, path_key).map(|value| match value {
+            Value::Address(address) => Some(address),
+            _ => None,
+        })
     }
 
-    pub fn insert(&mut self, frame: u32, path: &GlobalDataPath, value: Value) {
+    fn get_column(&mut self, frame: u32, path_key: usize) -> Option<Value> {
+        self.access(path_key);
+        let value = match self.chunks.get(&chunk_index(frame)) {
+            Some(_) => self.columns[path_key].get(frame),
+            None => None,
+        };
+        match value {
+            Some(_) => self.stats.hits += 1,
+            None => self.stats.misses += 1,
+        }
+        value
+    }
+
+    /// Look up the cached values of a path over a range of frames.
+    ///
+    /// The values are read in frame order from each chunk of the path's column.
+    pub fn get_range(&mut self, path: &GlobalDataPath, frames: Range<u32>) -> Vec<Option<Value>> {
         let path_key = self.intern(path);
-        let cache = match self.cache.get_mut(&frame) {
-            Some(cache) => cache,
-            None => {
-                self.cache.put(frame, HashMap::new());
-                self.cache.peek_mut(&frame).unwrap()
+        self.access(path_key);
+
+        let mut values = Vec::with_capacity(frames.len());
+        let mut frame = frames.start;
+        while frame < frames.end {
+            let index = chunk_index(frame);
+            let chunk_end = ((index + 1) * CHUNK_FRAMES).min(frames.end);
+            if self.chunks.get(&index).is_some() {
+                let column = &self.columns[path_key];
+                values.extend((frame..chunk_end).map(|frame| column.get(frame)));
+            } else {
+                values.extend((frame..chunk_end).map(|_| None));
             }
-        };
-        cache.insert(path_key, value);
+            frame = chunk_end;
+        }
+
+        let num_hits = values.iter().filter(|value| value.is_some()).count();
+        self.stats.hits += num_hits;
+        self.stats.misses += values.len() - num_hits;
+        values
+    }
+
+    /// Cache a value that was read from `state`.
+    pub fn insert(&mut self, state: &(impl State + ?Sized), path: &GlobalDataPath, value: Value) {
+        let path_key = self.intern(path);
+        self.insert_column(state, path_key, value);
+    }
+
+    /// Cache the address of a path that was computed from `state`.
+    pub fn insert_address(
+        &mut self,
+        state: &(impl State + ?Sized),
+        path: &GlobalDataPath,
+        address: Option<Address>,
+    ) {
+        let path_key = self.intern_address(path);
+        self.insert_column(state, path_key, address_value(address));
+    }
+
+    fn insert_column(&mut self, state: &(impl State + ?Sized), path_key: usize, value: Value) {
+        self.touch_chunk(chunk_index(state.frame()));
+        self.store(state.memory().data_layout(), path_key, state.frame(), value);
+        self.evict_over_budget();
+    }
+
+    /// Read a guarded path from `state` and cache its value.
+    pub fn read_guarded(
+        &mut self,
+        state: &(impl State + ?Sized),
+        path: &GuardedPath,
+    ) -> Result<Value, Error> {
+        let path_key = self.intern_guarded(path);
+        self.touch_chunk(chunk_index(state.frame()));
+        let value = self.read_column(state, path_key)?;
+        self.store(
+            state.memory().data_layout(),
+            path_key,
+            state.frame(),
+            value.clone(),
+        );
+        self.evict_over_budget();
+        Ok(value)
+    }
+
+    /// Read the value of a column's guarded path from `state`.
+    ///
+    /// The values of the guard paths are looked up in and added to the cache, so that a guard
+    /// shared by many paths (e.g. an object's active flags) is only read once per frame.
+    /// The frame's chunk must already exist.
+    fn read_column(
+        &mut self,
+        state: &(impl State + ?Sized),
+        path_key: usize,
+    ) -> Result<Value, Error> {
+        let frame = state.frame();
+        for i in 0..self.columns[path_key].guard_keys.len() {
+            let guard_key = self.columns[path_key].guard_keys[i];
+            let guard_value = match self.columns[guard_key].get(frame) {
+                Some(value) => value,
+                None => {
+                    let value = state.path_read(self.columns[guard_key].path.path())?;
+                    self.store(
+                        state.memory().data_layout(),
+                        guard_key,
+                        frame,
+                        value.clone(),
+                    );
+                    value
+                }
+            };
+            if !self.columns[path_key].path.guards()[i].check(&guard_value)? {
+                return Ok(Value::Null);
+            }
+        }
+        let path = self.columns[path_key].path.path();
+        match self.columns[path_key].kind {
+            ColumnKind::Value => state.path_read(path),
+            ColumnKind::Address { .. } => state.path_address(path).map(address_value),
+        }
+    }
+
+    pub fn contains_frame(&self, frame: u32) -> bool {
+        match self.chunks.peek(&chunk_index(frame)) {
+            Some(entry) => entry.preloaded & frame_bit(frame) != 0,
+            None => false,
+        }
     }
 
-    pub fn preload_frame(&mut self, state: &impl State) {
-        if self.cache.contains(&state.frame()) {
+    /// Preload a frame that was advanced through on the way to `requested_frame`.
+    ///
+    /// Frames too far before the requested frame are skipped, since they are unlikely to be
+    /// viewed and preloading them would slow down the seek.
+    pub fn capture_frame(&mut self, state: &(impl State + ?Sized), requested_frame: u32) {
+        if requested_frame.saturating_sub(state.frame()) < CAPTURE_FRAMES {
+            self.preload_frame(state);
+        }
+    }
+
+    pub fn preload_frame(&mut self, state: &(impl State + ?Sized)) {
+        let frame = state.frame();
+        if self.contains_frame(frame) {
             return;
         }
-        let mut cache = HashMap::new();
-        for (&path_key, ()) in &self.hot_paths {
-            let path = self.unintern(path_key);
+        self.touch_chunk(chunk_index(frame)).preloaded |= frame_bit(frame);
+
+        self.update_hot_paths();
+        for i in 0..self.hot_paths.len() {
+            let path_key = self.hot_paths[i];
+            // Skip guard paths that were already read for an earlier path
+            if self.columns[path_key].contains(frame) {
+                continue;
+            }
             // Ignore errors so that they can get caught when the path is directly requested
-            if let Ok(value) = state.path_read(path) {
-                cache.insert(path_key, value);
+            if let Ok(value) = self.read_column(state, path_key) {
+                self.store(state.memory().data_layout(), path_key, frame, value);
             }
         }
-        self.cache.put(state.frame(), cache);
+        self.evict_over_budget();
     }
 
     pub fn invalidate_frame(&mut self, invalidated_frame: u32) {
-        let invalidated_keys: Vec<u32> = self
-            .cache
-            .iter()
-            .filter(|(&frame, _)| frame >= invalidated_frame)
-            .map(|(&frame, _)| frame)
+        self.invalidate_frame_range(invalidated_frame, u32::MAX);
+    }
+
+    /// Invalidate the frames in `start..end`.
+    ///
+    /// This only visits the cached chunks overlapping the range.
+    pub fn invalidate_frame_range(&mut self, start: u32, end: u32) {
+        if start >= end {
+            return;
+        }
+        let invalidated_chunks: Vec<u32> = self
+            .chunk_order
+            .range(chunk_index(start)..=chunk_index(end - 1))
+            .cloned()
             .collect();
 
-        for frame in invalidated_keys {
-            self.cache.pop(&frame);
+        for index in invalidated_chunks {
+            let mask = chunk_mask(index, start, end);
+            if mask == !0 {
+                self.remove_chunk(index);
+            } else {
+                let columns = &mut self.columns;
+                let mut byte_size = self.byte_size;
+                let entry = self.chunks.peek_mut(&index).unwrap();
+                entry.preloaded &= !mask;
+                entry.columns.retain(|&path_key| {
+                    let column = &mut columns[path_key];
+                    let prev_size = column.byte_size;
+                    let removed_chunk = column.clear(index, mask);
+                    byte_size -= prev_size - column.byte_size;
+                    !removed_chunk
+                });
+                self.byte_size = byte_size;
+            }
         }
     }
 
+    /// Return the number of cached values.
+    pub fn num_cells(&self) -> usize {
+        self.columns.iter().map(Column::num_cells).sum()
+    }
+
+    /// Return the approximate number of bytes used by cached values.
     pub fn byte_size(&self) -> usize {
-        let mut entries: HashMap<u32, HashMap<usize, Value>> = HashMap::new();
-        for (frame, cache) in &self.cache {
-            entries.insert(*frame, cache.clone());
+        self.byte_size
+    }
+
+    pub fn byte_budget(&self) -> usize {
+        self.byte_budget
+    }
+
+    /// Set the number of bytes the cache may use, evicting chunks to fit.
+    pub fn set_byte_budget(&mut self, byte_budget: usize) {
+        self.byte_budget = byte_budget;
+        self.evict_over_budget();
+    }
+
+    pub fn stats(&self) -> DataCacheStats {
+        DataCacheStats {
+            hot_paths: self.hot_paths.len(),
+            ..self.stats
+        }
+    }
+}
+
+fn chunk_index(frame: u32) -> u32 {
+    frame / CHUNK_FRAMES
+}
+
+fn frame_bit(frame: u32) -> u64 {
+    1 << (frame % CHUNK_FRAMES)
+}
+
+/// Return the bits of the frames in `start..end` that lie in the given chunk.
+fn chunk_mask(index: u32, start: u32, end: u32) -> u64 {
+    let chunk_start = index * CHUNK_FRAMES;
+    let lo = start.max(chunk_start) - chunk_start;
+    let hi = end
+        .min(chunk_start + CHUNK_FRAMES)
+        .saturating_sub(chunk_start);
+    if lo >= hi {
+        return 0;
+    }
+    let below_hi = if hi == CHUNK_FRAMES {
+        !0
+    } else {
+        (1 << hi) - 1
+    };
+    below_hi & !((1 << lo) - 1)
+}
+
+/// The bookkeeping for a chunk of frames, shared by all columns.
+#[derive(Debug, Default)]
+struct ChunkEntry {
+    /// Bit i is set if the chunk's i-th frame has been preloaded.
+    preloaded: u64,
+    /// The columns that have values in the chunk.
+    columns: Vec<usize>,
+}
+
+impl ChunkEntry {
+    fn byte_size(&self) -> usize {
+        mem::size_of::<(u32, ChunkEntry)>()
+            + mem::size_of::<u32>()
+            + self.columns.capacity() * mem::size_of::<usize>()
+    }
+}
+
+/// What a column caches for its path.
+#[derive(Debug, Clone, Copy)]
+enum ColumnKind {
+    /// The value that the path points to.
+    Value,
+    /// The address of the path, stored as an address value or null.
+    ///
+    /// If the path doesn't pass through a pointer, its address is resolved once when the column
+    /// is created and no cells are stored.
+    Address { static_address: Option<Address> },
+}
+
+/// The cached values of a single path.
+#[derive(Debug)]
+struct Column {
+    path: GuardedPath,
+    kind: ColumnKind,
+    /// The columns of the path's guard paths.
+    guard_keys: Vec<usize>,
+    /// The cell layout, resolved when the first value is stored.
+    layout: Option<CellLayout>,
+    chunks: HashMap<u32, Chunk>,
+    /// The total size of `chunks`.
+    byte_size: usize,
+    /// True if the path is in the cache's hot paths.
+    hot: bool,
+    pinned: bool,
+    /// The last window in which the path was accessed.
+    last_window: u64,
+    /// The number of accesses during `last_window`.
+    window_accesses: u32,
+}
+
+/// How the values of a column are stored.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+enum CellLayout {
+    /// A scalar, or a fixed length array of scalars, packed at its native width.
+    Packed {
+        scalar: Scalar,
+        length: Option<usize>,
+    },
+    /// Any other value, stored as a `Value`.
+    Boxed,
+}
+
+/// A chunk of `CHUNK_FRAMES` cells in a column.
+#[derive(Debug)]
+struct Chunk {
+    /// Bit i is set if the cell for the chunk's i-th frame is present.
+    valid: u64,
+    /// Bit i is set if the chunk's i-th frame is null, for packed cells.
+    null: u64,
+    cells: Cells,
+}
+
+#[derive(Debug)]
+enum Cells {
+    Packed(Vec<u8>),
+    Boxed {
+        values: Vec<Option<Value>>,
+        /// The heap memory owned by `values`.
+        heap_size: usize,
+    },
+}
+
+impl Chunk {
+    fn byte_size(&self) -> usize {
+        let cells_size = match &self.cells {
+            Cells::Packed(bytes) => bytes.capacity(),
+            Cells::Boxed { values, heap_size } => {
+                values.capacity() * mem::size_of::<Option<Value>>() + heap_size
+            }
+        };
+        mem::size_of::<(u32, Chunk)>() + cells_size
+    }
+}
+
+impl Column {
+    fn new(path: GuardedPath, kind: ColumnKind, guard_keys: Vec<usize>) -> Self {
+        Self {
+            path,
+            kind,
+            guard_keys,
+            layout: None,
+            chunks: HashMap::new(),
+            byte_size: 0,
+            hot: false,
+            pinned: false,
+            last_window: 0,
+            window_accesses: 0,
+        }
+    }
+
+    fn contains(&self, frame: u32) -> bool {
+        match self.chunks.get(&chunk_index(frame)) {
+            Some(chunk) => chunk.valid & frame_bit(frame) != 0,
+            None => false,
+        }
+    }
+
+    fn get(&self, frame: u32) -> Option<Value> {
+        let chunk = self.chunks.get(&chunk_index(frame))?;
+        if chunk.valid & frame_bit(frame) == 0 {
+            return None;
+        }
+        if chunk.null & frame_bit(frame) != 0 {
+            return Some(Value::Null);
+        }
+        let offset = (frame % CHUNK_FRAMES) as usize;
+        match (&chunk.cells, self.layout) {
+            (Cells::Packed(bytes), Some(layout @ CellLayout::Packed { .. })) => {
+                let width = layout.width();
+                Some(layout.read(&bytes[offset * width..(offset + 1) * width]))
+            }
+            (Cells::Boxed { values, .. }, _) => values[offset].clone(),
+            _ => None,
+        }
+    }
+
+    /// Store a value, returning true if a new chunk was created for it.
+    fn store(&mut self, data_layout: &DataLayout, frame: u32, value: Value) -> bool {
+        let layout = match self.layout {
+            Some(layout) => layout,
+            None => {
+                let layout = match self.kind {
+                    ColumnKind::Value => {
+                        CellLayout::of(data_layout, &self.path.path().concrete_type())
+                    }
+                    ColumnKind::Address { .. } => CellLayout::Packed {
+                        scalar: Scalar::Address,
+                        length: None,
+                    },
+                };
+                self.layout = Some(layout);
+                layout
+            }
+        };
+        if layout != CellLayout::Boxed && !value.is_null() && !layout.fits(&value) {
+            self.unpack();
+        }
+
+        let layout = self.layout.unwrap();
+        let offset = (frame % CHUNK_FRAMES) as usize;
+        let index = chunk_index(frame);
+        let created_chunk = !self.chunks.contains_key(&index);
+        if created_chunk {
+            let chunk = Chunk {
+                valid: 0,
+                null: 0,
+                cells: layout.empty_cells(),
+            };
+            self.byte_size += chunk.byte_size();
+            self.chunks.insert(index, chunk);
+        }
+        let chunk = self.chunks.get_mut(&index).unwrap();
+        let prev_size = chunk.byte_size();
+        chunk.valid |= frame_bit(frame);
+        chunk.null &= !frame_bit(frame);
+        match &mut chunk.cells {
+            Cells::Packed(_) if value.is_null() => chunk.null |= frame_bit(frame),
+            Cells::Packed(bytes) => {
+                let width = layout.width();
+                layout.write(&value, &mut bytes[offset * width..(offset + 1) * width]);
+            }
+            Cells::Boxed { values, heap_size } => {
+                if let Some(prev_value) = &values[offset] {
+                    *heap_size -= value_heap_size(prev_value);
+                }
+                *heap_size += value_heap_size(&value);
+                values[offset] = Some(value);
+            }
+        }
+        self.byte_size -= prev_size;
+        self.byte_size += chunk.byte_size();
+        created_chunk
+    }
+
+    /// Switch to boxed storage, e.g. after storing a value that is out of range for its type.
+    fn unpack(&mut self) {
+        let frames: Vec<u32> = self
+            .chunks
+            .iter()
+            .flat_map(|(&index, chunk)| {
+                (0..CHUNK_FRAMES)
+                    .filter(move |&offset| chunk.valid & (1 << offset) != 0)
+                    .map(move |offset| index * CHUNK_FRAMES + offset)
+            })
+            .collect();
+        let values: Vec<(u32, Value)> = frames
+            .into_iter()
+            .filter_map(|frame| self.get(frame).map(|value| (frame, value)))
+            .collect();
+
+        self.layout = Some(CellLayout::Boxed);
+        for chunk in self.chunks.values_mut() {
+            chunk.valid = 0;
+            chunk.null = 0;
+            chunk.cells = CellLayout::Boxed.empty_cells();
+        }
+        for (frame, value) in values {
+            let chunk = self.chunks.get_mut(&chunk_index(frame)).unwrap();
+            chunk.valid |= frame_bit(frame);
+            if let Cells::Boxed { values, heap_size } = &mut chunk.cells {
+                *heap_size += value_heap_size(&value);
+                values[(frame % CHUNK_FRAMES) as usize] = Some(value);
+            }
+        }
+        self.byte_size = self.chunks.values().map(Chunk::byte_size).sum();
+    }
+
+    /// Clear the masked cells of a chunk, returning true if the chunk no longer exists.
+    fn clear(&mut self, index: u32, mask: u64) -> bool {
+        if let Some(chunk) = self.chunks.get_mut(&index) {
+            if chunk.valid & !mask == 0 {
+                self.remove_chunk(index);
+                return true;
+            }
+            let prev_size = chunk.byte_size();
+            chunk.valid &= !mask;
+            chunk.null &= !mask;
+            if let Cells::Boxed { values, heap_size } = &mut chunk.cells {
+                for (offset, value) in values.iter_mut().enumerate() {
+                    if mask & (1 << offset) != 0 {
+                        if let Some(value) = value.take() {
+                            *heap_size -= value_heap_size(&value);
+                        }
+                    }
+                }
+            }
+            self.byte_size -= prev_size;
+            self.byte_size += chunk.byte_size();
+            false
+        } else {
+            true
+        }
+    }
+
+    /// Remove a chunk, returning the number of values removed.
+    fn remove_chunk(&mut self, index: u32) -> usize {
+        match self.chunks.remove(&index) {
+            Some(chunk) => {
+                self.byte_size -= chunk.byte_size();
+                chunk.valid.count_ones() as usize
+            }
+            None => 0,
+        }
+    }
+
+    fn num_cells(&self) -> usize {
+        self.chunks
+            .values()
+            .map(|chunk| chunk.valid.count_ones() as usize)
+            .sum()
+    }
+}
+
+impl CellLayout {
+    fn of(data_layout: &DataLayout, data_type: &DataTypeRef) -> Self {
+        let data_type = match data_layout.concrete_type(data_type) {
+            Ok(data_type) => data_type,
+            Err(_) => return CellLayout::Boxed,
+        };
+        if let Some(scalar) = Scalar::of(&data_type) {
+            return CellLayout::Packed {
+                scalar,
+                length: None,
+            };
+        }
+        if let DataType::Array {
+            base,
+            length: Some(length),
+            ..
+        } = data_type.as_ref()
+        {
+            let base = data_layout.concrete_type(base).ok();
+            if let Some(scalar) = base.as_ref().and_then(Scalar::of) {
+                return CellLayout::Packed {
+                    scalar,
+                    length: Some(*length),
+                };
+            }
+        }
+        CellLayout::Boxed
+    }
+
+    /// The number of bytes used by a packed cell.
+    fn width(self) -> usize {
+        match self {
+            CellLayout::Packed { scalar, length } => scalar.size() * length.unwrap_or(1),
+            CellLayout::Boxed => 0,
+        }
+    }
+
+    fn empty_cells(self) -> Cells {
+        match self {
+            CellLayout::Packed { .. } => {
+                Cells::Packed(vec![0; CHUNK_FRAMES as usize * self.width()])
+            }
+            CellLayout::Boxed => Cells::Boxed {
+                values: vec![None; CHUNK_FRAMES as usize],
+                heap_size: 0,
+            },
         }
-        entries.deep_size_of()
     }
+
+    /// Return true if the value can be packed without loss.
+    fn fits(self, value: &Value) -> bool {
+        match (self, value) {
+            (
+                CellLayout::Packed {
+                    scalar,
+                    length: None,
+                },
+                _,
+            ) => scalar.fits(value),
+            (
+                CellLayout::Packed {
+                    scalar,
+                    length: Some(length),
+                },
+                Value::Array(elements),
+            ) => elements.len() == length && elements.iter().all(|element| scalar.fits(element)),
+            _ => false,
+        }
+    }
+
+    fn read(self, bytes: &[u8]) -> Value {
+        match self {
+            CellLayout::Packed {
+                scalar,
+                length: None,
+            } => scalar.read(bytes),
+            CellLayout::Packed {
+                scalar,
+                length: Some(_),
+            } => Value::Array(
+                bytes
+                    .chunks_exact(scalar.size())
+                    .map(|bytes| scalar.read(bytes))
+                    .collect(),
+            ),
+            CellLayout::Boxed => unreachable!(),
+        }
+    }
+
+    fn write(self, value: &Value, bytes: &mut [u8]) {
+        match (self, value) {
+            (
+                CellLayout::Packed {
+                    scalar,
+                    length: Some(_),
+                },
+                Value::Array(elements),
+            ) => {
+                for (element, bytes) in elements.iter().zip(bytes.chunks_exact_mut(scalar.size())) {
+                    scalar.write(element, bytes);
+                }
+            }
+            (CellLayout::Packed { scalar, .. }, _) => scalar.write(value, bytes),
+            (CellLayout::Boxed, _) => unreachable!(),
+        }
+    }
+}
+
+/// An int, float, or address type that can be packed into a column.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+enum Scalar {
+    Int(IntType),
+    Float(FloatType),
+    Address,
 }
 
-known_deep_size!(0, Value);
+impl Scalar {
+    fn of(data_type: &DataTypeRef) -> Option<Self> {
+        match data_type.as_ref() {
+            DataType::Int(int_type) => Some(Scalar::Int(*int_type)),
+            DataType::Float(float_type) => Some(Scalar::Float(*float_type)),
+            _ => None,
+        }
+    }
+
+    fn size(self) -> usize {
+        match self {
+            Scalar::Int(int_type) => int_type.size(),
+            Scalar::Float(float_type) => float_type.size(),
+            Scalar::Address => mem::size_of::<u64>(),
+        }
+    }
+
+    fn fits(self, value: &Value) -> bool {
+        match (self, value) {
+            (Scalar::Int(int_type), &Value::Int(n)) => match int_type {
+                IntType::U8 => u8::try_from(n).is_ok(),
+                IntType::S8 => i8::try_from(n).is_ok(),
+                IntType::U16 => u16::try_from(n).is_ok(),
+                IntType::S16 => i16::try_from(n).is_ok(),
+                IntType::U32 => u32::try_from(n).is_ok(),
+                IntType::S32 => i32::try_from(n).is_ok(),
+                IntType::U64 => u64::try_from(n).is_ok(),
+                IntType::S64 => i64::try_from(n).is_ok(),
+            },
+            (Scalar::Float(FloatType::F32), &Value::Float(r)) => r as f32 as f64 == r || r.is_nan(),
+            (Scalar::Float(FloatType::F64), Value::Float(_)) => true,
+            (Scalar::Address, Value::Address(_)) => true,
+            _ => false,
+        }
+    }
+
+    fn read(self, bytes: &[u8]) -> Value {
+        match self {
+            Scalar::Int(int_type) => Value::Int(match int_type {
+                IntType::U8 => bytes[0] as IntValue,
+                IntType::S8 => bytes[0] as i8 as IntValue,
+                IntType::U16 => u16::from_le_bytes(bytes.try_into().unwrap()) as IntValue,
+                IntType::S16 => i16::from_le_bytes(bytes.try_into().unwrap()) as IntValue,
+                IntType::U32 => u32::from_le_bytes(bytes.try_into().unwrap()) as IntValue,
+                IntType::S32 => i32::from_le_bytes(bytes.try_into().unwrap()) as IntValue,
+                IntType::U64 => u64::from_le_bytes(bytes.try_into().unwrap()) as IntValue,
+                IntType::S64 => i64::from_le_bytes(bytes.try_into().unwrap()) as IntValue,
+            }),
+            Scalar::Float(FloatType::F32) => {
+                Value::Float(f32::from_le_bytes(bytes.try_into().unwrap()) as FloatValue)
+            }
+            Scalar::Float(FloatType::F64) => {
+                Value::Float(f64::from_le_bytes(bytes.try_into().unwrap()))
+            }
+            Scalar::Address => Value::Address(Address(
+                u64::from_le_bytes(bytes.try_into().unwrap()) as usize,
+            )),
+        }
+    }
+
+    /// Write a value, which must fit in the scalar type.
+    fn write(self, value: &Value, bytes: &mut [u8]) {
+        match (self, value) {
+            (Scalar::Int(_), &Value::Int(n)) => {
+                // Truncating to the low bytes works for both signed and unsigned ints
+                bytes.copy_from_slice(&(n as u64).to_le_bytes()[..bytes.len()]);
+            }
+            (Scalar::Float(FloatType::F32), &Value::Float(r)) => {
+                bytes.copy_from_slice(&(r as f32).to_le_bytes());
+            }
+            (Scalar::Float(FloatType::F64), &Value::Float(r)) => {
+                bytes.copy_from_slice(&r.to_le_bytes());
+            }
+            (Scalar::Address, &Value::Address(address)) => {
+                bytes.copy_from_slice(&(address.0 as u64).to_le_bytes());
+            }
+            _ => unreachable!(),
+        }
+    }
+}
+
+/// Convert an address to the value cached in an address column.
+fn address_value(address: Option<Address>) -> Value {
+    match address {
+        Some(address) => Value::Address(address),
+        None => Value::Null,
+    }
+}
+
+/// Estimate the heap memory owned by a value.
+fn value_heap_size(value: &Value) -> usize {
+    match value {
+        Value::String(string) => string.capacity(),
+        Value::Struct { fields } => {
+            mem::size_of::<HashMap<String, Value>>()
+                + fields
+                    .iter()
+                    .map(|(name, value)| {
+                        mem::size_of::<(String, Value)>() + name.capacity() + value_heap_size(value)
+                    })
+                    .sum::<usize>()
+        }
+        Value::Array(elements) => {
+            elements.capacity() * mem::size_of::<Value>()
+                + elements.iter().map(value_heap_size).sum::<usize>()
+        }
+        Value::Null | Value::Int(_) | Value::Float(_) | Value::Address(_) => 0,
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::timeline::synthetic_memory::{SyntheticConfig, SyntheticMemory};
+
+    #[test]
+    fn chunk_mask_edges() {
+        assert_eq!(chunk_mask(0, 0, CHUNK_FRAMES), !0);
+        assert_eq!(chunk_mask(1, 0, 1000), !0);
+        assert_eq!(chunk_mask(1, 100, 1000), !0 << 36);
+        assert_eq!(chunk_mask(1, 0, 70), 0b11_1111);
+        assert_eq!(chunk_mask(1, 65, 67), 0b110);
+        assert_eq!(chunk_mask(0, 63, 64), 1 << 63);
+        assert_eq!(chunk_mask(1, 0, 64), 0);
+        assert_eq!(chunk_mask(1, 128, 200), 0);
+        assert_eq!(chunk_mask(1, 90, 80), 0);
+
+        for start in 0..3 * CHUNK_FRAMES {
+            for end in start..3 * CHUNK_FRAMES {
+                for index in 0..3 {
+                    let expected = (start..end)
+                        .filter(|&frame| chunk_index(frame) == index)
+                        .fold(0, |mask, frame| mask | frame_bit(frame));
+                    assert_eq!(chunk_mask(index, start, end), expected);
+                }
+            }
+        }
+    }
+
+    fn column(memory: &SyntheticMemory, source: &str) -> Column {
+        let path = GlobalDataPath::compile(memory, source).unwrap();
+        Column::new(path.into(), ColumnKind::Value, Vec::new())
+    }
+
+    fn get(column: &Column, frame: u32) -> String {
+        format!("{:?}", column.get(frame))
+    }
+
+    #[test]
+    fn column_store_and_unpack() {
+        let (memory, _) = SyntheticMemory::new(SyntheticConfig::default());
+        let data_layout = memory.data_layout();
+        let mut column = column(&memory, "gHotShorts[3]");
+
+        column.store(data_layout, 63, Value::Int(-5));
+        column.store(data_layout, 64, Value::Null);
+        column.store(data_layout, 0, Value::Int(i16::MAX as IntValue));
+        assert_eq!(
+            column.layout,
+            Some(CellLayout::Packed {
+                scalar: Scalar::Int(IntType::S16),
+                length: None,
+            })
+        );
+        assert_eq!(get(&column, 63), "Some(Int(-5))");
+        assert_eq!(get(&column, 64), "Some(Null)");
+        assert_eq!(get(&column, 0), "Some(Int(32767))");
+        assert_eq!(get(&column, 1), "None");
+        column.store(data_layout, 64, Value::Int(7));
+        assert_eq!(get(&column, 64), "Some(Int(7))");
+        column.store(data_layout, 65, Value::Null);
+
+        // A value that doesn't fit the type switches to boxed cells, keeping the stored values
+        column.store(data_layout, 127, Value::Int(1 << 20));
+        assert_eq!(column.layout, Some(CellLayout::Boxed));
+        assert_eq!(column.num_cells(), 5);
+        assert_eq!(get(&column, 63), "Some(Int(-5))");
+        assert_eq!(get(&column, 64), "Some(Int(7))");
+        assert_eq!(get(&column, 65), "Some(Null)");
+        assert_eq!(get(&column, 0), "Some(Int(32767))");
+        assert_eq!(get(&column, 127), "Some(Int(1048576))");
+    }
+
+    #[test]
+    fn column_packed_arrays() {
+        let (memory, _) = SyntheticMemory::new(SyntheticConfig::default());
+        let data_layout = memory.data_layout();
+        let mut column = column(&memory, "gMarioStates[0].pos");
+        let array =
+            |values: &[f64]| Value::Array(values.iter().map(|&r| Value::Float(r)).collect());
+
+        column.store(data_layout, 5, array(&[1.0, -2.5, 3.0]));
+        column.store(data_layout, 6, Value::Null);
+        assert_eq!(
+            column.layout,
+            Some(CellLayout::Packed {
+                scalar: Scalar::Float(FloatType::F32),
+                length: Some(3),
+            })
+        );
+        assert_eq!(
+            get(&column, 5),
+            "Some(Array([Float(1.0), Float(-2.5), Float(3.0)]))"
+        );
+        assert_eq!(get(&column, 6), "Some(Null)");
+
+        // 0.1 can't be represented exactly as an f32
+        column.store(data_layout, 7, array(&[0.1, 0.0, 0.0]));
+        assert_eq!(column.layout, Some(CellLayout::Boxed));
+        assert_eq!(
+            get(&column, 5),
+            "Some(Array([Float(1.0), Float(-2.5), Float(3.0)]))"
+        );
+        assert_eq!(get(&column, 6), "Some(Null)");
+        assert_eq!(
+            get(&column, 7),
+            "Some(Array([Float(0.1), Float(0.0), Float(0.0)]))"
+        );
+    }
+
+    fn assert_byte_size(column: &Column) {
+        let byte_size: usize = column.chunks.values().map(Chunk::byte_size).sum();
+        assert_eq!(column.byte_size, byte_size);
+    }
+
+    #[test]
+    fn column_chunk_bookkeeping() {
+        let (memory, _) = SyntheticMemory::new(SyntheticConfig::default());
+        let data_layout = memory.data_layout();
+        let mut column = column(&memory, "gHotShorts[3]");
+
+        // store reports whether it created a new chunk
+        assert!(column.store(data_layout, 63, Value::Int(-5)));
+        assert!(column.store(data_layout, 64, Value::Null));
+        assert!(!column.store(data_layout, 0, Value::Int(1)));
+        assert!(!column.store(data_layout, 64, Value::Int(7)));
+        column.store(data_layout, 65, Value::Null);
+        assert_byte_size(&column);
+        column.store(data_layout, 127, Value::Int(1 << 20));
+        assert_eq!(column.layout, Some(CellLayout::Boxed));
+        assert_byte_size(&column);
+
+        // clear reports whether it removed the whole chunk
+        assert!(!column.clear(1, chunk_mask(1, 64, 100)));
+        assert_eq!(get(&column, 64), "None");
+        assert_eq!(get(&column, 127), "Some(Int(1048576))");
+        assert_byte_size(&column);
+        assert!(column.clear(1, chunk_mask(1, 100, 1000)));
+        assert_eq!(column.num_cells(), 2);
+        assert_eq!(get(&column, 63), "Some(Int(-5))");
+        assert_byte_size(&column);
+    }
+}
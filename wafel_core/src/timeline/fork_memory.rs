@@ -0,0 +1,611 @@
+//! An experimental `Memory` implementation that keeps each backup slot in a suspended forked
+//! child process.
+//!
+//! Saving a slot forks the process, leaving a sleeping child that holds a copy-on-write image
+//! of the base slot, so the kernel only copies the pages that the base slot writes afterwards.
+//! Restoring reads back the pages that may have changed since then, which are found using the
+//! kernel's soft-dirty page bits.
+//!
+//! This relies on Linux-specific interfaces while the game DLL only loads on Windows, so the
+//! backend wraps `SyntheticMemory` and is used to compare against `SegmentBuffer` slots in
+//! benchmarks.
+
+use super::{
+    synthetic_memory::{
+        checksum_bytes, decode_int, read_u32, read_u64, SyntheticConfig, SyntheticController,
+        SyntheticMemory, SyntheticSlot,
+    },
+    Controller, SlotStateMut,
+};
+use crate::{
+    data_path::DataPathCache,
+    error::Error,
+    memory::{
+        data_type::{FloatType, IntType},
+        Address, ClassifiedAddress, DataLayout, FloatValue, IntValue, Memory, MemoryErrorCause,
+    },
+};
+use std::{
+    cell::RefCell,
+    fs::{self, File},
+    io,
+    ops::Range,
+    os::unix::fs::FileExt,
+    ptr,
+    rc::{Rc, Weak},
+};
+
+/// The bit of a pagemap entry that is set if the page was written since soft-dirty bits were
+/// last cleared.
+const SOFT_DIRTY_BIT: u64 = 1 << 55;
+
+/// The maximum number of ranges to copy in a single `process_vm_readv` call.
+const MAX_IOVECS: usize = 1024;
+
+/// A child process that sleeps until it is killed, holding a copy of the base slot.
+#[derive(Debug)]
+pub struct SuspendedChild {
+    pid: libc::pid_t,
+    /// The address of the base slot's data when the child was forked.
+    address: usize,
+    /// For each page of the base slot, whether it may differ from the child's copy.
+    stale_pages: RefCell<Vec<bool>>,
+}
+
+impl SuspendedChild {
+    /// Copy the given byte ranges of the slot from the child into the same ranges of `data`.
+    fn read_into(&self, data: &mut [u8], ranges: &[Range<usize>]) -> usize {
+        let segments: Vec<(usize, libc::iovec)> = ranges
+            .iter()
+            .map(|range| {
+                let local = libc::iovec {
+                    iov_base: data[range.clone()].as_mut_ptr() as *mut libc::c_void,
+                    iov_len: range.len(),
+                };
+                (range.start, local)
+            })
+            .collect();
+        self.read_segments(&segments)
+    }
+
+    /// Copy the bytes of the slot starting at `offset` into `buffer`.
+    fn read_at(&self, offset: usize, buffer: &mut [u8]) {
+        let local = libc::iovec {
+            iov_base: buffer.as_mut_ptr() as *mut libc::c_void,
+            iov_len: buffer.len(),
+        };
+        self.read_segments(&[(offset, local)]);
+    }
+
+    /// Copy from each slot offset into the paired local buffer.
+    fn read_segments(&self, segments: &[(usize, libc::iovec)]) -> usize {
+        let mut num_bytes = 0;
+        for batch in segments.chunks(MAX_IOVECS) {
+            let local: Vec<libc::iovec> = batch.iter().map(|(_, local)| *local).collect();
+            let remote: Vec<libc::iovec> = batch
+                .iter()
+                .map(|(offset, local)| libc::iovec {
+                    iov_base: (self.address + offset) as *mut libc::c_void,
+                    iov_len: local.iov_len,
+                })
+                .collect();
+            let batch_size: usize = local.iter().map(|local| local.iov_len).sum();
+
+            let result = unsafe {
+                libc::process_vm_readv(
+                    self.pid,
+                    local.as_ptr(),
+                    local.len() as libc::c_ulong,
+                    remote.as_ptr(),
+                    remote.len() as libc::c_ulong,
+                    0,
+                )
+            };
+            if result < 0 {
+                panic!(
+                    "failed to read child memory: {}",
+                    io::Error::last_os_error()
+                );
+            }
+            assert_eq!(result as usize, batch_size, "partial read of child memory");
+            num_bytes += batch_size;
+        }
+        num_bytes
+    }
+
+    /// Return a copy of the child's slot contents.
+    fn read_all(&self, size: usize) -> Vec<u8> {
+        let mut bytes = vec![0; size];
+        self.read_into(&mut bytes, &[0..size]);
+        bytes
+    }
+}
+
+impl Drop for SuspendedChild {
+    fn drop(&mut self) {
+        unsafe {
+            libc::kill(self.pid, libc::SIGKILL);
+            libc::waitpid(self.pid, ptr::null_mut(), 0);
+        }
+    }
+}
+
+/// Fork a child that holds a copy of `data` until it is dropped.
+fn fork_child(data: &[u8], num_pages: usize) -> SuspendedChild {
+    let parent_pid = unsafe { libc::getpid() };
+    let pid = unsafe { libc::fork() };
+    if pid == 0 {
+        // Only async-signal-safe calls are allowed here since other threads may have held
+        // locks at the time of the fork
+        unsafe {
+            libc::prctl(libc::PR_SET_PDEATHSIG, libc::SIGKILL);
+            if libc::getppid() != parent_pid {
+                libc::_exit(0);
+            }
+            loop {
+                libc::pause();
+            }
+        }
+    }
+    if pid < 0 {
+        panic!("failed to fork: {}", io::Error::last_os_error());
+    }
+    SuspendedChild {
+        pid,
+        address: data.as_ptr() as usize,
+        stale_pages: RefCell::new(vec![false; num_pages]),
+    }
+}
+
+fn clear_soft_dirty_bits() -> io::Result<()> {
+    fs::write("/proc/self/clear_refs", "4")
+}
+
+/// Tracks which pages of the base slot have changed relative to each child.
+#[derive(Debug)]
+struct PageTracker {
+    page_size: usize,
+    /// The pagemap of this process, or None if soft-dirty bits are unavailable, in which case
+    /// every page is assumed to have changed.
+    pagemap: Option<File>,
+    children: Vec<Weak<SuspendedChild>>,
+}
+
+impl PageTracker {
+    fn new() -> Self {
+        let page_size = unsafe { libc::sysconf(libc::_SC_PAGESIZE) } as usize;
+        let mut tracker = Self {
+            page_size,
+            pagemap: File::open("/proc/self/pagemap").ok(),
+            children: Vec::new(),
+        };
+        if !tracker.soft_dirty_bits_work() {
+            tracker.pagemap = None;
+        }
+        tracker
+    }
+
+    /// Check that writing to a page sets its soft-dirty bit, which requires kernel support.
+    fn soft_dirty_bits_work(&self) -> bool {
+        if self.pagemap.is_none() || clear_soft_dirty_bits().is_err() {
+            return false;
+        }
+        let mut page = vec![0u8; self.page_size];
+        let before = self.dirty_pages(&page);
+        unsafe { ptr::write_volatile(page.as_mut_ptr(), 1) };
+        let after = self.dirty_pages(&page);
+        !before[0] && after[0]
+    }
+
+    /// Return the pages overlapping `data`.
+    fn page_range(&self, data: &[u8]) -> Range<usize> {
+        let start = data.as_ptr() as usize;
+        start / self.page_size..(start + data.len() + self.page_size - 1) / self.page_size
+    }
+
+    /// Return the byte ranges of `data` that lie in the selected pages, merging adjacent
+    /// pages.
+    fn byte_ranges(&self, data: &[u8], pages: &[bool]) -> Vec<Range<usize>> {
+        let start = data.as_ptr() as usize;
+        let first_page = self.page_range(data).start;
+        let mut ranges: Vec<Range<usize>> = Vec::new();
+        for (index, _) in pages.iter().enumerate().filter(|(_, selected)| **selected) {
+            let page_start = (first_page + index) * self.page_size;
+            let range_start = page_start.saturating_sub(start);
+            let range_end = (page_start + self.page_size - start).min(data.len());
+            match ranges.last_mut() {
+                Some(range) if range.end == range_start => range.end = range_end,
+                _ => ranges.push(range_start..range_end),
+            }
+        }
+        ranges
+    }
+
+    /// Return the pages of `data` that were written since soft-dirty bits were last cleared.
+    fn dirty_pages(&self, data: &[u8]) -> Vec<bool> {
+        let pages = self.page_range(data);
+        match &self.pagemap {
+            Some(pagemap) => {
+                let mut entries = vec![0; pages.len() * 8];
+                pagemap
+                    .read_exact_at(&mut entries, pages.start as u64 * 8)
+                    .expect("failed to read pagemap");
+                entries
+                    .chunks(8)
+                    .map(|entry| read_u64(entry, 0) & SOFT_DIRTY_BIT != 0)
+                    .collect()
+            }
+            None => vec![true; pages.len()],
+        }
+    }
+
+    fn mark_stale(&mut self, pages: &[bool]) {
+        self.children.retain(|child| child.upgrade().is_some());
+        for child in self.children.iter().filter_map(Weak::upgrade) {
+            for (stale, &changed) in child.stale_pages.borrow_mut().iter_mut().zip(pages) {
+                *stale |= changed;
+            }
+        }
+    }
+
+    /// Record the pages of the base slot that were written since the last flush as stale in
+    /// every child.
+    fn flush(&mut self, data: &[u8]) {
+        let dirty = self.dirty_pages(data);
+        self.mark_stale(&dirty);
+        if self.pagemap.is_some() {
+            clear_soft_dirty_bits().expect("failed to clear soft-dirty bits");
+        }
+    }
+}
+
+#[derive(Debug)]
+pub enum ForkSlot {
+    Base(SyntheticSlot),
+    /// Children are immutable, so backup slots holding the same state can share one.
+    Child(Option<Rc<SuspendedChild>>),
+}
+
+impl ForkSlot {
+    fn child(&self) -> &SuspendedChild {
+        match self {
+            Self::Base(_) => panic!("slot is a base slot"),
+            Self::Child(child) => child.as_ref().expect("slot is unallocated"),
+        }
+    }
+}
+
+#[derive(Debug)]
+pub struct ForkMemory {
+    inner: SyntheticMemory,
+    tracker: RefCell<PageTracker>,
+}
+
+impl ForkMemory {
+    /// Create the memory and its base slot, which starts at frame 0.
+    pub fn new(config: SyntheticConfig) -> (Self, ForkSlot) {
+        let (inner, base_slot) = SyntheticMemory::new(config);
+        let memory = Self {
+            inner,
+            tracker: RefCell::new(PageTracker::new()),
+        };
+        (memory, ForkSlot::Base(base_slot))
+    }
+
+    /// Return true if restores only copy changed pages, rather than the whole slot.
+    pub fn tracks_dirty_pages(&self) -> bool {
+        self.tracker.borrow().pagemap.is_some()
+    }
+
+    /// Return the process ids of the children that are alive.
+    pub fn child_pids(&self) -> Vec<libc::pid_t> {
+        self.tracker
+            .borrow()
+            .children
+            .iter()
+            .filter_map(Weak::upgrade)
+            .map(|child| child.pid)
+            .collect()
+    }
+
+    /// Return the frame counter stored in the slot.
+    pub fn frame_counter(&self, slot: &ForkSlot) -> u32 {
+        read_u32(&self.bytes(slot, 0, 4).unwrap(), 0)
+    }
+
+    /// Return a hash of the full contents of the slot.
+    pub fn checksum(&self, slot: &ForkSlot) -> u64 {
+        match slot {
+            ForkSlot::Base(slot) => self.inner.checksum(slot),
+            ForkSlot::Child(_) => checksum_bytes(&slot.child().read_all(self.inner.size())),
+        }
+    }
+
+    fn bytes(&self, slot: &ForkSlot, address: usize, size: usize) -> Result<Vec<u8>, Error> {
+        if address + size > self.inner.size() {
+            return Err(MemoryErrorCause::InvalidAddress.into());
+        }
+        Ok(match slot {
+            ForkSlot::Base(slot) => slot.data()[address..address + size].to_vec(),
+            ForkSlot::Child(_) => {
+                let mut bytes = vec![0; size];
+                slot.child().read_at(address, &mut bytes);
+                bytes
+            }
+        })
+    }
+
+    fn base_slot_mut<'a>(&self, slot: &'a mut ForkSlot) -> Result<&'a mut SyntheticSlot, Error> {
+        match slot {
+            ForkSlot::Base(slot) => Ok(slot),
+            ForkSlot::Child(_) => Err(MemoryErrorCause::NonBaseSlot {
+                slot: format!("{:?}", slot),
+            }
+            .into()),
+        }
+    }
+
+    /// Fork a child holding the contents of the base slot.
+    fn save(&self, base_slot: &SyntheticSlot) -> Rc<SuspendedChild> {
+        let data = base_slot.data();
+        let mut tracker = self.tracker.borrow_mut();
+        tracker.flush(data);
+        let num_pages = tracker.page_range(data).len();
+        let child = Rc::new(fork_child(data, num_pages));
+        tracker.children.push(Rc::downgrade(&child));
+        child
+    }
+
+    /// Copy the pages that differ from the child into the base slot.
+    fn restore(&self, base_slot: &mut SyntheticSlot, child: &SuspendedChild) -> usize {
+        let data = base_slot.data_mut();
+        assert_eq!(
+            data.as_ptr() as usize,
+            child.address,
+            "base slot has been reallocated"
+        );
+        let mut tracker = self.tracker.borrow_mut();
+        tracker.flush(data);
+
+        let num_pages = tracker.page_range(data).len();
+        let pages = child.stale_pages.replace(vec![false; num_pages]);
+        let ranges = tracker.byte_ranges(data, &pages);
+        let num_bytes = child.read_into(data, &ranges);
+
+        // The copied pages now differ from the other children. Clearing the soft-dirty bits
+        // again avoids marking them as stale in this child on the next flush
+        tracker.mark_stale(&pages);
+        *child.stale_pages.borrow_mut() = vec![false; num_pages];
+        if tracker.pagemap.is_some() {
+            clear_soft_dirty_bits().expect("failed to clear soft-dirty bits");
+        }
+        num_bytes
+    }
+
+    /// Return true if the child holds the same contents as the base slot.
+    fn child_equals(&self, child: &SuspendedChild, base_slot: &SyntheticSlot) -> bool {
+        let data = base_slot.data();
+        let mut tracker = self.tracker.borrow_mut();
+        tracker.flush(data);
+        let pages = child.stale_pages.borrow();
+        tracker.byte_ranges(data, &pages).into_iter().all(|range| {
+            let mut bytes = vec![0; range.len()];
+            child.read_at(range.start, &mut bytes);
+            bytes[..] == data[range]
+        })
+    }
+}
+
+impl Memory for ForkMemory {
+    type Slot = ForkSlot;
+    type StaticAddress = ();
+    type RelocatableAddress = usize;
+
+    fn read_slot_int(
+        &self,
+        slot: &Self::Slot,
+        address: &Self::RelocatableAddress,
+        int_type: IntType,
+    ) -> Result<IntValue, Error> {
+        Ok(decode_int(
+            &self.bytes(slot, *address, int_type.size())?,
+            int_type,
+        ))
+    }
+
+    fn read_slot_float(
+        &self,
+        slot: &Self::Slot,
+        address: &Self::RelocatableAddress,
+        float_type: FloatType,
+    ) -> Result<FloatValue, Error> {
+        Ok(match float_type {
+            FloatType::F32 => f32::from_bits(read_u32(&self.bytes(slot, *address, 4)?, 0)).into(),
+            FloatType::F64 => f64::from_bits(read_u64(&self.bytes(slot, *address, 8)?, 0)),
+        })
+    }
+
+    fn read_slot_address(
+        &self,
+        slot: &Self::Slot,
+        address: &Self::RelocatableAddress,
+    ) -> Result<Address, Error> {
+        Ok(Address(
+            read_u64(&self.bytes(slot, *address, 8)?, 0) as usize
+        ))
+    }
+
+    fn read_static_int(
+        &self,
+        address: &Self::StaticAddress,
+        int_type: IntType,
+    ) -> Result<IntValue, Error> {
+        self.inner.read_static_int(address, int_type)
+    }
+
+    fn read_static_float(
+        &self,
+        address: &Self::StaticAddress,
+        float_type: FloatType,
+    ) -> Result<FloatValue, Error> {
+        self.inner.read_static_float(address, float_type)
+    }
+
+    fn read_static_address(&self, address: &Self::StaticAddress) -> Result<Address, Error> {
+        self.inner.read_static_address(address)
+    }
+
+    fn write_slot_int(
+        &self,
+        slot: &mut Self::Slot,
+        address: &Self::RelocatableAddress,
+        int_type: IntType,
+        value: IntValue,
+    ) -> Result<(), Error> {
+        self.inner
+            .write_slot_int(self.base_slot_mut(slot)?, address, int_type, value)
+    }
+
+    fn write_slot_float(
+        &self,
+        slot: &mut Self::Slot,
+        address: &Self::RelocatableAddress,
+        float_type: FloatType,
+        value: FloatValue,
+    ) -> Result<(), Error> {
+        self.inner
+            .write_slot_float(self.base_slot_mut(slot)?, address, float_type, value)
+    }
+
+    fn write_slot_address(
+        &self,
+        slot: &mut Self::Slot,
+        address: &Self::RelocatableAddress,
+        value: &Address,
+    ) -> Result<(), Error> {
+        self.inner
+            .write_slot_address(self.base_slot_mut(slot)?, address, value)
+    }
+
+    fn classify_address(&self, address: &Address) -> ClassifiedAddress<Self> {
+        if address.0 < self.inner.size() {
+            ClassifiedAddress::Relocatable(address.0)
+        } else {
+            ClassifiedAddress::Invalid
+        }
+    }
+
+    fn id(&self) -> usize {
+        self.inner.id()
+    }
+
+    fn data_layout(&self) -> &DataLayout {
+        self.inner.data_layout()
+    }
+
+    fn data_layout_mut(&mut self) -> &mut DataLayout {
+        self.inner.data_layout_mut()
+    }
+
+    fn symbol_address(&self, symbol: &str) -> Result<Address, Error> {
+        self.inner.symbol_address(symbol)
+    }
+
+    fn data_path_cache(&self) -> &DataPathCache {
+        self.inner.data_path_cache()
+    }
+
+    fn create_backup_slot(&self) -> Result<Self::Slot, Error> {
+        Ok(ForkSlot::Child(None))
+    }
+
+    fn copy_slot(&self, dst: &mut Self::Slot, src: &Self::Slot) -> Result<usize, Error> {
+        Ok(match (dst, src) {
+            (ForkSlot::Child(dst), ForkSlot::Child(src)) => {
+                *dst = src.clone();
+                0
+            }
+            (ForkSlot::Child(dst), ForkSlot::Base(src)) => {
+                // Kill the previous child first so that it doesn't need to be tracked
+                *dst = None;
+                *dst = Some(self.save(src));
+                0
+            }
+            (ForkSlot::Base(dst), ForkSlot::Child(_)) => self.restore(dst, src.child()),
+            (ForkSlot::Base(dst), ForkSlot::Base(src)) => self.inner.copy_slot(dst, src)?,
+        })
+    }
+
+    fn slots_equal(&self, slot1: &Self::Slot, slot2: &Self::Slot) -> Result<bool, Error> {
+        Ok(match (slot1, slot2) {
+            (ForkSlot::Child(Some(child1)), ForkSlot::Child(Some(child2))) => {
+                Rc::ptr_eq(child1, child2)
+                    || child1.read_all(self.inner.size()) == child2.read_all(self.inner.size())
+            }
+            (ForkSlot::Child(Some(child)), ForkSlot::Base(base_slot))
+            | (ForkSlot::Base(base_slot), ForkSlot::Child(Some(child))) => {
+                self.child_equals(child, base_slot)
+            }
+            (ForkSlot::Base(slot1), ForkSlot::Base(slot2)) => {
+                self.inner.slots_equal(slot1, slot2)?
+            }
+            _ => false,
+        })
+    }
+
+    fn slot_bytes(&self, slot: &Self::Slot) -> Result<Option<Vec<u8>>, Error> {
+        match slot {
+            ForkSlot::Base(slot) => self.inner.slot_bytes(slot),
+            ForkSlot::Child(_) => Ok(Some(slot.child().read_all(self.inner.size()))),
+        }
+    }
+
+    fn load_slot_bytes(&self, slot: &mut Self::Slot, bytes: &[u8]) -> Result<bool, Error> {
+        match slot {
+            ForkSlot::Base(slot) => self.inner.load_slot_bytes(slot, bytes),
+            ForkSlot::Child(_) => Ok(false),
+        }
+    }
+
+    /// For a child, this estimates the pages that the kernel has copied since the fork.
+    fn slot_size(&self, slot: &Self::Slot) -> usize {
+        match slot {
+            ForkSlot::Base(slot) => self.inner.slot_size(slot),
+            ForkSlot::Child(Some(child)) => {
+                let page_size = self.tracker.borrow().page_size;
+                child
+                    .stale_pages
+                    .borrow()
+                    .iter()
+                    .filter(|stale| **stale)
+                    .count()
+                    * page_size
+            }
+            ForkSlot::Child(None) => 0,
+        }
+    }
+
+    fn advance_base_slot(&self, base_slot: &mut Self::Slot) -> Result<(), Error> {
+        self.inner.advance_base_slot(self.base_slot_mut(base_slot)?)
+    }
+}
+
+impl Controller<ForkMemory> for SyntheticController {
+    fn edit_prefix_hash(&self, frame: u32) -> Option<u64> {
+        Some(self.prefix_hash(frame))
+    }
+
+    fn apply(&self, state: &mut impl SlotStateMut<Memory = ForkMemory>) -> Result<(), Error> {
+        let frame = state.frame();
+        match state.slot_mut() {
+            ForkSlot::Base(slot) => self.apply_edits(frame, slot),
+            slot => {
+                return Err(MemoryErrorCause::NonBaseSlot {
+                    slot: format!("{:?}", slot),
+                }
+                .into())
+            }
+        }
+        Ok(())
+    }
+}
@@ -1,10 +1,26 @@
 //! The core abstraction for random access to frames in a simulation (rewinding etc).
 
+pub use cost_model::CostModel;
+pub use data_cache::DataCacheStats;
+pub use placement::PlacementPolicy;
+pub use slot_manager::{BranchId, Playback, SlotMode};
+pub use snapshot_store::{SnapshotStore, StableHasher};
 pub use state::*;
 pub use timeline_impl::*;
 
+#[cfg(test)]
+mod benchmarks;
+mod cost_model;
 mod data_cache;
+#[cfg(all(test, target_os = "linux"))]
+mod fork_memory;
+mod placement;
 mod slot_manager;
 mod slot_state_impl;
+mod snapshot_store;
 mod state;
+#[cfg(test)]
+pub(crate) mod synthetic_memory;
+#[cfg(test)]
+mod tests;
 mod timeline_impl;
@@ -0,0 +1,274 @@
+//! Strategies for choosing which frames to keep in backup slots.
+
+use super::cost_model::FrameCosts;
+use std::collections::BTreeMap;
+
+/// The weight of older requests is multiplied by this factor on each new request.
+const DECAY: f32 = 0.995;
+
+/// Requests are grouped into buckets of this many frames.
+///
+/// This smooths the histogram, since a request for a frame makes requests for nearby frames
+/// likely too.
+const BUCKET_SIZE: u32 = 32;
+
+/// The maximum number of buckets tracked by the histogram.
+const MAX_BUCKETS: usize = 2048;
+
+/// The fraction of the total weight that is spread evenly over every requested frame range.
+///
+/// This keeps some coverage for jumps to frames that haven't been requested recently.
+const UNIFORM_WEIGHT: f32 = 0.1;
+
+/// The weight given to each hotspot, as a fraction of the total request weight.
+const HOTSPOT_WEIGHT: f32 = 0.1;
+
+/// How backup slots are placed during `balance_distribution`.
+#[derive(Debug, Clone, Copy, PartialEq, Eq, Hash)]
+pub enum PlacementPolicy {
+    /// Keep slots at fixed alignments below each hotspot.
+    Alignment,
+    /// Keep slots where they save the most advances for recently requested frames.
+    Histogram,
+}
+
+/// A decayed histogram of requested frames.
+#[derive(Debug, Clone)]
+pub struct AccessHistogram {
+    /// Request weights per bucket, multiplied by `scale`.
+    buckets: BTreeMap<u32, Bucket>,
+    /// The sum of `weights`.
+    total_weight: f32,
+    /// The current weight of a new request.
+    ///
+    /// Growing this instead of decaying every entry keeps recording O(log n).
+    scale: f32,
+    /// A decayed average of the number of advances each request required.
+    mean_advances: f32,
+}
+
+#[derive(Debug, Clone, Copy)]
+struct Bucket {
+    weight: f32,
+    /// The lowest frame requested in the bucket.
+    min_frame: u32,
+}
+
+/// A snapshot of the histogram that can estimate the weight of requests in a frame range.
+struct Density<'a> {
+    buckets: &'a BTreeMap<u32, Bucket>,
+    scale: f32,
+    /// The weight per frame of the uniform component.
+    uniform: f32,
+    /// The end of the range covered by the uniform component.
+    horizon: u32,
+    /// Sorted hotspot frames.
+    hotspots: Vec<u32>,
+    hotspot_weight: f32,
+}
+
+impl<'a> Density<'a> {
+    /// Return the expected weight of requests for frames in `start..end`.
+    fn mass(&self, start: u32, end: u32) -> f32 {
+        if start >= end {
+            return 0.0;
+        }
+        let mut mass = 0.0;
+
+        // Requests are assumed to be spread evenly between min_frame and the end of the bucket
+        for (&index, bucket) in self
+            .buckets
+            .range(start / BUCKET_SIZE..=(end - 1) / BUCKET_SIZE)
+        {
+            let bucket_start = bucket.min_frame;
+            let bucket_end = (index + 1).saturating_mul(BUCKET_SIZE);
+            let overlap_start = bucket_start.max(start);
+            let overlap_end = bucket_end.min(end);
+            if overlap_start < overlap_end {
+                let fraction =
+                    (overlap_end - overlap_start) as f32 / (bucket_end - bucket_start) as f32;
+                mass += bucket.weight / self.scale * fraction;
+            }
+        }
+
+        if start < self.horizon {
+            mass += self.uniform * (end.min(self.horizon) - start) as f32;
+        }
+
+        let num_hotspots = self
+            .hotspots
+            .iter()
+            .filter(|&&hotspot| hotspot >= start && hotspot < end)
+            .count();
+        mass + num_hotspots as f32 * self.hotspot_weight
+    }
+}
+
+impl AccessHistogram {
+    pub fn new() -> Self {
+        Self {
+            buckets: BTreeMap::new(),
+            total_weight: 0.0,
+            scale: 1.0,
+            mean_advances: 0.0,
+        }
+    }
+
+    /// Record a request for `frame` that took `advances` frame advances to satisfy.
+    pub fn record(&mut self, frame: u32, advances: usize) {
+        self.scale /= DECAY;
+        if self.scale > 1e6 {
+            for bucket in self.buckets.values_mut() {
+                bucket.weight /= self.scale;
+            }
+            self.total_weight /= self.scale;
+            self.scale = 1.0;
+        }
+        let bucket = self.buckets.entry(frame / BUCKET_SIZE).or_insert(Bucket {
+            weight: 0.0,
+            min_frame: frame,
+        });
+        bucket.weight += self.scale;
+        bucket.min_frame = bucket.min_frame.min(frame);
+        self.total_weight += self.scale;
+        self.mean_advances = DECAY * self.mean_advances + (1.0 - DECAY) * advances as f32;
+
+        if self.buckets.len() > MAX_BUCKETS {
+            self.prune();
+        }
+    }
+
+    /// Remove the lightest half of the buckets.
+    fn prune(&mut self) {
+        let mut weights: Vec<f32> = self.buckets.values().map(|bucket| bucket.weight).collect();
+        weights.sort_by(|a, b| a.partial_cmp(b).unwrap());
+        let threshold = weights[weights.len() / 2];
+        let light_buckets: Vec<u32> = self
+            .buckets
+            .iter()
+            .filter(|(_, bucket)| bucket.weight <= threshold)
+            .map(|(&index, _)| index)
+            .collect();
+        for index in light_buckets {
+            if let Some(bucket) = self.buckets.remove(&index) {
+                self.total_weight -= bucket.weight;
+            }
+        }
+    }
+
+    /// Return a decayed average of the number of advances per request.
+    pub fn mean_advances(&self) -> f32 {
+        self.mean_advances
+    }
+
+    fn density(&self, hotspots: &[u32]) -> Density<'_> {
+        let total_weight = self.total_weight / self.scale;
+        let horizon = hotspots
+            .iter()
+            .cloned()
+            .chain(
+                self.buckets
+                    .keys()
+                    .next_back()
+                    .map(|&index| index * BUCKET_SIZE),
+            )
+            .max()
+            .unwrap_or(0)
+            .saturating_add(BUCKET_SIZE);
+
+        let mut hotspots = hotspots.to_vec();
+        hotspots.sort_unstable();
+
+        Density {
+            buckets: &self.buckets,
+            scale: self.scale,
+            uniform: UNIFORM_WEIGHT * total_weight / horizon as f32,
+            horizon,
+            hotspots,
+            hotspot_weight: HOTSPOT_WEIGHT * total_weight.max(1.0),
+        }
+    }
+
+    /// Find the frame that would save the most expected advances if a slot were placed there.
+    ///
+    /// `checkpoints` should be the sorted, deduplicated frames that already have a slot,
+    /// including frame 0. Advances are weighted by their measured cost in `frame_costs`.
+    /// Returns the frame and its expected saving.
+    pub fn best_checkpoint(
+        &self,
+        checkpoints: &[u32],
+        hotspots: &[u32],
+        frame_costs: &FrameCosts,
+    ) -> Option<(u32, f32)> {
+        let density = self.density(hotspots);
+        let mut best: Option<(u32, f32)> = None;
+
+        for (i, &prev) in checkpoints.iter().enumerate() {
+            let next = checkpoints
+                .get(i + 1)
+                .cloned()
+                .unwrap_or_else(|| density.horizon.max(prev + 1));
+
+            // Candidates are the first requested frame in each bucket, hotspots, the middle of
+            // the gap, and the frames right after expensive frames so that they don't need to
+            // be re-simulated
+            let mut candidates: Vec<u32> = self
+                .buckets
+                .range(prev / BUCKET_SIZE..=(next - 1) / BUCKET_SIZE)
+                .map(|(_, bucket)| bucket.min_frame)
+                .chain(density.hotspots.iter().cloned())
+                .chain(Some(prev + (next - prev) / 2))
+                .chain(
+                    frame_costs
+                        .expensive_frames(prev, next - 1)
+                        .map(|frame| frame + 1),
+                )
+                .filter(|&frame| frame > prev && frame < next)
+                .collect();
+            candidates.sort_unstable();
+            candidates.dedup();
+
+            // A checkpoint at c saves the advances from prev to c for every request in c..next
+            let mut end = next;
+            let mut suffix_mass = 0.0;
+            for &candidate in candidates.iter().rev() {
+                suffix_mass += density.mass(candidate, end);
+                end = candidate;
+                let saving = frame_costs.advances(prev, candidate) as f32 * suffix_mass;
+                if best.map_or(true, |(_, best_saving)| saving > best_saving) {
+                    best = Some((candidate, saving));
+                }
+            }
+        }
+        best
+    }
+
+    /// Return the expected advances that would be lost by removing the checkpoint at `frame`.
+    ///
+    /// `checkpoints` should be sorted and deduplicated, and contain `frame`.
+    pub fn checkpoint_value(
+        &self,
+        checkpoints: &[u32],
+        frame: u32,
+        hotspots: &[u32],
+        frame_costs: &FrameCosts,
+    ) -> f32 {
+        let index = match checkpoints.binary_search(&frame) {
+            Ok(index) if index > 0 => index,
+            _ => return 0.0,
+        };
+        let density = self.density(hotspots);
+        let prev = checkpoints[index - 1];
+        let next = checkpoints
+            .get(index + 1)
+            .cloned()
+            .unwrap_or_else(|| density.horizon.max(frame + 1));
+        frame_costs.advances(prev, frame) as f32 * density.mass(frame, next)
+    }
+}
+
+impl Default for AccessHistogram {
+    fn default() -> Self {
+        Self::new()
+    }
+}
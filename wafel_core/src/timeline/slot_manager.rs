@@ -1,16 +1,77 @@
 //! Implementation of timeline algorithm.
 
-use super::{slot_state_impl::SlotStateImpl, Controller, SlotState, SlotStateMut};
+use super::{
+    cost_model::{CostModel, FrameCosts},
+    placement::{AccessHistogram, PlacementPolicy},
+    slot_state_impl::SlotStateImpl,
+    snapshot_store::{SnapshotKey, SnapshotStore, StableHasher},
+    Controller, SlotState, SlotStateMut, State,
+};
 use crate::{error::Error, memory::Memory};
 use itertools::{iproduct, Itertools};
 use rand::seq::SliceRandom;
 use std::{
     cell::{RefCell, RefMut},
-    collections::{HashMap, HashSet},
-    iter,
+    collections::{BTreeSet, HashMap, HashSet},
+    hash::{Hash, Hasher},
+    iter, mem,
     time::{Duration, Instant},
 };
 
+/// Backup slots are only compressed against a reference slot at most this many frames away.
+const MAX_REFERENCE_DISTANCE: u32 = 3000;
+
+/// With `PlacementPolicy::Histogram`, a slot is only moved if the expected saving is at least
+/// this many times the value of its current frame.
+///
+/// This avoids spending advances on moving slots between frames of similar value.
+const MIN_SAVING_RATIO: f32 = 2.0;
+
+/// Snapshots are persisted for frames that are multiples of this interval.
+const SNAPSHOT_INTERVAL: u32 = 1000;
+
+/// A snapshot is only loaded if it saves at least this many advances over the nearest slot.
+const MIN_SNAPSHOT_SAVING: u32 = 100;
+
+/// The maximum number of snapshot frames to check on each request.
+const MAX_SNAPSHOT_PROBES: usize = 8;
+
+/// The maximum fraction of backup slots that `import_snapshots` may replace at once.
+const MAX_IMPORT_FRACTION: f32 = 0.5;
+
+/// A seek or an interrupted internal request keeps one checkpoint per this many frames that it
+/// passes, overwriting its previous checkpoint when it is closer than this.
+const CHECKPOINT_SPACING: u32 = 1000;
+
+/// During playback, backup slots are kept this far ahead of the playhead.
+const PREFETCH_SECONDS: f32 = 2.0;
+
+/// The maximum number of backup slots kept ahead of the playhead during playback.
+///
+/// At most half of the backup slots are used for this.
+const MAX_PREFETCH_SLOTS: usize = 16;
+
+/// During reverse playback, the frames behind the playhead are simulated in blocks of this
+/// many frames, and kept in a ring of twice as many slots.
+const REVERSE_BLOCK_FRAMES: u32 = 32;
+
+/// How the contents of backup slots are stored.
+#[derive(Debug, Clone, Copy, PartialEq, Eq, Hash)]
+pub enum SlotMode {
+    /// Each backup slot holds a full copy of the slot data.
+    Dense,
+    /// Backup slots are stored as a sparse diff against a nearby uncompressed backup slot
+    /// when possible.
+    ///
+    /// This allows many more backup slots to fit in the same amount of memory, at the cost
+    /// of always needing a copy to read from a backup slot.
+    Delta,
+}
+
+/// Identifies a branch of the timeline. See `SlotManager::fork`.
+#[derive(Debug, Clone, Copy, PartialEq, Eq, Hash, PartialOrd, Ord)]
+pub struct BranchId(pub usize);
+
 /// A slot and information about its current content.
 #[derive(Debug)]
 struct SlotWrapper<S> {
@@ -18,6 +79,8 @@ struct SlotWrapper<S> {
     slot: S,
     is_base: bool,
     frame: Frame,
+    /// The branch whose edits produced the slot's contents.
+    branch: BranchId,
 }
 
 #[derive(Debug, Clone, Copy, PartialEq, Eq, Hash)]
@@ -40,10 +103,190 @@ struct Slots<M: Memory> {
     power_on: SlotWrapper<M::Slot>,
     base: SlotWrapper<M::Slot>,
     backups: Vec<SlotWrapper<M::Slot>>,
+    /// Slots holding the frames just behind the playhead during reverse playback.
+    ///
+    /// These are only allocated while playing in reverse.
+    ring: Vec<SlotWrapper<M::Slot>>,
     /// Debug stat counting number of frame advances.
     num_advances: usize,
     /// Debug stat counting number of slot copies.
     num_copies: usize,
+    /// Debug stat counting number of bytes written by slot copies.
+    num_copied_bytes: usize,
+    /// The frames requested from outside the slot manager.
+    access_histogram: AccessHistogram,
+    /// Measured times of copies into the base slot and of frame advances.
+    cost_model: CostModel,
+    /// Measured advance time of each frame.
+    frame_costs: FrameCosts,
+    snapshots: Option<Snapshots>,
+    branches: Branches,
+}
+
+/// The branches of a timeline, and the frames on which pairs of branches share edits.
+#[derive(Debug)]
+struct Branches {
+    /// The branch whose controller is used to simulate frames.
+    current: BranchId,
+    ids: BTreeSet<BranchId>,
+    next_id: usize,
+    /// For each pair of branches, the first frame on which their edits may differ.
+    ///
+    /// A slot on an earlier frame is valid for both branches. Keys are ordered pairs.
+    divergences: HashMap<(BranchId, BranchId), u32>,
+}
+
+impl Branches {
+    fn new() -> Self {
+        Self {
+            current: BranchId(0),
+            ids: iter::once(BranchId(0)).collect(),
+            next_id: 1,
+            divergences: HashMap::new(),
+        }
+    }
+
+    fn divergence(&self, branch1: BranchId, branch2: BranchId) -> u32 {
+        if branch1 == branch2 {
+            u32::MAX
+        } else {
+            let key = (branch1.min(branch2), branch1.max(branch2));
+            self.divergences.get(&key).cloned().unwrap_or(0)
+        }
+    }
+
+    fn set_divergence(&mut self, branch1: BranchId, branch2: BranchId, frame: u32) {
+        let key = (branch1.min(branch2), branch1.max(branch2));
+        self.divergences.insert(key, frame);
+    }
+
+    /// Return the frame of a slot as seen by the current branch.
+    fn visible_frame<S>(&self, slot: &SlotWrapper<S>) -> Frame {
+        match slot.frame {
+            Frame::At(frame) if frame >= self.divergence(slot.branch, self.current) => {
+                Frame::Unknown
+            }
+            frame => frame,
+        }
+    }
+
+    /// Return false if the slot holds a state that only other branches can use, so the
+    /// current branch shouldn't overwrite it.
+    fn can_replace<S>(&self, slot: &SlotWrapper<S>) -> bool {
+        match slot.frame {
+            Frame::At(_) => self.visible_frame(slot) != Frame::Unknown,
+            _ => true,
+        }
+    }
+
+    /// Return a branch other than `branch` that shares its state on `frame`, if any.
+    fn sharing_branch(&self, branch: BranchId, frame: u32) -> Option<BranchId> {
+        self.ids
+            .iter()
+            .cloned()
+            .find(|&other| other != branch && frame < self.divergence(branch, other))
+    }
+
+    /// Add a branch that shares all frames with the current branch.
+    fn fork(&mut self) -> BranchId {
+        let branch = BranchId(self.next_id);
+        self.next_id += 1;
+        for other in self.ids.clone() {
+            let divergence = self.divergence(self.current, other);
+            self.set_divergence(branch, other, divergence);
+        }
+        self.ids.insert(branch);
+        branch
+    }
+
+    fn remove(&mut self, branch: BranchId) {
+        self.ids.remove(&branch);
+        self.divergences
+            .retain(|&(branch1, branch2), _| branch1 != branch && branch2 != branch);
+    }
+}
+
+/// A persistent snapshot store, and the namespace used for this manager's snapshots.
+#[derive(Debug)]
+struct Snapshots {
+    store: SnapshotStore,
+    namespace: u64,
+}
+
+/// Called with the state of the base slot on each frame that it is advanced to while loading
+/// a requested frame.
+pub type AdvanceObserver<'a, M> = dyn FnMut(&dyn State<Memory = M>) + 'a;
+
+/// A frame request that is being loaded over several calls to `SlotManager::seek`.
+#[derive(Debug, Clone, Copy)]
+struct Seek {
+    target: u32,
+    /// The frame that the seek began advancing from, once known.
+    start_frame: Option<u32>,
+    /// The number of advances performed so far.
+    advances: usize,
+    /// The backup slot holding the latest checkpoint saved by the seek, and its frame.
+    checkpoint: Option<(SlotIndex, u32)>,
+}
+
+/// A hint that frames are being played back in order, one at a time.
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub struct Playback {
+    /// The frame at the playhead.
+    pub frame: u32,
+    /// The playback rate, which is negative when playing in reverse.
+    pub frames_per_second: f32,
+}
+
+impl Playback {
+    /// Return the frames to keep in backup slots, in increasing order.
+    ///
+    /// These are evenly spaced, starting at or just behind the playhead and covering
+    /// `PREFETCH_SECONDS` of playback. A request near the playhead never needs more advances
+    /// than the spacing.
+    ///
+    /// In reverse, a quarter of the slots are instead spaced a whole window apart below it.
+    /// Each frame that enters the window can then be simulated from one of these, rather than
+    /// from a distant slot.
+    fn prefetch_frames(&self, num_backup_slots: usize) -> Vec<u32> {
+        let num_slots = MAX_PREFETCH_SLOTS.min(num_backup_slots / 2) as u32;
+        if num_slots == 0 {
+            return Vec::new();
+        }
+        let reverse = self.frames_per_second < 0.0;
+        let num_coarse_slots = if reverse { num_slots / 4 } else { 0 };
+        let num_fine_slots = num_slots - num_coarse_slots;
+
+        let window = (self.frames_per_second.abs() * PREFETCH_SECONDS).ceil() as u32;
+        let spacing = ((window + num_fine_slots - 1) / num_fine_slots).max(1);
+        let start = self.frame - self.frame % spacing;
+
+        if reverse {
+            let coarse_spacing = spacing * num_fine_slots;
+            let coarse_start = self.frame - self.frame % coarse_spacing;
+            let fine_frames =
+                (0..num_fine_slots).filter_map(|index| start.checked_sub(index * spacing));
+            let coarse_frames = (1..=num_coarse_slots)
+                .filter_map(|index| coarse_start.checked_sub(index * coarse_spacing));
+            fine_frames.chain(coarse_frames).sorted().dedup().collect()
+        } else {
+            (0..num_fine_slots)
+                .map(|index| start + index * spacing)
+                .collect()
+        }
+    }
+
+    /// Return the frames that will be played next, nearest first.
+    pub fn upcoming_frames(&self, seconds: f32) -> Vec<u32> {
+        let count = (self.frames_per_second.abs() * seconds).ceil() as u32;
+        if self.frames_per_second < 0.0 {
+            (1..=count.min(self.frame))
+                .map(|offset| self.frame - offset)
+                .collect()
+        } else {
+            (1..=count).map(|offset| self.frame + offset).collect()
+        }
+    }
 }
 
 #[derive(Debug, Clone, Copy, PartialEq, Eq, Hash)]
@@ -51,6 +294,19 @@ enum SlotIndex {
     PowerOn,
     Base,
     Backup(usize),
+    Ring(usize),
+}
+
+impl SlotIndex {
+    /// Return the index of the same slot after the backup slot at `removed` is removed, or
+    /// None if this is the removed slot.
+    fn after_removing_backup(self, removed: usize) -> Option<Self> {
+        match self {
+            Self::Backup(index) if index == removed => None,
+            Self::Backup(index) if index > removed => Some(Self::Backup(index - 1)),
+            _ => Some(self),
+        }
+    }
 }
 
 impl<M: Memory> Slots<M> {
@@ -59,6 +315,7 @@ impl<M: Memory> Slots<M> {
             SlotIndex::PowerOn => &self.power_on,
             SlotIndex::Base => &self.base,
             SlotIndex::Backup(index) => &self.backups[index],
+            SlotIndex::Ring(index) => &self.ring[index],
         }
     }
 
@@ -67,6 +324,7 @@ impl<M: Memory> Slots<M> {
             SlotIndex::PowerOn => &mut self.power_on,
             SlotIndex::Base => &mut self.base,
             SlotIndex::Backup(index) => &mut self.backups[index],
+            SlotIndex::Ring(index) => &mut self.ring[index],
         }
     }
 
@@ -74,12 +332,61 @@ impl<M: Memory> Slots<M> {
     fn iter(&self) -> impl Iterator<Item = &SlotWrapper<M::Slot>> {
         iter::once(&self.base)
             .chain(self.backups.iter())
+            .chain(self.ring.iter())
             .chain(iter::once(&self.power_on))
     }
 
     /// Return an iterator over all mutable slots, i.e. excluding the power-on slot.
     fn iter_mut(&mut self) -> impl Iterator<Item = &mut SlotWrapper<M::Slot>> {
-        iter::once(&mut self.base).chain(self.backups.iter_mut())
+        iter::once(&mut self.base)
+            .chain(self.backups.iter_mut())
+            .chain(self.ring.iter_mut())
+    }
+
+    fn add_backup(&mut self, slot: M::Slot) {
+        self.backups.push(SlotWrapper {
+            index: SlotIndex::Backup(self.backups.len()),
+            slot,
+            is_base: false,
+            frame: Frame::Unknown,
+            branch: self.branches.current,
+        });
+    }
+
+    /// Remove a backup slot, shifting the indices of later backup slots.
+    ///
+    /// Any `SlotIndex` that is kept outside of `Slots` must be updated using
+    /// `SlotIndex::after_removing_backup`.
+    fn remove_backup(&mut self, index: usize) -> SlotWrapper<M::Slot> {
+        let slot = self.backups.remove(index);
+        for (index, slot) in self.backups.iter_mut().enumerate().skip(index) {
+            slot.index = SlotIndex::Backup(index);
+        }
+        slot
+    }
+
+    /// Prepare for an edit to the current branch that affects frames at or after `frame`.
+    ///
+    /// Slots of the current branch at or after `frame` that are also valid for another
+    /// branch are handed over to it, and the current branch stops sharing those frames.
+    fn diverge(&mut self, frame: u32) {
+        let branches = &mut self.branches;
+        for slot in iter::once(&mut self.base)
+            .chain(self.backups.iter_mut())
+            .chain(self.ring.iter_mut())
+        {
+            if let Frame::At(slot_frame) = slot.frame {
+                if slot.branch == branches.current && slot_frame >= frame {
+                    if let Some(other) = branches.sharing_branch(branches.current, slot_frame) {
+                        slot.branch = other;
+                    }
+                }
+            }
+        }
+        for other in branches.ids.clone() {
+            let divergence = branches.divergence(branches.current, other);
+            branches.set_divergence(branches.current, other, divergence.min(frame));
+        }
     }
 }
 
@@ -97,13 +404,99 @@ fn copy_slot<M: Memory>(
             (dst, src)
         };
 
-        memory.copy_slot(&mut dst.slot, &src.slot)?;
+        let start_time = Instant::now();
+        let num_bytes = memory.copy_slot(&mut dst.slot, &src.slot)?;
         dst.frame = src.frame;
+        dst.branch = src.branch;
+        if dst.is_base {
+            slots.cost_model.record_copy(start_time.elapsed());
+        }
         slots.num_copies = slots.num_copies.wrapping_add(1);
+        slots.num_copied_bytes = slots.num_copied_bytes.wrapping_add(num_bytes);
+    }
+    Ok(())
+}
+
+/// Compress a backup slot against the nearest uncompressed backup slot, if there is one
+/// close enough.
+fn compress_slot<M: Memory>(
+    memory: &M,
+    slots: &mut Slots<M>,
+    index: SlotIndex,
+) -> Result<(), Error> {
+    let frame = match slots.get(index).frame {
+        Frame::At(frame) => frame,
+        _ => return Ok(()),
+    };
+
+    let reference_index = slots
+        .backups
+        .iter()
+        .filter(|slot| slot.index != index && !memory.is_slot_compressed(&slot.slot))
+        .filter_map(|slot| match slot.frame {
+            Frame::At(slot_frame) => Some((slot.index, frame_distance(slot_frame, frame))),
+            _ => None,
+        })
+        .filter(|&(_, distance)| distance <= MAX_REFERENCE_DISTANCE)
+        .min_by_key(|&(_, distance)| distance)
+        .map(|(index, _)| index);
+
+    if let Some(reference_index) = reference_index {
+        let (slot, reference) = unsafe {
+            let reference = slots.get(reference_index) as *const _;
+            let slot = slots.get_mut(index);
+            let reference: &SlotWrapper<_> = &*reference;
+            (slot, reference)
+        };
+        memory.compress_slot(&mut slot.slot, &reference.slot)?;
     }
     Ok(())
 }
 
+/// Return the position of the backup slot that is least likely to be useful, other than
+/// `keep`.
+///
+/// Empty slots are chosen first, followed by the slot farthest from any hotspot.
+fn least_useful_backup<S>(
+    backups: &[SlotWrapper<S>],
+    hotspots: &HashMap<String, u32>,
+    keep: Option<SlotIndex>,
+) -> Option<usize> {
+    backups
+        .iter()
+        .enumerate()
+        .filter(|(_, slot)| Some(slot.index) != keep)
+        .max_by_key(|(_, slot)| match slot.frame {
+            Frame::At(frame) => hotspots
+                .values()
+                .map(|&hotspot| frame_distance(frame, hotspot))
+                .min()
+                .unwrap_or(0),
+            _ => u32::MAX,
+        })
+        .map(|(index, _)| index)
+}
+
+/// Return true if the slot holds one of the frames kept for playback.
+fn is_prefetched<S>(
+    branches: &Branches,
+    slot: &SlotWrapper<S>,
+    prefetch_frames: &HashSet<u32>,
+) -> bool {
+    match branches.visible_frame(slot) {
+        Frame::At(frame) => prefetch_frames.contains(&frame),
+        _ => false,
+    }
+}
+
+fn frame_distance(frame1: u32, frame2: u32) -> u32 {
+    if frame1 > frame2 {
+        frame1 - frame2
+    } else {
+        frame2 - frame1
+    }
+}
+
 /// Advance the base slot's frame and apply controller edits.
 ///
 /// The base slot's frame must not equal Frame::Unknown.
@@ -113,6 +506,7 @@ fn advance_frame<M: Memory, C: Controller<M>>(
     slots: &mut Slots<M>,
 ) -> Result<(), Error> {
     let base = &mut slots.base;
+    let start_time = Instant::now();
 
     let new_frame;
     match base.frame {
@@ -128,24 +522,134 @@ fn advance_frame<M: Memory, C: Controller<M>>(
     };
 
     base.frame = Frame::At(new_frame);
+    base.branch = slots.branches.current;
     controller.apply(&mut SlotStateImpl {
         memory,
         frame: new_frame,
         slot: &mut base.slot,
     })?;
 
+    if new_frame > 0 {
+        let time = start_time.elapsed();
+        slots.cost_model.record_advance(time);
+        slots.frame_costs.record(new_frame, time);
+    }
+    if new_frame > 0 && new_frame % SNAPSHOT_INTERVAL == 0 {
+        save_snapshot(memory, controller, slots, new_frame)?;
+    }
     Ok(())
 }
 
+/// Persist the base slot, which must be at `frame`, if it isn't already stored.
+fn save_snapshot<M: Memory, C: Controller<M>>(
+    memory: &M,
+    controller: &C,
+    slots: &mut Slots<M>,
+    frame: u32,
+) -> Result<(), Error> {
+    let snapshots = match &mut slots.snapshots {
+        Some(snapshots) => snapshots,
+        None => return Ok(()),
+    };
+    let edit_hash = match controller.edit_prefix_hash(frame) {
+        Some(edit_hash) => edit_hash,
+        None => return Ok(()),
+    };
+    let key = SnapshotKey {
+        namespace: snapshots.namespace,
+        frame,
+        edit_hash,
+    };
+    if !snapshots.store.contains(&key) {
+        if let Some(bytes) = memory.slot_bytes(&slots.base.slot)? {
+            // The store is only a cache, so failing to write to it is ignored
+            let _ = snapshots.store.write(key, &bytes);
+        }
+    }
+    Ok(())
+}
+
+/// Load the latest persisted snapshot at or before `requested_frame` into the base slot.
+///
+/// Only snapshots that save enough advances compared to starting from `nearest_frame` are
+/// considered. Returns false if no snapshot was loaded.
+fn load_snapshot<M: Memory, C: Controller<M>>(
+    memory: &M,
+    controller: &C,
+    slots: &mut Slots<M>,
+    nearest_frame: u32,
+    requested_frame: u32,
+) -> Result<bool, Error> {
+    let snapshots = match &mut slots.snapshots {
+        Some(snapshots) => snapshots,
+        None => return Ok(false),
+    };
+
+    let mut frame = requested_frame - requested_frame % SNAPSHOT_INTERVAL;
+    for _ in 0..MAX_SNAPSHOT_PROBES {
+        if frame == 0 || frame < nearest_frame.saturating_add(MIN_SNAPSHOT_SAVING) {
+            break;
+        }
+        let edit_hash = match controller.edit_prefix_hash(frame) {
+            Some(edit_hash) => edit_hash,
+            None => break,
+        };
+        let key = SnapshotKey {
+            namespace: snapshots.namespace,
+            frame,
+            edit_hash,
+        };
+        // Read errors are treated as a missing snapshot
+        if let Ok(Some(bytes)) = snapshots.store.read(&key) {
+            if memory.load_slot_bytes(&mut slots.base.slot, &bytes)? {
+                slots.base.frame = Frame::At(frame);
+                slots.base.branch = slots.branches.current;
+                return Ok(true);
+            }
+        }
+        frame -= SNAPSHOT_INTERVAL;
+    }
+    Ok(false)
+}
+
 fn request_frame<M: Memory, C: Controller<M>>(
     memory: &M,
     controller: &C,
     slots: &mut Slots<M>,
     requested_frame: u32,
     require_base: bool,
+    observer: &mut AdvanceObserver<'_, M>,
 ) -> Result<SlotIndex, Error> {
-    // Function to compute the number of copies and updates that would be required to reach
-    // the requested frame from a given slot
+    let slot_index = request_frame_until(
+        memory,
+        controller,
+        slots,
+        requested_frame,
+        require_base,
+        None,
+        observer,
+    )?;
+    Ok(slot_index.expect("request without deadline was interrupted"))
+}
+
+/// Load the requested frame, giving up once `deadline` has passed.
+///
+/// Returns None if the deadline was reached first, leaving the base slot part of the way
+/// there. At least one frame is advanced before giving up so that repeated calls make
+/// progress.
+///
+/// `observer` is called on each frame that the base slot is advanced to.
+fn request_frame_until<M: Memory, C: Controller<M>>(
+    memory: &M,
+    controller: &C,
+    slots: &mut Slots<M>,
+    requested_frame: u32,
+    require_base: bool,
+    deadline: Option<Instant>,
+    observer: &mut AdvanceObserver<'_, M>,
+) -> Result<Option<SlotIndex>, Error> {
+    // Function to compute the number of copies that would be required to reach the requested
+    // frame from a given slot, and the frame to advance from
     let work_from = |slot: &SlotWrapper<M::Slot>| -> (u32, u32) {
         let slot_frame = match slot.frame {
             Frame::At(frame) => frame,
@@ -153,62 +657,122 @@ fn request_frame<M: Memory, C: Controller<M>>(
             Frame::Unknown => unimplemented!(),
         };
         if slot_frame == requested_frame {
-            return (0, 0);
+            return (0, requested_frame);
         }
         let copies = if slot.is_base { 0 } else { 1 };
         assert!(slot_frame <= requested_frame);
-        let updates = requested_frame - slot_frame;
-        (copies, updates)
+        (copies, slot_frame)
     };
 
-    // Computes an approximate time cost of updating a slot to the requested frame
-    let cost_from = |slot: &SlotWrapper<M::Slot>| -> u32 {
-        let (copies, updates) = work_from(slot);
-        10 * copies + updates
+    // Computes an approximate time cost of updating a slot to the requested frame, measured
+    // in average frame advances
+    let copy_cost = slots.cost_model.copy_cost();
+    let frame_costs = &slots.frame_costs;
+    let cost_from = |slot: &SlotWrapper<M::Slot>| -> f64 {
+        let (copies, slot_frame) = work_from(slot);
+        copy_cost * copies as f64 + frame_costs.advances(slot_frame, requested_frame)
     };
 
     // Find the slot with the lowest cost
+    let branches = &slots.branches;
     let nearest_slot: &SlotWrapper<M::Slot> = slots
         .iter()
-        .filter(|slot| match slot.frame {
+        .filter(|slot| match branches.visible_frame(slot) {
             Frame::At(frame) => frame <= requested_frame,
             Frame::PowerOn => true,
             Frame::Unknown => false,
         })
-        .min_by_key(|slot| cost_from(slot))
+        .min_by(|slot1, slot2| cost_from(slot1).partial_cmp(&cost_from(slot2)).unwrap())
         .unwrap(); // power_on_slot is always included
 
     // Fast path (avoids a copy when nearest_slot is not the base slot)
-    let use_nearest_slot =
-        nearest_slot.frame == Frame::At(requested_frame) && (!require_base || nearest_slot.is_base);
+    let use_nearest_slot = nearest_slot.frame == Frame::At(requested_frame)
+        && (!require_base || nearest_slot.is_base)
+        && !memory.is_slot_compressed(&nearest_slot.slot);
 
     let result_slot = if use_nearest_slot {
         nearest_slot
     } else {
-        // Copy to base slot
+        // Copy to base slot, or load a persisted snapshot if it is closer
         let nearest_slot_index = nearest_slot.index;
-        copy_slot(memory, slots, SlotIndex::Base, nearest_slot_index)?;
+        let nearest_frame = match nearest_slot.frame {
+            Frame::At(frame) => frame,
+            _ => 0,
+        };
+        if !load_snapshot(memory, controller, slots, nearest_frame, requested_frame)? {
+            copy_slot(memory, slots, SlotIndex::Base, nearest_slot_index)?;
+        }
 
         // Advance base slot to requested frame
         while slots.base.frame != Frame::At(requested_frame) {
             advance_frame(memory, controller, slots)?;
+            if let Frame::At(frame) = slots.base.frame {
+                observer(&SlotStateImpl {
+                    memory,
+                    frame,
+                    slot: &mut slots.base.slot,
+                });
+            }
+            if slots.base.frame != Frame::At(requested_frame)
+                && deadline.map_or(false, |deadline| Instant::now() >= deadline)
+            {
+                return Ok(None);
+            }
         }
         &slots.base
     };
 
-    Ok(result_slot.index)
+    Ok(Some(result_slot.index))
+}
+
+/// Call `request_frame` and record the request in the access histogram.
+fn request_recorded_frame<M: Memory, C: Controller<M>>(
+    memory: &M,
+    controller: &C,
+    slots: &mut Slots<M>,
+    requested_frame: u32,
+    require_base: bool,
+    observer: &mut AdvanceObserver<'_, M>,
+) -> Result<SlotIndex, Error> {
+    let num_advances = slots.num_advances;
+    let slot_index = request_frame(
+        memory,
+        controller,
+        slots,
+        requested_frame,
+        require_base,
+        observer,
+    )?;
+    let advances = slots.num_advances.wrapping_sub(num_advances);
+    slots.access_histogram.record(requested_frame, advances);
+    Ok(slot_index)
 }
 
 #[derive(Debug)]
 pub struct SlotManager<M: Memory, C: Controller<M>> {
     memory: M,
+    /// The controller of the current branch.
     controller: C,
+    /// The controllers of the other branches.
+    parked_controllers: HashMap<BranchId, C>,
     /// The slots that are owned by this manager.
     ///
     /// Since conceptually these are mostly used a cache of the state on various frames,
     /// we use interior mutability.
     slots: RefCell<Slots<M>>,
     hotspots: HashMap<String, u32>,
+    slot_mode: SlotMode,
+    /// If set, the number of backup slots is adjusted to fit this many bytes.
+    memory_budget: Option<usize>,
+    placement_policy: PlacementPolicy,
+    seek: Option<Seek>,
+    /// The target of the last seek that was recorded in the access histogram.
+    recorded_seek_target: Option<u32>,
+    playback: Option<Playback>,
+    /// The backup slots that were filled for the current playback.
+    playback_slots: HashSet<SlotIndex>,
+    /// The latest checkpoint saved by an interrupted internal request, and its frame.
+    placement_checkpoint: Option<(SlotIndex, u32)>,
 }
 
 impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
@@ -217,12 +781,14 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
         base_slot: M::Slot,
         controller: C,
         num_backup_slots: usize,
+        slot_mode: SlotMode,
     ) -> Result<Self, Error> {
         let base_slot = SlotWrapper {
             index: SlotIndex::Base,
             slot: base_slot,
             is_base: true,
             frame: Frame::PowerOn,
+            branch: BranchId(0),
         };
 
         let mut power_on_slot = SlotWrapper {
@@ -230,6 +796,7 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
             slot: memory.create_backup_slot()?,
             is_base: false,
             frame: Frame::PowerOn,
+            branch: BranchId(0),
         };
         memory.copy_slot(&mut power_on_slot.slot, &base_slot.slot)?;
 
@@ -243,6 +810,7 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
                 slot,
                 is_base: false,
                 frame: Frame::Unknown,
+                branch: BranchId(0),
             })
             .collect();
 
@@ -253,10 +821,26 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
                 power_on: power_on_slot,
                 base: base_slot,
                 backups: backup_slots,
+                ring: Vec::new(),
                 num_advances: 0,
                 num_copies: 0,
+                num_copied_bytes: 0,
+                access_histogram: AccessHistogram::new(),
+                cost_model: CostModel::new(),
+                frame_costs: FrameCosts::new(),
+                snapshots: None,
+                branches: Branches::new(),
             }),
+            parked_controllers: HashMap::new(),
             hotspots: HashMap::new(),
+            slot_mode,
+            memory_budget: None,
+            placement_policy: PlacementPolicy::Histogram,
+            seek: None,
+            recorded_seek_target: None,
+            playback: None,
+            playback_slots: HashSet::new(),
+            placement_checkpoint: None,
         })
     }
 
@@ -271,22 +855,32 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
         Ok((self.memory, base_slot, self.controller))
     }
 
+    /// Borrow a slot at `frame`, recording the request in the access histogram if `record` is
+    /// true.
     fn borrow_slot_state<'a>(
         &'a self,
         frame: u32,
         require_base: bool,
+        record: bool,
+        observer: &mut AdvanceObserver<'_, M>,
     ) -> Result<impl SlotState<Memory = M> + 'a, Error> {
         let mut slots = self
             .slots
             .try_borrow_mut()
             .expect("only one state can be requested at a time");
 
-        let slot_index = request_frame(
+        let request = if record {
+            request_recorded_frame
+        } else {
+            request_frame
+        };
+        let slot_index = request(
             &self.memory,
             &self.controller,
             &mut slots,
             frame,
             require_base,
+            observer,
         )?;
         let slot = RefMut::map(slots, |slots| {
             let slot_wrapper = slots.get_mut(slot_index);
@@ -309,7 +903,14 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
     ) -> Result<impl SlotStateMut<Memory = M> + 'a, Error> {
         let slots = self.slots.get_mut();
 
-        let slot_index = request_frame(&self.memory, &self.controller, slots, frame, require_base)?;
+        let slot_index = request_recorded_frame(
+            &self.memory,
+            &self.controller,
+            slots,
+            frame,
+            require_base,
+            &mut |_| {},
+        )?;
 
         let slot_wrapper = slots.get_mut(slot_index);
         assert!(slot_wrapper.frame == Frame::At(frame));
@@ -326,11 +927,32 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
     }
 
     pub fn frame<'a>(&'a self, frame: u32) -> Result<impl SlotState<Memory = M> + 'a, Error> {
-        self.borrow_slot_state(frame, false)
+        self.borrow_slot_state(frame, false, true, &mut |_| {})
+    }
+
+    /// Request a frame, calling `observer` on each frame that is advanced through on the way.
+    pub fn frame_observed<'a>(
+        &'a self,
+        frame: u32,
+        observer: &mut AdvanceObserver<'_, M>,
+    ) -> Result<impl SlotState<Memory = M> + 'a, Error> {
+        self.borrow_slot_state(frame, false, true, observer)
+    }
+
+    /// Request a frame for internal use, e.g. prefetching, without recording it in the access
+    /// histogram.
+    ///
+    /// `observer` is called on each frame that is advanced through on the way.
+    pub fn prefetch_frame_observed<'a>(
+        &'a self,
+        frame: u32,
+        observer: &mut AdvanceObserver<'_, M>,
+    ) -> Result<impl SlotState<Memory = M> + 'a, Error> {
+        self.borrow_slot_state(frame, false, false, observer)
     }
 
     pub fn base_slot<'a>(&'a self, frame: u32) -> Result<impl SlotState<Memory = M> + 'a, Error> {
-        self.borrow_slot_state(frame, true)
+        self.borrow_slot_state(frame, true, true, &mut |_| {})
     }
 
     pub fn base_slot_mut<'a>(
@@ -340,11 +962,343 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
         self.slot_state_mut(frame, true)
     }
 
+    /// Advance toward `frame` for roughly `max_run_time`, returning true once it is loaded.
+    ///
+    /// This allows loading a distant frame over several calls without blocking for the whole
+    /// time. Calling with a different frame retargets the seek. Progress is saved to backup
+    /// slots between calls, so it isn't lost if the seek is cancelled or the base slot is
+    /// used for other requests in the meantime.
+    ///
+    /// `observer` is called on each frame that is advanced through.
+    pub fn seek(
+        &mut self,
+        frame: u32,
+        max_run_time: Duration,
+        observer: &mut AdvanceObserver<'_, M>,
+    ) -> Result<bool, Error> {
+        let deadline = Instant::now() + max_run_time;
+        let mut seek = match self.seek {
+            Some(seek) if seek.target == frame => seek,
+            _ => Seek {
+                target: frame,
+                start_frame: None,
+                advances: 0,
+                checkpoint: None,
+            },
+        };
+
+        let slots = self.slots.get_mut();
+        let num_advances = slots.num_advances;
+        let slot_index = request_frame_until(
+            &self.memory,
+            &self.controller,
+            slots,
+            frame,
+            false,
+            Some(deadline),
+            observer,
+        )?;
+        let advances = slots.num_advances.wrapping_sub(num_advances);
+        seek.advances += advances;
+
+        if slot_index.is_some() {
+            // Seeking the frame that is already being viewed isn't new demand, so each target
+            // is only recorded once, and only if it had to be advanced to
+            if seek.advances > 0 && self.recorded_seek_target != Some(frame) {
+                slots.access_histogram.record(frame, seek.advances);
+                self.recorded_seek_target = Some(frame);
+            }
+            self.seek = None;
+            return Ok(true);
+        }
+
+        let base_frame = match slots.base.frame {
+            Frame::At(frame) => frame,
+            _ => 0,
+        };
+        if seek.start_frame.is_none() {
+            seek.start_frame = Some(base_frame.saturating_sub(advances as u32));
+        }
+        self.save_checkpoint(&mut seek.checkpoint, seek.target, base_frame)?;
+        self.seek = Some(seek);
+        Ok(false)
+    }
+
+    /// Copy the base slot, which is at `frame` on the way to `target`, into a backup slot.
+    ///
+    /// `checkpoint` holds the previous checkpoint on the way to `target`, which is overwritten
+    /// if it is still valid and closer than `CHECKPOINT_SPACING`.
+    fn save_checkpoint(
+        &mut self,
+        checkpoint: &mut Option<(SlotIndex, u32)>,
+        target: u32,
+        frame: u32,
+    ) -> Result<(), Error> {
+        let slots = self.slots.get_mut();
+        let branches = &slots.branches;
+
+        let previous_checkpoint = checkpoint.filter(|&(index, checkpoint_frame)| {
+            branches.visible_frame(slots.get(index)) == Frame::At(checkpoint_frame)
+                && frame_distance(frame, checkpoint_frame) < CHECKPOINT_SPACING
+        });
+        let dest_slot = match previous_checkpoint {
+            Some((index, _)) => Some(index),
+            None => {
+                // Otherwise replace the slot farthest from the hotspots and the target
+                let targets: Vec<u32> = self
+                    .hotspots
+                    .values()
+                    .cloned()
+                    .chain(iter::once(target))
+                    .collect();
+                slots
+                    .backups
+                    .iter()
+                    .filter(|slot| branches.can_replace(slot))
+                    .max_by_key(|slot| match branches.visible_frame(slot) {
+                        Frame::At(slot_frame) => targets
+                            .iter()
+                            .map(|&target| frame_distance(slot_frame, target))
+                            .min()
+                            .unwrap_or(0),
+                        _ => u32::MAX,
+                    })
+                    .map(|slot| slot.index)
+            }
+        };
+
+        if let Some(dest_slot) = dest_slot {
+            self.fill_slot(dest_slot, SlotIndex::Base)?;
+            *checkpoint = Some((dest_slot, frame));
+        }
+        Ok(())
+    }
+
+    /// Return the target frame of the seek in progress and the fraction of the way there.
+    pub fn seek_progress(&self) -> Option<(u32, f32)> {
+        let seek = self.seek?;
+        let start_frame = seek.start_frame.unwrap_or(seek.target);
+        let progress = match self.slots.borrow().base.frame {
+            Frame::At(frame) if seek.target > start_frame && frame >= start_frame => {
+                ((frame - start_frame) as f32 / (seek.target - start_frame) as f32).min(1.0)
+            }
+            _ => 0.0,
+        };
+        Some((seek.target, progress))
+    }
+
+    /// Stop the seek in progress.
+    ///
+    /// Checkpoints saved by the seek are kept.
+    pub fn cancel_seek(&mut self) {
+        self.seek = None;
+    }
+
     /// Perform housekeeping to keep the hotspots fast to scroll near.
+    ///
+    /// During playback, the frames ahead of the playhead are loaded first.
+    ///
+    /// Slots aren't moved while a seek is in progress, since placing them near a hotspot on
+    /// the seek target would block until the seek finishes.
     pub fn balance_distribution(&mut self, max_run_time: Duration) -> Result<(), Error> {
+        let start_time = Instant::now();
+        self.fit_memory_budget()?;
+        if self.seek.is_some() {
+            return Ok(());
+        }
+        self.fill_reverse_ring(start_time, max_run_time)?;
+        self.place_for_playback(start_time, max_run_time)?;
+        match self.placement_policy {
+            PlacementPolicy::Alignment => self.place_by_alignment(start_time, max_run_time),
+            PlacementPolicy::Histogram => self.place_by_histogram(start_time, max_run_time),
+        }
+    }
+
+    /// Return the frames that are kept in backup slots for the current playback.
+    fn prefetch_frames(&self) -> HashSet<u32> {
+        match self.playback {
+            Some(playback) => playback
+                .prefetch_frames(self.num_backup_slots())
+                .into_iter()
+                .collect(),
+            None => HashSet::new(),
+        }
+    }
+
+    /// Load the frames ahead of the playhead into backup slots.
+    ///
+    /// The frames are loaded in increasing order, so that each one can be advanced to from
+    /// the last. Slots that the playhead has moved past are reused first, so that playback
+    /// doesn't evict the slots placed for the other hotspots.
+    fn place_for_playback(
+        &mut self,
+        start_time: Instant,
+        max_run_time: Duration,
+    ) -> Result<(), Error> {
+        let deadline = start_time + max_run_time;
+        let prefetch_frames = self.prefetch_frames();
+
+        for &target_frame in prefetch_frames.iter().sorted() {
+            if start_time.elapsed() > max_run_time {
+                break;
+            }
+
+            let slots = self.slots.get_mut();
+            let branches = &slots.branches;
+            if slots
+                .backups
+                .iter()
+                .any(|slot| branches.visible_frame(slot) == Frame::At(target_frame))
+            {
+                continue;
+            }
+
+            let source_slot = match self.request_frame_until(target_frame, deadline)? {
+                Some(source_slot) => source_slot,
+                None => break,
+            };
+            let slots = self.slots.get_mut();
+            let branches = &slots.branches;
+            let hotspots = &self.hotspots;
+            let playback_slots = &self.playback_slots;
+
+            // Prefer empty slots, then slots from earlier in the playback, then the slot
+            // farthest from any hotspot
+            let dest_slot = slots
+                .backups
+                .iter()
+                .filter(|slot| {
+                    slot.index != source_slot
+                        && branches.can_replace(slot)
+                        && !is_prefetched(branches, slot, &prefetch_frames)
+                })
+                .max_by_key(|slot| match branches.visible_frame(slot) {
+                    Frame::At(frame) => (
+                        playback_slots.contains(&slot.index),
+                        hotspots
+                            .values()
+                            .map(|&hotspot| frame_distance(frame, hotspot))
+                            .min()
+                            .unwrap_or(0),
+                    ),
+                    _ => (true, u32::MAX),
+                })
+                .map(|slot| slot.index);
+
+            match dest_slot {
+                Some(dest_slot) => {
+                    self.fill_slot(dest_slot, source_slot)?;
+                    self.playback_slots.insert(dest_slot);
+                }
+                None => break,
+            }
+        }
+
+        Ok(())
+    }
+
+    /// During reverse playback, simulate the next block of frames behind the playhead into
+    /// the ring.
+    ///
+    /// Stepping backward otherwise costs an advance for every frame back to the nearest slot,
+    /// so rewinding is quadratic in the spacing of the slots. Instead, once fewer than
+    /// `REVERSE_BLOCK_FRAMES` frames behind the playhead are ready, the block below them is
+    /// simulated forward once, and each frame is saved into a ring slot that the playhead has
+    /// already passed.
+    ///
+    /// The ring is freed when reverse playback stops. It is not counted against the memory
+    /// budget, so starting reverse playback doesn't evict backup slots.
+    fn fill_reverse_ring(
+        &mut self,
+        start_time: Instant,
+        max_run_time: Duration,
+    ) -> Result<(), Error> {
+        let deadline = start_time + max_run_time;
+        let playhead = match self.playback {
+            Some(playback) if playback.frames_per_second < 0.0 => playback.frame,
+            _ => {
+                self.slots.get_mut().ring.clear();
+                return Ok(());
+            }
+        };
+
         let slots = self.slots.get_mut();
+        if slots.ring.is_empty() {
+            for index in 0..2 * REVERSE_BLOCK_FRAMES as usize {
+                slots.ring.push(SlotWrapper {
+                    index: SlotIndex::Ring(index),
+                    slot: self.memory.create_backup_slot()?,
+                    is_base: false,
+                    frame: Frame::Unknown,
+                    branch: slots.branches.current,
+                });
+            }
+        }
 
-        let start_time = Instant::now();
+        let branches = &slots.branches;
+        let ring_frames: HashSet<u32> = slots
+            .ring
+            .iter()
+            .filter_map(|slot| match branches.visible_frame(slot) {
+                Frame::At(frame) => Some(frame),
+                _ => None,
+            })
+            .collect();
+        let num_ready = (1..=playhead)
+            .take_while(|&offset| ring_frames.contains(&(playhead - offset)))
+            .count() as u32;
+        if num_ready >= REVERSE_BLOCK_FRAMES {
+            return Ok(());
+        }
+
+        let block_end = playhead - num_ready;
+        let block_start = block_end.saturating_sub(REVERSE_BLOCK_FRAMES);
+        for frame in block_start..block_end {
+            if start_time.elapsed() > max_run_time {
+                break;
+            }
+            if ring_frames.contains(&frame) {
+                continue;
+            }
+
+            let source_slot = match self.request_frame_until(frame, deadline)? {
+                Some(source_slot) => source_slot,
+                None => break,
+            };
+            let slots = self.slots.get_mut();
+            let branches = &slots.branches;
+
+            // Reuse empty slots first, then the slots farthest behind the playback
+            let dest_slot = slots
+                .ring
+                .iter()
+                .filter(|slot| match branches.visible_frame(slot) {
+                    Frame::At(slot_frame) => slot_frame < block_start || slot_frame >= playhead,
+                    _ => true,
+                })
+                .max_by_key(|slot| match branches.visible_frame(slot) {
+                    Frame::At(slot_frame) => frame_distance(slot_frame, playhead),
+                    _ => u32::MAX,
+                })
+                .map(|slot| slot.index);
+
+            match dest_slot {
+                Some(dest_slot) => self.fill_slot(dest_slot, source_slot)?,
+                None => break,
+            }
+        }
+
+        Ok(())
+    }
+
+    /// Place slots at fixed alignments below each hotspot.
+    fn place_by_alignment(
+        &mut self,
+        start_time: Instant,
+        max_run_time: Duration,
+    ) -> Result<(), Error> {
+        let deadline = start_time + max_run_time;
+        let prefetch_frames = self.prefetch_frames();
 
         let alignments = vec![1, 15, 40, 145, 410, 1505, 4010, 14005];
         let target_frames: Vec<u32> = iproduct!(self.hotspots.values(), alignments.iter())
@@ -359,27 +1313,37 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
                 break;
             }
 
-            let matching_slot: Option<&SlotWrapper<M::Slot>> = slots
-                .iter()
-                .find(|slot| !slot.is_base && slot.frame == Frame::At(target_frame));
+            let slots = self.slots.get_mut();
+            let branches = &slots.branches;
+            let matching_slot: Option<&SlotWrapper<M::Slot>> = slots.iter().find(|slot| {
+                !slot.is_base && branches.visible_frame(slot) == Frame::At(target_frame)
+            });
             if let Some(matching_slot) = matching_slot {
                 used_slots.insert(matching_slot.index);
                 continue;
             }
 
-            let source_slot =
-                request_frame(&self.memory, &self.controller, slots, target_frame, false)?;
+            let source_slot = match self.request_frame_until(target_frame, deadline)? {
+                Some(source_slot) => source_slot,
+                None => break,
+            };
+            let slots = self.slots.get_mut();
+            let branches = &slots.branches;
             let available_slots: Vec<SlotIndex> = slots
-                .iter_mut()
+                .backups
+                .iter()
                 .filter(|slot| {
-                    !slot.is_base && slot.index != source_slot && !used_slots.contains(&slot.index)
+                    slot.index != source_slot
+                        && !used_slots.contains(&slot.index)
+                        && branches.can_replace(slot)
+                        && !is_prefetched(branches, slot, &prefetch_frames)
                 })
                 .map(|slot| slot.index)
                 .collect();
             let dest_slot = available_slots.choose(&mut rand::thread_rng()).cloned();
 
             match dest_slot {
-                Some(dest_slot) => copy_slot(&self.memory, slots, dest_slot, source_slot)?,
+                Some(dest_slot) => self.fill_slot(dest_slot, source_slot)?,
                 None => eprintln!("Using suboptimal number of slots"), // TODO: Logger
             }
             // TODO: Add dest_slot to used_slots?
@@ -388,6 +1352,132 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
         Ok(())
     }
 
+    /// Place slots where they save the most advances for the recorded requests.
+    ///
+    /// Slots are moved one at a time from the checkpoint with the lowest expected saving to
+    /// the frame with the highest, for as long as this is an improvement.
+    fn place_by_histogram(
+        &mut self,
+        start_time: Instant,
+        max_run_time: Duration,
+    ) -> Result<(), Error> {
+        let deadline = start_time + max_run_time;
+        let prefetch_frames = self.prefetch_frames();
+        let hotspots: Vec<u32> = self.hotspots.values().cloned().collect();
+
+        for _ in 0..self.num_backup_slots() {
+            if start_time.elapsed() > max_run_time {
+                break;
+            }
+            let slots = self.slots.get_mut();
+            let branches = &slots.branches;
+
+            let checkpoints: Vec<u32> =
+                iter::once(0)
+                    .chain(slots.backups.iter().filter_map(
+                        |slot| match branches.visible_frame(slot) {
+                            Frame::At(frame) => Some(frame),
+                            _ => None,
+                        },
+                    ))
+                    .sorted()
+                    .dedup()
+                    .collect();
+            let histogram = &slots.access_histogram;
+            let frame_costs = &slots.frame_costs;
+
+            let (target_frame, saving) =
+                match histogram.best_checkpoint(&checkpoints, &hotspots, frame_costs) {
+                    Some(best) => best,
+                    None => break,
+                };
+
+            // A slot that duplicates another slot's frame or is empty has no value
+            let mut seen_frames = HashSet::new();
+            let victim = slots
+                .backups
+                .iter()
+                .filter(|slot| {
+                    branches.can_replace(slot) && !is_prefetched(branches, slot, &prefetch_frames)
+                })
+                .map(|slot| {
+                    let value = match branches.visible_frame(slot) {
+                        Frame::At(frame) if seen_frames.insert(frame) => {
+                            histogram.checkpoint_value(&checkpoints, frame, &hotspots, frame_costs)
+                        }
+                        _ => 0.0,
+                    };
+                    (slot.index, value)
+                })
+                .min_by(|(_, value1), (_, value2)| value1.partial_cmp(value2).unwrap());
+
+            match victim {
+                Some((dest_slot, value)) if value * MIN_SAVING_RATIO < saving => {
+                    match self.request_frame_until(target_frame, deadline)? {
+                        Some(source_slot) => self.fill_slot(dest_slot, source_slot)?,
+                        None => break,
+                    }
+                }
+                _ => break,
+            }
+        }
+
+        Ok(())
+    }
+
+    /// Request a frame for internal use, giving up once `deadline` has passed.
+    ///
+    /// If the deadline is reached first, the base slot's progress is saved to a checkpoint so
+    /// that the next request for the frame resumes from there, and None is returned. This
+    /// keeps each call to `balance_distribution` short, even when a slot is placed far from
+    /// any other.
+    fn request_frame_until(
+        &mut self,
+        frame: u32,
+        deadline: Instant,
+    ) -> Result<Option<SlotIndex>, Error> {
+        let slots = self.slots.get_mut();
+        let slot_index = request_frame_until(
+            &self.memory,
+            &self.controller,
+            slots,
+            frame,
+            false,
+            Some(deadline),
+            &mut |_| {},
+        )?;
+        if slot_index.is_none() {
+            if let Frame::At(base_frame) = slots.base.frame {
+                let mut checkpoint = self.placement_checkpoint;
+                self.save_checkpoint(&mut checkpoint, frame, base_frame)?;
+                self.placement_checkpoint = checkpoint;
+            }
+        }
+        Ok(slot_index)
+    }
+
+    /// Request a frame for internal use, without recording it in the access histogram.
+    fn request_frame(&mut self, frame: u32) -> Result<SlotIndex, Error> {
+        request_frame(
+            &self.memory,
+            &self.controller,
+            self.slots.get_mut(),
+            frame,
+            false,
+            &mut |_| {},
+        )
+    }
+
+    /// Copy the source slot into a backup slot, compressing it if enabled.
+    fn fill_slot(&mut self, dest_slot: SlotIndex, source_slot: SlotIndex) -> Result<(), Error> {
+        let slots = self.slots.get_mut();
+        copy_slot(&self.memory, slots, dest_slot, source_slot)?;
+        if self.slot_mode == SlotMode::Delta {
+            compress_slot(&self.memory, slots, dest_slot)?;
+        }
+        Ok(())
+    }
+
     pub fn memory(&self) -> &M {
         &self.memory
     }
@@ -400,16 +1490,150 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
         &mut self.controller
     }
 
+    /// Return the branch whose controller is used for requests.
+    pub fn branch(&self) -> BranchId {
+        self.slots.borrow().branches.current
+    }
+
+    /// Return the ids of every branch, including the current one.
+    pub fn branches(&self) -> Vec<BranchId> {
+        self.slots.borrow().branches.ids.iter().cloned().collect()
+    }
+
+    /// Create a new branch with a copy of the current branch's controller.
+    ///
+    /// The branches share every slot until one of them is edited. After that, they only
+    /// share slots before the first edited frame, and slots after it belong to one branch.
+    pub fn fork(&mut self) -> BranchId
+    where
+        C: Clone,
+    {
+        let branch = self.slots.get_mut().branches.fork();
+        self.parked_controllers
+            .insert(branch, self.controller.clone());
+        branch
+    }
+
+    /// Make `branch` the current branch.
+    pub fn switch_branch(&mut self, branch: BranchId) {
+        let branches = &mut self.slots.get_mut().branches;
+        if branch != branches.current {
+            let controller = self
+                .parked_controllers
+                .remove(&branch)
+                .expect("invalid branch id");
+            let prev_controller = mem::replace(&mut self.controller, controller);
+            self.parked_controllers
+                .insert(branches.current, prev_controller);
+            branches.current = branch;
+        }
+    }
+
+    /// Delete a branch other than the current one.
+    ///
+    /// Its slots are handed over to another branch that shares them, or freed.
+    pub fn delete_branch(&mut self, branch: BranchId) {
+        self.parked_controllers
+            .remove(&branch)
+            .expect("invalid branch id");
+        let slots = self.slots.get_mut();
+        let branches = &mut slots.branches;
+        for slot in iter::once(&mut slots.base)
+            .chain(slots.backups.iter_mut())
+            .chain(slots.ring.iter_mut())
+        {
+            if slot.branch == branch {
+                let sharing_branch = match slot.frame {
+                    Frame::At(frame) => branches.sharing_branch(branch, frame),
+                    _ => Some(branches.current),
+                };
+                match sharing_branch {
+                    Some(other) => slot.branch = other,
+                    None => {
+                        slot.frame = Frame::Unknown;
+                        slot.branch = branches.current;
+                    }
+                }
+            }
+        }
+        branches.remove(branch);
+    }
+
+    /// Invalidate slots of the current branch at or after the given frame.
+    ///
+    /// Slots that are still valid for another branch are kept for that branch.
     pub fn invalidate_frame(&mut self, invalidated_frame: u32) {
-        for slot in self.slots.get_mut().iter_mut() {
+        let slots = self.slots.get_mut();
+        slots.diverge(invalidated_frame);
+        let current = slots.branches.current;
+        for slot in slots.iter_mut() {
             if let Frame::At(slot_frame) = slot.frame {
-                if slot_frame >= invalidated_frame {
+                if slot.branch == current && slot_frame >= invalidated_frame {
                     slot.frame = Frame::Unknown;
                 }
             }
         }
     }
 
+    /// Invalidate slots after an edit that only changed the controller's behavior on frames
+    /// in `start..end`.
+    ///
+    /// The edited frames are re-simulated, and the new state is compared with the previous
+    /// contents of slots at or after `end`. Once a slot matches, every later frame is
+    /// unchanged too, so slots at or after it are kept. At most about `max_advances` frames
+    /// are simulated before giving up.
+    ///
+    /// Returns the frame at which the states converged, if any. Slots before this frame (or
+    /// all slots at or after `start` if None) are invalidated.
+    pub fn invalidate_edited_frames(
+        &mut self,
+        start: u32,
+        end: u32,
+        max_advances: usize,
+    ) -> Result<Option<u32>, Error> {
+        let slots = self.slots.get_mut();
+        slots.diverge(start);
+        let current = slots.branches.current;
+
+        // Hide the slots after the edit so that they aren't used to satisfy requests, but
+        // remember their frames in case they are still valid
+        let mut pending: Vec<(SlotIndex, u32)> = Vec::new();
+        for slot in slots.iter_mut() {
+            if let Frame::At(frame) = slot.frame {
+                if slot.branch == current && frame >= start {
+                    if frame >= end && !slot.is_base {
+                        pending.push((slot.index, frame));
+                    }
+                    slot.frame = Frame::Unknown;
+                }
+            }
+        }
+        pending.sort_by_key(|&(_, frame)| frame);
+
+        let num_advances = slots.num_advances;
+        for &(index, frame) in &pending {
+            let advances = self.slots.get_mut().num_advances.wrapping_sub(num_advances);
+            if (frame - start) as usize > max_advances || advances > max_advances {
+                break;
+            }
+
+            let base_index = self.request_frame(frame)?;
+            let slots = self.slots.get_mut();
+            if self
+                .memory
+                .slots_equal(&slots.get(base_index).slot, &slots.get(index).slot)?
+            {
+                for &(index, slot_frame) in &pending {
+                    if slot_frame >= frame {
+                        slots.get_mut(index).frame = Frame::At(slot_frame);
+                    }
+                }
+                return Ok(Some(frame));
+            }
+        }
+        Ok(None)
+    }
+
     pub fn set_hotspot(&mut self, name: &str, frame: u32) {
         self.hotspots.insert(name.to_owned(), frame);
     }
@@ -418,11 +1642,32 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
         self.hotspots.remove(name);
     }
 
+    pub fn playback(&self) -> Option<Playback> {
+        self.playback
+    }
+
+    pub fn set_playback(&mut self, playback: Option<Playback>) {
+        if playback.is_none() {
+            self.playback_slots.clear();
+        }
+        self.playback = playback;
+    }
+
+    /// Return the frames of the current branch that are held in slots.
+    /// Return true if a slot holds `frame`, so that requesting it doesn't require advancing.
+    pub fn contains_frame(&self, frame: u32) -> bool {
+        let slots = self.slots.borrow();
+        let contains = slots
+            .iter()
+            .any(|slot| slots.branches.visible_frame(slot) == Frame::At(frame));
+        contains
+    }
+
     pub fn cached_frames(&self) -> Vec<u32> {
-        self.slots
-            .borrow()
+        let slots = self.slots.borrow();
+        slots
             .iter()
-            .filter_map(|slot| match slot.frame {
+            .filter_map(|slot| match slots.branches.visible_frame(slot) {
                 Frame::At(frame) => Some(frame),
                 Frame::PowerOn => Some(0),
                 Frame::Unknown => None,
@@ -437,4 +1682,237 @@ impl<M: Memory, C: Controller<M>> SlotManager<M, C> {
     pub fn num_copies(&self) -> usize {
         self.slots.borrow().num_copies
     }
+
+    pub fn num_copied_bytes(&self) -> usize {
+        self.slots.borrow().num_copied_bytes
+    }
+
+    pub fn slot_mode(&self) -> SlotMode {
+        self.slot_mode
+    }
+
+    pub fn placement_policy(&self) -> PlacementPolicy {
+        self.placement_policy
+    }
+
+    pub fn set_placement_policy(&mut self, placement_policy: PlacementPolicy) {
+        self.placement_policy = placement_policy;
+    }
+
+    pub fn cost_model(&self) -> CostModel {
+        self.slots.borrow().cost_model.clone()
+    }
+
+    /// Return the highest advance time in each of `num_bins` equal bins of frames
+    /// `0..num_frames`, relative to the average advance time.
+    pub fn frame_cost_bins(&self, num_frames: usize, num_bins: usize) -> Vec<f32> {
+        self.slots.borrow().frame_costs.bins(num_frames, num_bins)
+    }
+
+    /// Return a decayed average of the number of advances per external frame request.
+    pub fn mean_request_advances(&self) -> f32 {
+        self.slots.borrow().access_histogram.mean_advances()
+    }
+
+    pub fn num_backup_slots(&self) -> usize {
+        self.slots.borrow().backups.len()
+    }
+
+    pub fn memory_budget(&self) -> Option<usize> {
+        self.memory_budget
+    }
+
+    /// Limit the memory used by backup slots, or remove the limit if `None`.
+    ///
+    /// Backup slots are created or evicted until their total size fits within the budget.
+    /// Without a budget, the current backup slots are kept.
+    ///
+    /// The ring of slots used during reverse playback is not counted against the budget.
+    pub fn set_memory_budget(&mut self, memory_budget: Option<usize>) -> Result<(), Error> {
+        self.memory_budget = memory_budget;
+        self.fit_memory_budget()
+    }
+
+    fn fit_memory_budget(&mut self) -> Result<(), Error> {
+        let memory_budget = match self.memory_budget {
+            Some(memory_budget) => memory_budget,
+            None => return Ok(()),
+        };
+        let memory = &self.memory;
+        let slots = self.slots.get_mut();
+
+        // Slots without a valid frame may be filled at any time, so count them at full size
+        let dense_size = memory.slot_size(&slots.base.slot);
+        let reserved_size = |slot: &SlotWrapper<M::Slot>| match slot.frame {
+            Frame::Unknown => dense_size,
+            _ => memory.slot_size(&slot.slot),
+        };
+        // Shared reference data is split between the slots that use it, so removing a slot
+        // changes the size of others, and the total is recomputed after each removal
+        // The reverse playback ring is left out, since it is only held while playing in
+        // reverse and evicting backup slots to make room for it would lose them for good
+        let measure_total_size = |slots: &Slots<M>| -> usize {
+            iter::once(&slots.power_on)
+                .chain(slots.backups.iter())
+                .map(reserved_size)
+                .sum()
+        };
+
+        let mut total_size = loop {
+            let total_size = measure_total_size(slots);
+            if total_size <= memory_budget {
+                break total_size;
+            }
+            // The seek checkpoint holds the seek's progress, so it is never evicted
+            let checkpoint = self
+                .seek
+                .and_then(|seek| seek.checkpoint)
+                .map(|(index, _)| index);
+            let index = match least_useful_backup(&slots.backups, &self.hotspots, checkpoint) {
+                Some(index) => index,
+                None => break total_size,
+            };
+            slots.remove_backup(index);
+
+            self.playback_slots = self
+                .playback_slots
+                .iter()
+                .filter_map(|slot| slot.after_removing_backup(index))
+                .collect();
+            let remap_checkpoint = |checkpoint: Option<(SlotIndex, u32)>| {
+                checkpoint.and_then(|(slot, frame)| {
+                    slot.after_removing_backup(index).map(|slot| (slot, frame))
+                })
+            };
+            if let Some(seek) = &mut self.seek {
+                seek.checkpoint = remap_checkpoint(seek.checkpoint);
+            }
+            self.placement_checkpoint = remap_checkpoint(self.placement_checkpoint);
+        };
+        if dense_size > 0 {
+            while total_size + dense_size <= memory_budget {
+                slots.add_backup(memory.create_backup_slot()?);
+                total_size += dense_size;
+            }
+        }
+
+        Ok(())
+    }
+
+    /// Persist snapshots of frames to the given store, and use them to skip simulating
+    /// frames where possible. If None, snapshots are no longer used.
+    ///
+    /// Snapshots are taken whenever the simulation reaches a multiple of `SNAPSHOT_INTERVAL`,
+    /// and are keyed by the initial memory contents and the controller's
+    /// `edit_prefix_hash`.
+    pub fn set_snapshot_store(&mut self, store: Option<SnapshotStore>) -> Result<(), Error> {
+        let namespace = self.snapshot_namespace()?;
+        let slots = self.slots.get_mut();
+        slots.snapshots = match (store, namespace) {
+            (Some(store), Some(namespace)) => Some(Snapshots { store, namespace }),
+            _ => None,
+        };
+        Ok(())
+    }
+
+    /// Return a hash of the power-on state, or None if slots can't be persisted.
+    fn snapshot_namespace(&self) -> Result<Option<u64>, Error> {
+        let slots = self.slots.borrow();
+        Ok(self.memory.slot_bytes(&slots.power_on.slot)?.map(|bytes| {
+            let mut hasher = StableHasher::new();
+            bytes.hash(&mut hasher);
+            hasher.finish()
+        }))
+    }
+
+    /// Load snapshots from the given store into backup slots, e.g. after they were computed
+    /// by another process.
+    ///
+    /// Only snapshots matching this manager's initial memory and current edits are used.
+    /// Snapshots closest to a hotspot are imported first, and only replace backup slots that
+    /// are farther from a hotspot. At most `MAX_IMPORT_FRACTION` of the backup slots are
+    /// replaced. Returns the number of snapshots that were imported.
+    pub fn import_snapshots(&mut self, store: &mut SnapshotStore) -> Result<usize, Error> {
+        let namespace = match self.snapshot_namespace()? {
+            Some(namespace) => namespace,
+            None => return Ok(0),
+        };
+        let (memory, controller, hotspots) = (&self.memory, &self.controller, &self.hotspots);
+        let hotspot_distance = |frame: u32| -> u32 {
+            hotspots
+                .values()
+                .map(|&hotspot| frame_distance(frame, hotspot))
+                .min()
+                .unwrap_or(0)
+        };
+
+        let slots = self.slots.get_mut();
+        let cached_frames: HashSet<u32> = slots
+            .iter()
+            .filter_map(|slot| match slots.branches.visible_frame(slot) {
+                Frame::At(frame) => Some(frame),
+                _ => None,
+            })
+            .collect();
+        // Read errors are treated as an empty store
+        let keys: Vec<SnapshotKey> = match store.keys(namespace) {
+            Ok(keys) => keys
+                .filter(|key| {
+                    !cached_frames.contains(&key.frame)
+                        && controller.edit_prefix_hash(key.frame) == Some(key.edit_hash)
+                })
+                .cloned()
+                .sorted_by_key(|key| hotspot_distance(key.frame))
+                .collect(),
+            Err(_) => return Ok(0),
+        };
+
+        let max_imports = (slots.backups.len() as f32 * MAX_IMPORT_FRACTION) as usize;
+        let mut imported: Vec<SlotIndex> = Vec::new();
+        for key in keys.into_iter().take(max_imports) {
+            let victim = slots
+                .backups
+                .iter()
+                .filter(|slot| !imported.contains(&slot.index) && slots.branches.can_replace(slot))
+                .map(|slot| {
+                    let distance = match slots.branches.visible_frame(slot) {
+                        Frame::At(frame) => hotspot_distance(frame),
+                        _ => u32::MAX,
+                    };
+                    (slot.index, distance)
+                })
+                .max_by_key(|&(_, distance)| distance);
+            let dest_slot = match victim {
+                Some((dest_slot, distance)) if distance > hotspot_distance(key.frame) => dest_slot,
+                _ => break,
+            };
+
+            // Read errors are treated as a missing snapshot
+            let bytes = match store.read(&key) {
+                Ok(Some(bytes)) => bytes,
+                _ => continue,
+            };
+            let current = slots.branches.current;
+            let slot = slots.get_mut(dest_slot);
+            if memory.load_slot_bytes(&mut slot.slot, &bytes)? {
+                slot.frame = Frame::At(key.frame);
+                slot.branch = current;
+                if self.slot_mode == SlotMode::Delta {
+                    compress_slot(memory, slots, dest_slot)?;
+                }
+                imported.push(dest_slot);
+            }
+        }
+        Ok(imported.len())
+    }
+
+    /// Return the number of bytes used by backup slots, including the power-on slot.
+    pub fn slot_memory_size(&self) -> usize {
+        self.slots
+            .borrow()
+            .iter()
+            .filter(|slot| !slot.is_base)
+            .map(|slot| self.memory.slot_size(&slot.slot))
+            .sum()
+    }
 }
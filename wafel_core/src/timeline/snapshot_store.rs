@@ -0,0 +1,359 @@
+//! Persistent storage of slot contents across sessions.
+
+use serde::{Deserialize, Serialize};
+use std::{
+    collections::{HashMap, HashSet},
+    fs::{self, File, OpenOptions},
+    hash::Hasher,
+    io::{self, Read, Seek, SeekFrom, Write},
+    path::{Path, PathBuf},
+};
+
+const DATA_FILE_NAME: &str = "snapshots.bin";
+const INDEX_FILE_NAME: &str = "snapshots.json";
+
+/// Each record starts with its key, so that a stale index can't return the wrong snapshot.
+const HEADER_SIZE: usize = 24;
+
+/// The index is saved after this many writes, as well as when the store is dropped.
+///
+/// Since records are checked against their key, an index that misses the latest writes only
+/// loses those snapshots.
+const INDEX_SAVE_INTERVAL: usize = 32;
+
+/// A 64 bit FNV-1a hasher, for hashes that are persisted in snapshot keys.
+///
+/// Unlike `DefaultHasher`, the algorithm is fixed, so the hashes stay the same across program
+/// runs and Rust versions. Integers are hashed as little endian bytes.
+#[derive(Debug, Clone, Copy)]
+pub struct StableHasher(u64);
+
+impl StableHasher {
+    pub fn new() -> Self {
+        Self(0xcbf2_9ce4_8422_2325)
+    }
+}
+
+impl Default for StableHasher {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
+impl Hasher for StableHasher {
+    fn finish(&self) -> u64 {
+        self.0
+    }
+
+    fn write(&mut self, bytes: &[u8]) {
+        for &byte in bytes {
+            self.0 = (self.0 ^ byte as u64).wrapping_mul(0x0100_0000_01b3);
+        }
+    }
+
+    fn write_u16(&mut self, i: u16) {
+        self.write(&i.to_le_bytes());
+    }
+
+    fn write_u32(&mut self, i: u32) {
+        self.write(&i.to_le_bytes());
+    }
+
+    fn write_u64(&mut self, i: u64) {
+        self.write(&i.to_le_bytes());
+    }
+
+    fn write_usize(&mut self, i: usize) {
+        self.write_u64(i as u64);
+    }
+}
+
+/// Identifies the state of a frame.
+#[derive(Debug, Clone, Copy, PartialEq, Eq, Hash, Serialize, Deserialize)]
+pub struct SnapshotKey {
+    /// A hash of the program's initial memory, distinguishing both different programs and
+    /// different load addresses of the same program.
+    pub namespace: u64,
+    pub frame: u32,
+    /// A hash of every edit applied up to and including `frame`.
+    pub edit_hash: u64,
+}
+
+impl SnapshotKey {
+    fn header(&self) -> [u8; HEADER_SIZE] {
+        let mut header = [0; HEADER_SIZE];
+        header[0..8].copy_from_slice(&self.namespace.to_le_bytes());
+        header[8..12].copy_from_slice(&self.frame.to_le_bytes());
+        header[16..24].copy_from_slice(&self.edit_hash.to_le_bytes());
+        header
+    }
+}
+
+#[derive(Debug, Clone, Serialize, Deserialize)]
+struct Entry {
+    key: SnapshotKey,
+    /// The position of the snapshot in the data file, in units of `record_size`.
+    record: usize,
+    /// The value of `Index::clock` when the entry was last read or written.
+    last_used: u64,
+}
+
+#[derive(Debug, Clone, Default, Serialize, Deserialize)]
+struct Index {
+    /// The size of every record including its header, or 0 if nothing has been stored yet.
+    record_size: usize,
+    clock: u64,
+    entries: Vec<Entry>,
+}
+
+/// A cache of slot contents stored on disk, keyed by frame and edit history.
+///
+/// The snapshots of each namespace are kept in a separate subdirectory, so that programs with
+/// different memory sizes (e.g. different game versions) can share a store. Each namespace
+/// uses at most `max_size` bytes.
+#[derive(Debug)]
+pub struct SnapshotStore {
+    directory: PathBuf,
+    max_size: usize,
+    /// The namespaces that have been accessed so far.
+    partitions: HashMap<u64, Partition>,
+}
+
+impl SnapshotStore {
+    /// Open or create a store in the given directory, using at most `max_size` bytes per
+    /// namespace.
+    pub fn open(directory: impl AsRef<Path>, max_size: usize) -> io::Result<Self> {
+        let directory = directory.as_ref().to_owned();
+        fs::create_dir_all(&directory)?;
+        Ok(Self {
+            directory,
+            max_size,
+            partitions: HashMap::new(),
+        })
+    }
+
+    fn partition(&mut self, namespace: u64) -> io::Result<&mut Partition> {
+        if !self.partitions.contains_key(&namespace) {
+            let directory = self.directory.join(format!("{:016x}", namespace));
+            let partition = Partition::open(directory, self.max_size)?;
+            self.partitions.insert(namespace, partition);
+        }
+        Ok(self.partitions.get_mut(&namespace).unwrap())
+    }
+
+    /// Return true if the snapshot is in the store.
+    ///
+    /// A namespace that can't be opened is treated as empty.
+    pub fn contains(&mut self, key: &SnapshotKey) -> bool {
+        self.partition(key.namespace)
+            .map_or(false, |partition| partition.positions.contains_key(key))
+    }
+
+    /// Return the keys of every stored snapshot in the namespace.
+    pub fn keys(&mut self, namespace: u64) -> io::Result<impl Iterator<Item = &SnapshotKey> + '_> {
+        let partition = self.partition(namespace)?;
+        Ok(partition.index.entries.iter().map(|entry| &entry.key))
+    }
+
+    /// Return the contents of a snapshot, or None if it isn't in the store.
+    pub fn read(&mut self, key: &SnapshotKey) -> io::Result<Option<Vec<u8>>> {
+        self.partition(key.namespace)?.read(key)
+    }
+
+    /// Store a snapshot, evicting the least recently used one in its namespace if the
+    /// namespace is full.
+    pub fn write(&mut self, key: SnapshotKey, bytes: &[u8]) -> io::Result<()> {
+        self.partition(key.namespace)?.write(key, bytes)
+    }
+}
+
+/// The snapshots of a single namespace.
+///
+/// Snapshots are stored as fixed size records in a single data file, with an index file
+/// alongside it. When the size limit is reached, the least recently used snapshot is
+/// overwritten.
+#[derive(Debug)]
+struct Partition {
+    directory: PathBuf,
+    data_file: File,
+    max_size: usize,
+    index: Index,
+    /// Maps keys to positions in `index.entries`.
+    positions: HashMap<SnapshotKey, usize>,
+    /// The number of writes since the index was last saved.
+    unsaved_writes: usize,
+}
+
+impl Partition {
+    /// Open or create a partition in the given directory.
+    ///
+    /// A missing or unreadable index is treated as an empty partition.
+    fn open(directory: PathBuf, max_size: usize) -> io::Result<Self> {
+        fs::create_dir_all(&directory)?;
+
+        let data_file = OpenOptions::new()
+            .read(true)
+            .write(true)
+            .create(true)
+            .open(directory.join(DATA_FILE_NAME))?;
+        let index: Index = File::open(directory.join(INDEX_FILE_NAME))
+            .ok()
+            .and_then(|file| serde_json::from_reader(io::BufReader::new(file)).ok())
+            .unwrap_or_default();
+
+        let mut partition = Self {
+            directory,
+            data_file,
+            max_size,
+            index,
+            positions: HashMap::new(),
+            unsaved_writes: 0,
+        };
+        partition.reindex();
+        partition.evict_to_capacity()?;
+        Ok(partition)
+    }
+
+    fn reindex(&mut self) {
+        self.positions = self
+            .index
+            .entries
+            .iter()
+            .enumerate()
+            .map(|(position, entry)| (entry.key, position))
+            .collect();
+    }
+
+    /// The number of snapshots that fit within the size limit.
+    fn capacity(&self) -> usize {
+        if self.index.record_size == 0 {
+            0
+        } else {
+            self.max_size / self.index.record_size
+        }
+    }
+
+    /// Drop entries whose records lie beyond the size limit, e.g. after it was lowered.
+    fn evict_to_capacity(&mut self) -> io::Result<()> {
+        let capacity = self.capacity();
+        let num_entries = self.index.entries.len();
+        self.index.entries.retain(|entry| entry.record < capacity);
+        if self.index.entries.len() != num_entries {
+            self.reindex();
+        }
+        let max_len = (capacity * self.index.record_size) as u64;
+        if self.data_file.metadata()?.len() > max_len {
+            self.data_file.set_len(max_len)?;
+        }
+        Ok(())
+    }
+
+    fn read(&mut self, key: &SnapshotKey) -> io::Result<Option<Vec<u8>>> {
+        let position = match self.positions.get(key) {
+            Some(&position) => position,
+            None => return Ok(None),
+        };
+        self.index.clock += 1;
+        let entry = &mut self.index.entries[position];
+        entry.last_used = self.index.clock;
+
+        let mut header = [0; HEADER_SIZE];
+        let mut bytes = vec![0; self.index.record_size - HEADER_SIZE];
+        self.data_file.seek(SeekFrom::Start(
+            (entry.record * self.index.record_size) as u64,
+        ))?;
+        self.data_file.read_exact(&mut header)?;
+        if header != key.header() {
+            return Ok(None);
+        }
+        self.data_file.read_exact(&mut bytes)?;
+        Ok(Some(bytes))
+    }
+
+    /// Store a snapshot, evicting the least recently used one if the partition is full.
+    ///
+    /// Snapshots of a different size than the ones already stored replace the entire
+    /// partition. This doesn't happen in practice, since a namespace identifies the program.
+    fn write(&mut self, key: SnapshotKey, bytes: &[u8]) -> io::Result<()> {
+        let record_size = HEADER_SIZE + bytes.len();
+        if self.index.record_size != record_size {
+            self.index = Index {
+                record_size,
+                ..Index::default()
+            };
+            self.positions.clear();
+            self.data_file.set_len(0)?;
+        }
+        if self.capacity() == 0 {
+            return Ok(());
+        }
+
+        self.index.clock += 1;
+        let position = match self.positions.get(&key) {
+            Some(&position) => position,
+            None if self.index.entries.len() < self.capacity() => {
+                let used_records: HashSet<usize> = self
+                    .index
+                    .entries
+                    .iter()
+                    .map(|entry| entry.record)
+                    .collect();
+                let record = (0..).find(|record| !used_records.contains(record)).unwrap();
+                self.index.entries.push(Entry {
+                    key,
+                    record,
+                    last_used: 0,
+                });
+                self.index.entries.len() - 1
+            }
+            None => {
+                let position = self
+                    .index
+                    .entries
+                    .iter()
+                    .enumerate()
+                    .min_by_key(|(_, entry)| entry.last_used)
+                    .map(|(position, _)| position)
+                    .unwrap();
+                let entry = &mut self.index.entries[position];
+                self.positions.remove(&entry.key);
+                entry.key = key;
+                position
+            }
+        };
+        self.positions.insert(key, position);
+        let entry = &mut self.index.entries[position];
+        entry.last_used = self.index.clock;
+
+        self.data_file.seek(SeekFrom::Start(
+            (entry.record * self.index.record_size) as u64,
+        ))?;
+        self.data_file.write_all(&key.header())?;
+        self.data_file.write_all(bytes)?;
+
+        self.unsaved_writes += 1;
+        if self.unsaved_writes >= INDEX_SAVE_INTERVAL {
+            self.save_index()?;
+        }
+        Ok(())
+    }
+
+    /// Write the index to disk, so that the partition can be reopened later.
+    fn save_index(&mut self) -> io::Result<()> {
+        // Write to a temporary file first so that a crash can't leave a corrupt index
+        let path = self.directory.join(INDEX_FILE_NAME);
+        let temp_path = path.with_extension("json.tmp");
+        let file = File::create(&temp_path)?;
+        serde_json::to_writer(io::BufWriter::new(file), &self.index)?;
+        fs::rename(temp_path, path)?;
+        self.unsaved_writes = 0;
+        Ok(())
+    }
+}
+
+impl Drop for Partition {
+    fn drop(&mut self) {
+        // Persist the recency of reads. Failing to do so only affects eviction order
+        let _ = self.save_index();
+    }
+}
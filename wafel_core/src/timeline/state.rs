@@ -1,8 +1,9 @@
 use crate::{
-    data_path::GlobalDataPath,
+    data_path::{GlobalDataPath, PathHandle},
     error::Error,
-    memory::{Address, Memory, Value},
+    memory::{Address, IntValue, Memory, Value},
 };
+use derive_more::Display;
 
 /// An abstract state of the simulation on a given frame.
 pub trait State {
@@ -30,6 +31,129 @@ pub trait State {
 
     /// Read from the given path.
     fn path_read(&self, path: &GlobalDataPath) -> Result<Value, Error>;
+
+    /// Read from the given path if its guards hold, and return null otherwise.
+    fn guarded_read(&self, path: &GuardedPath) -> Result<Value, Error> {
+        if path.guards_hold(self)? {
+            self.path_read(path.path())
+        } else {
+            Ok(Value::Null)
+        }
+    }
+}
+
+/// A condition on the value of a path.
+#[derive(Debug, Display, Clone)]
+pub enum Guard {
+    /// The path's int value is nonzero.
+    #[display(fmt = "{} != 0", _0)]
+    NonZero(GlobalDataPath),
+    /// The path's address value is equal to the given address.
+    #[display(fmt = "{} == {}", _0, _1)]
+    AddressEquals(GlobalDataPath, Address),
+    /// The path's int value is greater than the given value.
+    #[display(fmt = "{} > {}", _0, _1)]
+    GreaterThan(GlobalDataPath, IntValue),
+}
+
+impl Guard {
+    /// The path that the guard reads.
+    pub fn path(&self) -> &GlobalDataPath {
+        match self {
+            Guard::NonZero(path) | Guard::AddressEquals(path, _) | Guard::GreaterThan(path, _) => {
+                path
+            }
+        }
+    }
+
+    fn key(&self) -> GuardKey {
+        match self {
+            Guard::NonZero(path) => GuardKey::NonZero(path.handle()),
+            Guard::AddressEquals(path, address) => GuardKey::AddressEquals(path.handle(), *address),
+            Guard::GreaterThan(path, n) => GuardKey::GreaterThan(path.handle(), *n),
+        }
+    }
+
+    /// Evaluate the guard on a state.
+    pub fn holds(&self, state: &(impl State + ?Sized)) -> Result<bool, Error> {
+        self.check(&state.path_read(self.path())?)
+    }
+
+    /// Evaluate the guard given the value of its path.
+    pub fn check(&self, value: &Value) -> Result<bool, Error> {
+        Ok(match self {
+            Guard::NonZero(_) => value.as_int()? != 0,
+            Guard::AddressEquals(_, address) => value.as_address()? == *address,
+            Guard::GreaterThan(_, n) => value.as_int()? > *n,
+        })
+    }
+}
+
+/// A path that is only read if all of its guards hold, and is null otherwise.
+///
+/// This is used for paths into a slot of an object or surface pool, which only make sense
+/// while the slot is active. The data cache caches a guarded path's value, including a null
+/// value due to a failed guard, without reading the guard paths again.
+#[derive(Debug, Clone)]
+pub struct GuardedPath {
+    path: GlobalDataPath,
+    guards: Vec<Guard>,
+    key: GuardedPathKey,
+}
+
+/// Identifies a guarded path by the handles of its path and guards.
+#[derive(Debug, Clone, PartialEq, Eq, Hash)]
+pub struct GuardedPathKey {
+    path: PathHandle,
+    guards: Vec<GuardKey>,
+}
+
+#[derive(Debug, Clone, PartialEq, Eq, Hash)]
+enum GuardKey {
+    NonZero(PathHandle),
+    AddressEquals(PathHandle, Address),
+    GreaterThan(PathHandle, IntValue),
+}
+
+impl GuardedPath {
+    /// Create a guarded path.
+    pub fn new(path: GlobalDataPath, guards: Vec<Guard>) -> Self {
+        let key = GuardedPathKey {
+            path: path.handle(),
+            guards: guards.iter().map(Guard::key).collect(),
+        };
+        Self { path, guards, key }
+    }
+
+    /// The path that is read when the guards hold.
+    pub fn path(&self) -> &GlobalDataPath {
+        &self.path
+    }
+
+    pub fn guards(&self) -> &[Guard] {
+        &self.guards
+    }
+
+    /// A key that identifies the path and its guards.
+    pub fn key(&self) -> &GuardedPathKey {
+        &self.key
+    }
+
+    /// Evaluate the guards on a state, returning true if they all hold.
+    pub fn guards_hold(&self, state: &(impl State + ?Sized)) -> Result<bool, Error> {
+        for guard in &self.guards {
+            if !guard.holds(state)? {
+                return Ok(false);
+            }
+        }
+        Ok(true)
+    }
+}
+
+impl From<GlobalDataPath> for GuardedPath {
+    fn from(path: GlobalDataPath) -> Self {
+        Self::new(path, Vec::new())
+    }
 }
 
 /// A state backed by a slot.
@@ -0,0 +1,648 @@
+//! A deterministic in-process `Memory` implementation for testing and benchmarking timelines.
+//!
+//! The simulation mimics the write pattern of a game: every frame touches a small "hot" region
+//! of memory, and occasionally a "level load" rewrites a large part of it.
+
+use super::{Controller, SlotStateMut};
+use crate::{
+    data_path::DataPathCache,
+    error::Error,
+    memory::{
+        copy_changed_chunks,
+        data_type::{DataType, Field, FloatType, IntType, Namespace, TypeName},
+        Address, ClassifiedAddress, DataLayout, FloatValue, IntValue, Memory, MemoryErrorCause,
+        SegmentBuffer,
+    },
+};
+use std::sync::{
+    atomic::{AtomicUsize, Ordering},
+    Arc,
+};
+
+/// The id of the next memory to be created.
+static NEXT_MEMORY_ID: AtomicUsize = AtomicUsize::new(1);
+
+/// Parameters for the simulated program.
+#[derive(Debug, Clone)]
+pub struct SyntheticConfig {
+    /// The total size of slot memory in bytes.
+    pub size: usize,
+    /// The size of the region at the start of memory that is written to every frame.
+    pub hot_size: usize,
+    /// The number of 8 byte words written in the hot region each frame.
+    pub hot_writes: usize,
+    /// The number of frames between level loads.
+    pub level_load_period: u32,
+    /// The size of the region rewritten on a level load.
+    pub level_load_size: usize,
+}
+
+impl Default for SyntheticConfig {
+    fn default() -> Self {
+        Self {
+            size: 1 << 20,
+            hot_size: 64 << 10,
+            hot_writes: 64,
+            level_load_period: 2000,
+            level_load_size: 256 << 10,
+        }
+    }
+}
+
+/// The offset of the region holding the struct globals.
+///
+/// With the default config this lies past the level load region, so it is never written while
+/// advancing.
+const STRUCT_REGION: usize = 0xc0000;
+
+/// The size of the region holding the struct globals.
+const STRUCT_REGION_SIZE: usize = 0x4000;
+
+/// The global variables that can be read using data paths, and their offsets.
+///
+/// The arrays view the hot region, after the frame counter and seed. `gMarioState` points to
+/// `gMarioStates`, and `sSurfacePool` points to an array of surfaces after the object pool.
+const GLOBALS: &[(&str, usize)] = &[
+    ("gFrameCounter", 0),
+    ("gHotWords", 16),
+    ("gHotFloats", 16),
+    ("gHotShorts", 16),
+    ("gHotPointers", 16),
+    ("gMarioState", STRUCT_REGION),
+    ("sSurfacePool", STRUCT_REGION + 8),
+    ("gSurfacesAllocated", STRUCT_REGION + 16),
+    ("gMarioStates", STRUCT_REGION + 0x100),
+    ("gObjectPool", STRUCT_REGION + 0x1000),
+];
+
+/// The size of `struct Object`.
+const OBJECT_SIZE: usize = 32;
+
+/// The number of objects in `gObjectPool`.
+const OBJECT_POOL_LENGTH: usize = 240;
+
+/// The size of `struct Surface`.
+const SURFACE_SIZE: usize = 16;
+
+#[derive(Debug)]
+pub enum SyntheticSlot {
+    Base(Vec<u8>),
+    Buffer(SegmentBuffer),
+}
+
+impl SyntheticSlot {
+    pub(super) fn data(&self) -> &[u8] {
+        match self {
+            Self::Base(data) => data,
+            Self::Buffer(buffer) => buffer
+                .segment(0)
+                .expect("slot is compressed or unallocated"),
+        }
+    }
+
+    pub(super) fn data_mut(&mut self) -> &mut [u8] {
+        match self {
+            Self::Base(data) => data,
+            Self::Buffer(buffer) => buffer.segment_mut(0).expect("slot is unallocated"),
+        }
+    }
+}
+
+#[derive(Debug)]
+pub struct SyntheticMemory {
+    id: usize,
+    config: SyntheticConfig,
+    data_layout: DataLayout,
+    data_path_cache: DataPathCache,
+    /// The number of values read from slots.
+    num_slot_reads: AtomicUsize,
+}
+
+impl SyntheticMemory {
+    /// Create the memory and its base slot, which starts at frame 0.
+    pub fn new(config: SyntheticConfig) -> (Self, SyntheticSlot) {
+        let mut base_data = vec![0; config.size];
+        if STRUCT_REGION + STRUCT_REGION_SIZE <= config.size {
+            init_struct_region(&mut base_data);
+        }
+        let base_slot = SyntheticSlot::Base(base_data);
+
+        let mut data_layout = DataLayout::new();
+        let hot_array = |base: DataType, stride: usize| {
+            Arc::new(DataType::Array {
+                base: Arc::new(base),
+                length: Some((config.hot_size - 16) / stride),
+                stride,
+            })
+        };
+        let globals = vec![
+            ("gFrameCounter", Arc::new(DataType::Int(IntType::U32))),
+            ("gHotWords", hot_array(DataType::Int(IntType::U64), 8)),
+            ("gHotFloats", hot_array(DataType::Float(FloatType::F32), 4)),
+            ("gHotShorts", hot_array(DataType::Int(IntType::S16), 2)),
+            (
+                "gHotPointers",
+                hot_array(
+                    DataType::Pointer {
+                        base: Arc::new(DataType::Float(FloatType::F32)),
+                        stride: Some(4),
+                    },
+                    8,
+                ),
+            ),
+        ];
+        for (name, data_type) in globals {
+            data_layout.globals.insert(name.to_owned(), data_type);
+        }
+
+        let struct_type = |fields: Vec<(&str, usize, DataType)>| {
+            Arc::new(DataType::Struct {
+                fields: fields
+                    .into_iter()
+                    .map(|(name, offset, data_type)| {
+                        let data_type = Arc::new(data_type);
+                        (name.to_owned(), Field { offset, data_type })
+                    })
+                    .collect(),
+            })
+        };
+        let vec3f = || DataType::Array {
+            base: Arc::new(DataType::Float(FloatType::F32)),
+            length: Some(3),
+            stride: 4,
+        };
+        let mario_state = struct_type(vec![
+            ("action", 0, DataType::Int(IntType::U32)),
+            ("pos", 4, vec3f()),
+            ("vel", 16, vec3f()),
+        ]);
+        let object = struct_type(vec![
+            ("activeFlags", 0, DataType::Int(IntType::S16)),
+            (
+                "behavior",
+                8,
+                DataType::Pointer {
+                    base: Arc::new(DataType::Void),
+                    stride: None,
+                },
+            ),
+            ("oPosX", 16, DataType::Float(FloatType::F32)),
+            ("oPosY", 20, DataType::Float(FloatType::F32)),
+            ("oPosZ", 24, DataType::Float(FloatType::F32)),
+        ]);
+        let surface = struct_type(vec![
+            ("type", 0, DataType::Int(IntType::S16)),
+            ("normal", 4, vec3f()),
+        ]);
+        let struct_globals = vec![
+            (
+                "gMarioState",
+                Arc::new(DataType::Pointer {
+                    base: Arc::clone(&mario_state),
+                    stride: Some(28),
+                }),
+            ),
+            (
+                "gMarioStates",
+                Arc::new(DataType::Array {
+                    base: Arc::clone(&mario_state),
+                    length: Some(1),
+                    stride: 28,
+                }),
+            ),
+            (
+                "gObjectPool",
+                Arc::new(DataType::Array {
+                    base: Arc::clone(&object),
+                    length: Some(OBJECT_POOL_LENGTH),
+                    stride: OBJECT_SIZE,
+                }),
+            ),
+            (
+                "sSurfacePool",
+                Arc::new(DataType::Pointer {
+                    base: Arc::clone(&surface),
+                    stride: Some(SURFACE_SIZE),
+                }),
+            ),
+            ("gSurfacesAllocated", Arc::new(DataType::Int(IntType::S32))),
+        ];
+        for (name, data_type) in struct_globals {
+            data_layout.globals.insert(name.to_owned(), data_type);
+        }
+        let struct_defns = vec![
+            ("MarioState", mario_state),
+            ("Object", object),
+            ("Surface", surface),
+        ];
+        for (name, data_type) in struct_defns {
+            let type_name = TypeName {
+                namespace: Namespace::Struct,
+                name: name.to_owned(),
+            };
+            data_layout.type_defns.insert(type_name, data_type);
+        }
+
+        let memory = Self {
+            id: NEXT_MEMORY_ID.fetch_add(1, Ordering::SeqCst),
+            config,
+            data_layout,
+            data_path_cache: DataPathCache::new(),
+            num_slot_reads: AtomicUsize::new(0),
+        };
+        (memory, base_slot)
+    }
+
+    /// Return the frame counter stored in the slot.
+    pub fn frame_counter(&self, slot: &SyntheticSlot) -> u32 {
+        read_u32(slot.data(), 0)
+    }
+
+    /// Return a hash of the full contents of the slot.
+    pub fn checksum(&self, slot: &SyntheticSlot) -> u64 {
+        checksum_bytes(slot.data())
+    }
+
+    /// Return the number of int, float, and address values read from slots.
+    pub fn num_slot_reads(&self) -> usize {
+        self.num_slot_reads.load(Ordering::Relaxed)
+    }
+
+    /// Return the size of slot memory in bytes.
+    pub fn size(&self) -> usize {
+        self.config.size
+    }
+
+    fn bytes<'a>(
+        &self,
+        slot: &'a SyntheticSlot,
+        address: usize,
+        size: usize,
+    ) -> Result<&'a [u8], Error> {
+        self.num_slot_reads.fetch_add(1, Ordering::Relaxed);
+        slot.data()
+            .get(address..address + size)
+            .ok_or_else(|| MemoryErrorCause::InvalidAddress.into())
+    }
+
+    fn bytes_mut<'a>(
+        &self,
+        slot: &'a mut SyntheticSlot,
+        address: usize,
+        size: usize,
+    ) -> Result<&'a mut [u8], Error> {
+        slot.data_mut()
+            .get_mut(address..address + size)
+            .ok_or_else(|| MemoryErrorCause::InvalidAddress.into())
+    }
+}
+
+pub(super) fn read_u32(data: &[u8], offset: usize) -> u32 {
+    let mut bytes = [0; 4];
+    bytes.copy_from_slice(&data[offset..offset + 4]);
+    u32::from_le_bytes(bytes)
+}
+
+pub(super) fn read_u64(data: &[u8], offset: usize) -> u64 {
+    let mut bytes = [0; 8];
+    bytes.copy_from_slice(&data[offset..offset + 8]);
+    u64::from_le_bytes(bytes)
+}
+
+/// Return a hash of the contents of a slot.
+pub(super) fn checksum_bytes(data: &[u8]) -> u64 {
+    data.chunks(8)
+        .fold(0, |hash, chunk| mix(hash ^ read_u64(chunk, 0)))
+}
+
+/// Decode a little endian integer of the given type.
+pub(super) fn decode_int(bytes: &[u8], int_type: IntType) -> IntValue {
+    let mut buffer = [0; 8];
+    buffer[..bytes.len()].copy_from_slice(bytes);
+    let value = u64::from_le_bytes(buffer);
+    match int_type {
+        IntType::U8 => (value as u8).into(),
+        IntType::S8 => (value as i8).into(),
+        IntType::U16 => (value as u16).into(),
+        IntType::S16 => (value as i16).into(),
+        IntType::U32 => (value as u32).into(),
+        IntType::S32 => (value as i32).into(),
+        IntType::U64 => value.into(),
+        IntType::S64 => (value as i64).into(),
+    }
+}
+
+/// Write the initial contents of the struct region.
+///
+/// Every third object is active, and has one of four behaviors.
+fn init_struct_region(data: &mut [u8]) {
+    let mut write = |offset: usize, bytes: &[u8]| {
+        let start = STRUCT_REGION + offset;
+        data[start..start + bytes.len()].copy_from_slice(bytes);
+    };
+    write(0, &(STRUCT_REGION as u64 + 0x100).to_le_bytes());
+    write(8, &(STRUCT_REGION as u64 + 0x3000).to_le_bytes());
+    for object in (0..OBJECT_POOL_LENGTH).step_by(3) {
+        let offset = 0x1000 + object * OBJECT_SIZE;
+        write(offset, &1i16.to_le_bytes());
+        write(
+            offset + 8,
+            &(0x8000 + object as u64 % 4 * 0x100).to_le_bytes(),
+        );
+    }
+}
+
+/// A cheap deterministic hash used to pick the bytes that change each frame.
+fn mix(mut x: u64) -> u64 {
+    x ^= x >> 33;
+    x = x.wrapping_mul(0xff51_afd7_ed55_8ccd);
+    x ^= x >> 33;
+    x = x.wrapping_mul(0xc4ce_b9fe_1a85_ec53);
+    x ^ (x >> 33)
+}
+
+impl Memory for SyntheticMemory {
+    type Slot = SyntheticSlot;
+    type StaticAddress = ();
+    type RelocatableAddress = usize;
+
+    fn read_slot_int(
+        &self,
+        slot: &Self::Slot,
+        address: &Self::RelocatableAddress,
+        int_type: IntType,
+    ) -> Result<IntValue, Error> {
+        let bytes = self.bytes(slot, *address, int_type.size())?;
+        Ok(decode_int(bytes, int_type))
+    }
+
+    fn read_slot_float(
+        &self,
+        slot: &Self::Slot,
+        address: &Self::RelocatableAddress,
+        float_type: FloatType,
+    ) -> Result<FloatValue, Error> {
+        Ok(match float_type {
+            FloatType::F32 => f32::from_bits(read_u32(self.bytes(slot, *address, 4)?, 0)).into(),
+            FloatType::F64 => f64::from_bits(read_u64(self.bytes(slot, *address, 8)?, 0)),
+        })
+    }
+
+    fn read_slot_address(
+        &self,
+        slot: &Self::Slot,
+        address: &Self::RelocatableAddress,
+    ) -> Result<Address, Error> {
+        Ok(Address(read_u64(self.bytes(slot, *address, 8)?, 0) as usize))
+    }
+
+    fn read_static_int(
+        &self,
+        _address: &Self::StaticAddress,
+        _int_type: IntType,
+    ) -> Result<IntValue, Error> {
+        Err(MemoryErrorCause::InvalidAddress.into())
+    }
+
+    fn read_static_float(
+        &self,
+        _address: &Self::StaticAddress,
+        _float_type: FloatType,
+    ) -> Result<FloatValue, Error> {
+        Err(MemoryErrorCause::InvalidAddress.into())
+    }
+
+    fn read_static_address(&self, _address: &Self::StaticAddress) -> Result<Address, Error> {
+        Err(MemoryErrorCause::InvalidAddress.into())
+    }
+
+    fn write_slot_int(
+        &self,
+        slot: &mut Self::Slot,
+        address: &Self::RelocatableAddress,
+        int_type: IntType,
+        value: IntValue,
+    ) -> Result<(), Error> {
+        let bytes = (value as u64).to_le_bytes();
+        let size = int_type.size();
+        self.bytes_mut(slot, *address, size)?
+            .copy_from_slice(&bytes[..size]);
+        Ok(())
+    }
+
+    fn write_slot_float(
+        &self,
+        slot: &mut Self::Slot,
+        address: &Self::RelocatableAddress,
+        float_type: FloatType,
+        value: FloatValue,
+    ) -> Result<(), Error> {
+        match float_type {
+            FloatType::F32 => self
+                .bytes_mut(slot, *address, 4)?
+                .copy_from_slice(&(value as f32).to_bits().to_le_bytes()),
+            FloatType::F64 => self
+                .bytes_mut(slot, *address, 8)?
+                .copy_from_slice(&value.to_bits().to_le_bytes()),
+        }
+        Ok(())
+    }
+
+    fn write_slot_address(
+        &self,
+        slot: &mut Self::Slot,
+        address: &Self::RelocatableAddress,
+        value: &Address,
+    ) -> Result<(), Error> {
+        self.bytes_mut(slot, *address, 8)?
+            .copy_from_slice(&(value.0 as u64).to_le_bytes());
+        Ok(())
+    }
+
+    fn classify_address(&self, address: &Address) -> ClassifiedAddress<Self> {
+        if address.0 < self.config.size {
+            ClassifiedAddress::Relocatable(address.0)
+        } else {
+            ClassifiedAddress::Invalid
+        }
+    }
+
+    fn id(&self) -> usize {
+        self.id
+    }
+
+    fn data_layout(&self) -> &DataLayout {
+        &self.data_layout
+    }
+
+    fn data_layout_mut(&mut self) -> &mut DataLayout {
+        &mut self.data_layout
+    }
+
+    fn symbol_address(&self, symbol: &str) -> Result<Address, Error> {
+        match GLOBALS.iter().find(|(name, _)| *name == symbol) {
+            Some(&(_, offset)) => Ok(Address(offset)),
+            None => Err(MemoryErrorCause::UndefinedGlobal {
+                name: symbol.to_owned(),
+            }
+            .into()),
+        }
+    }
+
+    fn data_path_cache(&self) -> &DataPathCache {
+        &self.data_path_cache
+    }
+
+    fn create_backup_slot(&self) -> Result<Self::Slot, Error> {
+        Ok(SyntheticSlot::Buffer(SegmentBuffer::new()))
+    }
+
+    fn copy_slot(&self, dst: &mut Self::Slot, src: &Self::Slot) -> Result<usize, Error> {
+        Ok(match (dst, src) {
+            (SyntheticSlot::Buffer(dst), SyntheticSlot::Buffer(src)) => {
+                dst.copy_from(src);
+                0
+            }
+            (SyntheticSlot::Buffer(dst), SyntheticSlot::Base(src)) => dst.write_segments(&[src]),
+            (SyntheticSlot::Base(dst), SyntheticSlot::Buffer(src)) => src.copy_segment_into(0, dst),
+            (SyntheticSlot::Base(dst), SyntheticSlot::Base(src)) => copy_changed_chunks(dst, src),
+        })
+    }
+
+    fn compress_slot(&self, slot: &mut Self::Slot, reference: &Self::Slot) -> Result<bool, Error> {
+        match (slot, reference) {
+            (SyntheticSlot::Buffer(slot), SyntheticSlot::Buffer(reference)) => {
+                Ok(slot.compress(reference))
+            }
+            _ => Ok(false),
+        }
+    }
+
+    fn is_slot_compressed(&self, slot: &Self::Slot) -> bool {
+        match slot {
+            SyntheticSlot::Base(_) => false,
+            SyntheticSlot::Buffer(buffer) => buffer.is_compressed(),
+        }
+    }
+
+    fn slots_equal(&self, slot1: &Self::Slot, slot2: &Self::Slot) -> Result<bool, Error> {
+        Ok(match (slot1, slot2) {
+            (SyntheticSlot::Buffer(slot1), SyntheticSlot::Buffer(slot2)) => {
+                slot1.contents_equal(slot2)
+            }
+            (SyntheticSlot::Buffer(buffer), SyntheticSlot::Base(data))
+            | (SyntheticSlot::Base(data), SyntheticSlot::Buffer(buffer)) => {
+                buffer.segment_equals(0, data)
+            }
+            (SyntheticSlot::Base(data1), SyntheticSlot::Base(data2)) => data1 == data2,
+        })
+    }
+
+    fn slot_bytes(&self, slot: &Self::Slot) -> Result<Option<Vec<u8>>, Error> {
+        let mut bytes = vec![0; self.config.size];
+        match slot {
+            SyntheticSlot::Base(data) => bytes.copy_from_slice(data),
+            SyntheticSlot::Buffer(buffer) => {
+                buffer.copy_segment_into(0, &mut bytes);
+            }
+        }
+        Ok(Some(bytes))
+    }
+
+    fn load_slot_bytes(&self, slot: &mut Self::Slot, bytes: &[u8]) -> Result<bool, Error> {
+        if bytes.len() != self.config.size {
+            return Ok(false);
+        }
+        match slot {
+            SyntheticSlot::Base(data) => {
+                copy_changed_chunks(data, bytes);
+            }
+            SyntheticSlot::Buffer(buffer) => {
+                buffer.write_segments(&[bytes]);
+            }
+        }
+        Ok(true)
+    }
+
+    fn slot_size(&self, slot: &Self::Slot) -> usize {
+        match slot {
+            SyntheticSlot::Base(data) => data.len(),
+            SyntheticSlot::Buffer(buffer) => buffer.byte_size(),
+        }
+    }
+
+    fn advance_base_slot(&self, base_slot: &mut Self::Slot) -> Result<(), Error> {
+        let config = &self.config;
+        let data = match base_slot {
+            SyntheticSlot::Base(data) => data,
+            SyntheticSlot::Buffer(_) => {
+                return Err(MemoryErrorCause::NonBaseSlot {
+                    slot: format!("{:?}", base_slot),
+                }
+                .into())
+            }
+        };
+
+        let frame = read_u32(data, 0).wrapping_add(1);
+        data[0..4].copy_from_slice(&frame.to_le_bytes());
+
+        // The new contents depend on the previous contents so that edits propagate
+        let seed = mix(read_u64(data, 8) ^ frame as u64);
+        let num_words = config.hot_size / 8;
+        for i in 0..config.hot_writes {
+            let word = 2 + mix(seed.wrapping_add(i as u64)) as usize % (num_words - 2);
+            let value = mix(seed ^ word as u64);
+            data[word * 8..word * 8 + 8].copy_from_slice(&value.to_le_bytes());
+        }
+
+        if frame % config.level_load_period == 0 {
+            let start = config.hot_size;
+            let end = (start + config.level_load_size).min(config.size);
+            for (i, chunk) in data[start..end].chunks_mut(8).enumerate() {
+                let value = mix(seed ^ (i as u64) << 32).to_le_bytes();
+                chunk.copy_from_slice(&value[..chunk.len()]);
+            }
+        }
+
+        Ok(())
+    }
+}
+
+/// A controller that writes a value to the start of the hot region on chosen frames.
+#[derive(Debug, Clone, Default)]
+pub struct SyntheticController {
+    pub edits: Vec<(u32, u64)>,
+}
+
+impl SyntheticController {
+    pub(super) fn prefix_hash(&self, frame: u32) -> u64 {
+        self.edits
+            .iter()
+            .filter(|(edit_frame, _)| *edit_frame <= frame)
+            .fold(0, |hash, &(edit_frame, value)| {
+                hash.wrapping_add(mix(mix(edit_frame as u64) ^ value))
+            })
+    }
+
+    pub(super) fn apply_edits(&self, frame: u32, slot: &mut SyntheticSlot) {
+        for (_, value) in self
+            .edits
+            .iter()
+            .filter(|(edit_frame, _)| *edit_frame == frame)
+        {
+            slot.data_mut()[8..16].copy_from_slice(&value.to_le_bytes());
+        }
+    }
+}
+
+impl Controller<SyntheticMemory> for SyntheticController {
+    fn edit_prefix_hash(&self, frame: u32) -> Option<u64> {
+        Some(self.prefix_hash(frame))
+    }
+
+    fn apply(&self, state: &mut impl SlotStateMut<Memory = SyntheticMemory>) -> Result<(), Error> {
+        let frame = state.frame();
+        self.apply_edits(frame, state.slot_mut());
+        Ok(())
+    }
+}
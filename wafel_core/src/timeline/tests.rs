@@ -0,0 +1,273 @@
+//! Unit tests for the timeline, run using `cargo test`.
+
+use super::{
+    cost_model::FrameCosts,
+    slot_manager::SlotManager,
+    snapshot_store::{SnapshotKey, StableHasher},
+    synthetic_memory::{SyntheticConfig, SyntheticController, SyntheticMemory},
+    GuardedPath, PlacementPolicy, Playback, SlotMode, SnapshotStore, State, Timeline,
+};
+use crate::{data_path::GlobalDataPath, memory::Memory};
+use std::{
+    env, fs,
+    hash::{Hash, Hasher},
+    process,
+    time::{Duration, Instant},
+};
+
+/// Shrinking the memory budget while a seek is in progress must not evict or invalidate the
+/// seek's checkpoint.
+#[test]
+fn evict_during_seek() {
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let slot_size = memory.slot_size(&base_slot);
+    let mut manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        4,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    manager.set_hotspot("selected-frame", 0);
+
+    // The checkpoint goes in the last empty backup slot
+    let done = manager
+        .seek(10_000_000, Duration::from_millis(1), &mut |_| {})
+        .unwrap();
+    assert!(!done);
+
+    // Room for the power-on slot and two backup slots
+    manager.set_memory_budget(Some(3 * slot_size)).unwrap();
+    assert_eq!(manager.num_backup_slots(), 2);
+
+    for _ in 0..3 {
+        let done = manager
+            .seek(10_000_000, Duration::from_millis(1), &mut |_| {})
+            .unwrap();
+        assert!(!done);
+        manager
+            .balance_distribution(Duration::from_millis(1))
+            .unwrap();
+    }
+    assert!(manager.seek_progress().unwrap().1 > 0.0);
+}
+
+/// Starting reverse playback under a memory budget must not evict backup slots to make room
+/// for the reverse playback ring.
+#[test]
+fn reverse_ring_outside_budget() {
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let slot_size = memory.slot_size(&base_slot);
+    let mut manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        0,
+        SlotMode::Delta,
+    )
+    .unwrap();
+    manager.set_memory_budget(Some(10 * slot_size)).unwrap();
+    let num_backup_slots = manager.num_backup_slots();
+    assert!(num_backup_slots > 0);
+
+    manager.set_playback(Some(Playback {
+        frame: 500,
+        frames_per_second: -30.0,
+    }));
+    for _ in 0..3 {
+        manager
+            .balance_distribution(Duration::from_millis(10))
+            .unwrap();
+    }
+    assert!(manager.num_backup_slots() >= num_backup_slots);
+}
+
+/// Placing a slot far from any other must be spread over several calls to
+/// `balance_distribution` instead of blocking until the frame is loaded.
+#[test]
+fn balance_distribution_deadline() {
+    const HOTSPOT: u32 = 2_000_000;
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let mut manager = SlotManager::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        30,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    manager.set_placement_policy(PlacementPolicy::Alignment);
+    manager.set_hotspot("selected-frame", HOTSPOT);
+
+    let mut max_call_time = Duration::from_secs(0);
+    let mut num_calls = 0;
+    while !manager.cached_frames().contains(&HOTSPOT) {
+        let start_time = Instant::now();
+        manager
+            .balance_distribution(Duration::from_millis(1))
+            .unwrap();
+        max_call_time = max_call_time.max(start_time.elapsed());
+        num_calls += 1;
+    }
+    assert!(num_calls > 1);
+    assert!(max_call_time < Duration::from_millis(50));
+}
+
+/// Snapshots of different sizes are kept in separate namespaces, and survive reopening the
+/// store.
+#[test]
+fn snapshot_store_namespaces() {
+    let directory = env::temp_dir().join(format!("wafel-snapshot-test-{}", process::id()));
+    let key = |namespace: u64, frame: u32| SnapshotKey {
+        namespace,
+        frame,
+        edit_hash: 7,
+    };
+    let small: Vec<u8> = (0..100).collect();
+    let large: Vec<u8> = (0..200).map(|i| (i * 3) as u8).collect();
+
+    {
+        let mut store = SnapshotStore::open(&directory, 1 << 20).unwrap();
+        store.write(key(1, 1000), &small).unwrap();
+        store.write(key(2, 1000), &large).unwrap();
+        store.write(key(1, 2000), &small).unwrap();
+        assert!(store.contains(&key(1, 1000)));
+        assert!(!store.contains(&key(2, 2000)));
+    }
+
+    let mut store = SnapshotStore::open(&directory, 1 << 20).unwrap();
+    assert_eq!(store.read(&key(1, 1000)).unwrap(), Some(small.clone()));
+    assert_eq!(store.read(&key(1, 2000)).unwrap(), Some(small));
+    assert_eq!(store.read(&key(2, 1000)).unwrap(), Some(large));
+    assert_eq!(store.keys(2).unwrap().count(), 1);
+    assert_eq!(store.read(&key(3, 1000)).unwrap(), None);
+
+    drop(store);
+    fs::remove_dir_all(&directory).unwrap();
+}
+
+/// `StableHasher` must match the FNV-1a reference values, since its hashes are persisted.
+#[test]
+fn stable_hasher_values() {
+    let hash = |bytes: &[u8]| {
+        let mut hasher = StableHasher::new();
+        hasher.write(bytes);
+        hasher.finish()
+    };
+    assert_eq!(hash(b""), 0xcbf2_9ce4_8422_2325);
+    assert_eq!(hash(b"a"), 0xaf63_dc4c_8601_ec8c);
+    assert_eq!(hash(b"foobar"), 0x8594_4171_f739_67e8);
+
+    let mut hasher = StableHasher::new();
+    0x0403_0201_u32.hash(&mut hasher);
+    assert_eq!(hasher.finish(), hash(&[1, 2, 3, 4]));
+}
+
+/// Each frame cost bin holds its most expensive frame relative to the mean measured frame.
+#[test]
+fn frame_cost_bins() {
+    let mut costs = FrameCosts::new();
+    assert_eq!(costs.bins(10, 2), vec![0.0, 0.0]);
+
+    for frame in 0..8 {
+        costs.record(frame, Duration::from_millis(1));
+    }
+    costs.record(6, Duration::from_millis(1000));
+    let mean = costs.mean_time().unwrap() as f32;
+    let expensive = costs.bins(100, 100)[6];
+
+    let bins = costs.bins(10, 3);
+    assert_eq!(bins.len(), 3);
+    assert!((bins[0] - 0.001 / mean).abs() < 1e-3);
+    assert!((bins[1] - expensive).abs() < 1e-3);
+    assert!(bins[1] > bins[0]);
+    // Frames 8 and 9 haven't been measured
+    assert!((bins[2] - 0.001 / mean).abs() < 1e-3);
+    assert_eq!(costs.bins(10, 10)[9], 0.0);
+    assert_eq!(costs.bins(0, 4), vec![0.0; 4]);
+}
+
+/// Seeking a frame that is already loaded, as the UI does on every UI frame, must neither
+/// advance nor count as a new request in the access histogram.
+#[test]
+fn repeated_seek_is_free() {
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let mut timeline = Timeline::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        4,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let long = Duration::from_secs(60);
+    assert!(timeline.seek(3000, long).unwrap());
+    assert!(timeline.seek(4000, long).unwrap());
+
+    let num_advances = timeline.num_advances();
+    let mean_advances = timeline.mean_request_advances();
+    for _ in 0..60 {
+        assert!(timeline.seek(4000, long).unwrap());
+        assert!(timeline.seek(3000, long).unwrap());
+    }
+    assert_eq!(timeline.num_advances(), num_advances);
+    assert_eq!(timeline.mean_request_advances(), mean_advances);
+}
+
+/// Preloading the data cache ahead of the playhead is internal, and must not be recorded in the
+/// access histogram as user demand.
+#[test]
+fn playback_preload_unrecorded() {
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let mut timeline = Timeline::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        4,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    assert!(timeline.seek(1000, Duration::from_secs(60)).unwrap());
+
+    let num_advances = timeline.num_advances();
+    let mean_advances = timeline.mean_request_advances();
+    timeline.set_playback(Some(Playback {
+        frame: 1000,
+        frames_per_second: 30.0,
+    }));
+    for _ in 0..3 {
+        timeline
+            .balance_distribution(Duration::from_secs(1))
+            .unwrap();
+    }
+    assert!(timeline.num_advances() > num_advances);
+    assert_eq!(timeline.mean_request_advances(), mean_advances);
+}
+
+/// Demoting a path must also stop preloading it in the data caches of parked branches.
+#[test]
+fn demote_parked_branches() {
+    let (memory, base_slot) = SyntheticMemory::new(SyntheticConfig::default());
+    let mut timeline = Timeline::new(
+        memory,
+        base_slot,
+        SyntheticController::default(),
+        4,
+        SlotMode::Dense,
+    )
+    .unwrap();
+    let path = GuardedPath::new(
+        GlobalDataPath::compile(timeline.memory(), "gFrameCounter").unwrap(),
+        Vec::new(),
+    );
+    timeline.frame(10).unwrap().guarded_read(&path).unwrap();
+    assert_eq!(timeline.data_cache_stats().hot_paths, 1);
+
+    let main_branch = timeline.branch();
+    let branch = timeline.fork();
+    timeline.switch_branch(branch);
+    timeline.demote_paths(&[path]);
+    timeline.switch_branch(main_branch);
+    assert_eq!(timeline.data_cache_stats().hot_paths, 0);
+}
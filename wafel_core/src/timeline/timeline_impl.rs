@@ -1,22 +1,54 @@
-use super::{data_cache::DataCache, slot_manager::SlotManager, SlotState, SlotStateMut, State};
+use super::{
+    data_cache::{DataCache, DataCacheStats},
+    slot_manager::SlotManager,
+    BranchId, CostModel, GuardedPath, PlacementPolicy, Playback, SlotMode, SlotState, SlotStateMut,
+    SnapshotStore, State,
+};
 use crate::{
     data_path::GlobalDataPath,
     error::Error,
     memory::{Address, Memory, Value},
 };
-use std::{cell::RefCell, time::Duration};
+use std::{
+    cell::RefCell,
+    collections::HashMap,
+    mem,
+    ops::Range,
+    time::{Duration, Instant},
+};
+use tracing::warn;
+
+/// During playback, data cache rows are preloaded for this many seconds ahead of the
+/// playhead.
+const PRELOAD_SECONDS: f32 = 0.5;
 
 /// Applies edits at the end of each frame to control the simulation.
 pub trait Controller<M: Memory> {
     /// Apply edits to the given state.
     fn apply(&self, state: &mut impl SlotStateMut<Memory = M>) -> Result<(), Error>;
+
+    /// Return a hash of every edit applied on frames up to and including `frame`.
+    ///
+    /// Together with the initial state, this identifies the state on `frame`, and is used to
+    /// key persisted snapshots. The hash should be stable across program runs and Rust
+    /// versions, e.g. by using `StableHasher`. Returning None disables snapshots for the
+    /// frame, which is the default.
+    fn edit_prefix_hash(&self, _frame: u32) -> Option<u64> {
+        None
+    }
 }
 
 /// An abstraction allowing random access to any frame of the simulation.
 #[derive(Debug)]
 pub struct Timeline<M: Memory, C: Controller<M>> {
     slot_manager: SlotManager<M, C>,
+    /// The data cache of the current branch.
     data_cache: RefCell<DataCache>,
+    /// The data caches of the other branches.
+    parked_data_caches: HashMap<BranchId, DataCache>,
+    /// If set, the maximum number of frames to simulate when checking whether an edit's
+    /// effects re-converge.
+    convergence_limit: Option<usize>,
 }
 
 impl<M: Memory, C: Controller<M>> Timeline<M, C> {
@@ -25,15 +57,26 @@ impl<M: Memory, C: Controller<M>> Timeline<M, C> {
     /// Typically `memory` should be a freshly created `Memory` object.
     /// Otherwise, frame 0 will be defined as whatever the current contents of the
     /// base slot are.
+    ///
+    /// `slot_mode` determines whether backup slots are compressed. See `SlotMode`.
     pub fn new(
         memory: M,
         base_slot: M::Slot,
         controller: C,
         num_backup_slots: usize,
+        slot_mode: SlotMode,
     ) -> Result<Self, Error> {
         Ok(Self {
-            slot_manager: SlotManager::new(memory, base_slot, controller, num_backup_slots)?,
+            slot_manager: SlotManager::new(
+                memory,
+                base_slot,
+                controller,
+                num_backup_slots,
+                slot_mode,
+            )?,
             data_cache: RefCell::new(DataCache::new()),
+            parked_data_caches: HashMap::new(),
+            convergence_limit: None,
         })
     }
 
@@ -55,17 +98,126 @@ impl<M: Memory, C: Controller<M>> Timeline<M, C> {
     }
 
     /// Get a mutable reference to the controller.
+    ///
+    /// If convergence detection is enabled and the edit only affects a bounded range of
+    /// frames, states after the edit are kept if the simulation re-converges with them.
+    /// See `set_convergence_limit`. This simulates frames, so temporary changes should use
+    /// `with_controller_mut_preview` instead.
     pub fn with_controller_mut(&mut self, func: impl FnOnce(&mut C) -> InvalidatedFrames) {
         let invalidated_frames = func(self.slot_manager.controller_mut());
-        if let InvalidatedFrames::StartingAt(frame) = invalidated_frames {
-            self.slot_manager.invalidate_frame(frame);
-            self.data_cache.borrow_mut().invalidate_frame(frame);
+        match invalidated_frames {
+            InvalidatedFrames::StartingAt(frame) => self.invalidate_frame(frame),
+            InvalidatedFrames::Edited { start, end } => match self.convergence_limit {
+                Some(max_advances) => {
+                    let converged_frame =
+                        self.slot_manager
+                            .invalidate_edited_frames(start, end, max_advances);
+                    match converged_frame {
+                        Ok(Some(converged_frame)) => self
+                            .data_cache
+                            .borrow_mut()
+                            .invalidate_frame_range(start, converged_frame),
+                        Ok(None) => self.invalidate_frame(start),
+                        // The error will resurface when the frames are requested
+                        Err(error) => {
+                            warn!("convergence check failed: {}", error);
+                            self.invalidate_frame(start)
+                        }
+                    }
+                }
+                None => self.invalidate_frame(start),
+            },
+            InvalidatedFrames::None => {}
         }
     }
 
+    /// Get a mutable reference to the controller for a temporary change, such as a drag
+    /// preview.
+    ///
+    /// Unlike `with_controller_mut`, states after the edit are always invalidated without
+    /// checking for convergence, since the change is likely to be replaced before they are
+    /// requested.
+    pub fn with_controller_mut_preview(&mut self, func: impl FnOnce(&mut C) -> InvalidatedFrames) {
+        let invalidated_frames = func(self.slot_manager.controller_mut());
+        match invalidated_frames {
+            InvalidatedFrames::StartingAt(frame)
+            | InvalidatedFrames::Edited { start: frame, .. } => self.invalidate_frame(frame),
+            InvalidatedFrames::None => {}
+        }
+    }
+
+    fn invalidate_frame(&mut self, frame: u32) {
+        self.slot_manager.invalidate_frame(frame);
+        self.data_cache.borrow_mut().invalidate_frame(frame);
+    }
+
+    /// Return the current branch, which all requests and edits apply to.
+    pub fn branch(&self) -> BranchId {
+        self.slot_manager.branch()
+    }
+
+    /// Return the ids of every branch, including the current one.
+    pub fn branches(&self) -> Vec<BranchId> {
+        self.slot_manager.branches()
+    }
+
+    /// Create a branch whose controller is a copy of the current branch's controller.
+    ///
+    /// The current branch is unchanged. Slots are shared between the branches for frames
+    /// before their first differing edit, while cached data is kept separately.
+    pub fn fork(&mut self) -> BranchId
+    where
+        C: Clone,
+    {
+        let branch = self.slot_manager.fork();
+        let mut data_cache = DataCache::new();
+        data_cache.set_byte_budget(self.data_cache.get_mut().byte_budget());
+        data_cache.set_pinned_paths(&self.data_cache.get_mut().pinned_paths());
+        self.parked_data_caches.insert(branch, data_cache);
+        branch
+    }
+
+    /// Make `branch` the current branch.
+    ///
+    /// Panics if the branch doesn't exist.
+    pub fn switch_branch(&mut self, branch: BranchId) {
+        let prev_branch = self.slot_manager.branch();
+        if branch != prev_branch {
+            self.slot_manager.switch_branch(branch);
+            let data_cache = self.parked_data_caches.remove(&branch).unwrap();
+            let prev_data_cache = mem::replace(self.data_cache.get_mut(), data_cache);
+            self.parked_data_caches.insert(prev_branch, prev_data_cache);
+        }
+    }
+
+    /// Delete a branch other than the current one.
+    ///
+    /// Panics if the branch doesn't exist or is the current branch.
+    pub fn delete_branch(&mut self, branch: BranchId) {
+        self.slot_manager.delete_branch(branch);
+        self.parked_data_caches.remove(&branch);
+    }
+
+    /// Return the maximum number of frames simulated to detect convergence after an edit, or
+    /// None if convergence detection is disabled.
+    pub fn convergence_limit(&self) -> Option<usize> {
+        self.convergence_limit
+    }
+
+    /// Enable or disable convergence detection after edits.
+    ///
+    /// When enabled, an edit to a bounded range of frames re-simulates up to `max_advances`
+    /// frames past the edit, comparing the new state with previously saved slots. If they
+    /// match, the later slots and cached data are kept rather than being recomputed. Edits
+    /// that don't affect the game state then only cost a few frame advances.
+    pub fn set_convergence_limit(&mut self, max_advances: Option<usize>) {
+        self.convergence_limit = max_advances;
+    }
+
     /// Get the state for a given frame.
     ///
-    /// This method bypasses the data cache.
+    /// This method bypasses the data cache, although the frames advanced through to reach
+    /// it are still preloaded into the cache.
     ///
     /// Generally, only one state should be kept alive at a time. Accessing one of the states
     /// may result in a panic.
@@ -73,7 +225,10 @@ impl<M: Memory, C: Controller<M>> Timeline<M, C> {
         &'a self,
         frame: u32,
     ) -> Result<impl SlotState<Memory = M> + 'a, Error> {
-        self.slot_manager.frame(frame)
+        let data_cache = &self.data_cache;
+        self.slot_manager.frame_observed(frame, &mut |state| {
+            data_cache.borrow_mut().capture_frame(state, frame)
+        })
     }
 
     /// Get the state for a given frame.
@@ -100,13 +255,68 @@ impl<M: Memory, C: Controller<M>> Timeline<M, C> {
                 data_cache.preload_frame(&state);
 
                 let value = state.path_read(path)?;
-                data_cache.insert(frame, path, value.clone());
+                data_cache.insert(&state, path, value.clone());
 
                 Ok(value)
             }
         }
     }
 
+    fn path_address_cached(
+        &self,
+        frame: u32,
+        path: &GlobalDataPath,
+    ) -> Result<Option<Address>, Error> {
+        let cached_address = self.data_cache.borrow_mut().get_address(frame, path);
+        match cached_address {
+            Some(address) => Ok(address),
+            None => {
+                let state = self.frame_uncached(frame)?;
+                let mut data_cache = self.data_cache.borrow_mut();
+
+                data_cache.preload_frame(&state);
+
+                let address = state.path_address(path)?;
+                data_cache.insert_address(&state, path, address);
+
+                Ok(address)
+            }
+        }
+    }
+
+    fn guarded_read_cached(&self, frame: u32, path: &GuardedPath) -> Result<Value, Error> {
+        let cached_value = self.data_cache.borrow_mut().get_guarded(frame, path);
+        match cached_value {
+            Some(value) => Ok(value),
+            None => {
+                let state = self.frame_uncached(frame)?;
+                let mut data_cache = self.data_cache.borrow_mut();
+
+                data_cache.preload_frame(&state);
+                data_cache.read_guarded(&state, path)
+            }
+        }
+    }
+
+    /// Read a data path on each frame in a range, using the data cache.
+    ///
+    /// Cached values are read from the path's column in frame order, and only the missing
+    /// frames are requested from the slot manager.
+    pub fn path_read_range(
+        &self,
+        path: &GlobalDataPath,
+        frames: Range<u32>,
+    ) -> Result<Vec<Value>, Error> {
+        let cached_values = self.data_cache.borrow_mut().get_range(path, frames.clone());
+        frames
+            .zip(cached_values)
+            .map(|(frame, cached_value)| match cached_value {
+                Some(value) => Ok(value),
+                None => self.path_read_cached(frame, path),
+            })
+            .collect()
+    }
+
     /// Get an immutable view of the base slot.
     ///
     /// This can be used for running internal functions in the base slot if they have no
@@ -146,9 +356,76 @@ impl<M: Memory, C: Controller<M>> Timeline<M, C> {
         self.slot_manager.delete_hotspot(name);
     }
 
-    /// Perform housekeeping to improve scrolling near hotspots.
+    /// Advance toward `frame` for roughly `max_run_time`, returning true once it is loaded.
+    ///
+    /// Returns true immediately if the frame's rows are in the data cache or a slot holds the
+    /// frame, since the UI seeks the selected frame on every UI frame.
+    ///
+    /// See `SlotManager::seek`.
+    pub fn seek(&mut self, frame: u32, max_run_time: Duration) -> Result<bool, Error> {
+        if self.data_cache.get_mut().contains_frame(frame)
+            || self.slot_manager.contains_frame(frame)
+        {
+            self.slot_manager.cancel_seek();
+            return Ok(true);
+        }
+        let data_cache = &self.data_cache;
+        self.slot_manager.seek(frame, max_run_time, &mut |state| {
+            data_cache.borrow_mut().capture_frame(state, frame)
+        })
+    }
+
+    /// Return the target frame of the seek in progress and the fraction of the way there.
+    pub fn seek_progress(&self) -> Option<(u32, f32)> {
+        self.slot_manager.seek_progress()
+    }
+
+    /// Stop the seek in progress, keeping any checkpoints it saved.
+    pub fn cancel_seek(&mut self) {
+        self.slot_manager.cancel_seek();
+    }
+
+    /// Set a hint that frames are being played back in order, or None when playback stops.
+    ///
+    /// During playback, `balance_distribution` keeps backup slots and data cache rows ready
+    /// ahead of the playhead.
+    pub fn set_playback(&mut self, playback: Option<Playback>) {
+        self.slot_manager.set_playback(playback);
+    }
+
+    /// Perform housekeeping to improve scrolling near hotspots and during playback.
     pub fn balance_distribution(&mut self, max_run_time: Duration) -> Result<(), Error> {
-        self.slot_manager.balance_distribution(max_run_time)
+        let start_time = Instant::now();
+        self.slot_manager.balance_distribution(max_run_time)?;
+        self.preload_playback(start_time, max_run_time)
+    }
+
+    /// Preload the data cache for the frames that will be played next.
+    fn preload_playback(
+        &mut self,
+        start_time: Instant,
+        max_run_time: Duration,
+    ) -> Result<(), Error> {
+        let playback = match self.slot_manager.playback() {
+            Some(playback) if self.slot_manager.seek_progress().is_none() => playback,
+            _ => return Ok(()),
+        };
+        for frame in playback.upcoming_frames(PRELOAD_SECONDS) {
+            if start_time.elapsed() > max_run_time {
+                break;
+            }
+            if !self.data_cache.get_mut().contains_frame(frame) {
+                // Prefetching isn't user demand, so it isn't recorded in the access histogram
+                let data_cache = &self.data_cache;
+                let state = self
+                    .slot_manager
+                    .prefetch_frame_observed(frame, &mut |state| {
+                        data_cache.borrow_mut().capture_frame(state, frame)
+                    })?;
+                data_cache.borrow_mut().preload_frame(&state);
+            }
+        }
+        Ok(())
     }
 
     /// Return the set of currently loaded frames for debugging purposes.
@@ -166,10 +443,124 @@ impl<M: Memory, C: Controller<M>> Timeline<M, C> {
         self.slot_manager.num_copies()
     }
 
+    /// Return the number of bytes written by slot copies since the timeline was created.
+    ///
+    /// Data that was already equal in the destination slot is not counted.
+    pub fn num_copied_bytes(&self) -> usize {
+        self.slot_manager.num_copied_bytes()
+    }
+
+    /// Return the way that backup slots are stored.
+    pub fn slot_mode(&self) -> SlotMode {
+        self.slot_manager.slot_mode()
+    }
+
+    /// Return the number of bytes used by backup slots.
+    pub fn slot_memory_size(&self) -> usize {
+        self.slot_manager.slot_memory_size()
+    }
+
+    /// Return the policy used to place backup slots.
+    pub fn placement_policy(&self) -> PlacementPolicy {
+        self.slot_manager.placement_policy()
+    }
+
+    /// Set the policy used to place backup slots.
+    pub fn set_placement_policy(&mut self, placement_policy: PlacementPolicy) {
+        self.slot_manager.set_placement_policy(placement_policy);
+    }
+
+    /// Return the measured costs of slot copies and frame advances.
+    pub fn cost_model(&self) -> CostModel {
+        self.slot_manager.cost_model()
+    }
+
+    /// Return the highest advance time in each of `num_bins` equal bins of frames
+    /// `0..num_frames`, relative to the average advance time.
+    ///
+    /// Bins without measured frames have a value of zero.
+    pub fn frame_cost_bins(&self, num_frames: usize, num_bins: usize) -> Vec<f32> {
+        self.slot_manager.frame_cost_bins(num_frames, num_bins)
+    }
+
+    /// Return a decayed average of the number of frame advances per frame request.
+    pub fn mean_request_advances(&self) -> f32 {
+        self.slot_manager.mean_request_advances()
+    }
+
+    /// Return the current number of backup slots.
+    pub fn num_backup_slots(&self) -> usize {
+        self.slot_manager.num_backup_slots()
+    }
+
+    /// Return the memory budget for backup slots, if any.
+    pub fn memory_budget(&self) -> Option<usize> {
+        self.slot_manager.memory_budget()
+    }
+
+    /// Limit the memory used by backup slots, creating or evicting slots to fit.
+    ///
+    /// If `memory_budget` is None, the current slots are kept but no longer adjusted.
+    pub fn set_memory_budget(&mut self, memory_budget: Option<usize>) -> Result<(), Error> {
+        self.slot_manager.set_memory_budget(memory_budget)
+    }
+
+    /// Persist snapshots of frames to the given store and use them to skip simulation, or
+    /// stop using snapshots if None.
+    pub fn set_snapshot_store(&mut self, store: Option<SnapshotStore>) -> Result<(), Error> {
+        self.slot_manager.set_snapshot_store(store)
+    }
+
+    /// Load matching snapshots from the given store into backup slots, returning the number
+    /// of snapshots loaded.
+    pub fn import_snapshots(&mut self, store: &mut SnapshotStore) -> Result<usize, Error> {
+        self.slot_manager.import_snapshots(store)
+    }
+
     /// Return the size of the data cache in bytes.
     pub fn data_size_cache(&self) -> usize {
         self.data_cache.borrow().byte_size()
     }
+
+    /// Return the number of bytes each branch's data cache may use.
+    pub fn data_cache_budget(&self) -> usize {
+        self.data_cache.borrow().byte_budget()
+    }
+
+    /// Limit the number of bytes each branch's data cache may use, evicting the least
+    /// recently used frames to fit.
+    pub fn set_data_cache_budget(&mut self, byte_budget: usize) {
+        self.data_cache.get_mut().set_byte_budget(byte_budget);
+        for data_cache in self.parked_data_caches.values_mut() {
+            data_cache.set_byte_budget(byte_budget);
+        }
+    }
+
+    /// Always preload the given paths into the data cache for new frames, replacing the
+    /// previously pinned paths.
+    pub fn set_pinned_paths(&mut self, paths: &[GuardedPath]) {
+        self.data_cache.get_mut().set_pinned_paths(paths);
+        for data_cache in self.parked_data_caches.values_mut() {
+            data_cache.set_pinned_paths(paths);
+        }
+    }
+
+    /// Stop preloading the given paths into the data cache until they are read again.
+    ///
+    /// Pinned paths are not affected.
+    pub fn demote_paths(&mut self, paths: &[GuardedPath]) {
+        for path in paths {
+            self.data_cache.get_mut().demote_path(path);
+            for data_cache in self.parked_data_caches.values_mut() {
+                data_cache.demote_path(path);
+            }
+        }
+    }
+
+    /// Return the hit, miss, and eviction counts of the current branch's data cache.
+    pub fn data_cache_stats(&self) -> DataCacheStats {
+        self.data_cache.borrow().stats()
+    }
 }
 
 /// A set of frames that should be invalidated after a controller mutation.
@@ -178,6 +569,11 @@ impl<M: Memory, C: Controller<M>> Timeline<M, C> {
 pub enum InvalidatedFrames {
     /// Invalidate states at and after the given frame.
     StartingAt(u32),
+    /// Invalidate states at and after `start`, where the controller's behavior only changed
+    /// on frames in `start..end`.
+    ///
+    /// States at or after `end` may re-converge with their previous values.
+    Edited { start: u32, end: u32 },
     /// No frames need to be invalidated.
     None,
 }
@@ -188,20 +584,39 @@ impl InvalidatedFrames {
         *self = InvalidatedFrames::None;
     }
 
-    /// Include `frame` in the set.
+    /// Include `frame` in the set, where only the controller's behavior on `frame` changed.
     pub fn include(&mut self, frame: u32) {
-        match self {
-            Self::StartingAt(prev_frame) => *prev_frame = frame.min(*prev_frame),
-            Self::None => *self = Self::StartingAt(frame),
-        }
+        *self = self.union(Self::Edited {
+            start: frame,
+            end: frame + 1,
+        });
     }
 
     /// The union of two sets of frames.
-    pub fn union(mut self, other: Self) -> Self {
-        if let Self::StartingAt(frame) = other {
-            self.include(frame);
+    pub fn union(self, other: Self) -> Self {
+        match (self, other) {
+            (Self::None, other) => other,
+            (this, Self::None) => this,
+            (
+                Self::Edited { start, end },
+                Self::Edited {
+                    start: other_start,
+                    end: other_end,
+                },
+            ) => Self::Edited {
+                start: start.min(other_start),
+                end: end.max(other_end),
+            },
+            (this, other) => Self::StartingAt(this.start().min(other.start())),
+        }
+    }
+
+    /// Return the first invalidated frame.
+    fn start(self) -> u32 {
+        match self {
+            Self::StartingAt(start) | Self::Edited { start, .. } => start,
+            Self::None => u32::MAX,
         }
-        self
     }
 }
 
@@ -223,14 +638,14 @@ impl<'a, M: Memory, C: Controller<M>> State for TimelineState<'a, M, C> {
     }
 
     fn path_address(&self, path: &GlobalDataPath) -> Result<Option<Address>, Error> {
-        // Uncached for now (could also skip frame request in common case)
-        Ok(self
-            .timeline
-            .frame_uncached(self.frame)?
-            .path_address(path)?)
+        self.timeline.path_address_cached(self.frame, path)
     }
 
     fn path_read(&self, path: &GlobalDataPath) -> Result<Value, Error> {
         self.timeline.path_read_cached(self.frame, path)
     }
+
+    fn guarded_read(&self, path: &GuardedPath) -> Result<Value, Error> {
+        self.timeline.guarded_read_cached(self.frame, path)
+    }
 }